@@ -0,0 +1,91 @@
+# calc_multiples'taki fiyat - finansal eşlemesinin karşılaştırması:
+#   eski yol: effective_quarter_end kolonu + bütün price tablosu üzerinde hash merge
+#   yeni yol: align_fundamentals (şirket + gün anahtarı üzerinde searchsorted)
+#
+# Çalıştırmak için proje kök dizininden:
+#   python -m benchmarks.bench_alignment --rows 10000000
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.alignment import align_fundamentals
+
+
+def _make_frames(n_rows: int, n_companies: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    n_days = n_rows // n_companies
+    dates = pd.bdate_range("2000-01-03", periods=n_days)
+
+    # fiyatlar şirkete göre sıralı gelmesin
+    price_df = pd.DataFrame({
+        "company_id": np.repeat(np.arange(1, n_companies + 1), n_days),
+        "date": np.tile(dates.to_numpy(), n_companies),
+        "market_cap": rng.random(n_days * n_companies) * 1e9,
+    }).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    years = range(dates[0].year - 1, dates[-1].year + 1)
+    periods = [(y, m) for y in years for m in (3, 6, 9, 12)]
+    fin_df = pd.DataFrame({
+        "company_id": np.repeat(np.arange(1, n_companies + 1), len(periods)),
+        "period_year": np.tile([y for y, _ in periods], n_companies),
+        "period_month": np.tile([m for _, m in periods], n_companies),
+        "date_of_publish": None,
+        "net_income_ttm": rng.random(len(periods) * n_companies) * 1e8,
+    })
+    return price_df, fin_df
+
+
+# eski yol, karşılaştırma için olduğu gibi bırakıldı
+def _legacy_merge(price_df: pd.DataFrame, fin_df: pd.DataFrame) -> pd.DataFrame:
+    price_df = price_df.copy()
+    fin_df = fin_df.copy()
+    price_df["effective_quarter_end"] = (price_df["date"] - pd.Timedelta(days=45)) + pd.offsets.QuarterEnd(-1)
+    fin_df["period_end"] = pd.to_datetime(
+        fin_df["period_year"].astype(str) + "-" + fin_df["period_month"].astype(str) + "-01"
+    ) + pd.offsets.MonthEnd(0)
+    return price_df.merge(
+        fin_df,
+        left_on=["company_id", "effective_quarter_end"],
+        right_on=["company_id", "period_end"],
+        how="left"
+    )
+
+
+def _aligned_merge(price_df: pd.DataFrame, fin_df: pd.DataFrame) -> pd.DataFrame:
+    fin_idx = align_fundamentals(price_df, fin_df)
+    aligned_fin = fin_df.drop(columns=["company_id"]).reindex(fin_idx).reset_index(drop=True)
+    return pd.concat([price_df.reset_index(drop=True), aligned_fin], axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--companies", type=int, default=2000)
+    args = parser.parse_args()
+
+    price_df, fin_df = _make_frames(args.rows, args.companies)
+    print(f"{len(price_df):,} fiyat satırı, {len(fin_df):,} finansal satır")
+
+    start = time.perf_counter()
+    align_fundamentals(price_df, fin_df)
+    seconds = time.perf_counter() - start
+    print(f"{'sadece eşleme indeksi':>28}: {seconds:8.3f} s  {len(price_df) / seconds:14,.0f} satır/s")
+
+    results = {}
+    for name, fn in [("align_fundamentals", _aligned_merge), ("effective_quarter_end merge", _legacy_merge)]:
+        start = time.perf_counter()
+        results[name] = fn(price_df, fin_df)
+        seconds = time.perf_counter() - start
+        print(f"{name:>28}: {seconds:8.3f} s  {len(price_df) / seconds:14,.0f} satır/s")
+
+    # date_of_publish boşken iki yol aynı sonucu vermeli
+    new = results["align_fundamentals"]["net_income_ttm"].to_numpy()
+    old = results["effective_quarter_end merge"]["net_income_ttm"].to_numpy()
+    print("Sonuçlar aynı:", np.array_equal(new, old, equal_nan=True))
+
+
+if __name__ == "__main__":
+    main()
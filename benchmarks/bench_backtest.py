@@ -0,0 +1,54 @@
+# src/backtest.py motorunun büyük bir evrende süresini ölçer.
+#
+# Çalıştırmak için proje kök dizininden:
+#   python -m benchmarks.bench_backtest --stocks 500 --years 20
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.backtest import backtest, top_n_weights
+
+
+def _make_market(n_stocks: int, n_years: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2005-01-03", periods=n_years * 252, name="date")
+    returns = rng.normal(0.0003, 0.02, (len(dates), n_stocks))
+    close = pd.DataFrame(100 * np.cumprod(1 + returns, axis=0), index=dates, columns=np.arange(1, n_stocks + 1))
+    # hisselerin bir kısmı dönemin ortasında işlem görmeye başlasın
+    listing = rng.integers(0, len(dates) // 2, n_stocks // 10)
+    for col, start in zip(close.columns[:len(listing)], listing):
+        close.iloc[:start, close.columns.get_loc(col)] = np.nan
+    signal = pd.DataFrame(rng.normal(size=close.shape), index=dates, columns=close.columns)
+    return close, signal
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stocks", type=int, default=500)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    close, signal = _make_market(args.stocks, args.years)
+    print(f"{args.stocks} hisse x {args.years} yıl: {close.shape[0]} gün")
+
+    start = time.perf_counter()
+    weights = top_n_weights(signal, args.top)
+    print(f"{'top_n_weights':>28}: {time.perf_counter() - start:8.3f} s")
+
+    for rebalance_every in (1, 21):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = backtest(close, weights, rebalance_every=rebalance_every, cost_bps=10)
+            best = min(best, time.perf_counter() - start)
+        print(f"{f'backtest (her {rebalance_every} günde)':>28}: {best:8.3f} s  "
+              f"ortalama turnover {result.summary()['avg_turnover']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# fetch_fin içindeki çeyreklik / TTM hesaplarının eski (kalem başına groupby diff + rolling)
+# ve yeni (_derive_quarterly) yollarının karşılaştırması.
+#
+# Çalıştırmak için proje kök dizininden:
+#   python -m benchmarks.bench_quarterly --companies 3000 --years 20
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.fetch_financials import KALEMLER, _derive_quarterly
+
+
+def _make_fin_frame(n_companies: int, n_years: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n_periods = n_years * 4
+    df = pd.DataFrame({
+        "company_id": np.repeat(np.arange(1, n_companies + 1), n_periods),
+        "period_year": np.tile(np.repeat(np.arange(2005, 2005 + n_years), 4), n_companies),
+        "period_month": np.tile([3, 6, 9, 12], n_companies * n_years),
+    })
+    for kalem in KALEMLER:
+        # yıl içinde artan kümülatif değerler
+        quarterly = rng.random((n_companies * n_years, 4)) * 1e6
+        df[kalem + "_c"] = quarterly.cumsum(axis=1).ravel()
+    return df
+
+
+# eski yol, karşılaştırma için olduğu gibi bırakıldı
+def _legacy_derive(df_pivoted: pd.DataFrame, kalemler: list) -> pd.DataFrame:
+    df_pivoted = df_pivoted.copy()
+    for kalem in kalemler:
+        kalem_q = kalem + "_q"
+        kalem_c = kalem + "_c"
+        kalem_ttm = kalem + "_ttm"
+
+        df_pivoted[kalem_q] = np.where(
+            df_pivoted['period_month'] == 3,
+            df_pivoted[kalem_c],
+            df_pivoted.groupby(['company_id',"period_year"])[kalem_c].diff()
+        )
+
+        df_pivoted[kalem_ttm] = df_pivoted.groupby('company_id')[kalem_q].rolling(
+            window=4
+        ).sum().reset_index(level=0, drop=True)
+    return df_pivoted
+
+
+def _time(fn, data: pd.DataFrame, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(data, KALEMLER)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=3000)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = _make_fin_frame(args.companies, args.years)
+    print(f"{args.companies} şirket x {args.years} yıl: {len(data)} dönem, {len(KALEMLER)} kalem")
+
+    results = {}
+    for name, fn in [("_derive_quarterly", _derive_quarterly), ("groupby diff + rolling", _legacy_derive)]:
+        seconds, results[name] = _time(fn, data, args.repeat)
+        print(f"{name:>24}: {seconds:8.3f} s  {len(data) / seconds:14,.0f} satır/s")
+
+    # boşluk olmayan veride iki yol aynı sonucu vermeli
+    new, old = results.values()
+    columns = [kalem + suffix for kalem in KALEMLER for suffix in ("_q", "_ttm")]
+    assert np.allclose(new[columns].to_numpy(), old[columns].to_numpy(), equal_nan=True)
+    print("sonuçlar aynı")
+
+
+if __name__ == "__main__":
+    main()
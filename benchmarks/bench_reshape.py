@@ -0,0 +1,70 @@
+# yfinance geniş tablosunu price tablosunun uzun formatına çeviren eski (melt + pivot_table)
+# ve yeni (_reshape_yf) yolların karşılaştırması.
+#
+# Çalıştırmak için proje kök dizininden:
+#   python -m benchmarks.bench_reshape --tickers 500 --years 20
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.fetch_prices import _reshape_yf
+
+
+def _make_yf_frame(n_tickers: int, n_years: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2000-01-03", periods=n_years * 252, name="Date")
+    tickers = [f"TICK{i}.IS" for i in range(n_tickers)]
+    columns = pd.MultiIndex.from_product([["Close", "High", "Low", "Open", "Volume"], tickers], names=["Price", "Ticker"])
+    values = rng.random((len(dates), len(columns))) * 100
+    return pd.DataFrame(values, index=dates, columns=columns)
+
+
+# eski yol, karşılaştırma için olduğu gibi bırakıldı
+def _legacy_reshape(data: pd.DataFrame) -> pd.DataFrame:
+    data = data.copy()
+    data.columns = ['_'.join(col).strip() for col in data.columns.values]
+    data = data.reset_index()
+    data = pd.melt(data, id_vars=['Date'], var_name='ticker_info', value_name='value')
+    data[['data_type', 'ticker']] = data['ticker_info'].str.split('_', expand=True)
+    data.drop('ticker_info', axis=1, inplace=True)
+
+    data = data.pivot_table(index=['Date', 'ticker'], columns='data_type', values='value').reset_index()
+    data.columns.name = None
+    data.columns = data.columns.str.lower()
+    return data
+
+
+def _time(fn, data: pd.DataFrame, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    data = _make_yf_frame(args.tickers, args.years)
+    print(f"{args.tickers} ticker x {args.years} yıl: {data.shape[0]} gün, {data.shape[1]} kolon")
+
+    paths = [("_reshape_yf", _reshape_yf)]
+    if not args.skip_legacy:
+        paths.append(("melt + pivot_table", _legacy_reshape))
+
+    for name, fn in paths:
+        seconds, rows = _time(fn, data, args.repeat)
+        print(f"{name:>20}: {seconds:8.3f} s  {rows:>10} satır  {rows / seconds:14,.0f} satır/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Metin anahtarlı eski price düzeni ile tam sayı gün anahtarlı (src/migrate.py, migration 1 ve 9) düzenin
+# dosya boyutu, close matrisi okuma süresi ve upsert süresi karşılaştırması.
+#   eski düzen: UNIQUE (company_id, date) ve (company_id, date) metin index'leri, okuyucu metin tarihleri to_datetime ile çevirir
+#   yeni düzen: day kolonu, UNIQUE (company_id, day) + (company_id, day, close) covering index'i,
+#               sadece tekil günler tarihe çevrilir. Upsert burada table_version / change_log triggerlarını da çalıştırır.
+#
+# Çalıştırmak için proje kök dizininden:
+#   python -m benchmarks.bench_storage --companies 300 --days 2500
+
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.backtest import load_matrix
+from src.db_writer import upsert_prices
+from src.migrate import SQL_DIR, migrate
+
+
+def _legacy_database(path: str, n_companies: int, n_days: int, seed: int = 0):
+    with open(os.path.join(SQL_DIR, "schema.sql"), encoding="utf-8") as f:
+        schema = re.sub(r"\n\s*(day|period_key)\s+INTEGER,[^\n]*", "", f.read())
+    schema = re.sub(r",[ \t]*\n\s*UNIQUE \(company_id, (day|period_key)\)[^\n]*", "", schema)
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2015-01-01", periods=n_days).strftime("%Y-%m-%d %H:%M:%S")
+    conn = sqlite3.connect(path)
+    conn.executescript(schema)
+    conn.execute("CREATE UNIQUE INDEX legacy_price_key ON price (company_id, date)")
+    conn.execute("CREATE INDEX idx_prices_company_date ON price (company_id, date)")
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(c, f"T{c}.IS", f"T{c}") for c in range(1, n_companies + 1)])
+    pd.DataFrame({
+        "company_id": np.repeat(np.arange(1, n_companies + 1), n_days),
+        "date": np.tile(dates, n_companies),
+        "open": 10.0, "close": rng.random(n_companies * n_days) * 100, "high": 110.0, "low": 1.0,
+        "volume": 1000, "market_cap": 1e9,
+    }).to_sql("price", conn, if_exists="append", index=False)
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def _legacy_load(conn) -> pd.DataFrame:
+    # migration öncesi load_matrix'in okuma yolu, karşılaştırma için olduğu gibi bırakıldı
+    df = pd.read_sql_query("SELECT company_id, date, close FROM price", conn)
+    df["date"] = pd.to_datetime(df["date"])
+    date_codes, dates = pd.factorize(df["date"], sort=True)
+    company_codes, companies = pd.factorize(df["company_id"], sort=True)
+    values = np.full((len(dates), len(companies)), np.nan)
+    values[date_codes, company_codes] = df["close"].to_numpy(dtype=float)
+    return pd.DataFrame(values, index=pd.DatetimeIndex(dates, name="date"), columns=pd.Index(companies, name="company_id"))
+
+
+def _new_days(n_companies: int, n_days: int, start_day: int) -> pd.DataFrame:
+    # günlük yazma yolu: mevcut son günden sonraki n_days gün, bütün şirketler
+    dates = pd.bdate_range("2015-01-01", periods=start_day + n_days)[start_day:]
+    return pd.DataFrame({
+        "company_id": np.repeat(np.arange(1, n_companies + 1), n_days),
+        "date": np.tile(dates, n_companies),
+        "open": 10.0, "close": 50.0, "high": 110.0, "low": 1.0, "volume": 1000, "market_cap": 1e9,
+    })
+
+
+def _timed(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=300)
+    parser.add_argument("--days", type=int, default=2500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        legacy_path = os.path.join(tmp_dir, "legacy.db")
+        compact_path = os.path.join(tmp_dir, "compact.db")
+        _legacy_database(legacy_path, args.companies, args.days)
+        shutil.copy(legacy_path, compact_path)
+
+        conn = sqlite3.connect(compact_path)
+        start = time.perf_counter()
+        migrate(conn, vacuum=True)
+        print(f"{args.companies * args.days:,} fiyat satırı, migration {time.perf_counter() - start:.2f} s")
+        conn.close()
+
+        results = {}
+        for name, path, fn in [("metin anahtar", legacy_path, _legacy_load),
+                               ("tam sayı gün", compact_path, lambda c: load_matrix(c, "price", "close"))]:
+            conn = sqlite3.connect(path)
+            seconds, results[name] = _timed(lambda: fn(conn), args.repeat)
+            size = os.path.getsize(path) / 2 ** 20
+
+            start = time.perf_counter()
+            with conn:
+                upsert_prices(conn, _new_days(args.companies, 20, args.days))
+            upsert_seconds = time.perf_counter() - start
+            conn.close()
+            print(f"{name:>14}: {size:8.1f} MB  close matrisi {seconds:7.3f} s  20 günlük upsert {upsert_seconds:6.3f} s")
+
+        old, new = results.values()
+        print("Sonuçlar aynı:", old.shape == new.shape and np.array_equal(old.to_numpy(), new.to_numpy(), equal_nan=True))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# src/sweep.py'nin worker sayısına göre saniyedeki backtest sayısını ölçer.
+#
+# Çalıştırmak için proje kök dizininden:
+#   python -m benchmarks.bench_sweep --stocks 500 --years 20 --runs 32
+
+import argparse
+import os
+import sqlite3
+import time
+
+from benchmarks.bench_backtest import _make_market
+from src.sweep import run_sweep
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stocks", type=int, default=500)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    close, signal = _make_market(args.stocks, args.years)
+    market = {"close": close, "signal": signal}
+    grid = [{"factor": "signal", "n": n, "rebalance_every": 5} for n in range(10, 10 + args.runs)]
+    print(f"{args.stocks} hisse x {args.years} yıl, {args.runs} çalıştırma, {os.cpu_count()} CPU")
+
+    conn = sqlite3.connect(":memory:")
+    with open(os.path.join(ROOT, "sql", "schema.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())
+
+    base = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        run_sweep(conn, f"bench_{workers}", market, grid, workers=workers)
+        seconds = time.perf_counter() - start
+        base = base or seconds
+        print(f"{workers:>3} worker: {seconds:8.2f} s  {args.runs / seconds:6.2f} çalıştırma/s  hızlanma x{base / seconds:.2f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# Sentetik veriyle (benchmarks/synthetic.py) bütün pipeline'ın süre ve bellek ölçümü.
+#
+# Her ölçek (şirket x yıl) için aşamalar sırayla çalıştırılır:
+#   _fetch_and_process_yf, _fetch_and_merge_is, fetch_fin (sadece dönüşüm, ağ yok),
+#   upsert_prices / upsert_financials (boş tabloya ve aynı veriyle ikinci kez, değişmeyen satırlar),
+#   calc_ratios / calc_multiples (sadece hesap), update_ratios / update_multiples (hesap + yazma)
+# Veritabanı geçici bir dizindeki dosyadır ve src.db.connect'in PRAGMA'larıyla açılır.
+#
+# Süre: --repeat kez çalıştırılan pipeline'da her aşamanın en iyi süresi.
+# Bellek: ayrı bir çalıştırmada tracemalloc ile her aşamanın en yüksek Python + numpy ayırması (peak_mb).
+# Sonuçlar benchmarks/results/ altına commit hash'li bir JSON olarak yazılır. --compare ile
+# önceki bir sonuç dosyasına göre oranlar basılır, eşikten yavaş aşamalar varsa çıkış kodu 1 olur.
+#
+# Çalıştırmak için proje kök dizininden:
+#   python -m benchmarks.run_benchmarks --scales 50x2 200x5 500x10
+#   python -m benchmarks.run_benchmarks --scales 50x2 --compare benchmarks/results/<önceki>.json
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from src.app_logger import AppLogger
+from src.calc_multiples import calc_multiples, update_multiples
+from src.calc_ratios import calc_ratios, update_ratios
+from src.db import connect
+from src.db_writer import upsert_financials, upsert_prices
+from src.fetch_financials import fetch_fin
+from src.fetch_prices import _fetch_and_merge_is, _fetch_and_process_yf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def _prepare_database(path: str, ticker_dict: dict):
+    conn = connect(path)
+    for name in ["schema.sql", "indexes.sql", "triggers.sql"]:
+        with open(os.path.join(ROOT, "sql", name), encoding="utf-8") as f:
+            conn.executescript(f.read())
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(company_id, ticker, ticker[:-3]) for ticker, company_id in ticker_dict.items()])
+    conn.commit()
+    return conn
+
+
+def _stages(n_companies: int, n_years: int, seed: int) -> list:
+    """(aşama adı, fonksiyon) listesi. Fonksiyonlar ortak bir state sözlüğü alır, işledikleri satır sayısını döndürür."""
+    ticker_dict = synthetic.ticker_dict(n_companies)
+    end_year = synthetic.FIRST_YEAR + n_years - 1
+    yf_result = synthetic.fetch_result("yf", synthetic.yf_frames(n_companies, n_years, seed=seed))
+    is_result = synthetic.fetch_result("is", synthetic.is_price_frames(n_companies, n_years, seed=seed))
+    provider = synthetic.SyntheticProvider(seed)
+    logger = AppLogger(None, "benchmark", level="ERROR")
+
+    def process_yf(state):
+        state["yf_df"] = _fetch_and_process_yf(ticker_dict, yf_result)
+        return len(state["yf_df"])
+
+    def merge_is(state):
+        state["price_df"] = _fetch_and_merge_is(state["yf_df"], is_result)
+        return len(state["price_df"])
+
+    def transform_fin(state):
+        state["fin_df"] = fetch_fin(None, ticker_dict, synthetic.FIRST_YEAR, end_year, logger, provider)
+        return len(state["fin_df"])
+
+    def write_prices(state):
+        return sum(upsert_prices(state["conn"], state["price_df"]).values())
+
+    def write_financials(state):
+        return sum(upsert_financials(state["conn"], state["fin_df"]).values())
+
+    def compute_ratios(state):
+        return len(calc_ratios(state["conn"]))
+
+    def write_ratios(state):
+        return sum(update_ratios(state["conn"], logger=logger).values())
+
+    def compute_multiples(state):
+        return len(calc_multiples(state["conn"]))
+
+    def write_multiples(state):
+        return sum(update_multiples(state["conn"], logger=logger).values())
+
+    return [
+        ("_fetch_and_process_yf", process_yf),
+        ("_fetch_and_merge_is", merge_is),
+        ("fetch_fin", transform_fin),
+        ("upsert_prices", write_prices),
+        ("upsert_prices_unchanged", write_prices),
+        ("upsert_financials", write_financials),
+        ("upsert_financials_unchanged", write_financials),
+        ("calc_ratios", compute_ratios),
+        ("update_ratios", write_ratios),
+        ("calc_multiples", compute_multiples),
+        ("update_multiples", write_multiples),
+    ], ticker_dict
+
+
+def _run_pipeline(stages: list, ticker_dict: dict, tmp_dir: str, trace: bool) -> dict:
+    """Aşamaları boş bir veritabanı üzerinde sırayla çalıştırır: {aşama: (saniye, satır, peak_mb)}."""
+    path = os.path.join(tmp_dir, "bench.db")
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    state = {"conn": _prepare_database(path, ticker_dict)}
+
+    measured = {}
+    try:
+        for name, fn in stages:
+            if trace:
+                tracemalloc.start()
+            start = time.perf_counter()
+            rows = fn(state)
+            seconds = time.perf_counter() - start
+            peak_mb = None
+            if trace:
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                tracemalloc.stop()
+            measured[name] = (seconds, rows, peak_mb)
+    finally:
+        state["conn"].close()
+    return measured
+
+
+def run_scale(n_companies: int, n_years: int, repeat: int, seed: int = 0) -> list:
+    stages, ticker_dict = _stages(n_companies, n_years, seed)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        timings = [_run_pipeline(stages, ticker_dict, tmp_dir, trace=False) for _ in range(repeat)]
+        memory = _run_pipeline(stages, ticker_dict, tmp_dir, trace=True)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    results = []
+    for name, _ in stages:
+        seconds = min(run[name][0] for run in timings)
+        rows = timings[0][name][1]
+        results.append({
+            "scale": f"{n_companies}x{n_years}",
+            "companies": n_companies,
+            "years": n_years,
+            "stage": name,
+            "rows": int(rows),
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds > 0 else None,
+            "peak_mb": memory[name][2],
+        })
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True,
+                               text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment() -> dict:
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(current: list, baseline: list, threshold: float, min_seconds: float = 0.0) -> list:
+    """
+    Aynı (ölçek, aşama) için süre ve bellek oranları. ratio > 1 + threshold olan aşamalar regression sayılır,
+    önceki süresi min_seconds'tan kısa aşamalar gürültülü olduğu için sayılmaz.
+    """
+    base = {(row["scale"], row["stage"]): row for row in baseline}
+    rows = []
+    for row in current:
+        old = base.get((row["scale"], row["stage"]))
+        if old is None or not old["seconds"]:
+            continue
+        ratio = row["seconds"] / old["seconds"]
+        memory_ratio = row["peak_mb"] / old["peak_mb"] if row["peak_mb"] and old["peak_mb"] else None
+        rows.append({"scale": row["scale"], "stage": row["stage"], "old_seconds": old["seconds"],
+                     "seconds": row["seconds"], "ratio": ratio, "memory_ratio": memory_ratio,
+                     "regression": ratio > 1 + threshold and old["seconds"] >= min_seconds})
+    return rows
+
+
+def _parse_scale(text: str) -> tuple:
+    companies, years = text.lower().split("x")
+    return int(companies), int(years)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentetik veriyle pipeline benchmark'ı.")
+    parser.add_argument("--scales", nargs="+", default=["50x2", "200x5"], help="şirket x yıl, örn. 500x10")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="sonuç dosyası (varsayılan: benchmarks/results/<zaman>_<commit>.json)")
+    parser.add_argument("--compare", default=None, help="karşılaştırılacak önceki sonuç dosyası")
+    parser.add_argument("--threshold", type=float, default=0.2, help="bu orandan fazla yavaşlama regression sayılır")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="bundan kısa süren aşamalar regression sayılmaz")
+    args = parser.parse_args()
+
+    env = environment()
+    print(f"commit {env['commit']}, Python {env['python']}, pandas {env['pandas']}, SQLite {env['sqlite']}, {env['cpu_count']} CPU")
+
+    results = []
+    for scale in args.scales:
+        n_companies, n_years = _parse_scale(scale)
+        scale_results = run_scale(n_companies, n_years, args.repeat, args.seed)
+        for row in scale_results:
+            print(f"{row['scale']:>9} {row['stage']:>28}: {row['seconds']:8.3f} s  {row['rows']:>10,} satır  "
+                  f"{row['peak_mb']:8.1f} MB")
+        results.extend(scale_results)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = env["timestamp"].replace(":", "").replace("-", "")
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{env['commit']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": env, "args": vars(args), "results": results}, f, indent=2)
+    print(f"Sonuçlar yazıldı: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Karşılaştırma: {baseline['environment']['commit']} -> {env['commit']}")
+        comparison = compare(results, baseline["results"], args.threshold, args.min_seconds)
+        for row in comparison:
+            flag = "  YAVAŞLADI" if row["regression"] else ""
+            memory = f"  bellek x{row['memory_ratio']:.2f}" if row["memory_ratio"] is not None else ""
+            print(f"{row['scale']:>9} {row['stage']:>28}: {row['old_seconds']:8.3f} -> {row['seconds']:8.3f} s  "
+                  f"x{row['ratio']:.2f}{memory}{flag}")
+        if any(row["regression"] for row in comparison):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# Benchmark'lar için sağlayıcı cevaplarının şeklinde, tekrarlanabilir (seed'li) sentetik veri.
+#
+# - yf_frames:       yfinance.download'un (alan, ticker) MultiIndex kolonlu geniş tabloları
+# - is_price_frames: isyatirimhisse.fetch_stock_data'nın HGDG_HS_KODU / HGDG_TARIH / PD tabloları
+# - is_fin_frame:    isyatirimhisse.fetch_financials'ın kalem x dönem ('2024/3', ...) tablosu
+#
+# Cevaplar FetchExecutor gibi shard_size'lık ticker parçaları halinde üretilir. SyntheticProvider,
+# ProviderCache.fetch ile aynı arayüzü verdiği için fetch_fin'e cache olarak verilip ağa gitmeden çalıştırılabilir.
+
+import numpy as np
+import pandas as pd
+
+from src.fetch_executor import FetchResult
+
+START_DATE = "2010-01-04"
+FIRST_YEAR = 2010
+
+# fetch_fin'in kullandığı kalemler: (kod, Türkçe ad, İngilizce ad, tür)
+# tür: "stock" bilanço kalemi, "flow" yıl içinde kümülatif artan gelir tablosu kalemi, "expense" negatif kümülatif kalem
+FIN_ITEMS = [
+    ("1A", "Dönen Varlıklar", "CURRENT ASSETS", "stock"),
+    ("1AA", "Nakit ve Nakit Benzerleri", "Cash\xa0and\xa0Cash\xa0Equivalents", "stock"),
+    ("1AB", "Finansal Yatırımlar", "Short-Term Financial Investments", "stock"),
+    ("1BL", "TOPLAM VARLIKLAR", "TOTAL ASSETS", "stock"),
+    ("2A", "Kısa Vadeli Yükümlülükler", "SHORT TERM LIABILITIES", "stock"),
+    ("2AA", "Finansal Borçlar", "Short-Term Financial Loans", "stock"),
+    ("2AAG", "Diğer Finansal Yükümlülükler", "Other Short-Term Financial Liabilities", "stock"),
+    ("2AAGB", "Finans Sektörü Faaliyetlerinden Borçlar", "Short-Term Loans from Financial Operations", "stock"),
+    ("2B", "Uzun Vadeli Yükümlülükler", "LONG TERM LIABILITIES", "stock"),
+    ("2BA", "Finansal Borçlar", "Long-Term Financial Loans", "stock"),
+    ("2BC", "Finans Sektörü Faaliyetlerinden Borçlar", "Long-Term Loans from Financial Operations", "stock"),
+    ("2N", "Özkaynaklar", "SHAREHOLDERS EQUITY", "stock"),
+    ("3C", "Satış Gelirleri", "Net Sales", "flow"),
+    ("3D", "BRÜT KAR (ZARAR)", "GROSS PROFIT (LOSS)", "flow"),
+    ("3DA", "Pazarlama, Satış ve Dağıtım Giderleri (-)", "Marketing Selling & Distrib. Expenses (-)", "expense"),
+    ("3DB", "Genel Yönetim Giderleri (-)", "General Administrative Expenses (-)", "expense"),
+    ("3DC", "Araştırma ve Geliştirme Giderleri (-)", "Research & Development Expenses (-)", "expense"),
+    ("3DF", "FAALİYET KARI (ZARARI)", "OPERATING PROFITS", "flow"),
+    ("3I", "SÜRDÜRÜLEN FAALİYETLER VERGİ ÖNCESİ KARI (ZARARI)", "PROFIT BEFORE TAX FROM CONTINUING OPERATIONS", "flow"),
+    ("3IA", "Sürdürülen Faaliyetler Vergi Gelir/Gideri", "Taxation on Continuing Operations", "expense"),
+    ("3L", "DÖNEM KARI (ZARARI)", "NET PROFIT AFTER TAXES", "flow"),
+    ("3ZE", "Sulandırılmış Hisse Başına Kar", "Diluted Earnings per Share", "flow"),
+    ("4B", "Amortisman Giderleri", "Depreciation & Amortization", "flow"),
+    ("4CBB", "Ödenen Temettüler", "Dividends Paid", "expense"),
+]
+
+
+def tickers(n_companies: int) -> list:
+    return [f"SYN{i:04d}.IS" for i in range(1, n_companies + 1)]
+
+
+def ticker_dict(n_companies: int) -> dict:
+    """fetch_prices / fetch_fin'e verilen {ticker: company_id} sözlüğü."""
+    return {ticker: company_id for company_id, ticker in enumerate(tickers(n_companies), start=1)}
+
+
+def trading_days(n_years: int) -> pd.DatetimeIndex:
+    return pd.bdate_range(START_DATE, periods=n_years * 252, name="Date")
+
+
+def _shards(items: list, shard_size: int) -> list:
+    return [items[i:i + shard_size] for i in range(0, len(items), shard_size)]
+
+
+def _prices(n_companies: int, n_days: int, seed: int) -> np.ndarray:
+    # geometrik rastgele yürüyüş, (gün, şirket)
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.02, (n_days, n_companies))
+    return 10 * np.exp(np.cumsum(returns, axis=0))
+
+
+def yf_frames(n_companies: int, n_years: int, shard_size: int = 50, seed: int = 0, missing: float = 0.01) -> list:
+    """
+    Her ticker parçası için yfinance.download şeklinde bir tablo. missing oranındaki (gün, ticker)
+    hücreleri NaN'dır (tatil / işlem görmeyen gün).
+    """
+    rng = np.random.default_rng(seed + 1)
+    dates = trading_days(n_years)
+    close = _prices(n_companies, len(dates), seed)
+    close[rng.random(close.shape) < missing] = np.nan
+    fields = {
+        "Close": close,
+        "High": close * 1.01,
+        "Low": close * 0.99,
+        "Open": close * (1 + rng.normal(0, 0.005, close.shape)),
+        "Volume": np.where(np.isnan(close), np.nan, rng.integers(1_000, 1_000_000, close.shape)),
+    }
+
+    names_all = tickers(n_companies)
+    frames = []
+    for shard in _shards(list(range(n_companies)), shard_size):
+        names = [names_all[i] for i in shard]
+        columns = pd.MultiIndex.from_product([list(fields), names], names=["Price", "Ticker"])
+        values = np.hstack([fields[field][:, shard] for field in fields])
+        frames.append(pd.DataFrame(values, index=dates, columns=columns))
+    return frames
+
+
+def is_price_frames(n_companies: int, n_years: int, shard_size: int = 50, seed: int = 0) -> list:
+    """Her ticker parçası için isyatirimhisse.fetch_stock_data şeklinde piyasa değeri tablosu."""
+    dates = trading_days(n_years)
+    market_cap = _prices(n_companies, len(dates), seed) * 1e8
+
+    codes_all = [ticker[:-3] for ticker in tickers(n_companies)]
+    frames = []
+    for shard in _shards(list(range(n_companies)), shard_size):
+        codes = [codes_all[i] for i in shard]
+        frames.append(pd.DataFrame({
+            "HGDG_HS_KODU": np.tile(codes, len(dates)),
+            "HGDG_TARIH": np.repeat(dates.to_numpy(), len(shard)),
+            "PD": market_cap[:, shard].ravel(),
+            "PD_USD": market_cap[:, shard].ravel() / 30,
+        }))
+    return frames
+
+
+def fetch_result(provider: str, frames: list) -> FetchResult:
+    """_fetch_raw'ın döndürdüğü, bütün parçaları başarılı bir FetchResult."""
+    result = FetchResult(provider)
+    result.frames = list(frames)
+    return result
+
+
+def is_fin_frame(symbols: list, start_year: int, end_year: int, seed: int = 0) -> pd.DataFrame:
+    """isyatirimhisse.fetch_financials şeklinde tablo: her sembol için kalem başına bir satır, dönem başına bir kolon."""
+    rng = np.random.default_rng(seed + 2)
+    periods = [f"{year}/{month}" for year in range(start_year, end_year + 1) for month in (3, 6, 9, 12)]
+    n_years = end_year - start_year + 1
+    n_rows = len(symbols) * len(FIN_ITEMS)
+
+    scale = np.repeat(rng.uniform(1e8, 1e10, len(symbols)), len(FIN_ITEMS))[:, None]
+    kinds = np.tile([kind for *_, kind in FIN_ITEMS], len(symbols))
+    stock = scale * rng.uniform(0.5, 1.5, (n_rows, len(periods)))
+    # kümülatif kalemler: her yılın çeyrekleri pozitif, yıl içinde birikerek artar
+    quarterly = scale[:, :, None] * rng.uniform(0.01, 0.1, (n_rows, n_years, 4))
+    cumulative = quarterly.cumsum(axis=2).reshape(n_rows, len(periods))
+    values = np.where((kinds == "stock")[:, None], stock, np.where((kinds == "expense")[:, None], -cumulative, cumulative))
+
+    df = pd.DataFrame(values, columns=periods)
+    df.insert(0, "FINANCIAL_ITEM_CODE", np.tile([code for code, *_ in FIN_ITEMS], len(symbols)))
+    df.insert(1, "FINANCIAL_ITEM_NAME_TR", np.tile([name for _, name, *_ in FIN_ITEMS], len(symbols)))
+    df.insert(2, "FINANCIAL_ITEM_NAME_EN", np.tile([name for _, _, name, _ in FIN_ITEMS], len(symbols)))
+    df["SYMBOL"] = np.repeat(symbols, len(FIN_ITEMS))
+    return df
+
+
+class SyntheticProvider:
+    """
+    ProviderCache.fetch ile aynı imzayı veren, istenen semboller için sentetik cevap üreten nesne.
+    fetch_fin(conn, ticker_dict, start_year, end_year, logger, cache=SyntheticProvider()) ağa gitmeden çalışır.
+    """
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+
+    def fetch(self, provider: str, fetch_fn, symbols, start, end, params: dict = None, closed: bool = False):
+        if provider != "is_fin":
+            raise ValueError(f"{provider} için sentetik cevap yok, fiyat parçaları için yf_frames / is_price_frames kullanılmalı.")
+        return is_fin_frame(list(symbols), int(start), int(end), self.seed)
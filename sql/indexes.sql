@@ -1,18 +1,26 @@
 -- Bu dosyanın ana amacı sorgu performansını arttırmak için indexler oluşturmak
 -- Mesela finansallar için company_id ve period bir girişi temsil eder. Buna göre
 -- sorgulama yapılabilir.
+--
+-- price, financial, ratio ve multiple'ın UNIQUE kısıtları tam sayı anahtarlardadır (day, period_key,
+-- src/compact_keys.py): (company_id, day) ve (company_id, period_key) aramaları bu kısıtların index'lerini kullanır.
+-- Metin tarih / dönem kolonlarında index yoktur.
 
-CREATE INDEX IF NOT EXISTS idx_prices_company_date
-    ON price (company_id, date);
+-- close okuması tablonun kendisine gitmeden sadece bu index'ten yapılır (covering index)
+CREATE INDEX IF NOT EXISTS idx_prices_company_day_close
+    ON price (company_id, day, close);
 
-CREATE INDEX IF NOT EXISTS idx_financials_company_period
-    ON financial (company_id, period_year,period_month);
-
-CREATE INDEX IF NOT EXISTS idx_ratios_company_period
-    ON ratio (company_id, period_year,period_month);;
-    
-CREATE INDEX IF NOT EXISTS idx_multiples_company_period
-    ON multiple (company_id, date_of_price);
+-- "D günü skora göre ilk N" sorgusu bu index üzerinde aralık taraması olarak çalışır
+CREATE INDEX IF NOT EXISTS idx_scores_name_date_rank
+    ON score (score_name, date, rank);
 
 CREATE INDEX IF NOT EXISTS idx_portfolio_company_date
-    ON portfolio (company_id, date_purchased);
\ No newline at end of file
+    ON portfolio (company_id, date_purchased);
+
+-- rapor her action'ın son çalıştırmalarını (stage = 'total' satırları) bu index üzerinden bulur
+CREATE INDEX IF NOT EXISTS idx_stage_metrics_stage_action_started
+    ON stage_metrics (stage, action, started_at);
+
+-- okuyucu "table_name = ? AND seq > ?" ile okur, seq (rowid) index'in sonunda olduğu için aralık taraması olur
+CREATE INDEX IF NOT EXISTS idx_change_log_table
+    ON change_log (table_name);
@@ -20,8 +20,9 @@ CREATE TABLE IF NOT EXISTS price (
     low         REAL    CHECK (low   >= 0),
     volume      INTEGER CHECK (volume >= 0),
     market_cap REAL,
+    day         INTEGER,                              -- 1970-01-01'den beri gün (src/compact_keys.py)
     FOREIGN KEY (company_id) REFERENCES company(company_id) ON DELETE CASCADE,
-    UNIQUE (company_id, date)                          -- aynı güne iki kayıt yok
+    UNIQUE (company_id, day)                           -- aynı güne iki kayıt yok ('2024-06-03' ve '2024-06-03 00:00:00' dahil)
 );
 
 -- 3) financial
@@ -59,8 +60,9 @@ CREATE TABLE IF NOT EXISTS financial (
     eps_q            REAL,
     eps_ttm            REAL,
     dividend_ttm       REAL,
+    period_key       INTEGER,                         -- yyyyqq (src/compact_keys.py)
     FOREIGN KEY (company_id) REFERENCES company(company_id) ON DELETE CASCADE,
-    UNIQUE (company_id, period_year,period_month)                        -- her dönem bir kayıt
+    UNIQUE (company_id, period_key)                   -- her dönem bir kayıt
 );
 
 -- 4) ratio
@@ -98,8 +100,9 @@ CREATE TABLE IF NOT EXISTS ratio (
     eps_growth_ttm_yoy REAL,
     eps_growth_q_yoy REAL,
     eps_growth_q_qoq REAL,
+    period_key          INTEGER,                      -- yyyyqq (src/compact_keys.py)
     FOREIGN KEY (company_id) REFERENCES company(company_id) ON DELETE CASCADE,
-    UNIQUE (company_id, period_year, period_month)                         -- dönem başına tek oran seti
+    UNIQUE (company_id, period_key)                   -- dönem başına tek oran seti
 );
 
 -- 5) multiple
@@ -115,8 +118,10 @@ CREATE TABLE IF NOT EXISTS multiple (
     ev_ebitda           REAL,
     dividend_yield      REAL,
     peg                 REAL,
+    day                 INTEGER,                      -- date_of_price'ın gün numarası
+    period_key          INTEGER,                      -- yyyyqq
     FOREIGN KEY (company_id) REFERENCES company(company_id) ON DELETE CASCADE,
-    UNIQUE (company_id, date_of_price)
+    UNIQUE (company_id, day)
 );
 
 -- 6) portfolio
@@ -129,6 +134,39 @@ CREATE TABLE IF NOT EXISTS portfolio (
     FOREIGN KEY (company_id) REFERENCES company(company_id)
 );
 
+-- 7) score
+-- her gün için kesitsel faktör skoru ve yüzdelik sırası (src/scoring.py)
+CREATE TABLE IF NOT EXISTS score (
+    score_id    INTEGER PRIMARY KEY,
+    score_name  TEXT    NOT NULL,                     -- config/settings.json'daki skor tanımının adı
+    date        TEXT    NOT NULL,
+    company_id  INTEGER NOT NULL,
+    composite   REAL,                                 -- faktör z-skorlarının ağırlıklı ortalaması
+    percentile  REAL,                                 -- o günkü evren içindeki yüzdelik sıra (1 = en iyi)
+    rank        INTEGER,                              -- o günkü sıra (1 = en iyi)
+    FOREIGN KEY (company_id) REFERENCES company(company_id) ON DELETE CASCADE,
+    UNIQUE (score_name, date, company_id)
+);
+
+-- 8) sweep_result
+-- parametre taramasındaki her backtest çalıştırmasının özeti (src/sweep.py)
+CREATE TABLE IF NOT EXISTS sweep_result (
+    sweep_result_id INTEGER PRIMARY KEY,
+    sweep_name      TEXT    NOT NULL,
+    run_id          TEXT    NOT NULL,                 -- parametrelerin hash'i, resume için
+    params          TEXT    NOT NULL,                 -- JSON
+    total_return    REAL,
+    cagr            REAL,
+    volatility      REAL,
+    sharpe          REAL,
+    max_drawdown    REAL,
+    avg_turnover    REAL,
+    total_cost      REAL,
+    error           TEXT,                             -- hata veren çalıştırmalarda mesaj, diğerlerinde NULL
+    finished_at     TEXT,
+    UNIQUE (sweep_name, run_id)
+);
+
 -- temel uygulama logları
 CREATE TABLE IF NOT EXISTS app_logs (
     log_id     INTEGER PRIMARY KEY,
@@ -136,4 +174,98 @@ CREATE TABLE IF NOT EXISTS app_logs (
     action     TEXT,           -- 'fetch_prices', 'calc_ratios', ...
     level      TEXT,           -- 'INFO','WARN','ERROR'
     message    TEXT
-);
\ No newline at end of file
+);
+
+-- pipeline adımlarının aşama bazında süre / satır / bellek ölçümleri (src/stage_metrics.py)
+CREATE TABLE IF NOT EXISTS stage_metrics (
+    metric_id   INTEGER PRIMARY KEY,
+    run_id      TEXT    NOT NULL,                     -- bir çalıştırmanın bütün aşamaları aynı run_id'yi taşır
+    action      TEXT    NOT NULL,                     -- 'fetch_prices', 'calc_ratios', ...
+    stage       TEXT    NOT NULL,                     -- 'total' ya da aşamanın yolu, örn. 'write/diff'
+    depth       INTEGER NOT NULL,
+    started_at  TEXT    NOT NULL,
+    calls       INTEGER NOT NULL,                     -- aşama kaç kez çalıştı (chunk döngüleri)
+    seconds     REAL    NOT NULL,
+    rows_in     INTEGER,
+    rows_out    INTEGER,
+    peak_mb     REAL,                                 -- aşamanın başına göre en yüksek ek bellek (tracemalloc)
+    status      TEXT    NOT NULL                      -- 'ok', 'error'
+);
+
+-- pipeline aşamalarının son başarılı çalıştırmadaki girdi durumu (src/pipeline.py)
+CREATE TABLE IF NOT EXISTS pipeline_state (
+    stage           TEXT    PRIMARY KEY,              -- 'fetch_prices', 'fetch_fin', 'calc_ratios', 'calc_multiples'
+    input_watermark TEXT,                             -- son başarılı çalıştırmanın girdileri (JSON), örn. {"financial": [12, 3]}
+    status          TEXT    NOT NULL,                 -- son çalıştırmanın sonucu: 'ok', 'error'
+    last_run_at     TEXT    NOT NULL,
+    last_success_at TEXT,
+    seconds         REAL,
+    result          TEXT                              -- son çalıştırmanın sayıları (JSON) ya da hata mesajı
+);
+
+-- price / financial'da eklenen, güncellenen ve silinen satırların anahtarları, sql/triggers.sql'deki triggerlarla yazılır
+-- (src/change_feed.py)
+CREATE TABLE IF NOT EXISTS change_log (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,    -- silinen seq'ler tekrar verilmez, okuyucuların cursor'ları hep ileri gider
+    table_name  TEXT    NOT NULL,                     -- 'price', 'financial', 'ratio', 'multiple'
+    company_id  INTEGER NOT NULL,
+    row_key     INTEGER,                              -- price / multiple: day, financial / ratio: period_key
+    op          TEXT    NOT NULL                      -- 'I', 'U', 'D'
+);
+
+-- change_log okuyucularının tablo bazında son okudukları seq
+CREATE TABLE IF NOT EXISTS change_cursor (
+    consumer    TEXT    NOT NULL,                     -- 'calc_ratios', 'calc_multiples', ...
+    table_name  TEXT    NOT NULL,
+    seq         INTEGER NOT NULL,
+    updated_at  TEXT    NOT NULL,
+    PRIMARY KEY (consumer, table_name)
+);
+
+-- şirket aksiyonlarının (bölünme / bedelsiz, temettü) fiyat düzeltme çarpanları, price ham kalır (src/adjustments.py)
+CREATE TABLE IF NOT EXISTS adjustment_factor (
+    adjustment_id INTEGER PRIMARY KEY,
+    company_id    INTEGER NOT NULL,
+    ex_date       TEXT    NOT NULL,                   -- 'YYYY-MM-DD', bu günden önceki fiyatlar factor ile çarpılır
+    ex_day        INTEGER NOT NULL,                   -- ex_date'in gün numarası (src/compact_keys.py)
+    kind          TEXT    NOT NULL,                   -- 'split', 'dividend', 'other'
+    value         REAL,                               -- split: oran (2:1 için 2), dividend: hisse başı tutar
+    factor        REAL    NOT NULL CHECK (factor > 0),
+    cumulative    REAL    NOT NULL,                   -- şirketin bu ve önceki bütün aksiyonlarının factor çarpımı
+    FOREIGN KEY (company_id) REFERENCES company(company_id) ON DELETE CASCADE,
+    UNIQUE (company_id, ex_day, kind)                 -- okuma bu kısıtın index'i üzerinden şirket ve gün sırasıyla yapılır
+);
+
+-- fiyatlardan türetilen günlük teknik göstergeler (src/calc_indicators.py)
+CREATE TABLE IF NOT EXISTS indicator (
+    indicator_id INTEGER PRIMARY KEY,
+    company_id   INTEGER NOT NULL,
+    day          INTEGER NOT NULL,                    -- 1970-01-01'den beri gün (src/compact_keys.py)
+    ret_1d       REAL,                                -- düzeltilmiş kapanışın günlük getirisi
+    vol_20       REAL,                                -- son 20 günlük getirinin standart sapması
+    sma_20       REAL,                                -- son 20 kapanışın ortalaması, o günün ham fiyat bazında
+    sma_50       REAL,
+    mom_20       REAL,                                -- 20 işlem günlük getiri
+    vavg_20      REAL,                                -- son 20 günün ortalama hacmi (ham)
+    FOREIGN KEY (company_id) REFERENCES company(company_id) ON DELETE CASCADE,
+    UNIQUE (company_id, day)
+);
+
+-- göstergelerin şirket başına kayan pencere durumu: son kapanışlar / getiriler / hacimler (src/calc_indicators.py)
+CREATE TABLE IF NOT EXISTS indicator_state (
+    company_id        INTEGER PRIMARY KEY,
+    last_day          INTEGER NOT NULL,               -- işlenen son fiyat günü
+    factor_cumulative REAL    NOT NULL,               -- last_day'e kadarki aksiyonların cumulative'i (adjustment_factor)
+    state             TEXT    NOT NULL,               -- pencereler (JSON)
+    updated_at        TEXT    NOT NULL,
+    FOREIGN KEY (company_id) REFERENCES company(company_id) ON DELETE CASCADE
+);
+
+-- fiyat geçmişi sağlayıcının düzeltilmiş fiyatlarıyla yazılmış, ham fiyatlarla yeniden çekilmesi gereken şirketler.
+-- Kaydı olan şirketler için adjusted=True okuma yapılmaz (src/adjustments.py, src/fetch_prices.py)
+CREATE TABLE IF NOT EXISTS price_refetch (
+    company_id  INTEGER PRIMARY KEY,
+    first_day   INTEGER NOT NULL,                     -- yeniden çekilecek ilk gün (src/compact_keys.py)
+    flagged_at  TEXT    NOT NULL,
+    FOREIGN KEY (company_id) REFERENCES company(company_id) ON DELETE CASCADE
+);
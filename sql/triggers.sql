@@ -0,0 +1,255 @@
+-- Bu dosyanın amacı tabloların değişip değişmediğini ucuzca takip etmek ve tam sayı anahtar
+-- kolonlarını (day, period_key) doldurmak.
+--
+-- table_version her tablo için iki sayaç tutar:
+--   version:   her insert / update / delete'te artar
+--   mutations: sadece update / delete'te artar
+-- Bellekteki önbellek (src/market_cache.py) version değişmediyse veriyi tekrar okumaz,
+-- sadece mutations değişmediyse (sadece yeni satır eklendiyse) sadece yeni satırları okur.
+--
+-- db_writer day / period_key kolonlarını kendisi yazar. Doğrudan SQL ile eklenen ya da tarihi / dönemi
+-- değişen satırlarda bu kolonlar aşağıdaki *_keys triggerları ile doldurulur. Sadece anahtarı dolduran
+-- bu güncelleme (OLD'da anahtar boş, NEW'de dolu) version triggerlarında değişiklik sayılmaz.
+--
+-- price ve financial'da değişen her satırın anahtarı change_log'a yazılır (src/change_feed.py):
+--   'I' eklenen, 'U' güncellenen satırın yeni anahtarı, 'D' silinen ya da anahtarı değişen satırın eski anahtarı.
+-- Anahtar metin kolonlarından hesaplanır, çünkü doğrudan SQL ile eklenen satırlarda day / period_key henüz boştur.
+-- Sadece anahtar kolonunu dolduran / düzelten güncelleme (tarih / dönem aynı, anahtar farklı) tekrar yazılmaz.
+-- ratio ve multiple da aynı şekilde yazılır, ama sadece tablonun change_cursor'da bir okuyucusu varsa
+-- (src/columnar_store.py): okuyucusu olmayan satırlar trim() ile silinmez, hesaplama yazmalarını boşuna büyütür.
+
+CREATE TABLE IF NOT EXISTS table_version (
+    table_name  TEXT    PRIMARY KEY,
+    version     INTEGER NOT NULL DEFAULT 0,
+    mutations   INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO table_version (table_name) VALUES ('price'), ('financial'), ('ratio'), ('multiple'), ('adjustment_factor'), ('indicator');
+
+-- price
+CREATE TRIGGER IF NOT EXISTS trg_price_version_insert AFTER INSERT ON price
+BEGIN
+    UPDATE table_version SET version = version + 1 WHERE table_name = 'price';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_price_version_update AFTER UPDATE ON price
+WHEN NOT (OLD.day IS NULL AND NEW.day IS NOT NULL)
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'price';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_price_version_delete AFTER DELETE ON price
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'price';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_price_keys_insert AFTER INSERT ON price
+WHEN NEW.day IS NULL
+BEGIN
+    UPDATE price SET day = CAST(julianday(substr(NEW.date, 1, 10)) - 2440587.5 AS INTEGER) WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_price_keys_update AFTER UPDATE OF date ON price
+WHEN NEW.date IS NOT OLD.date
+BEGIN
+    UPDATE price SET day = CAST(julianday(substr(NEW.date, 1, 10)) - 2440587.5 AS INTEGER) WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_price_changes_insert AFTER INSERT ON price
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('price', NEW.company_id, CAST(julianday(substr(NEW.date, 1, 10)) - 2440587.5 AS INTEGER), 'I');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_price_changes_update AFTER UPDATE ON price
+WHEN NEW.day IS OLD.day OR NEW.date IS NOT OLD.date OR NEW.company_id IS NOT OLD.company_id
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('price', NEW.company_id, CAST(julianday(substr(NEW.date, 1, 10)) - 2440587.5 AS INTEGER), 'U');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_price_changes_rekey AFTER UPDATE OF company_id, date ON price
+WHEN NEW.date IS NOT OLD.date OR NEW.company_id IS NOT OLD.company_id
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('price', OLD.company_id, CAST(julianday(substr(OLD.date, 1, 10)) - 2440587.5 AS INTEGER), 'D');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_price_changes_delete AFTER DELETE ON price
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('price', OLD.company_id, CAST(julianday(substr(OLD.date, 1, 10)) - 2440587.5 AS INTEGER), 'D');
+END;
+
+-- financial
+CREATE TRIGGER IF NOT EXISTS trg_financial_version_insert AFTER INSERT ON financial
+BEGIN
+    UPDATE table_version SET version = version + 1 WHERE table_name = 'financial';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_financial_version_update AFTER UPDATE ON financial
+WHEN NOT (OLD.period_key IS NULL AND NEW.period_key IS NOT NULL)
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'financial';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_financial_version_delete AFTER DELETE ON financial
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'financial';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_financial_keys_insert AFTER INSERT ON financial
+WHEN NEW.period_key IS NULL
+BEGIN
+    UPDATE financial SET period_key = CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3 WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_financial_keys_update AFTER UPDATE OF period_year, period_month ON financial
+WHEN NEW.period_year IS NOT OLD.period_year OR NEW.period_month IS NOT OLD.period_month
+BEGIN
+    UPDATE financial SET period_key = CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3 WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_financial_changes_insert AFTER INSERT ON financial
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('financial', NEW.company_id, CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3, 'I');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_financial_changes_update AFTER UPDATE ON financial
+WHEN NEW.period_key IS OLD.period_key OR NEW.period_year IS NOT OLD.period_year OR NEW.period_month IS NOT OLD.period_month
+     OR NEW.company_id IS NOT OLD.company_id
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('financial', NEW.company_id, CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3, 'U');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_financial_changes_rekey AFTER UPDATE OF company_id, period_year, period_month ON financial
+WHEN NEW.period_year IS NOT OLD.period_year OR NEW.period_month IS NOT OLD.period_month OR NEW.company_id IS NOT OLD.company_id
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('financial', OLD.company_id, CAST(OLD.period_year AS INTEGER) * 100 + (CAST(OLD.period_month AS INTEGER) + 2) / 3, 'D');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_financial_changes_delete AFTER DELETE ON financial
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('financial', OLD.company_id, CAST(OLD.period_year AS INTEGER) * 100 + (CAST(OLD.period_month AS INTEGER) + 2) / 3, 'D');
+END;
+
+-- ratio
+CREATE TRIGGER IF NOT EXISTS trg_ratio_version_insert AFTER INSERT ON ratio
+BEGIN
+    UPDATE table_version SET version = version + 1 WHERE table_name = 'ratio';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ratio_version_update AFTER UPDATE ON ratio
+WHEN NOT (OLD.period_key IS NULL AND NEW.period_key IS NOT NULL)
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'ratio';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ratio_version_delete AFTER DELETE ON ratio
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'ratio';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ratio_keys_insert AFTER INSERT ON ratio
+WHEN NEW.period_key IS NULL
+BEGIN
+    UPDATE ratio SET period_key = CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3 WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ratio_keys_update AFTER UPDATE OF period_year, period_month ON ratio
+WHEN NEW.period_year IS NOT OLD.period_year OR NEW.period_month IS NOT OLD.period_month
+BEGIN
+    UPDATE ratio SET period_key = CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3 WHERE rowid = NEW.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ratio_changes_insert AFTER INSERT ON ratio
+WHEN EXISTS (SELECT 1 FROM change_cursor WHERE table_name = 'ratio')
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('ratio', NEW.company_id, CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3, 'I');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ratio_changes_update AFTER UPDATE ON ratio
+WHEN (NEW.period_key IS OLD.period_key OR NEW.period_year IS NOT OLD.period_year OR NEW.period_month IS NOT OLD.period_month
+      OR NEW.company_id IS NOT OLD.company_id)
+     AND EXISTS (SELECT 1 FROM change_cursor WHERE table_name = 'ratio')
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('ratio', NEW.company_id, CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3, 'U');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ratio_changes_rekey AFTER UPDATE OF company_id, period_year, period_month ON ratio
+WHEN (NEW.period_year IS NOT OLD.period_year OR NEW.period_month IS NOT OLD.period_month OR NEW.company_id IS NOT OLD.company_id)
+     AND EXISTS (SELECT 1 FROM change_cursor WHERE table_name = 'ratio')
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('ratio', OLD.company_id, CAST(OLD.period_year AS INTEGER) * 100 + (CAST(OLD.period_month AS INTEGER) + 2) / 3, 'D');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_ratio_changes_delete AFTER DELETE ON ratio
+WHEN EXISTS (SELECT 1 FROM change_cursor WHERE table_name = 'ratio')
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('ratio', OLD.company_id, CAST(OLD.period_year AS INTEGER) * 100 + (CAST(OLD.period_month AS INTEGER) + 2) / 3, 'D');
+END;
+
+-- multiple
+CREATE TRIGGER IF NOT EXISTS trg_multiple_version_insert AFTER INSERT ON multiple
+BEGIN
+    UPDATE table_version SET version = version + 1 WHERE table_name = 'multiple';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_multiple_version_update AFTER UPDATE ON multiple
+WHEN NOT (OLD.day IS NULL AND NEW.day IS NOT NULL)
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'multiple';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_multiple_version_delete AFTER DELETE ON multiple
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'multiple';
+END;
+-- period_year'ı boş olan (henüz finansalı açıklanmamış) günler olağandır, sadece day'e bakılır
+CREATE TRIGGER IF NOT EXISTS trg_multiple_keys_insert AFTER INSERT ON multiple
+WHEN NEW.day IS NULL
+BEGIN
+    UPDATE multiple SET day = CAST(julianday(substr(NEW.date_of_price, 1, 10)) - 2440587.5 AS INTEGER), period_key = CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3 WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_multiple_keys_update AFTER UPDATE OF date_of_price, period_year, period_month ON multiple
+WHEN NEW.date_of_price IS NOT OLD.date_of_price OR NEW.period_year IS NOT OLD.period_year OR NEW.period_month IS NOT OLD.period_month
+BEGIN
+    UPDATE multiple SET day = CAST(julianday(substr(NEW.date_of_price, 1, 10)) - 2440587.5 AS INTEGER), period_key = CAST(NEW.period_year AS INTEGER) * 100 + (CAST(NEW.period_month AS INTEGER) + 2) / 3 WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_multiple_changes_insert AFTER INSERT ON multiple
+WHEN EXISTS (SELECT 1 FROM change_cursor WHERE table_name = 'multiple')
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('multiple', NEW.company_id, CAST(julianday(substr(NEW.date_of_price, 1, 10)) - 2440587.5 AS INTEGER), 'I');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_multiple_changes_update AFTER UPDATE ON multiple
+WHEN (NEW.day IS OLD.day OR NEW.date_of_price IS NOT OLD.date_of_price OR NEW.company_id IS NOT OLD.company_id)
+     AND EXISTS (SELECT 1 FROM change_cursor WHERE table_name = 'multiple')
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('multiple', NEW.company_id, CAST(julianday(substr(NEW.date_of_price, 1, 10)) - 2440587.5 AS INTEGER), 'U');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_multiple_changes_rekey AFTER UPDATE OF company_id, date_of_price ON multiple
+WHEN (NEW.date_of_price IS NOT OLD.date_of_price OR NEW.company_id IS NOT OLD.company_id)
+     AND EXISTS (SELECT 1 FROM change_cursor WHERE table_name = 'multiple')
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('multiple', OLD.company_id, CAST(julianday(substr(OLD.date_of_price, 1, 10)) - 2440587.5 AS INTEGER), 'D');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_multiple_changes_delete AFTER DELETE ON multiple
+WHEN EXISTS (SELECT 1 FROM change_cursor WHERE table_name = 'multiple')
+BEGIN
+    INSERT INTO change_log (table_name, company_id, row_key, op)
+    VALUES ('multiple', OLD.company_id, CAST(julianday(substr(OLD.date_of_price, 1, 10)) - 2440587.5 AS INTEGER), 'D');
+END;
+
+-- adjustment_factor: yeni bir aksiyon önbellekteki düzeltilmiş matrisleri geçersiz kılar (src/market_cache.py)
+CREATE TRIGGER IF NOT EXISTS trg_adjustment_factor_version_insert AFTER INSERT ON adjustment_factor
+BEGIN
+    UPDATE table_version SET version = version + 1 WHERE table_name = 'adjustment_factor';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_adjustment_factor_version_update AFTER UPDATE ON adjustment_factor
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'adjustment_factor';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_adjustment_factor_version_delete AFTER DELETE ON adjustment_factor
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'adjustment_factor';
+END;
+
+-- indicator
+CREATE TRIGGER IF NOT EXISTS trg_indicator_version_insert AFTER INSERT ON indicator
+BEGIN
+    UPDATE table_version SET version = version + 1 WHERE table_name = 'indicator';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_indicator_version_update AFTER UPDATE ON indicator
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'indicator';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_indicator_version_delete AFTER DELETE ON indicator
+BEGIN
+    UPDATE table_version SET version = version + 1, mutations = mutations + 1 WHERE table_name = 'indicator';
+END;
@@ -0,0 +1,162 @@
+# Şirket aksiyonları (bölünme / bedelsiz, temettü) için okuma anında uygulanan fiyat düzeltmesi.
+#
+# - price tablosu yfinance'in ham (düzeltilmemiş) OHLC'sini tutar, aksiyonlarda geçmiş fiyatlar yeniden yazılmaz.
+# - Her aksiyon adjustment_factor'da tek bir satırdır: ex_date'ten önceki fiyatlar factor ile çarpılır.
+#     split:    value = oran (2:1 bölünme / %100 bedelsiz için 2), factor = 1 / value
+#     dividend: value = hisse başı temettü, factor = 1 - value / ex_date'ten önceki son ham kapanış
+#     other:    factor doğrudan verilir (bedelli sermaye artırımı gibi)
+#   cumulative, şirketin o aksiyona kadarki (dahil) bütün factor'lerinin çarpımıdır. Yeni aksiyon en sondaysa
+#   cumulative = önceki cumulative * factor olarak tek satır eklenir, mevcut satırlar değişmez.
+# - d günündeki düzeltilmiş fiyat = ham fiyat * son cumulative / d günü bilinen cumulative (d'den önceki
+#   ex_date'lerin cumulative'i, hiç yoksa 1). adjust_matrix bunu şirket başına bir searchsorted ve
+#   matris çarpımıyla yapar. volume ve market_cap düzeltilmez.
+# - load_matrix(..., adjusted=True) ve cached_matrix(..., adjusted=True) düzeltilmiş matrisi verir. Önbellekte
+#   ham matris ve düzeltilmiş matris ayrı tutulur, yeni bir aksiyon sadece çarpımı tekrarlatır.
+# - Ham fiyata geçilmeden önce yazılmış fiyatlar sağlayıcı tarafından düzeltilmiştir. Bu şirketler price_refetch'te
+#   işaretlidir (migration 7), geçmişleri ham fiyatlarla yeniden çekilene kadar (fetch_prices.refetch_history)
+#   düzeltilmiş okuma yapılmaz, çarpanlar ikinci kez uygulanmasın.
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.compact_keys import encode_day
+
+# düzeltilen price kolonları
+ADJUSTED_COLUMNS = ["open", "close", "high", "low"]
+
+ACTION_KINDS = ["split", "dividend", "other"]
+
+
+def check_adjustable(table: str, column: str):
+    if table != "price" or column not in ADJUSTED_COLUMNS:
+        raise ValueError(f"Sadece price tablosunun {', '.join(ADJUSTED_COLUMNS)} kolonları düzeltilebilir: {table}.{column}")
+
+
+def refetch_pending(conn, company_ids: list = None) -> dict:
+    """Fiyat geçmişi henüz ham fiyatlarla yeniden çekilmemiş şirketler: {company_id: yeniden çekilecek ilk gün}."""
+    if company_ids is None:
+        rows = conn.execute("SELECT company_id, first_day FROM price_refetch")
+    else:
+        rows = conn.execute("SELECT company_id, first_day FROM price_refetch WHERE company_id IN (SELECT value FROM json_each(?))",
+                            [json.dumps([int(c) for c in company_ids])])
+    return {company_id: first_day for company_id, first_day in rows}
+
+
+def check_raw_history(conn, company_ids: list = None):
+    """Şirketlerden biri price_refetch'te işaretliyse ValueError fırlatır (geçmişi zaten düzeltilmiş fiyatlar)."""
+    pending = refetch_pending(conn, company_ids)
+    if pending:
+        raise ValueError(f"{len(pending)} şirketin fiyat geçmişi düzeltilmiş fiyatlarla yazılmış, önce ham fiyatlarla "
+                         f"yeniden çekilmeli (python -m src.fetch_prices): {', '.join(map(str, sorted(pending)[:10]))}")
+
+
+def _factor(conn, company_id: int, ex_day: int, kind: str, value: float) -> float:
+    if kind == "split":
+        return 1.0 / value
+    # temettü, ex_date'ten önceki son ham kapanışa oranlanır (idx_prices_company_day_close üzerinde tek arama)
+    row = conn.execute("SELECT close FROM price WHERE company_id = ? AND day < ? ORDER BY day DESC LIMIT 1",
+                       [company_id, ex_day]).fetchone()
+    if row is None or not row[0] or value >= row[0]:
+        raise ValueError(f"{company_id} için {kind} düzeltmesi hesaplanamadı: önceki kapanış {row and row[0]}, tutar {value}")
+    return 1.0 - value / row[0]
+
+
+def _rebuild_cumulative(conn, company_id: int, from_day: int):
+    # geriye dönük eklenen ya da değişen aksiyondan sonraki satırların cumulative'i yeniden hesaplanır (nadir)
+    rows = conn.execute("SELECT adjustment_id, ex_day, factor FROM adjustment_factor WHERE company_id = ? ORDER BY ex_day, adjustment_id",
+                        [company_id]).fetchall()
+    cumulative = np.cumprod([factor for _, _, factor in rows])
+    conn.executemany("UPDATE adjustment_factor SET cumulative = ? WHERE adjustment_id = ?",
+                     [(float(c), adjustment_id) for (adjustment_id, ex_day, _), c in zip(rows, cumulative) if ex_day >= from_day])
+
+
+def record_action(conn, company_id: int, ex_date, kind: str, value: float = None, factor: float = None) -> bool:
+    """
+    Bir aksiyonu adjustment_factor'a yazar. Aynı (company_id, ex_date, kind) aynı factor ile zaten varsa bir şey yapmaz.
+    factor verilmezse kind ve value'dan hesaplanır. Yazıldıysa True döner. Commit etmez.
+    """
+    if kind not in ACTION_KINDS:
+        raise ValueError(f"Bilinmeyen aksiyon türü: {kind}")
+    ex_day = int(encode_day([ex_date]).iloc[0])
+    company_id = int(company_id)
+    if factor is None:
+        if kind == "other" or not value or value <= 0:
+            raise ValueError(f"{kind} için pozitif value ya da factor verilmeli.")
+        factor = _factor(conn, company_id, ex_day, kind, float(value))
+
+    existing = conn.execute("SELECT factor FROM adjustment_factor WHERE company_id = ? AND ex_day = ? AND kind = ?",
+                            [company_id, ex_day, kind]).fetchone()
+    if existing is not None and np.isclose(existing[0], factor, rtol=1e-12, atol=0):
+        return False
+
+    # son aksiyonun cumulative'i, bu aksiyon en sondaysa tek satır eklemek yeterli
+    last = conn.execute("SELECT ex_day, cumulative FROM adjustment_factor WHERE company_id = ? ORDER BY ex_day DESC, adjustment_id DESC LIMIT 1",
+                        [company_id]).fetchone()
+    appended = existing is None and (last is None or last[0] < ex_day)
+    conn.execute("""
+        INSERT INTO adjustment_factor (company_id, ex_date, ex_day, kind, value, factor, cumulative)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(company_id, ex_day, kind) DO UPDATE SET value = excluded.value, factor = excluded.factor
+    """, [company_id, pd.Timestamp(ex_date).strftime("%Y-%m-%d"), ex_day, kind, value, factor,
+          (last[1] if last is not None else 1.0) * factor])
+    if not appended:
+        _rebuild_cumulative(conn, company_id, ex_day)
+    return True
+
+
+def record_actions(conn, df: pd.DataFrame, logger=None) -> int:
+    """
+    yfinance'in actions=True ile verdiği "dividends" ve "stock splits" kolonlarındaki aksiyonları yazar
+    (df: company_id, date, dividends, stock splits). Fiyatlar price'a yazıldıktan sonra çağrılmalıdır, temettü
+    düzeltmesi önceki kapanışı price'tan okur. Düzeltmesi hesaplanamayan aksiyon (önceki kapanış yok) atlanıp
+    loglanır. Yeni yazılan aksiyon sayısını döndürür. Commit etmez.
+    """
+    written = 0
+    for column, kind in [("stock splits", "split"), ("dividends", "dividend")]:
+        if column not in df.columns:
+            continue
+        actions = df.loc[pd.to_numeric(df[column], errors="coerce").fillna(0) > 0, ["company_id", "date", column]]
+        for company_id, date, value in actions.itertuples(index=False):
+            try:
+                written += record_action(conn, company_id, date, kind, float(value))
+            except ValueError as e:
+                if logger is not None:
+                    logger.warn(str(e))
+    return written
+
+
+def read_factors(conn, company_ids: list = None) -> pd.DataFrame:
+    """Aksiyonların şirket ve gün sırasıyla (company_id, ex_day, cumulative) kolonları."""
+    if company_ids is None:
+        return pd.read_sql_query("SELECT company_id, ex_day, cumulative FROM adjustment_factor ORDER BY company_id, ex_day, adjustment_id", conn)
+    return pd.read_sql_query(
+        "SELECT company_id, ex_day, cumulative FROM adjustment_factor WHERE company_id IN (SELECT value FROM json_each(?)) "
+        "ORDER BY company_id, ex_day, adjustment_id", conn, params=[json.dumps([int(c) for c in company_ids])]
+    )
+
+
+def adjustment_multipliers(dates: pd.DatetimeIndex, company_ids, factors: pd.DataFrame) -> np.ndarray:
+    """gün x şirket çarpan matrisi: son cumulative / o gün bilinen cumulative. Aksiyonu olmayan şirketler için 1."""
+    company_ids = pd.Index(company_ids)
+    days = encode_day(dates).to_numpy(dtype=np.int64)
+    multipliers = np.ones((len(dates), len(company_ids)))
+    for company_id, group in factors.groupby("company_id", sort=False):
+        pos = company_ids.get_indexer([company_id])[0]
+        if pos < 0:
+            continue
+        cumulative = group["cumulative"].to_numpy(dtype=float)
+        # her gün için o güne kadar (dahil) ex_date'i gelmiş son aksiyon
+        known = np.searchsorted(group["ex_day"].to_numpy(dtype=np.int64), days, side="right") - 1
+        multipliers[:, pos] = cumulative[-1] / np.where(known >= 0, cumulative[np.maximum(known, 0)], 1.0)
+    return multipliers
+
+
+def adjust_matrix(matrix: pd.DataFrame, factors: pd.DataFrame) -> pd.DataFrame:
+    """Ham fiyat matrisini (gün x company_id) düzeltilmiş fiyat matrisine çevirir. Aksiyon yoksa matrisin kendisi döner."""
+    factors = factors[factors["company_id"].isin(matrix.columns)]
+    if factors.empty:
+        return matrix
+    multipliers = adjustment_multipliers(matrix.index, matrix.columns, factors)
+    return pd.DataFrame(matrix.to_numpy(dtype=float) * multipliers, index=matrix.index, columns=matrix.columns)
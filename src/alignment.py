@@ -0,0 +1,107 @@
+# Günlük fiyat satırlarını o gün piyasada bilinen en son finansal döneme eşleyen modül.
+# Her finansal satır için bir "açıklanma tarihi" belirlenir: date_of_publish varsa o,
+# yoksa ADR 11'deki gibi dönem sonu + 45 gün. Fiyat satırları bu tarihten kesin olarak
+# sonraki günlerde o döneme eşlenir (aynı gün kullanılmaz, geleceği görme riski yok).
+#
+# Her şirketin açıklanma günleri sıralı bir dizide tutulur ve şirket x gün tablosu bir kez
+# np.searchsorted ile doldurulur, fiyat satırları bu tablodan okunur. Tablo çok büyükse
+# şirket ve günden oluşan tek bir int64 anahtar üzerinde searchsorted yapılır.
+# İki yolda da fiyatların şirkete göre sıralı olması gerekmez.
+
+import numpy as np
+import pandas as pd
+
+REPORT_LAG_DAYS = 45
+
+_DAY_OFFSET = 2 ** 31  # 1970 öncesi günler de pozitif kalsın diye
+
+# şirket x gün tablosunun en fazla hücre sayısı (int64, ~400 MB), daha büyükse searchsorted yolu kullanılır
+MAX_GRID_CELLS = 50_000_000
+
+
+def period_end(period_year, period_month) -> pd.Series:
+    """period_year ve period_month'tan dönem sonu tarihini (ayın son günü) hesaplar."""
+    start = pd.to_datetime(pd.DataFrame({
+        "year": pd.to_numeric(period_year),
+        "month": pd.to_numeric(period_month),
+        "day": 1,
+    }))
+    return start + pd.offsets.MonthEnd(0)
+
+
+def available_dates(fin_df: pd.DataFrame, lag_days: int = REPORT_LAG_DAYS) -> pd.Series:
+    """Her finansal satırın piyasada bilinir olduğu tarih: date_of_publish, yoksa dönem sonu + lag_days."""
+    fallback = period_end(fin_df["period_year"], fin_df["period_month"]) + pd.Timedelta(days=lag_days)
+    if "date_of_publish" not in fin_df.columns:
+        return fallback
+    published = pd.to_datetime(fin_df["date_of_publish"], errors="coerce")
+    return published.fillna(fallback)
+
+
+def _to_days(dates) -> np.ndarray:
+    return pd.to_datetime(dates).to_numpy(dtype="datetime64[D]").astype(np.int64)
+
+
+def _keys(company_id, days) -> np.ndarray:
+    return (np.asarray(company_id, dtype=np.int64) << 32) + (days + _DAY_OFFSET)
+
+
+def _align_by_search(price_company, price_days, fin_company, fin_days, order) -> np.ndarray:
+    # tek bir (şirket, gün) anahtarı üzerinde searchsorted, her durumda çalışan yol
+    fin_keys = _keys(fin_company[order], fin_days[order])
+    pos = np.searchsorted(fin_keys, _keys(price_company, price_days), side="left") - 1
+    valid = pos >= 0
+    matched = order[np.where(valid, pos, 0)]
+    valid &= fin_company[matched] == price_company
+    return np.where(valid, matched, -1)
+
+
+def _align_by_grid(price_company, price_days, fin_company, fin_days, order) -> np.ndarray:
+    # şirket x gün tablosu: her şirketin sıralı açıklanma günleri üzerinde bir kez searchsorted,
+    # sonra her fiyat satırı için sadece tablodan okuma yapılır
+    first_day = price_days.min()
+    grid_days = np.arange(first_day, price_days.max() + 1)
+
+    sorted_company = fin_company[order]
+    companies, starts = np.unique(sorted_company, return_index=True)
+    ends = np.append(starts[1:], len(order))
+
+    grid = np.empty((len(companies), len(grid_days)), dtype=np.int64)
+    for code, (start, end) in enumerate(zip(starts, ends)):
+        rows = order[start:end]
+        pos = np.searchsorted(fin_days[rows], grid_days, side="left") - 1
+        grid[code] = np.where(pos >= 0, rows[np.maximum(pos, 0)], -1)
+
+    # company_id -> tablo satırı, finansali olmayan şirketler -1
+    lookup = np.full(max(companies.max(), price_company.max()) + 1, -1, dtype=np.int64)
+    lookup[companies] = np.arange(len(companies))
+    code = lookup[price_company]
+    has_fin = code >= 0
+    return np.where(has_fin, grid[np.maximum(code, 0), price_days - first_day], -1)
+
+
+def align_fundamentals(price_df: pd.DataFrame, fin_df: pd.DataFrame, date_col: str = "date",
+                       lag_days: int = REPORT_LAG_DAYS) -> np.ndarray:
+    """
+    price_df'in her satırı için fin_df'te kullanılacak satırın pozisyonunu döndürür (yoksa -1).
+    Sonuç price_df ile aynı sırada ve uzunluktadır, fin_df.iloc / reindex ile kullanılabilir.
+    """
+    if price_df.empty or fin_df.empty:
+        return np.full(len(price_df), -1, dtype=np.int64)
+
+    fin_company = fin_df["company_id"].to_numpy(dtype=np.int64)
+    fin_days = _to_days(available_dates(fin_df, lag_days))
+
+    # şirket ve açıklanma gününe göre sırala, aynı gün açıklanan dönemler varsa en yeni dönem sonda kalsın
+    period_rank = pd.to_numeric(fin_df["period_year"]).to_numpy() * 100 + pd.to_numeric(fin_df["period_month"]).to_numpy()
+    order = np.lexsort((period_rank, fin_days, fin_company))
+
+    price_company = price_df["company_id"].to_numpy(dtype=np.int64)
+    price_days = _to_days(price_df[date_col])
+
+    n_companies = len(np.unique(fin_company))
+    grid_size = n_companies * (price_days.max() - price_days.min() + 1)
+    small_ids = min(fin_company.min(), price_company.min()) >= 0 and max(fin_company.max(), price_company.max()) < MAX_GRID_CELLS
+    if grid_size <= MAX_GRID_CELLS and small_ids:
+        return _align_by_grid(price_company, price_days, fin_company, fin_days, order)
+    return _align_by_search(price_company, price_days, fin_company, fin_days, order)
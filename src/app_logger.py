@@ -0,0 +1,114 @@
+# Pipeline olaylarını bellekte toplayıp app_logs tablosuna toplu halde yazan modül.
+# Aynı türden tekrar eden uyarılar (örneğin her satır için "zaten bulunuyor") tek tek
+# yazılmaz, şirket bazında "312 satır, 2020-01-02..2021-03-04" gibi bir özete dönüştürülür.
+
+import threading
+from datetime import datetime, timezone
+
+from src.db import transaction
+from src.settings import get_settings
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+
+
+def utc_now() -> str:
+    # app_logs.ts varsayılanı olan datetime('now') ile aynı format (UTC), diğer tabloların zaman damgaları da bunu kullanır
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class AppLogger:
+    """
+    action: app_logs.action kolonuna yazılacak isim ('fetch_prices', 'calc_ratios', ...)
+    level: bu seviyenin altındaki olaylar atılır
+    batch_size: bu kadar olay biriktiğinde app_logs'a yazılır
+    echo: True ise yazılan olaylar ekrana da basılır
+    conn None ise olaylar sadece ekrana basılır.
+    """
+
+    def __init__(self, conn, action: str, level: str = None, batch_size: int = None, echo: bool = None):
+        settings = get_settings("logging")
+        self.conn = conn
+        self.action = action
+        self.level = (level or settings["level"]).upper()
+        self.batch_size = batch_size or settings["batch_size"]
+        self.echo = settings["echo"] if echo is None else echo
+
+        self._events = []    # (ts, level, message)
+        self._repeated = {}  # (level, event, company_id) -> [ts, count, first_key, last_key]
+        self._lock = threading.Lock()
+
+    def _enabled(self, level: str) -> bool:
+        return LEVELS[level] >= LEVELS[self.level]
+
+    def log(self, level: str, message: str):
+        if not self._enabled(level):
+            return
+        with self._lock:
+            self._events.append((utc_now(), level, message))
+            full = len(self._events) >= self.batch_size
+        if full:
+            self.flush(summaries=False)
+
+    def info(self, message: str):
+        self.log("INFO", message)
+
+    def warn(self, message: str):
+        self.log("WARN", message)
+
+    def error(self, message: str):
+        self.log("ERROR", message)
+
+    def repeated(self, level: str, event: str, company_id, first_key, last_key=None, count: int = 1):
+        """
+        Tekrar eden bir olayı (level, event, company_id) grubuna ekler. Gruplar flush sırasında
+        tek bir özet satırına dönüşür. Toplu bilgi varsa count ve last_key ile tek çağrıda verilebilir.
+        """
+        if not self._enabled(level) or count == 0:
+            return
+        last_key = first_key if last_key is None else last_key
+        group = (level, event, company_id)
+        with self._lock:
+            summary = self._repeated.get(group)
+            if summary is None:
+                self._repeated[group] = [utc_now(), count, first_key, last_key]
+            else:
+                summary[1] += count
+                summary[2] = min(summary[2], first_key)
+                summary[3] = max(summary[3], last_key)
+
+    def _summaries(self) -> list:
+        rows = []
+        for (level, event, company_id), (ts, count, first_key, last_key) in self._repeated.items():
+            key_range = f"{first_key}" if first_key == last_key else f"{first_key}..{last_key}"
+            rows.append((ts, level, f"company_id {company_id} için {count} {event}, {key_range}"))
+        return rows
+
+    def flush(self, summaries: bool = True):
+        """Biriken olayları (summaries=True ise tekrar özetlerini de) app_logs'a yazar."""
+        with self._lock:
+            rows = self._events
+            self._events = []
+            if summaries:
+                rows = rows + self._summaries()
+                self._repeated = {}
+
+        if not rows:
+            return
+
+        if self.echo:
+            print("\n".join(f"{level}: {message}" for _, level, message in rows))
+
+        # çağıranın açık transaction'ı commit edilmesin diye SAVEPOINT içinde yazılır (src/db.py)
+        if self.conn is not None:
+            with transaction(self.conn):
+                self.conn.executemany(
+                    "INSERT INTO app_logs (ts, action, level, message) VALUES (?, ?, ?, ?)",
+                    [(ts, self.action, level, message) for ts, level, message in rows]
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
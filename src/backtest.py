@@ -0,0 +1,185 @@
+# Gün x şirket matrisleri üzerinde çalışan vektörel backtest motoru.
+#
+# - close: satırlar işlem günleri, kolonlar company_id olan kapanış fiyatı matrisi (load_matrix ile)
+# - weights: aynı şekilde hedef ağırlık matrisi. t günü kapanışında t gününe kadarki bilgiyle karar verilir,
+#   işlem t kapanışından yapılır ve ağırlıklar t+1'den itibaren getiri kazanır (geleceği görme yok).
+#   Ağırlıkların toplamı 1'den küçükse kalan kısım getirisiz nakittir.
+#
+# Her gün için döngü yoktur. Son yeniden dengeleme günü (anchor) her gün için np.maximum.accumulate ile
+# bulunur. Pozisyonların o günden beri fiyatla değişen (drift) değerleri tek seferde hesaplanır:
+#   değer_t = sum_i w_anchor,i * P_t,i / P_anchor,i + nakit_anchor
+# Günlük getiri, işlem maliyeti (turnover * cost_bps) ve sermaye eğrisi bu değerlerden çıkar.
+
+import numpy as np
+import pandas as pd
+from src.adjustments import adjust_matrix, check_adjustable, check_raw_history, read_factors
+from src.alignment import align_fundamentals
+from src.db_reader import iter_company_chunks
+from src.db import get_database
+from src.compact_keys import decode_day, encode_day
+
+TRADING_DAYS = 252
+
+# load_matrix'in günlük kolon okuyabildiği tablolar ve gün numarası kolonları (src/compact_keys.py)
+DAILY_TABLES = {"price": "day", "multiple": "day", "indicator": "day"}
+
+
+def _dense(df: pd.DataFrame, day_col: str, value_col: str) -> pd.DataFrame:
+    # (gün, şirket, değer) satırlarını pivot yerine tek bir fancy-index atamasıyla matrise çevirir,
+    # gün numaraları sadece tekil değerler için tarihe çevrilir
+    day_codes, days = pd.factorize(df[day_col].to_numpy(dtype=np.int64), sort=True)
+    company_codes, companies = pd.factorize(df["company_id"], sort=True)
+    values = np.full((len(days), len(companies)), np.nan)
+    values[day_codes, company_codes] = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype=float)
+    return pd.DataFrame(values, index=decode_day(days), columns=pd.Index(companies, name="company_id"))
+
+
+def load_matrix(conn, table: str, column: str, company_ids: list = None, start=None, end=None,
+                index: pd.DatetimeIndex = None, adjusted: bool = False) -> pd.DataFrame:
+    """
+    table.column'u gün x şirket matrisine çevirir. price ve multiple günlük okunur.
+    company_ids verilirse kolonlar tam olarak bu şirketler olur (verisi olmayanlar NaN).
+    ratio dönemlik olduğu için her gün, o gün bilinen son döneme (src/alignment.py) eşlenir, bunun için index
+    (genellikle close matrisinin günleri) verilmelidir.
+    adjusted True ise price'ın open / close / high / low'u şirket aksiyonlarına göre düzeltilir (src/adjustments.py).
+    """
+    if adjusted:
+        check_adjustable(table, column)
+    if table == "ratio":
+        if index is None:
+            raise ValueError("ratio matrisi için günleri belirten index verilmeli.")
+        return _load_ratio_matrix(conn, column, company_ids, index)
+
+    day_col = DAILY_TABLES[table]
+    start_day = None if start is None else encode_day([start]).iloc[0]
+    end_day = None if end is None else encode_day([end]).iloc[0]
+    frames = []
+    for chunk in iter_company_chunks(conn, table, ["company_id", day_col, column], ids=company_ids):
+        if start_day is not None:
+            chunk = chunk[chunk[day_col] >= start_day]
+        if end_day is not None:
+            chunk = chunk[chunk[day_col] <= end_day]
+        frames.append(chunk)
+
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="date"))
+    matrix = _dense(pd.concat(frames, ignore_index=True), day_col, column)
+    if adjusted:
+        check_raw_history(conn, list(matrix.columns))
+        matrix = adjust_matrix(matrix, read_factors(conn, list(matrix.columns)))
+    if company_ids is not None:
+        matrix = matrix.reindex(columns=pd.Index(company_ids, name="company_id"))
+    return matrix if index is None else matrix.reindex(index)
+
+
+def _load_ratio_matrix(conn, column: str, company_ids: list, index: pd.DatetimeIndex) -> pd.DataFrame:
+    columns = ["company_id", "period_year", "period_month", "date_of_publish", column]
+    fin_df = pd.concat(list(iter_company_chunks(conn, "ratio", columns, ids=company_ids)) or [pd.DataFrame(columns=columns)],
+                       ignore_index=True)
+    companies = np.sort(fin_df["company_id"].unique()) if company_ids is None else np.asarray(company_ids)
+
+    # her (gün, şirket) hücresi için o gün bilinen son dönem
+    grid = pd.DataFrame({"company_id": np.tile(companies, len(index)), "date": np.repeat(index.values, len(companies))})
+    fin_idx = align_fundamentals(grid, fin_df)
+    values = fin_df[column].astype(float).reindex(fin_idx).to_numpy()
+    return pd.DataFrame(values.reshape(len(index), len(companies)), index=index,
+                        columns=pd.Index(companies, name="company_id"))
+
+
+def top_n_weights(signal: pd.DataFrame, n: int, ascending: bool = False) -> pd.DataFrame:
+    """Her gün sinyali en yüksek (ascending=True ise en düşük) n şirkete eşit ağırlık verir, NaN'lar seçilmez."""
+    values = signal.to_numpy(dtype=float)
+    ranked = np.where(np.isnan(values), np.inf, values if ascending else -values)
+    order = np.argsort(ranked, axis=1, kind="stable")[:, :n]
+
+    weights = np.zeros_like(values)
+    rows = np.arange(len(values))[:, None]
+    weights[rows, order] = 1.0
+    weights[np.isnan(values)] = 0.0
+    counts = weights.sum(axis=1, keepdims=True)
+    weights = np.divide(weights, counts, out=np.zeros_like(weights), where=counts > 0)
+    return pd.DataFrame(weights, index=signal.index, columns=signal.columns)
+
+
+class BacktestResult:
+    """Günlük net / brüt getiri, turnover, maliyet ve sermaye eğrisi serileri."""
+
+    def __init__(self, returns: pd.Series, gross_returns: pd.Series, turnover: pd.Series, costs: pd.Series):
+        self.returns = returns
+        self.gross_returns = gross_returns
+        self.turnover = turnover
+        self.costs = costs
+        self.equity = (1 + returns).cumprod()
+
+    def summary(self) -> dict:
+        n_days = len(self.returns)
+        if n_days == 0:
+            return {}
+        total_return = self.equity.iloc[-1] - 1
+        volatility = self.returns.std() * np.sqrt(TRADING_DAYS)
+        drawdown = self.equity / self.equity.cummax() - 1
+        return {
+            "total_return": float(total_return),
+            "cagr": float((1 + total_return) ** (TRADING_DAYS / n_days) - 1),
+            "volatility": float(volatility),
+            "sharpe": float(self.returns.mean() * TRADING_DAYS / volatility) if volatility > 0 else np.nan,
+            "max_drawdown": float(drawdown.min()),
+            "avg_turnover": float(self.turnover.mean()),
+            "total_cost": float(self.costs.sum()),
+        }
+
+
+def backtest(close: pd.DataFrame, weights, rebalance_every: int = 1, cost_bps: float = 10.0) -> BacktestResult:
+    """
+    weights: close ile aynı şekilde hedef ağırlık matrisi ya da close'u alıp böyle bir matris döndüren fonksiyon.
+    rebalance_every: kaç günde bir yeniden dengelenir (1 = her gün). Arada ağırlıklar fiyatlarla kayar.
+    cost_bps: alınıp satılan her 1 birim değer için baz puan cinsinden işlem maliyeti.
+    """
+    if callable(weights):
+        weights = weights(close)
+    weights = weights.reindex(index=close.index, columns=close.columns)
+
+    # fiyatı olmayan günlerde son fiyat kullanılır (getiri 0), hiç fiyatı olmamış şirkete ağırlık verilmez
+    prices = close.ffill().to_numpy(dtype=float)
+    target = np.nan_to_num(weights.to_numpy(dtype=float))
+    target[np.isnan(prices)] = 0.0
+    prices = np.where(np.isnan(prices), 1.0, prices)  # ağırlığı 0 olan hücreler, değeri etkilemez
+
+    n_days = len(prices)
+    if n_days == 0:
+        empty = pd.Series(dtype=float)
+        return BacktestResult(empty, empty, empty, empty)
+
+    rebalance = np.zeros(n_days, dtype=bool)
+    rebalance[::max(int(rebalance_every), 1)] = True
+    anchor = np.maximum.accumulate(np.where(rebalance, np.arange(n_days), 0))
+    cash = 1.0 - target.sum(axis=1)
+
+    # her gün, önceki günün anchor'ındaki pozisyonların bugünkü ve dünkü değeri
+    prev_anchor = np.concatenate([[0], anchor[:-1]])
+    w = target[prev_anchor]
+    value_today = (w * prices / prices[prev_anchor]).sum(axis=1) + cash[prev_anchor]
+    value_prev = (w * np.vstack([prices[:1], prices[:-1]]) / prices[prev_anchor]).sum(axis=1) + cash[prev_anchor]
+    gross = value_today / value_prev - 1
+    gross[0] = 0.0
+
+    # yeniden dengeleme günlerinde kaymış ağırlıklardan hedef ağırlıklara geçişin turnover'ı
+    drifted = w * prices / prices[prev_anchor] / value_today[:, None]
+    drifted[0] = 0.0  # ilk gün nakitten başlanır
+    turnover = np.where(rebalance, np.abs(target - drifted).sum(axis=1), 0.0)
+    costs = turnover * cost_bps / 10_000
+    net = (1 + gross) * (1 - costs) - 1
+
+    index = close.index
+    return BacktestResult(pd.Series(net, index=index), pd.Series(gross, index=index),
+                          pd.Series(turnover, index=index), pd.Series(costs, index=index))
+
+
+if __name__ == "__main__":
+    with get_database().read() as conn:
+        close = load_matrix(conn, "price", "close", start="2020-01-01", adjusted=True)
+        pe = load_matrix(conn, "multiple", "pe", company_ids=list(close.columns), index=close.index)
+
+    # örnek strateji: her ay en düşük pozitif F/K'lı 10 hisseye eşit ağırlık
+    result = backtest(close, top_n_weights(pe.where(pe > 0), 10, ascending=True), rebalance_every=21)
+    print(result.summary())
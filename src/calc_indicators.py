@@ -0,0 +1,365 @@
+# Fiyatlardan günlük teknik göstergeleri (getiri, volatilite, hareketli ortalamalar, momentum, hacim ortalaması)
+# hesaplayıp indicator tablosuna yazan modül.
+#
+# - Her şirketin kayan pencereleri (son 50 kapanış, son 20 getiri, son 20 hacim) ve pencere toplamları
+#   indicator_state'te tutulur. Yeni bir fiyat satırı pencereye eklenip en eskisi çıkarılarak O(1) işlenir,
+#   fiyat geçmişi tekrar okunmaz (update_indicators).
+# - Toplamlar her çalıştırmanın sonunda pencerelerden yeniden hesaplanarak saklanır, ekleme / çıkarma ile
+#   biriken kayan nokta hatası çalıştırmalar boyunca büyümez.
+# - Şirket aksiyonları (src/adjustments.py): ret_1d, vol_20 ve mom_20 düzeltilmiş fiyatlardan hesaplanır.
+#   sma_20 / sma_50 o günün ham fiyat bazındadır (o günün ham kapanışıyla karşılaştırılabilir). Aksiyon günü
+#   penceredeki kapanışlar factor ile çarpılır, saklanan eski değerler değişmez. vavg_20 ham hacimdir.
+# - Durumu olmayan şirketler, geçmişe dönük değişen fiyatlar (change_log) ve geriye dönük eklenen aksiyonlar
+#   için şirketin bütün geçmişi vektörel olarak (pandas rolling) yeniden hesaplanır ve durum bunun sonundan kurulur.
+#   Aynı vektörel hesap verify_indicators ile saklanan değerleri doğrulamak için de kullanılır.
+#
+# Çalıştırmak için proje kök dizininden:
+#   python -m src.calc_indicators              # yeni fiyat günleri
+#   python -m src.calc_indicators --rebuild    # bütün geçmiş vektörel olarak
+#   python -m src.calc_indicators --verify     # saklanan değerleri vektörel hesapla karşılaştır
+
+import argparse
+import json
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from src.adjustments import refetch_pending
+from src.app_logger import AppLogger, utc_now
+from src.db import get_database, transaction
+from src.db_reader import company_batches, company_ids, read_companies
+from src.db_writer import INDICATOR_VALUES, upsert_indicators
+from src.stage_metrics import stage, track_run
+
+SHORT_WINDOW = 20   # vol_20, sma_20, mom_20, vavg_20
+LONG_WINDOW = 50    # sma_50, kapanış penceresinin uzunluğu
+
+PRICE_COLUMNS = ["company_id", "day", "close", "volume"]
+
+
+class RollingState:
+    """Bir şirketin kayan pencereleri ve toplamları. push() her yeni fiyat satırını O(1) işler."""
+
+    def __init__(self, last_day: int = None, closes=(), returns=(), volumes=(), factor_cumulative: float = 1.0):
+        self.last_day = last_day
+        self.factor_cumulative = factor_cumulative
+        self.closes = deque(closes, maxlen=LONG_WINDOW)      # son kapanışlar, son günün ham fiyat bazında
+        self.returns = deque(returns, maxlen=SHORT_WINDOW)   # son getiriler
+        self.volumes = deque(volumes, maxlen=SHORT_WINDOW)   # son hacimler (boş olabilir)
+        self.resync()
+
+    def resync(self):
+        """Toplamları pencerelerden yeniden hesaplar."""
+        closes = list(self.closes)
+        self.close_sum_short = math.fsum(closes[-SHORT_WINDOW:])
+        self.close_sum_long = math.fsum(closes)
+        self.ret_sum = math.fsum(self.returns)
+        self.ret_sq_sum = math.fsum(r * r for r in self.returns)
+        valid = [v for v in self.volumes if not math.isnan(v)]
+        self.volume_sum = math.fsum(valid)
+        self.volume_count = len(valid)
+
+    def push(self, day: int, close: float, volume: float, factor: float = 1.0) -> tuple:
+        """
+        day gününün fiyatını ekler, o günün göstergelerini INDICATOR_VALUES sırasıyla döndürür.
+        factor: önceki günden bu güne kadar ex_date'i gelen aksiyonların factor çarpımı.
+        """
+        if factor != 1.0:
+            # önceki kapanışlar bu günün bazına çevrilir (en fazla LONG_WINDOW eleman, sadece aksiyon günleri)
+            self.closes = deque((c * factor for c in self.closes), maxlen=LONG_WINDOW)
+            self.close_sum_short *= factor
+            self.close_sum_long *= factor
+
+        ret = close / self.closes[-1] - 1 if self.closes else math.nan
+        mom = close / self.closes[-SHORT_WINDOW] - 1 if len(self.closes) >= SHORT_WINDOW else math.nan
+
+        if len(self.closes) >= SHORT_WINDOW:
+            self.close_sum_short -= self.closes[-SHORT_WINDOW]
+        if len(self.closes) == LONG_WINDOW:
+            self.close_sum_long -= self.closes[0]
+        self.closes.append(close)
+        self.close_sum_short += close
+        self.close_sum_long += close
+
+        if not math.isnan(ret):
+            if len(self.returns) == SHORT_WINDOW:
+                old = self.returns[0]
+                self.ret_sum -= old
+                self.ret_sq_sum -= old * old
+            self.returns.append(ret)
+            self.ret_sum += ret
+            self.ret_sq_sum += ret * ret
+
+        if len(self.volumes) == SHORT_WINDOW and not math.isnan(self.volumes[0]):
+            self.volume_sum -= self.volumes[0]
+            self.volume_count -= 1
+        self.volumes.append(volume)
+        if not math.isnan(volume):
+            self.volume_sum += volume
+            self.volume_count += 1
+
+        self.last_day = day
+        n = len(self.returns)
+        vol = math.sqrt(max((self.ret_sq_sum - self.ret_sum * self.ret_sum / n) / (n - 1), 0.0)) \
+            if n == SHORT_WINDOW else math.nan
+        sma_short = self.close_sum_short / SHORT_WINDOW if len(self.closes) >= SHORT_WINDOW else math.nan
+        sma_long = self.close_sum_long / LONG_WINDOW if len(self.closes) == LONG_WINDOW else math.nan
+        vavg = self.volume_sum / self.volume_count \
+            if len(self.volumes) == SHORT_WINDOW and self.volume_count > 0 else math.nan
+        return ret, vol, sma_short, sma_long, mom, vavg
+
+    def to_json(self) -> str:
+        # NaN hacimler JSON'da null olarak tutulur
+        return json.dumps({"closes": list(self.closes), "returns": list(self.returns),
+                           "volumes": [None if math.isnan(v) else v for v in self.volumes]})
+
+    @classmethod
+    def from_row(cls, last_day: int, factor_cumulative: float, state: str) -> "RollingState":
+        data = json.loads(state)
+        return cls(last_day, data["closes"], data["returns"],
+                   [math.nan if v is None else v for v in data["volumes"]], factor_cumulative)
+
+
+# -----------------------------------------------------------
+# Vektörel hesap (ilk hesap, yeniden hesap ve doğrulama)
+# -----------------------------------------------------------
+
+def _read_factors(conn, ids: list) -> pd.DataFrame:
+    return pd.read_sql_query(
+        "SELECT company_id, ex_day, factor, cumulative FROM adjustment_factor WHERE company_id IN (SELECT value FROM json_each(?)) "
+        "ORDER BY company_id, ex_day, adjustment_id", conn, params=[json.dumps([int(c) for c in ids])]
+    )
+
+
+def _known_cumulative(price_df: pd.DataFrame, factors: pd.DataFrame) -> np.ndarray:
+    """Her fiyat satırı için o güne kadar (dahil) ex_date'i gelmiş son aksiyonun cumulative'i, hiç yoksa 1."""
+    known = np.ones(len(price_df))
+    if factors.empty:
+        return known
+    # aynı güne düşen aksiyonlardan sonuncusu (cumulative'i hepsini içerir) kalır
+    factors = factors.drop_duplicates(subset=["company_id", "ex_day"], keep="last")
+    merged = pd.merge_asof(price_df[["company_id", "day"]].reset_index().sort_values("day"),
+                           factors[["company_id", "ex_day", "cumulative"]].sort_values("ex_day"),
+                           left_on="day", right_on="ex_day", by="company_id", direction="backward")
+    known[merged["index"].to_numpy()] = merged["cumulative"].fillna(1.0).to_numpy()
+    return known
+
+
+def compute_indicators(price_df: pd.DataFrame, factors: pd.DataFrame) -> tuple:
+    """
+    Şirketlerin bütün fiyat geçmişinden göstergeleri pandas rolling ile hesaplar.
+    price_df: company_id, day, close, volume (bir şirketin bütün satırları). factors: company_id, ex_day, cumulative.
+    Sonuç: (göstergeler DataFrame'i, {company_id: RollingState}) — durum son satırlardan kurulur.
+    """
+    price_df = price_df[price_df["close"].notna()].sort_values(["company_id", "day"]).reset_index(drop=True)
+    known = _known_cumulative(price_df, factors)
+    last = pd.Series(known).groupby(price_df["company_id"]).transform("last").to_numpy()
+    # düzeltilmiş kapanış: her satır son günün bazına (src/adjustments.py), satırın kendi gününün bazına / multiplier
+    multiplier = last / known
+    adjusted = price_df["close"].astype(float) * multiplier
+    volume = pd.to_numeric(price_df["volume"], errors="coerce").astype(float)
+
+    by_company = adjusted.groupby(price_df["company_id"])
+    ret = by_company.pct_change()
+    row_number = by_company.cumcount()
+    out = price_df[["company_id", "day"]].copy()
+    out["ret_1d"] = ret
+    out["vol_20"] = ret.groupby(price_df["company_id"]).transform(lambda s: s.rolling(SHORT_WINDOW).std())
+    # adjusted son günün bazında, satırın kendi gününün bazına multiplier ile dönülür
+    out["sma_20"] = by_company.transform(lambda s: s.rolling(SHORT_WINDOW).mean()) / multiplier
+    out["sma_50"] = by_company.transform(lambda s: s.rolling(LONG_WINDOW).mean()) / multiplier
+    out["mom_20"] = adjusted / by_company.shift(SHORT_WINDOW) - 1
+    out["vavg_20"] = volume.groupby(price_df["company_id"]).transform(
+        lambda s: s.rolling(SHORT_WINDOW, min_periods=1).mean()).where(row_number >= SHORT_WINDOW - 1)
+
+    states = {}
+    for company_id, rows in price_df.assign(adjusted=adjusted, ret=ret, volume=volume).groupby("company_id"):
+        tail = rows.tail(LONG_WINDOW)
+        # son satırın multiplier'ı 1, düzeltilmiş kapanışlar zaten son günün ham fiyat bazındadır
+        states[int(company_id)] = RollingState(int(rows["day"].iloc[-1]), tail["adjusted"].tolist(),
+                                               rows["ret"].dropna().tail(SHORT_WINDOW).tolist(),
+                                               rows["volume"].tail(SHORT_WINDOW).tolist(), float(known[tail.index[-1]]))
+    return out, states
+
+
+# -----------------------------------------------------------
+# Durum ve güncelleme
+# -----------------------------------------------------------
+
+def _read_states(conn, ids: list) -> dict:
+    rows = conn.execute("SELECT company_id, last_day, factor_cumulative, state FROM indicator_state "
+                        "WHERE company_id IN (SELECT value FROM json_each(?))", [json.dumps([int(c) for c in ids])])
+    return {company_id: RollingState.from_row(last_day, factor_cumulative, state)
+            for company_id, last_day, factor_cumulative, state in rows}
+
+
+def _save_states(conn, states: dict):
+    for state in states.values():
+        state.resync()
+    conn.executemany("""
+        INSERT INTO indicator_state (company_id, last_day, factor_cumulative, state, updated_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(company_id) DO UPDATE SET last_day = excluded.last_day, factor_cumulative = excluded.factor_cumulative,
+            state = excluded.state, updated_at = excluded.updated_at
+    """, [(company_id, state.last_day, state.factor_cumulative, state.to_json(), utc_now())
+          for company_id, state in states.items()])
+
+
+def _drop_stale(conn, ids: list):
+    # baştan hesaplanan şirketlerde fiyatı silinen ya da kapanışı boşaltılan günlerin göstergeleri silinir
+    conn.execute("""
+        DELETE FROM indicator WHERE company_id IN (SELECT value FROM json_each(?))
+        AND NOT EXISTS (SELECT 1 FROM price p WHERE p.company_id = indicator.company_id AND p.day = indicator.day
+                        AND p.close IS NOT NULL)
+    """, [json.dumps([int(c) for c in ids])])
+
+
+def _cumulative_at(factors: pd.DataFrame, day: int) -> float:
+    known = factors.loc[factors["ex_day"] <= day, "cumulative"]
+    return float(known.iloc[-1]) if len(known) else 1.0
+
+
+def _push_rows(state: RollingState, rows: pd.DataFrame, factors: pd.DataFrame) -> list:
+    """Bir şirketin last_day'den sonraki fiyat satırlarını sırayla işler, gösterge satırlarını döndürür."""
+    ex_days = factors["ex_day"].to_numpy()
+    factor_values = factors["factor"].to_numpy()
+    out = []
+    for day, close, volume in zip(rows["day"].to_numpy(), rows["close"].to_numpy(dtype=float),
+                                  rows["volume"].to_numpy(dtype=float)):
+        # önceki işlenen günden bu güne kadar ex_date'i gelen aksiyonlar
+        between = (ex_days > state.last_day) & (ex_days <= day)
+        factor = float(np.prod(factor_values[between])) if between.any() else 1.0
+        out.append((int(day),) + state.push(int(day), float(close), float(volume), factor))
+    state.factor_cumulative = _cumulative_at(factors, state.last_day)
+    return out
+
+
+def update_indicators(conn, changed_price_days: dict = None, rebuild: bool = False, logger: AppLogger = None,
+                      chunk_size: int = None) -> dict:
+    """
+    Her şirketin indicator_state'teki son gününden sonraki fiyatlarını durumu güncelleyerek işler.
+    Durumu olmayan şirketler, changed_price_days'te ({company_id: day}) son işlenen günden önce fiyatı değişenler
+    ve son işlenen günden önce ex_date'li yeni aksiyonu olanlar baştan (vektörel) hesaplanır.
+    rebuild True ise bütün şirketler baştan hesaplanır. Okuma ve yazma chunk_size şirketlik gruplar halinde yapılır.
+    """
+    if logger is None:
+        with AppLogger(conn, "calc_indicators") as logger:
+            return update_indicators(conn, changed_price_days, rebuild, logger, chunk_size)
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    n_prices = 0
+    n_rebuilt = 0
+    changed_price_days = changed_price_days or {}
+
+    # geçmişi henüz ham fiyatlarla yeniden çekilmemiş şirketlerde aksiyonlar ikinci kez uygulanır, atlanırlar
+    ids = company_ids(conn, "price")
+    pending = refetch_pending(conn, ids)
+    if pending:
+        logger.warn(f"{len(pending)} şirketin fiyat geçmişi yeniden çekilmeyi bekliyor, göstergeleri hesaplanmadı.")
+        ids = [company_id for company_id in ids if company_id not in pending]
+
+    with track_run(conn, "calc_indicators") as run:
+        for batch in company_batches(ids, chunk_size):
+            with stage("state", rows_in=len(batch)) as s:
+                states = {} if rebuild else _read_states(conn, batch)
+                factors = _read_factors(conn, batch)
+                by_company = {company_id: rows for company_id, rows in factors.groupby("company_id")}
+                empty = factors.iloc[:0]
+                for company_id in list(states):
+                    state = states[company_id]
+                    company_factors = by_company.get(company_id, empty)
+                    if changed_price_days.get(company_id, state.last_day + 1) <= state.last_day or \
+                            not np.isclose(_cumulative_at(company_factors, state.last_day), state.factor_cumulative):
+                        del states[company_id]
+                full = [company_id for company_id in batch if company_id not in states]
+                s.add_rows(rows_out=len(states))
+
+            frames = []
+            if states:
+                # t.day >= sınır koşulu idx_prices_company_day_close üzerinde aralık taraması olarak çalışır
+                with stage("read_prices", rows_in=len(states)) as s:
+                    price_df = read_companies(conn, "price", PRICE_COLUMNS, list(states),
+                                              lower_bounds={c: state.last_day + 1 for c, state in states.items()},
+                                              bound_expr="t.day")
+                    price_df = price_df[price_df["close"].notna()].sort_values(["company_id", "day"])
+                    s.add_rows(rows_out=len(price_df))
+                with stage("update", rows_in=len(price_df)) as s:
+                    rows = []
+                    for company_id, company_rows in price_df.groupby("company_id"):
+                        pushed = _push_rows(states[company_id], company_rows, by_company.get(company_id, empty))
+                        rows += [(company_id,) + row for row in pushed]
+                    frames.append(pd.DataFrame(rows, columns=["company_id", "day"] + INDICATOR_VALUES))
+                    s.add_rows(rows_out=len(rows))
+                n_prices += len(price_df)
+
+            if full:
+                with stage("read_history", rows_in=len(full)) as s:
+                    history = read_companies(conn, "price", PRICE_COLUMNS, full)
+                    s.add_rows(rows_out=len(history))
+                with stage("rebuild", rows_in=len(history)) as s:
+                    indicator_df, rebuilt = compute_indicators(history, factors[factors["company_id"].isin(full)])
+                    states.update(rebuilt)
+                    frames.append(indicator_df)
+                    s.add_rows(rows_out=len(indicator_df))
+                n_prices += len(history)
+                n_rebuilt += len(full)
+
+            frames = [frame for frame in frames if not frame.empty]
+            indicator_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            # gösterge satırları ve durumlar birlikte yazılır: biri yazılıp diğeri yazılamazsa durum satırlarla
+            # uyuşmaz. Çağıranın açık transaction'ı commit edilmez (src/db.transaction)
+            with stage("write", rows_in=len(indicator_df)) as s, transaction(conn):
+                chunk_counts = upsert_indicators(conn, indicator_df)
+                if full:
+                    _drop_stale(conn, full)
+                _save_states(conn, states)
+                s.add_rows(rows_out=chunk_counts["inserted"] + chunk_counts["updated"])
+            for key in counts:
+                counts[key] += chunk_counts[key]
+        run.add_rows(rows_in=n_prices, rows_out=counts["inserted"] + counts["updated"])
+
+    logger.info(f"{n_prices} fiyat satırı işlendi ({n_rebuilt} şirket baştan): {counts['inserted']} yeni, "
+                f"{counts['updated']} güncellenen, {counts['unchanged']} değişmeyen satır.")
+    return counts
+
+
+def verify_indicators(conn, ids: list = None, rtol: float = 1e-9, chunk_size: int = None) -> pd.DataFrame:
+    """
+    Saklanan göstergeleri bütün geçmişin vektörel hesabıyla karşılaştırır. Farklı olan (ya da sadece birinde
+    bulunan) değerleri company_id, day, column, stored, expected olarak döndürür, hepsi aynıysa boş döner.
+    """
+    ids = company_ids(conn, "price") if ids is None else ids
+    mismatches = []
+    for batch in company_batches(ids, chunk_size):
+        expected, _ = compute_indicators(read_companies(conn, "price", PRICE_COLUMNS, batch), _read_factors(conn, batch))
+        stored = read_companies(conn, "indicator", ["company_id", "day"] + INDICATOR_VALUES, batch)
+        merged = expected.merge(stored, on=["company_id", "day"], how="outer", suffixes=("_expected", "_stored"))
+        for column in INDICATOR_VALUES:
+            exp = merged[f"{column}_expected"].astype(float).to_numpy()
+            got = merged[f"{column}_stored"].astype(float).to_numpy()
+            same = np.isclose(got, exp, rtol=rtol, atol=0.0, equal_nan=True)
+            if not same.all():
+                mismatches.append(pd.DataFrame({"company_id": merged["company_id"][~same], "day": merged["day"][~same],
+                                                "column": column, "stored": got[~same], "expected": exp[~same]}))
+    if not mismatches:
+        return pd.DataFrame(columns=["company_id", "day", "column", "stored", "expected"])
+    return pd.concat(mismatches, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fiyatlardan teknik göstergeleri hesaplar.")
+    parser.add_argument("--rebuild", action="store_true", help="bütün geçmişi vektörel olarak yeniden hesapla")
+    parser.add_argument("--verify", action="store_true", help="saklanan değerleri vektörel hesapla karşılaştır")
+    args = parser.parse_args()
+
+    database = get_database()
+    if args.verify:
+        with database.read() as conn:
+            mismatches = verify_indicators(conn)
+        print(f"{len(mismatches)} farklı değer" if not mismatches.empty else "Saklanan göstergeler vektörel hesapla aynı.")
+        if not mismatches.empty:
+            print(mismatches.head(20).to_string(index=False))
+    else:
+        with database.write() as conn:
+            update_indicators(conn, rebuild=args.rebuild)
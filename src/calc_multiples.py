@@ -1,29 +1,34 @@
-import sqlite3
+import json
 import pandas as pd
 import numpy as np
+from src.alignment import align_fundamentals, available_dates
+from src.db_reader import company_batches, iter_company_chunks, read_companies
+from src.db_writer import upsert_multiples
+from src.app_logger import AppLogger
+from src.db import get_database
+from src.compact_keys import NO_DAY, decode_day, encode_day
+from src.stage_metrics import stage, track_run
 
-def calc_multiples(conn):
+# çarpanlar için gereken kolonlar, SELECT * yerine sadece bunlar okunur
+PRICE_COLUMNS = ["company_id", "day", "market_cap"]
+FIN_COLUMNS = ["company_id", "period_year", "period_month", "date_of_publish", "net_income_ttm", "equity", "revenue_ttm",
+               "gross_debt", "cash_and_cash_equivalents", "ebitda_ttm", "dividend_ttm"]
 
-    price_df = pd.read_sql_query("SELECT * FROM price", conn)
-    fin_df = pd.read_sql_query("SELECT * FROM financial", conn)
 
-    price_df["date"] = pd.to_datetime(price_df["date"])
+def _compute_multiples(price_df: pd.DataFrame, fin_df: pd.DataFrame) -> pd.DataFrame:
 
-    price_df["effective_quarter_end"] = (price_df["date"] - pd.Timedelta(days=45)) + pd.offsets.QuarterEnd(-1)
-
-    fin_df["period_end"] = pd.to_datetime(
-        fin_df["period_year"].astype(str) + "-" + fin_df["period_month"].astype(str) + "-01"
-    ) + pd.offsets.MonthEnd(0)
+    price_df = price_df.assign(date=decode_day(price_df["day"]).to_numpy()).drop(columns=["day"])
 
+    fin_df['period_month'] = pd.to_numeric(fin_df['period_month'])
+    fin_df['period_year'] = pd.to_numeric(fin_df['period_year'])
     fin_df = fin_df.sort_values(by=['company_id', 'period_year', 'period_month']).reset_index(drop=True)
     fin_df["net_income_growth_ttm_yoy"] = (fin_df["net_income_ttm"] / fin_df.groupby('company_id')['net_income_ttm'].shift(4)) - 1
 
-    merged_df = price_df.merge(
-        fin_df,
-        left_on=["company_id", "effective_quarter_end"],
-        right_on=["company_id", "period_end"],
-        how="left"
-    )
+    # her fiyat satırı için o gün bilinen en son finansal satır (date_of_publish, yoksa dönem sonu + 45 gün)
+    fin_idx = align_fundamentals(price_df, fin_df)
+    aligned_fin = fin_df.drop(columns=["company_id"]).reindex(fin_idx).reset_index(drop=True) # -1 olanlar NaN kalır
+
+    merged_df = pd.concat([price_df.reset_index(drop=True), aligned_fin], axis=1)
 
     merged_df = merged_df.rename(columns={"date":"date_of_price"})
     merged_df["pe"] = merged_df["market_cap"] / merged_df["net_income_ttm"]
@@ -35,11 +40,129 @@ def calc_multiples(conn):
 
     merged_df["peg"] = merged_df["pe"] / merged_df["net_income_growth_ttm_yoy"] / 100
 
+    # eşleşmeyen satırlarda dönem boş kalır, TEXT kolona '2024.0' yazılmasın diye tam sayıya çevrilir
+    merged_df["period_year"] = merged_df["period_year"].astype("Int64")
+    merged_df["period_month"] = merged_df["period_month"].astype("Int64")
 
     merged_df = merged_df[["company_id","date_of_price","period_year","period_month","pe","pb","ps","ev_ebitda","dividend_yield","peg"]]
 
+    return merged_df
+
+
+def calc_multiples(conn, chunk_size: int = None):
+
+    # fiyatlar şirket grupları halinde okunur, her grup için sadece o şirketlerin finansalları okunur
+    chunks = []
+    for price_df in iter_company_chunks(conn, "price", PRICE_COLUMNS, chunk_size=chunk_size):
+        fin_df = read_companies(conn, "financial", FIN_COLUMNS, price_df["company_id"].unique().tolist())
+        chunks.append(_compute_multiples(price_df, fin_df))
+    if not chunks:
+        return _compute_multiples(pd.DataFrame(columns=PRICE_COLUMNS), pd.DataFrame(columns=FIN_COLUMNS))
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _price_bounds(conn, changed_fin_keys, full: bool = False, changed_price_days: dict = None) -> dict:
+    """
+    Her şirket için yeniden hesaplanması gereken ilk fiyat tarihini bulur:
+    multiple tablosundaki son gün (o gün de dahil, sonuç aynıysa upsert dokunmaz), değişen finansal satırın
+    açıklanma günü (silinen dönemlerde NO_DAY) ya da changed_price_days'teki ({company_id: day}) değişen ilk fiyat günü, hangisi daha önceyse.
+    Son günden önceye sonradan eklenen fiyat günleri sadece changed_price_days'te verilirse hesaplanır (pipeline
+    bunları change_log'dan okur). Sınırlar gün numarasıdır (src/compact_keys.py),
+    hiç çarpanı olmayan şirketler için ve full True ise bütün şirketler için NO_DAY.
+    """
+    if full:
+        return {company_id: NO_DAY for (company_id,) in conn.execute("SELECT company_id FROM company")}
+
+    # MAX alt sorgusu UNIQUE (company_id, day) kısıtının index'i üzerinde tek bir index araması
+    rows = conn.execute("""
+        SELECT c.company_id, (SELECT MAX(m.day) FROM multiple m WHERE m.company_id = c.company_id)
+        FROM company c
+    """).fetchall()
+    bounds = {company_id: (NO_DAY if last_day is None else last_day) for company_id, last_day in rows}
+
+    if changed_fin_keys:
+        changed = pd.DataFrame(list(changed_fin_keys), columns=["company_id", "period_year", "period_month"])
+        fin_df = pd.read_sql_query(
+            "SELECT company_id, period_year, period_month, date_of_publish FROM financial "
+            "WHERE company_id IN (SELECT value FROM json_each(?))",
+            conn, params=[json.dumps(changed["company_id"].astype(int).unique().tolist())]
+        )
+        for col in ["period_year", "period_month"]:
+            fin_df[col] = pd.to_numeric(fin_df[col])
+            changed[col] = pd.to_numeric(changed[col])
+        fin_df = changed.merge(fin_df, on=["company_id", "period_year", "period_month"], how="left", indicator=True)
+
+        # silinen dönem financial'da yok, açıklanma günü bilinmediği için şirketin bütün günleri hesaplanır
+        for company_id in fin_df.loc[fin_df["_merge"] == "left_only", "company_id"].unique():
+            bounds[int(company_id)] = NO_DAY
+        fin_df = fin_df[fin_df["_merge"] == "both"].drop(columns=["_merge"]).reset_index(drop=True)
+        fin_df["available"] = available_dates(fin_df)
+
+        # değişen dönem, açıklandığı günden itibaren bütün fiyatları etkiler (peg 4 çeyrek sonrasını da etkiler)
+        first_days = fin_df.groupby("company_id")["available"].min()
+        for company_id, first_day in zip(first_days.index, encode_day(first_days)):
+            bounds[company_id] = int(min(bounds.get(company_id, first_day), first_day))
+
+    for company_id, first_day in (changed_price_days or {}).items():
+        bounds[company_id] = int(min(bounds.get(company_id, first_day), first_day))
+
+    return bounds
+
+
+def update_multiples(conn, changed_fin_keys=None, logger: AppLogger = None, chunk_size: int = None,
+                     full: bool = False, changed_price_days: dict = None) -> dict:
+    """
+    Sadece son çarpan gününden sonraki yeni fiyat günlerini, changed_fin_keys'teki
+    (company_id, period_year, period_month) dönemlerinden etkilenen günleri ve changed_price_days'teki
+    ({company_id: day}) eklenen / güncellenen / silinen ilk fiyat gününden sonrasını hesaplayıp multiple'a upsert eder.
+    full True ise bütün fiyat günleri yeniden hesaplanır (değişen satırlar bilinmediğinde).
+    Okuma ve yazma chunk_size şirketlik gruplar halinde yapılır.
+    """
+    if logger is None:
+        with AppLogger(conn, "calc_multiples") as logger:
+            return update_multiples(conn, changed_fin_keys, logger, chunk_size, full, changed_price_days)
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    n_prices = 0
+    # aşamalar chunk'lar boyunca toplanır, stage_metrics'e "calc_multiples" olarak yazılır
+    with track_run(conn, "calc_multiples") as run:
+        with stage("bounds") as s:
+            bounds = _price_bounds(conn, changed_fin_keys, full, changed_price_days)
+            s.add_rows(rows_out=len(bounds))
+
+        for batch in company_batches(bounds, chunk_size):
+            # t.day >= sınır koşulu idx_prices_company_day_close üzerinde aralık taraması olarak çalışır
+            with stage("read_prices", rows_in=len(batch)) as s:
+                price_df = read_companies(conn, "price", PRICE_COLUMNS, batch, lower_bounds=bounds, bound_expr="t.day")
+                s.add_rows(rows_out=len(price_df))
+            if price_df.empty:
+                continue
+
+            with stage("read_financials") as s:
+                fin_df = read_companies(conn, "financial", FIN_COLUMNS, price_df["company_id"].unique().tolist())
+                s.add_rows(rows_out=len(fin_df))
+            with stage("compute", rows_in=len(price_df)) as s:
+                multiple_df = _compute_multiples(price_df, fin_df)
+                s.add_rows(rows_out=len(multiple_df))
+
+            with stage("write", rows_in=len(multiple_df)) as s:
+                chunk_counts = upsert_multiples(conn, multiple_df)
+                s.add_rows(rows_out=chunk_counts["inserted"] + chunk_counts["updated"])
+            for key in counts:
+                counts[key] += chunk_counts[key]
+            n_prices += len(price_df)
+        run.add_rows(rows_in=n_prices, rows_out=counts["inserted"] + counts["updated"])
+
+    if n_prices == 0:
+        logger.info("Hesaplanacak yeni fiyat günü yok.")
+        return counts
+
+    logger.info(f"{n_prices} fiyat günü hesaplandı: {counts['inserted']} yeni, {counts['updated']} güncellenen, {counts['unchanged']} değişmeyen satır.")
+
+    return counts
+
+
 if __name__ == "__main__":
-    conn = sqlite3.connect("C:/Users/KULLANICI/Desktop/portfolio-backtest-project/data/database.db")
-    merged_df = calc_multiples(conn)
-    merged_df.to_sql('multiple', conn, if_exists='append', index=False)
-    conn.close()
+    with get_database().write() as conn:
+        update_multiples(conn)
@@ -1,10 +1,25 @@
-import sqlite3
+import json
 import pandas as pd
+from src.db_reader import iter_company_chunks
+from src.db_writer import upsert_ratios
+from src.app_logger import AppLogger
+from src.db import get_database
+from src.compact_keys import encode_period
+from src.stage_metrics import metered, stage, track_run
 
-def calc_ratios(conn):
+# büyüme oranlarındaki en uzak geriye bakış (shift(4)), kirli pencere bu kadar satır geriden okunur
+GROWTH_LAG = 4
 
-    query = "SELECT * FROM financial"
-    fin_df = pd.read_sql_query(query, conn)
+# oranlar için gereken kolonlar, SELECT * yerine sadece bunlar okunur
+FIN_COLUMNS = ["company_id", "period_year", "period_month", "date_of_publish", "revenue_ttm", "revenue_q", "revenue_c",
+               "net_income_ttm", "net_income_q", "net_income_c", "gross_profit_ttm", "gross_profit_q", "gross_profit_c",
+               "operating_profit_ttm", "operating_profit_q", "operating_profit_c", "ebitda_ttm", "effective_tax_rate_ttm",
+               "eps_ttm", "eps_q", "current_assets", "fixed_assets", "short_term_debt", "gross_debt", "equity"]
+
+# yyyyqq dönem anahtarı (src/compact_keys.py), kirli pencerenin alt sınırı bununla karşılaştırılır
+PERIOD_KEY_SQL = "t.period_key"
+
+def _compute_ratios(fin_df: pd.DataFrame) -> pd.DataFrame:
 
     fin_df["current_ratio"] = fin_df["current_assets"] / fin_df["short_term_debt"]
     fin_df["debt_to_equity"] = fin_df["gross_debt"] / fin_df["equity"]
@@ -46,8 +61,101 @@ def calc_ratios(conn):
     return ratio_df
 
 
+def calc_ratios(conn, chunk_size: int = None):
+
+    # şirket grupları halinde okunur, her şirketin bütün dönemleri aynı grupta olduğu için shift'ler doğru kalır
+    chunks = [_compute_ratios(fin_df) for fin_df in iter_company_chunks(conn, "financial", FIN_COLUMNS, chunk_size=chunk_size)]
+    if not chunks:
+        return _compute_ratios(pd.DataFrame(columns=FIN_COLUMNS))
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _dirty_windows(conn, changed_keys) -> pd.DataFrame:
+    """
+    Değişen dönemlerden etkilenen pencereyi şirket bazında bulur:
+    read_from: hesaplama için okunacak ilk dönem (ilk değişen dönemden GROWTH_LAG satır önce)
+    write_from / write_to: yeniden yazılacak dönemler (son değişen dönemden GROWTH_LAG satır sonrasına kadar)
+    Dönemler yyyyqq period_key olarak tutulur.
+    """
+    changed = pd.DataFrame(list(changed_keys), columns=["company_id", "period_year", "period_month"])
+    changed["period_key"] = encode_period(changed["period_year"], changed["period_month"])
+
+    # sadece tam sayı anahtarlar okunur, tarama UNIQUE (company_id, period_key) index'i üzerinde kalır (tablo okunmaz)
+    keys_df = pd.read_sql_query(
+        "SELECT company_id, period_key FROM financial WHERE company_id IN (SELECT value FROM json_each(?))",
+        conn, params=[json.dumps(changed["company_id"].astype(int).unique().tolist())]
+    )
+
+    windows = []
+    for company_id, company_keys in keys_df.groupby("company_id"):
+        period_keys = company_keys["period_key"].sort_values().to_numpy()
+        changed_keys_of_company = changed.loc[changed["company_id"] == company_id, "period_key"]
+        first = period_keys.searchsorted(changed_keys_of_company.min())
+        last = period_keys.searchsorted(changed_keys_of_company.max())
+        windows.append({
+            "company_id": int(company_id),
+            "read_from": int(period_keys[max(first - GROWTH_LAG, 0)]),
+            "write_from": int(period_keys[min(first, len(period_keys) - 1)]),
+            "write_to": int(period_keys[min(last + GROWTH_LAG, len(period_keys) - 1)]),
+        })
+
+    return pd.DataFrame(windows, columns=["company_id", "read_from", "write_from", "write_to"])
+
+
+def update_ratios(conn, changed_keys=None, logger: AppLogger = None, chunk_size: int = None) -> dict:
+    """
+    changed_keys None ise bütün oranları yeniden hesaplar. (company_id, period_year, period_month)
+    listesi verilirse sadece bu dönemlerden etkilenen dönemleri hesaplar. Sonuçlar ratio tablosuna upsert edilir.
+    Okuma ve yazma chunk_size şirketlik gruplar halinde yapılır.
+    """
+    if logger is None:
+        with AppLogger(conn, "calc_ratios") as logger:
+            return update_ratios(conn, changed_keys, logger, chunk_size)
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    n_periods = 0
+
+    if changed_keys is not None and len(changed_keys) == 0:
+        return counts
+
+    # aşamalar (read / compute / write) chunk'lar boyunca toplanır, stage_metrics'e "calc_ratios" olarak yazılır
+    with track_run(conn, "calc_ratios", rows_in=None if changed_keys is None else len(changed_keys)) as run:
+        if changed_keys is None:
+            chunks = iter_company_chunks(conn, "financial", FIN_COLUMNS, chunk_size=chunk_size)
+            windows = None
+        else:
+            with stage("dirty_windows", rows_in=len(changed_keys)) as s:
+                windows = _dirty_windows(conn, changed_keys)
+                s.add_rows(rows_out=len(windows))
+            chunks = iter_company_chunks(conn, "financial", FIN_COLUMNS, chunk_size=chunk_size,
+                                         lower_bounds=dict(zip(windows["company_id"], windows["read_from"].astype(int).tolist())),
+                                         bound_expr=PERIOD_KEY_SQL)
+
+        for fin_df in metered("read", chunks):
+            with stage("compute", rows_in=len(fin_df)) as s:
+                ratio_df = _compute_ratios(fin_df)
+
+                if windows is not None:
+                    # sadece etkilenen dönemler yazılır, okunan önceki dönemler sadece shift için kullanıldı
+                    ratio_df = ratio_df.merge(windows, on="company_id")
+                    period_key = encode_period(ratio_df["period_year"], ratio_df["period_month"])
+                    ratio_df = ratio_df[(period_key >= ratio_df["write_from"]) & (period_key <= ratio_df["write_to"])]
+                s.add_rows(rows_out=len(ratio_df))
+
+            with stage("write", rows_in=len(ratio_df)) as s:
+                chunk_counts = upsert_ratios(conn, ratio_df)
+                s.add_rows(rows_out=chunk_counts["inserted"] + chunk_counts["updated"])
+            for key in counts:
+                counts[key] += chunk_counts[key]
+            n_periods += len(ratio_df)
+        run.add_rows(rows_out=counts["inserted"] + counts["updated"])
+
+    logger.info(f"{n_periods} dönem hesaplandı: {counts['inserted']} yeni, {counts['updated']} güncellenen, {counts['unchanged']} değişmeyen satır.")
+
+    return counts
+
+
 if __name__ == "__main__":
-    conn = sqlite3.connect("C:/Users/KULLANICI/Desktop/portfolio-backtest-project/data/database.db")
-    ratio_df = calc_ratios(conn)
-    ratio_df.to_sql('ratio', conn, if_exists='append', index=False)
-    conn.close()
\ No newline at end of file
+    with get_database().write() as conn:
+        update_ratios(conn)
\ No newline at end of file
@@ -0,0 +1,136 @@
+# price ve financial'da değişen satırların anahtarlarını okuyuculara (calc_ratios, calc_multiples, önbellekler,
+# dışa aktarımlar) veren değişiklik akışı.
+#
+# - sql/triggers.sql'deki triggerlar her insert / update / delete'te change_log'a (tablo, company_id, anahtar, op)
+#   yazar. Anahtar price için day, financial için period_key'dir. seq hiç tekrar kullanılmaz.
+# - Her okuyucunun tablo bazında son okuduğu seq change_cursor'da tutulur:
+#
+#     changes, seq = read_changes(conn, "calc_ratios", "financial")   # cursor'dan sonraki değişiklikler
+#     ... changes None ise tamamı, değilse sadece changes'teki anahtarlar hesaplanır ...
+#     advance(conn, "calc_ratios", "financial", seq)                   # hesaplama bittikten sonra
+#
+#   Okuma idx_change_log_table üzerinde "table_name = ? AND seq > cursor" aralık taramasıdır, tablolar taranmaz.
+#   Hesaplama ile advance() arasında hata olursa cursor ilerlemez, aynı anahtarlar bir sonraki okumada tekrar döner.
+# - Okuyucunun cursor'ı yoksa (ilk çalıştırma ya da trim(max_lag=...) ile düşürüldüyse) read_changes None
+#   döndürür, okuyucu tamamını hesaplar. Anahtarı hesaplanamayan bir satır (bozuk tarih) için de None döner.
+# - trim() her tablonun bütün okuyucular tarafından okunmuş satırlarını siler. Hiç cursor'ı olmayan tablonun
+#   satırları okuyucu ilk kez okuyana kadar silinmez, ilk okumada zaten tamamı hesaplanacağı için
+#   bunları da silmek için trim(conn, unread=True) kullanılır.
+#
+# Durum: python -m src.change_feed [--trim] [--max-lag 1000000]
+
+import argparse
+
+import pandas as pd
+
+from src.app_logger import utc_now
+from src.db import transaction
+
+
+def last_seq(conn) -> int:
+    """change_log'a yazılmış son seq (silinmiş olsa bile), hiç yazılmadıysa 0."""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+def cursor(conn, consumer: str, table: str):
+    """consumer'ın table için son okuduğu seq, cursor'ı yoksa None."""
+    row = conn.execute("SELECT seq FROM change_cursor WHERE consumer = ? AND table_name = ?", [consumer, table]).fetchone()
+    return row[0] if row else None
+
+
+def read_changes(conn, consumer: str, table: str) -> tuple:
+    """
+    consumer'ın cursor'ından sonra table'da değişen anahtarlar: (DataFrame[company_id, row_key, op], seq).
+    Aynı anahtar birden fazla değiştiyse son değişikliği döner. seq, hesaplama bittikten sonra advance()'e
+    verilecek değerdir. Cursor yoksa DataFrame yerine None döner (tamamı hesaplanmalı).
+    """
+    # üst sınır okumadan önce alınır, okuma sırasında yazılan satırlar bir sonraki okumaya kalır
+    upto = last_seq(conn)
+    since = cursor(conn, consumer, table)
+    if since is None:
+        return None, upto
+
+    changes = pd.read_sql_query("""
+        SELECT company_id, row_key, op FROM change_log
+        WHERE seq IN (SELECT MAX(seq) FROM change_log
+                      WHERE table_name = :table AND seq > :since AND seq <= :upto
+                      GROUP BY company_id, row_key)
+        ORDER BY company_id, row_key
+    """, conn, params={"table": table, "since": since, "upto": upto})
+    if changes["row_key"].isna().any():
+        return None, upto
+    changes["row_key"] = changes["row_key"].astype("int64")
+    return changes, upto
+
+
+def changed_periods(changes: pd.DataFrame) -> list:
+    """financial değişikliklerini update_ratios / update_multiples'ın (company_id, period_year, period_month) anahtarlarına çevirir."""
+    return [(int(company_id), str(key // 100), str(key % 100 * 3)) for company_id, key in
+            zip(changes["company_id"], changes["row_key"])]
+
+
+def changed_days(changes: pd.DataFrame) -> dict:
+    """price değişikliklerinden her şirketin değişen ilk günü: {company_id: day}."""
+    first = changes.groupby("company_id")["row_key"].min()
+    return {int(company_id): int(day) for company_id, day in first.items()}
+
+
+def advance(conn, consumer: str, table: str, seq: int):
+    """consumer'ın table cursor'ını seq'e taşır. Commit etmez, çağıranın transaction'ının parçasıdır."""
+    conn.execute("""
+        INSERT INTO change_cursor (consumer, table_name, seq, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(consumer, table_name) DO UPDATE SET seq = MAX(seq, excluded.seq), updated_at = excluded.updated_at
+    """, [consumer, table, int(seq), utc_now()])
+
+
+def consumer_lag(conn) -> pd.DataFrame:
+    """Her okuyucunun cursor'ı ve henüz okumadığı change_log satırı sayısı."""
+    return pd.read_sql_query("""
+        SELECT c.consumer, c.table_name, c.seq, c.updated_at,
+               (SELECT COUNT(*) FROM change_log l WHERE l.table_name = c.table_name AND l.seq > c.seq) AS pending
+        FROM change_cursor c
+        ORDER BY c.table_name, c.consumer
+    """, conn)
+
+
+def trim(conn, max_lag: int = None, unread: bool = False) -> int:
+    """
+    Bütün okuyucuların okuduğu change_log satırlarını siler, silinen satır sayısını döndürür.
+    max_lag verilirse max_lag'den fazla satır geride kalan okuyucuların cursor'ı silinir (bir sonraki
+    okumada tamamını hesaplarlar), böylece uzun süre çalışmayan bir okuyucu tablonun büyümesine yol açmaz.
+    unread True ise hiç okuyucusu olmayan tabloların satırları da silinir.
+    """
+    deleted = 0
+    with transaction(conn):
+        if max_lag is not None:
+            lag = consumer_lag(conn)
+            for consumer, table in lag.loc[lag["pending"] > max_lag, ["consumer", "table_name"]].itertuples(index=False):
+                conn.execute("DELETE FROM change_cursor WHERE consumer = ? AND table_name = ?", [consumer, table])
+
+        tables = [row[0] for row in conn.execute("SELECT DISTINCT table_name FROM change_log")]
+        for table in tables:
+            upto = conn.execute("SELECT MIN(seq) FROM change_cursor WHERE table_name = ?", [table]).fetchone()[0]
+            if upto is None:
+                if not unread:
+                    continue
+                upto = last_seq(conn)
+            deleted += conn.execute("DELETE FROM change_log WHERE table_name = ? AND seq <= ?", [table, upto]).rowcount
+    return deleted
+
+
+if __name__ == "__main__":
+    from src.db import get_database
+
+    parser = argparse.ArgumentParser(description="change_log okuyucularının durumu.")
+    parser.add_argument("--trim", action="store_true", help="bütün okuyucuların okuduğu satırları sil")
+    parser.add_argument("--max-lag", type=int, default=None, help="bundan fazla geride kalan okuyucuların cursor'ını düşür")
+    args = parser.parse_args()
+
+    database = get_database()
+    if args.trim:
+        with database.write() as conn:
+            print(f"{trim(conn, args.max_lag)} satır silindi.")
+    with database.read() as conn:
+        lag = consumer_lag(conn)
+        print(lag.to_string(index=False) if not lag.empty else "okuyucu yok")
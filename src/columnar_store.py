@@ -0,0 +1,269 @@
+# price, financial, ratio ve multiple tablolarının Parquet formatında, kolon bazlı bir kopyasını tutan modül.
+# Backtest ve taramalar bütün tabloyu SQLite'tan satır satır okumak yerine bu kopyayı okur.
+#
+# Yerleşim: <path>/<tablo>/year=<yıl>/company_id=<id>/part-0.parquet (hive partition)
+# - company_id ve year dosyanın içinde değil klasör adındadır, okurken dictionary tipinde gelir.
+# - Türetilmiş oranlar (ratio, multiple) float32, para tutarları ve fiyatlar float64 saklanır.
+# - Tarihler date32, dönem yılı / ayı küçük tam sayı olarak saklanır.
+#
+# sync_columnar artımlıdır: her tablo için change_log'un "sync_columnar" okuyucusudur (src/change_feed.py).
+# Cursor'dan sonra değişen anahtarların (şirket, yıl) partition'ları yeniden yazılır, kaynakta satırı kalmayanlar
+# silinir, tablonun geri kalanı okunmaz. Cursor ya da _manifest.json yoksa (ilk çalıştırma, silinen kopya,
+# trim ile düşürülen cursor) bütün partition'lar yazılır. Cursor kopya yazıldıktan sonra ilerler, yarıda kalan
+# bir sync bir sonraki çalıştırmada aynı partition'ları tekrar yazar. Kopya veritabanı başına tektir.
+#
+# pyarrow sadece bu modül kullanıldığında gerekir (pip install pyarrow).
+
+import json
+import os
+import shutil
+import pandas as pd
+from src.db_writer import (PRICE_KEYS, PRICE_VALUES, FINANCIAL_KEYS, FINANCIAL_VALUES,
+                           RATIO_KEYS, RATIO_VALUES, MULTIPLE_KEYS, MULTIPLE_VALUES)
+from src.app_logger import AppLogger
+from src.settings import get_settings
+from src.db import get_database, transaction
+from src.change_feed import read_changes, advance
+from src.compact_keys import decode_day
+
+# tablo -> kolonlar, partition yılının SQL ifadesi, change_log anahtarının türü (day / period_key),
+# tarih kolonu ve float32 saklanabilecek kolonlar
+TABLES = {
+    "price": {
+        "columns": PRICE_KEYS + PRICE_VALUES,
+        "year_sql": "CAST(substr(t.date, 1, 4) AS INTEGER)",
+        "row_key": "day",
+        "date_col": "date",
+        "float32": [],
+    },
+    "financial": {
+        "columns": FINANCIAL_KEYS + FINANCIAL_VALUES,
+        "year_sql": "CAST(t.period_year AS INTEGER)",
+        "row_key": "period_key",
+        "date_col": None,
+        "float32": [],
+    },
+    "ratio": {
+        "columns": RATIO_KEYS + RATIO_VALUES,
+        "year_sql": "CAST(t.period_year AS INTEGER)",
+        "row_key": "period_key",
+        "date_col": None,
+        "float32": [col for col in RATIO_VALUES if col != "date_of_publish"],
+    },
+    "multiple": {
+        "columns": MULTIPLE_KEYS + MULTIPLE_VALUES,
+        "year_sql": "CAST(substr(t.date_of_price, 1, 4) AS INTEGER)",
+        "row_key": "day",
+        "date_col": "date_of_price",
+        "float32": ["pe", "pb", "ps", "ev_ebitda", "dividend_yield", "peg"],
+    },
+}
+
+DATE_COLUMNS = ["date", "date_of_price", "date_of_publish"]
+PERIOD_COLUMNS = {"period_year": "int16", "period_month": "int8"}
+
+MANIFEST = "_manifest.json"
+CONSUMER = "sync_columnar"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.fs
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Kolon bazlı depo için pyarrow gerekli: pip install pyarrow") from e
+    return pyarrow
+
+
+def _store_path(path: str = None) -> str:
+    path = path or get_settings("columnar")["path"]
+    if not os.path.isabs(path):
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        path = os.path.join(project_root, path)
+    return path
+
+
+def _partition(year: int, company_id: int) -> str:
+    return f"year={int(year)}/company_id={int(company_id)}"
+
+
+def _load_manifest(table_path: str) -> dict:
+    try:
+        with open(os.path.join(table_path, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_manifest(table_path: str, manifest: dict):
+    os.makedirs(table_path, exist_ok=True)
+    tmp_path = os.path.join(table_path, MANIFEST + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(table_path, MANIFEST))
+
+
+def _all_partitions(conn, table: str) -> list:
+    """Kaynaktaki bütün (şirket, yıl) partition'ları. Tablonun tamamını tarar, sadece tam sync'te kullanılır."""
+    query = f"SELECT DISTINCT t.company_id, {TABLES[table]['year_sql']} AS year FROM {table} t"
+    return [_partition(year, company_id) for company_id, year in conn.execute(query)]
+
+
+def _dirty_partitions(changes: pd.DataFrame, table: str) -> list:
+    """change_log değişikliklerinin (şirket, yıl) partition'ları."""
+    if TABLES[table]["row_key"] == "day":
+        years = decode_day(changes["row_key"]).year
+    else:
+        years = changes["row_key"] // 100
+    return sorted({_partition(year, company_id) for company_id, year in zip(changes["company_id"], years)})
+
+
+def _to_arrow(df: pd.DataFrame, table: str):
+    pa = _pyarrow()
+    spec = TABLES[table]
+
+    df = df.drop(columns=["company_id", "year"])
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            df[col] = pd.to_datetime(df[col], errors="coerce").dt.date
+        elif col in PERIOD_COLUMNS:
+            df[col] = pd.to_numeric(df[col]).astype(PERIOD_COLUMNS[col])
+        elif col in spec["float32"]:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+
+    arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+    # pandas'tan object olarak gelen tarih kolonları date32 olarak saklanır
+    for i, field in enumerate(arrow_table.schema):
+        if field.name in DATE_COLUMNS and not pa.types.is_date32(field.type):
+            arrow_table = arrow_table.set_column(i, field.name, arrow_table.column(i).cast(pa.date32()))
+    return arrow_table
+
+
+def _read_partitions(conn, table: str, partitions: list) -> pd.DataFrame:
+    # (şirket, yıl) çiftleri json_each ile verilir, company_id index'i üzerinden okunur
+    spec = TABLES[table]
+    pairs = [[int(p.split("company_id=")[1]), int(p.split("/")[0][len("year="):])] for p in partitions]
+    return pd.read_sql_query(f"""
+        SELECT {', '.join(f't.{col}' for col in spec['columns'])}, {spec['year_sql']} AS year
+        FROM json_each(?) w
+        JOIN {table} t ON t.company_id = json_extract(w.value, '$[0]')
+        WHERE {spec['year_sql']} = json_extract(w.value, '$[1]')
+    """, conn, params=[json.dumps(pairs)])
+
+
+def _write_partition(table_path: str, partition: str, arrow_table):
+    pq = _pyarrow().parquet
+    partition_path = os.path.join(table_path, partition)
+    os.makedirs(partition_path, exist_ok=True)
+    # önce geçici dosyaya yazılır, okuyucular yarım dosya görmesin ("." ile başlayan dosyaları pyarrow okumaz)
+    tmp_path = os.path.join(partition_path, ".part-0.parquet.tmp")
+    pq.write_table(arrow_table, tmp_path, compression="zstd", use_dictionary=True)
+    os.replace(tmp_path, os.path.join(partition_path, "part-0.parquet"))
+
+
+def sync_table(conn, table: str, path: str = None, batch_size: int = 200) -> dict:
+    """
+    table'ın Parquet kopyasını günceller, sadece son sync'ten beri satırı değişen partition'lar yeniden yazılır.
+    Sonuç: {"written": yazılan partition, "deleted": silinen partition, "unchanged": aynı kalan partition}
+    """
+    table_path = os.path.join(_store_path(path), table)
+    manifest = _load_manifest(table_path)
+    changes, seq = read_changes(conn, CONSUMER, table)
+
+    if changes is None or not manifest:
+        dirty = _all_partitions(conn, table)
+        removed = set(manifest) - set(dirty)
+    else:
+        dirty = _dirty_partitions(changes, table)
+        removed = set()
+
+    written = 0
+    for i in range(0, len(dirty), batch_size):
+        batch = dirty[i:i + batch_size]
+        df = _read_partitions(conn, table, batch)
+        for (year, company_id), part_df in df.groupby(["year", "company_id"]):
+            partition = _partition(year, company_id)
+            _write_partition(table_path, partition, _to_arrow(part_df, table))
+            manifest[partition] = len(part_df)
+            written += 1
+        # kaynakta satırı kalmayan değişmiş partition'lar silinir
+        found = {_partition(year, company_id) for year, company_id in zip(df["year"], df["company_id"])}
+        removed |= {p for p in batch if p not in found and p in manifest}
+        # manifest her grupta kaydedilir
+        _save_manifest(table_path, manifest)
+
+    for partition in removed:
+        shutil.rmtree(os.path.join(table_path, partition), ignore_errors=True)
+        manifest.pop(partition, None)
+    _save_manifest(table_path, manifest)
+
+    with transaction(conn):
+        advance(conn, CONSUMER, table, seq)
+
+    return {"written": written, "deleted": len(removed), "unchanged": len(manifest) - written}
+
+
+def sync_columnar(conn, tables: list = None, path: str = None, logger: AppLogger = None) -> dict:
+    """Verilen (varsayılan: hepsi) tabloların Parquet kopyasını günceller, tablo başına sayıları döndürür."""
+    if logger is None:
+        with AppLogger(conn, "sync_columnar") as logger:
+            return sync_columnar(conn, tables, path, logger)
+
+    results = {}
+    for table in tables or list(TABLES):
+        results[table] = sync_table(conn, table, path)
+        counts = results[table]
+        logger.info(f"{table}: {counts['written']} partition yazıldı, {counts['deleted']} silindi, {counts['unchanged']} aynı.")
+    return results
+
+
+def load_columnar(table: str, columns: list = None, company_ids: list = None, start=None, end=None,
+                  path: str = None) -> pd.DataFrame:
+    """
+    table'ın Parquet kopyasını bellek eşlemeli (mmap) Arrow tamponları üzerinden okur.
+    Sadece columns kolonları okunur. company_ids ve yıl filtresi partition klasörlerini eler,
+    start / end (dahil) filtresi tarih kolonunda (financial / ratio için period_year) satır grubu istatistikleriyle uygulanır.
+    """
+    pa = _pyarrow()
+    ds = pa.dataset
+    spec = TABLES[table]
+
+    table_path = os.path.join(_store_path(path), table)
+    if not os.path.isdir(table_path):
+        return pd.DataFrame(columns=columns or spec["columns"])
+
+    dataset = ds.dataset(
+        table_path,
+        format="parquet",
+        partitioning=ds.HivePartitioning.discover(infer_dictionary=True),  # company_id ve year dictionary tipinde
+        filesystem=pa.fs.LocalFileSystem(use_mmap=True),
+        exclude_invalid_files=True,
+    )
+
+    expr = None
+
+    def _and(condition):
+        return condition if expr is None else expr & condition
+
+    if company_ids is not None:
+        expr = _and(ds.field("company_id").isin([int(company_id) for company_id in company_ids]))
+    if start is not None:
+        start = pd.Timestamp(start)
+        expr = _and(ds.field("year") >= start.year)
+        if spec["date_col"] is not None:
+            expr = _and(ds.field(spec["date_col"]) >= pa.scalar(start.date(), pa.date32()))
+    if end is not None:
+        end = pd.Timestamp(end)
+        expr = _and(ds.field("year") <= end.year)
+        if spec["date_col"] is not None:
+            expr = _and(ds.field(spec["date_col"]) <= pa.scalar(end.date(), pa.date32()))
+
+    arrow_table = dataset.to_table(columns=columns or spec["columns"], filter=expr)
+    return arrow_table.to_pandas()
+
+
+if __name__ == "__main__":
+    with get_database().write() as conn:
+        sync_columnar(conn)
@@ -0,0 +1,74 @@
+# Tarih ve dönem anahtarlarının tam sayı karşılıkları.
+#
+# - day: 1970-01-01'den bu yana geçen gün sayısı (price.date, multiple.date_of_price için).
+#   '2024-06-03' ve '2024-06-03 00:00:00' aynı güne denk gelir.
+# - period_key: yıl * 100 + çeyrek (yyyyqq), örn. 2024/3 -> 202401, 2024/12 -> 202404
+#   (financial, ratio ve multiple'ın period_year / period_month'u için).
+#
+# Metin kolonları olduğu gibi durur, tam sayı kolonlar yazılırken db_writer tarafından,
+# doğrudan SQL ile eklenen satırlarda sql/triggers.sql'deki triggerlar tarafından doldurulur.
+# Tabloların UNIQUE kısıtları (ve upsert'lerin ON CONFLICT anahtarları) tam sayı kolonlardadır (UNIQUE_KEYS).
+# Okuyucular tam sayıları okur ve sadece tekil değerleri tarihe çevirir (decode_day).
+
+import numpy as np
+import pandas as pd
+
+# tablo -> {tam sayı kolon: kaynak metin kolon(lar)ı}
+COMPACT_KEYS = {
+    "price": {"day": "date"},
+    "multiple": {"day": "date_of_price", "period_key": ("period_year", "period_month")},
+    "financial": {"period_key": ("period_year", "period_month")},
+    "ratio": {"period_key": ("period_year", "period_month")},
+}
+
+# tablo -> UNIQUE kısıtının kolonları (src/migrate.py, migration 9)
+UNIQUE_KEYS = {
+    "price": ["company_id", "day"],
+    "multiple": ["company_id", "day"],
+    "financial": ["company_id", "period_key"],
+    "ratio": ["company_id", "period_key"],
+}
+
+# hiç satırı olmayan şirketlerin alt sınırı olarak kullanılır, her günden küçüktür
+NO_DAY = -(2 ** 31)
+
+
+def day_sql(col: str) -> str:
+    """Metin tarih kolonundan gün numarasını hesaplayan SQL ifadesi (saat kısmı atılır)."""
+    return f"CAST(julianday(substr({col}, 1, 10)) - 2440587.5 AS INTEGER)"
+
+
+def period_key_sql(year_col: str, month_col: str) -> str:
+    """period_year / period_month kolonlarından yyyyqq anahtarını hesaplayan SQL ifadesi."""
+    return f"CAST({year_col} AS INTEGER) * 100 + (CAST({month_col} AS INTEGER) + 2) / 3"
+
+
+def encode_day(dates) -> pd.Series:
+    """Tarihleri (metin ya da datetime) gün numarasına çevirir, boş tarihler <NA> olur."""
+    dates = pd.Series(pd.to_datetime(dates, format="ISO8601"))  # saatli ve saatsiz metinler karışık olabilir
+    days = pd.Series(dates.to_numpy(dtype="datetime64[D]").astype(np.int64), index=dates.index, dtype="Int64")
+    return days.mask(dates.isna())
+
+
+def decode_day(days) -> pd.DatetimeIndex:
+    """Gün numaralarını DatetimeIndex'e çevirir."""
+    return pd.DatetimeIndex(np.asarray(days, dtype=np.int64).astype("datetime64[D]").astype("datetime64[ns]"), name="date")
+
+
+def encode_period(period_year, period_month) -> pd.Series:
+    """period_year / period_month'u yyyyqq anahtarına çevirir, boş dönemler <NA> olur."""
+    year = pd.Series(pd.to_numeric(period_year), dtype="Int64")
+    month = pd.Series(pd.to_numeric(period_month), dtype="Int64").set_axis(year.index)
+    return year * 100 + (month + 2) // 3
+
+
+def with_compact_keys(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """df'e table'ın tam sayı anahtar kolonlarını ekler (kaynak kolonlar df'te varsa)."""
+    df = df.copy()
+    for key_col, source in COMPACT_KEYS.get(table, {}).items():
+        if isinstance(source, tuple):
+            if all(col in df.columns for col in source):
+                df[key_col] = encode_period(df[source[0]], df[source[1]]).to_numpy()
+        elif source in df.columns:
+            df[key_col] = encode_day(df[source]).to_numpy()
+    return df
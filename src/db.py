@@ -0,0 +1,280 @@
+# Bütün pipeline adımlarının ortak kullandığı SQLite bağlantı katmanı.
+#
+# - Veritabanı yolu config/settings.json'daki "database" bölümünden gelir (göreli yol proje köküne göredir).
+# - Her bağlantıya aynı PRAGMA'lar uygulanır: WAL, synchronous=NORMAL, cache_size, mmap_size,
+#   temp_store=MEMORY, foreign_keys ve busy_timeout.
+# - Database tek bir yazma bağlantısı (write(), aynı anda tek kullanıcı, çıkışta commit / hata olursa rollback)
+#   ve bir okuma bağlantısı havuzu (read(), query_only) verir. WAL'da okuyucular yazarı beklemez.
+# - Bağlantılar TimedConnection'dır: her SQL ifadesinin kaç kez çalıştığı ve toplam / en uzun süresi tutulur,
+#   query_stats() ile en çok zaman alan sorgular görülebilir.
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from src.settings import get_settings
+
+
+class QueryStats:
+    """SQL ifadesi başına çalışma sayısı, toplam ve en uzun süre (saniye)."""
+
+    def __init__(self):
+        self._stats = {}  # sql -> [count, total, max]
+        self._lock = threading.Lock()
+
+    def add(self, sql: str, seconds: float, count: int = 1):
+        with self._lock:
+            entry = self._stats.setdefault(sql, [0, 0.0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def merge(self, other: "QueryStats"):
+        with other._lock:
+            items = [(sql, list(entry)) for sql, entry in other._stats.items()]
+        with self._lock:
+            for sql, (count, total, longest) in items:
+                entry = self._stats.setdefault(sql, [0, 0.0, 0.0])
+                entry[0] += count
+                entry[1] += total
+                entry[2] = max(entry[2], longest)
+
+    def to_frame(self, top: int = None) -> pd.DataFrame:
+        with self._lock:
+            rows = [(sql, count, total, longest) for sql, (count, total, longest) in self._stats.items()]
+        df = pd.DataFrame(rows, columns=["sql", "count", "total_seconds", "max_seconds"])
+        df = df.sort_values("total_seconds", ascending=False, ignore_index=True)
+        return df if top is None else df.head(top)
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def _normalize(sql: str) -> str:
+    # aynı sorgunun farklı girintileri tek satırda toplansın
+    return " ".join(sql.split())
+
+
+class TimedCursor(sqlite3.Cursor):
+    # fetch süreleri son çalıştırılan ifadeye eklenir (SQLite satırları fetch sırasında üretir)
+
+    def _timed(self, sql: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.connection.query_stats.add(sql, time.perf_counter() - start)
+
+    def execute(self, sql, parameters=()):
+        self._last_sql = _normalize(sql)
+        return self._timed(self._last_sql, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._last_sql = _normalize(sql)
+        return self._timed(self._last_sql, super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        self._last_sql = "<script>"
+        return self._timed(self._last_sql, super().executescript, sql_script)
+
+    def _fetch(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            sql = getattr(self, "_last_sql", None)
+            if sql is not None:
+                self.connection.query_stats.add(sql, time.perf_counter() - start, count=0)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+
+class TimedConnection(sqlite3.Connection):
+    """conn.execute ve pandas'ın read_sql_query'si dahil bütün sorguların süresini query_stats'a yazan bağlantı."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_stats = QueryStats()
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute cursor()'ı C tarafında çağırır, süre tutulsun diye TimedCursor üzerinden yönlendirilir
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+@contextmanager
+def transaction(conn):
+    """
+    Açık transaction yoksa yenisini açar: blok hatasız biterse commit, hata olursa rollback.
+    Çağıranın açık bir transaction'ı varsa blok bir SAVEPOINT içinde çalışır, çağıranın transaction'ı commit
+    edilmez: hata olursa sadece bu bloğun yazdıkları geri alınır, commit'i çağıran yapar.
+    """
+    if not conn.in_transaction:
+        # "with conn:" transaction'ı ilk yazmada açar, ondan önce çağrılan iç bloklar da commit ederdi.
+        # BEGIN hemen çalıştırılır, bağlantının isolation_level'ı (ör. pipeline'da IMMEDIATE) korunur
+        conn.execute(f"BEGIN {conn.isolation_level or ''}")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return
+    conn.execute("SAVEPOINT nested_write")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK TO nested_write")
+        conn.execute("RELEASE nested_write")
+        raise
+    conn.execute("RELEASE nested_write")
+
+
+def db_path(path: str = None) -> str:
+    """Verilen ya da ayarlardaki veritabanı yolu, göreli yollar proje köküne göredir."""
+    path = path or get_settings("database")["path"]
+    if path != ":memory:" and not os.path.isabs(path):
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        path = os.path.join(project_root, path)
+    return path
+
+
+def apply_pragmas(conn, read_only: bool = False):
+    settings = get_settings("database")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = {-int(settings['cache_size_mb'] * 1024)}")  # negatif değer KiB cinsindendir
+    conn.execute(f"PRAGMA mmap_size = {int(settings['mmap_size_mb'] * 1024 * 1024)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA busy_timeout = {int(settings['busy_timeout_ms'])}")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+
+
+def connect(path: str = None, read_only: bool = False) -> TimedConnection:
+    """Ayarlı PRAGMA'larla tek bir bağlantı açar. Bağlantı thread'ler arasında kullanılabilir (check_same_thread=False)."""
+    path = db_path(path)
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, factory=TimedConnection, check_same_thread=False)
+    apply_pragmas(conn, read_only)
+    return conn
+
+
+class Database:
+    """
+    Bir veritabanı dosyası için tek yazma bağlantısı ve okuma bağlantısı havuzu.
+    read_pool_size kadar okuma bağlantısı gerektikçe açılır, havuz doluysa bir bağlantının geri gelmesi beklenir.
+    """
+
+    def __init__(self, path: str = None, read_pool_size: int = None):
+        self.path = db_path(path)
+        if self.path == ":memory:":
+            raise ValueError("Database bir dosya ister, bellekteki veritabanı için connect(':memory:') kullanılmalı.")
+        self.read_pool_size = read_pool_size or get_settings("database")["read_pool_size"]
+
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._readers = queue.LifoQueue()
+        self._n_readers = 0
+        self._pool_lock = threading.Lock()
+        self._all = []
+
+    @contextmanager
+    def write(self):
+        """Tek yazma bağlantısı. Blok hatasız biterse commit, hata olursa rollback yapılır."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = connect(self.path)
+                self._all.append(self._writer)
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.rollback()
+                raise
+            else:
+                self._writer.commit()
+
+    @contextmanager
+    def read(self):
+        """Havuzdan salt okunur bir bağlantı, blok bitince havuza geri döner."""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            conn.rollback()  # açık kalan okuma işlemi WAL'ın checkpoint'ini engellemesin
+            self._readers.put(conn)
+
+    def _acquire_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._n_readers < self.read_pool_size:
+                self._n_readers += 1
+                conn = connect(self.path, read_only=True)
+                self._all.append(conn)
+                return conn
+        return self._readers.get()
+
+    def query_stats(self, top: int = None) -> pd.DataFrame:
+        """Bütün bağlantıların sorgu sürelerinin toplamı, en çok zaman alandan başlayarak."""
+        total = QueryStats()
+        for conn in list(self._all):
+            total.merge(conn.query_stats)
+        return total.to_frame(top)
+
+    def close(self):
+        with self._write_lock, self._pool_lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._writer = None
+            self._readers = queue.LifoQueue()
+            self._n_readers = 0
+
+
+# process seviyesinde, veritabanı yolu başına bir Database
+_DATABASES = {}
+_DATABASES_LOCK = threading.Lock()
+
+
+def get_database(path: str = None) -> Database:
+    """
+    Ayarlardaki (ya da verilen) veritabanı için process'te ortak kullanılan Database nesnesi.
+    İlk çağrıda bekleyen şema migration'ları (src/migrate.py) uygulanır.
+    """
+    path = db_path(path)
+    with _DATABASES_LOCK:
+        if path not in _DATABASES:
+            database = Database(path)
+            # tablolar oluşturulmuşsa bekleyen migration'lar ilk açılışta uygulanır
+            from src.migrate import migrate  # src.migrate bu modülü import ettiği için burada
+            with database.write() as conn:
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'price'").fetchone():
+                    migrate(conn)
+            _DATABASES[path] = database
+        return _DATABASES[path]
@@ -1,18 +1,30 @@
 # Buradaki amaç sql dosyalarını okuyup database.db (sqlite dosyasına) uygulamak
 
 from pathlib import Path
-import sqlite3
+import sys
 
 ROOT = Path(__file__).resolve().parents[1] #dosyanın ana pathini bulmak için
-db_path = ROOT / "data" / "database.db" #database'in yükleneceği yer
+sys.path.insert(0, str(ROOT)) # python src/db_init.py ile çalıştırıldığında src paketi bulunsun
+
+from src.db import connect, db_path
+from src.migrate import migrate
+
 schema = (ROOT / "sql" / "schema.sql").read_text(encoding="utf-8") #schema sql dosyası
 indexes = (ROOT / "sql" / "indexes.sql").read_text(encoding="utf-8") #index sql dosyası
 seed_companies = (ROOT / "sql" / "seed_companies.sql").read_text(encoding="utf-8") #index sql dosyası
+triggers = (ROOT / "sql" / "triggers.sql").read_text(encoding="utf-8") #tablo versiyonlarını tutan triggerlar
 
 
-with sqlite3.connect(db_path) as conn:
-    conn.execute("PRAGMA foreign_keys = ON;")
-    conn.executescript(schema)
-    conn.executescript(indexes)
-    conn.executescript(seed_companies)
-print(f"Initialized {db_path}")
+if __name__ == "__main__":
+    # database'in yükleneceği yer ve PRAGMA'lar (WAL, foreign_keys, ...) config/settings.json'daki "database" bölümünden
+    conn = connect()
+    with conn:
+        conn.executescript(schema)
+    # eski bir veritabanında yeni kolonlar index'lerden önce eklenmeli (src/migrate.py)
+    migrate(conn)
+    with conn:
+        conn.executescript(indexes)
+        conn.executescript(seed_companies)
+        conn.executescript(triggers)
+    conn.close()
+    print(f"Initialized {db_path()}")
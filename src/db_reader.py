@@ -0,0 +1,67 @@
+# Analiz adımlarının (calc_ratios, calc_multiples) veritabanından okuma yaptığı yardımcı modül.
+# Tablonun tamamını "SELECT *" ile tek DataFrame'e almak yerine sadece istenen kolonlar,
+# şirket grupları (chunk) halinde okunur. Her adım bir grubu işleyip yazdıktan sonra
+# bir sonrakine geçer, böylece bellek kullanımı veritabanının boyutuna değil grup boyutuna bağlı kalır.
+
+import json
+import pandas as pd
+from src.settings import get_settings
+
+
+def _chunk_size(chunk_size: int = None) -> int:
+    if chunk_size is None:
+        chunk_size = get_settings("analytics")["chunk_companies"]
+    return max(int(chunk_size), 1)
+
+
+def company_ids(conn, table: str) -> list:
+    """table'da satırı olan şirketler, company_id index'i üzerinden okunur."""
+    return [row[0] for row in conn.execute(f"SELECT DISTINCT company_id FROM {table} ORDER BY company_id")]
+
+
+def company_batches(ids, chunk_size: int = None):
+    """Şirket listesini chunk_size'lık gruplara böler."""
+    ids = list(ids)
+    chunk_size = _chunk_size(chunk_size)
+    for i in range(0, len(ids), chunk_size):
+        yield ids[i:i + chunk_size]
+
+
+def read_companies(conn, table: str, columns: list, ids: list, lower_bounds: dict = None,
+                   bound_expr: str = None) -> pd.DataFrame:
+    """
+    ids'teki şirketlerin sadece columns kolonlarını okur.
+    lower_bounds verilirse ({company_id: alt sınır}) sadece bound_expr >= sınır olan satırlar okunur.
+    bound_expr tablo üzerinde (t) bir SQL ifadesidir, örn. "t.date".
+    """
+    col_list = ", ".join(f"t.{col}" for col in columns)
+
+    if lower_bounds is None:
+        return pd.read_sql_query(
+            f"SELECT {col_list} FROM {table} t WHERE t.company_id IN (SELECT value FROM json_each(?))",
+            conn, params=[json.dumps([int(company_id) for company_id in ids])]
+        )
+
+    # json_each ile şirket başına bir sınır verilir, (company_id, ...) index'inde aralık taraması olarak çalışır
+    bounds = [[int(company_id), lower_bounds[company_id]] for company_id in ids]
+    return pd.read_sql_query(f"""
+        SELECT {col_list}
+        FROM json_each(?) b
+        JOIN {table} t ON t.company_id = json_extract(b.value, '$[0]') AND {bound_expr} >= json_extract(b.value, '$[1]')
+    """, conn, params=[json.dumps(bounds)])
+
+
+def iter_company_chunks(conn, table: str, columns: list, ids: list = None, lower_bounds: dict = None,
+                        bound_expr: str = None, chunk_size: int = None):
+    """
+    table'ı şirket grupları halinde okur, her grup için bir DataFrame döndürür (generator).
+    ids verilmezse lower_bounds'taki, o da yoksa tablodaki bütün şirketler okunur.
+    Bir şirketin bütün satırları her zaman aynı grupta gelir.
+    """
+    if ids is None:
+        ids = list(lower_bounds) if lower_bounds is not None else company_ids(conn, table)
+
+    for batch in company_batches(ids, chunk_size):
+        df = read_companies(conn, table, columns, batch, lower_bounds, bound_expr)
+        if not df.empty:
+            yield df
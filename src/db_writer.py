@@ -0,0 +1,186 @@
+# Yeni verileri tek seferde veritabanına yazan yardımcı modül.
+# Veri önce geçici bir staging tablosuna yüklenir, sonra tek bir
+# INSERT ... ON CONFLICT DO UPDATE sorgusuyla hedef tabloya uygulanır.
+# Sadece değeri değişen satırlar güncellenir, değişmeyenlere dokunulmaz.
+# price, financial, ratio ve multiple'a yazarken tam sayı anahtarlar (day, period_key) da doldurulur,
+# bu tablolarda eşleşme (ON CONFLICT) tam sayı anahtarlar üzerindendir, metin anahtarlar değer gibi yazılır.
+
+import pandas as pd
+from src.compact_keys import COMPACT_KEYS, UNIQUE_KEYS, with_compact_keys
+from src.db import transaction
+from src.stage_metrics import stage
+
+# to_sql'in datetime kolonlarını yazdığı format, mevcut kayıtlarla aynı olması için
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+PRICE_KEYS = ["company_id", "date"]
+PRICE_VALUES = ["open", "close", "high", "low", "volume", "market_cap"]
+
+FINANCIAL_KEYS = ["company_id", "period_year", "period_month"]
+FINANCIAL_VALUES = ["date_of_publish","revenue_ttm","gross_profit_ttm","operating_profit_ttm","ebitda_ttm","net_income_ttm","revenue_q","gross_profit_q","operating_profit_q","ebitda_q","net_income_q","revenue_c","gross_profit_c","operating_profit_c","ebitda_c","net_income_c","effective_tax_rate_ttm","cash_and_cash_equivalents","current_assets","fixed_assets","long_term_debt","short_term_debt","gross_debt","net_debt","equity","eps_c","eps_q","eps_ttm","dividend_ttm"]
+
+RATIO_KEYS = ["company_id", "period_year", "period_month"]
+RATIO_VALUES = ["date_of_publish","current_ratio","debt_to_equity","debt_to_assets","debt_to_ebitda","net_income_margin_ttm","net_income_margin_q","net_income_margin_c","gross_profit_margin_ttm","gross_profit_margin_q","gross_profit_margin_c","operating_margin_ttm","operating_margin_q","operating_margin_c","roe_ttm","roe_q","roa_ttm","roa_q","roic_ttm","asset_turnover","revenue_growth_ttm_yoy","revenue_growth_q_yoy","revenue_growth_q_qoq","net_income_growth_ttm_yoy","net_income_growth_q_yoy","net_income_growth_q_qoq","eps_growth_ttm_yoy","eps_growth_q_yoy","eps_growth_q_qoq"]
+
+MULTIPLE_KEYS = ["company_id", "date_of_price"]
+MULTIPLE_VALUES = ["period_year", "period_month", "pe", "pb", "ps", "ev_ebitda", "dividend_yield", "peg"]
+
+INDICATOR_KEYS = ["company_id", "day"]
+INDICATOR_VALUES = ["ret_1d", "vol_20", "sma_20", "sma_50", "mom_20", "vavg_20"]
+
+SCORE_KEYS = ["score_name", "date", "company_id"]
+SCORE_VALUES = ["composite", "percentile", "rank"]
+
+
+def _to_records(df: pd.DataFrame, columns: list):
+    # sqlite3 numpy tiplerini kabul etmediği için python tiplerine, NaN'ları None'a çevirir
+    df = df[columns].copy()
+    for col in columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime(DATE_FORMAT)
+    df = df.astype(object).where(df.notna(), None)
+    return df.itertuples(index=False, name=None)
+
+
+def upsert_df(conn, df: pd.DataFrame, table: str, key_cols: list, value_cols: list, logger=None, label: str = None,
+              return_keys: bool = False) -> dict:
+    """
+    df'i table'a key_cols üzerinden upsert eder. Hepsi tek bir transaction içinde yapılır, çağıranın açık
+    transaction'ı varsa onun içinde bir SAVEPOINT'te (commit'i çağıran yapar, bkz. src/db.transaction).
+    Sonuç: {"inserted": yeni satır, "updated": değeri değişen satır, "unchanged": aynı kalan satır}
+    logger verilirse zaten bulunan satırlar şirket bazında özetlenip loglanır. label, özetteki
+    aralığı göstermek için staging tablosu (s) üzerinde bir SQL ifadesidir.
+    return_keys True ise eklenen ve güncellenen satırların anahtarları da "keys" altında döner.
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if return_keys:
+        counts["keys"] = []
+    if df.empty:
+        return counts
+
+    df = df.drop_duplicates(subset=key_cols, keep="last")
+    columns = key_cols + value_cols
+    col_list = ", ".join(columns)
+    staging = f"staging_{table}"
+
+    # staging tablosu hedef tablonun kolon tiplerini (affinity) alır
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} AS SELECT {col_list} FROM {table} LIMIT 0")
+
+    key_match = " AND ".join(f"t.{col} = s.{col}" for col in key_cols)
+    set_clause = ", ".join(f"{col} = excluded.{col}" for col in value_cols)
+    changed = " OR ".join(f"{table}.{col} IS NOT excluded.{col}" for col in value_cols)
+
+    # aşamalar (staging / diff / upsert) aktif bir ölçüm varsa stage_metrics'e yazılır (src/stage_metrics.py)
+    with transaction(conn):
+        with stage("staging", rows_in=len(df)):
+            conn.execute(f"DELETE FROM {staging}")
+            conn.executemany(
+                f"INSERT INTO {staging} ({col_list}) VALUES ({', '.join('?' for _ in columns)})",
+                _to_records(df, columns)
+            )
+
+        with stage("diff", rows_in=len(df)) as diff_stage:
+            total, inserted = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(t.{key_cols[0]} IS NULL), 0) "
+                f"FROM {staging} s LEFT JOIN {table} t ON {key_match}"
+            ).fetchone()
+
+            if return_keys:
+                changed_rows = " OR ".join(f"t.{col} IS NOT s.{col}" for col in value_cols)
+                counts["keys"] = conn.execute(
+                    f"SELECT {', '.join(f's.{col}' for col in key_cols)} "
+                    f"FROM {staging} s LEFT JOIN {table} t ON {key_match} "
+                    f"WHERE t.{key_cols[0]} IS NULL OR {changed_rows}"
+                ).fetchall()
+
+            if logger is not None and total > inserted:
+                _log_existing_rows(conn, logger, table, staging, key_match, value_cols, label or f"s.{key_cols[-1]}")
+            diff_stage.add_rows(rows_out=total - inserted)  # zaten bulunan satırlar
+
+        with stage("upsert", rows_in=total) as upsert_stage:
+            # "WHERE true" INSERT ... SELECT ile ON CONFLICT'in karışmaması için gerekli.
+            # rowcount sadece bu ifadenin satırlarını sayar, total_changes'in aksine triggerların yazdıkları dahil değildir.
+            written = conn.execute(
+                f"INSERT INTO {table} ({col_list}) SELECT {col_list} FROM {staging} WHERE true "
+                f"ON CONFLICT({', '.join(key_cols)}) DO UPDATE SET {set_clause} WHERE {changed}"
+            ).rowcount
+            upsert_stage.add_rows(rows_out=written)
+
+            conn.execute(f"DELETE FROM {staging}")
+
+    counts["inserted"] = inserted
+    counts["updated"] = written - inserted
+    counts["unchanged"] = total - written
+    return counts
+
+
+def _log_existing_rows(conn, logger, table: str, staging: str, key_match: str, value_cols: list, label: str):
+    # zaten bulunan satırları şirket ve değişti/değişmedi bazında tek sorguda gruplar
+    changed = " OR ".join(f"t.{col} IS NOT s.{col}" for col in value_cols)
+    query = f"""
+    SELECT s.company_id, ({changed}) AS changed, COUNT(*), MIN({label}), MAX({label})
+    FROM {staging} s JOIN {table} t ON {key_match}
+    GROUP BY s.company_id, changed
+    """
+    for company_id, is_changed, count, first_key, last_key in conn.execute(query):
+        event = "satır zaten bulunuyordu ve güncellendi" if is_changed else "satır zaten bulunuyor"
+        logger.repeated("WARN", event, company_id, first_key, last_key, count)
+
+
+def _has_unique_index(conn, table: str, columns: list) -> bool:
+    for _, name, unique, *_ in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        if unique and [row[2] for row in conn.execute(f"PRAGMA index_info({name})")] == columns:
+            return True
+    return False
+
+
+def _upsert_with_keys(conn, df: pd.DataFrame, table: str, key_cols: list, value_cols: list, logger, label: str,
+                      return_keys: bool = False) -> dict:
+    # tam sayı anahtarlar metin anahtarlardan türetilir, satırlar UNIQUE_KEYS üzerinden eşleşir ve metin anahtarlar
+    # değer gibi yazılır ('2024-06-03' ile '2024-06-03 00:00:00' aynı satırdır).
+    # Henüz migrate edilmemiş tablolara metin anahtarlar üzerinden, kolonları yoksa sadece metin kolonlar yazılır.
+    table_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    compact_cols = [col for col in COMPACT_KEYS[table] if col in table_columns]
+    if not compact_cols:
+        return upsert_df(conn, df, table, key_cols, value_cols, logger, label=label, return_keys=return_keys)
+
+    df = with_compact_keys(df, table)
+    unique_cols = UNIQUE_KEYS[table]
+    if not _has_unique_index(conn, table, unique_cols):
+        return upsert_df(conn, df, table, key_cols, value_cols + compact_cols, logger, label=label,
+                         return_keys=return_keys)
+
+    values = [col for col in key_cols + value_cols + compact_cols if col not in unique_cols]
+    counts = upsert_df(conn, df, table, unique_cols, values, logger, label=label, return_keys=return_keys)
+    if return_keys and unique_cols[-1] == "period_key":
+        # çağıranlar dönemleri (company_id, period_year, period_month) olarak kullanır
+        counts["keys"] = [(company_id, str(key // 100), str(key % 100 * 3)) for company_id, key in counts["keys"]]
+    return counts
+
+
+def upsert_prices(conn, df: pd.DataFrame, logger=None) -> dict:
+    return _upsert_with_keys(conn, df, "price", PRICE_KEYS, PRICE_VALUES, logger, label="substr(s.date, 1, 10)")
+
+
+def upsert_financials(conn, df: pd.DataFrame, logger=None, return_keys: bool = False) -> dict:
+    return _upsert_with_keys(conn, df, "financial", FINANCIAL_KEYS, FINANCIAL_VALUES, logger,
+                             label="printf('%s/%02d', s.period_year, s.period_month)", return_keys=return_keys)
+
+
+def upsert_ratios(conn, df: pd.DataFrame, logger=None) -> dict:
+    return _upsert_with_keys(conn, df, "ratio", RATIO_KEYS, RATIO_VALUES, logger,
+                             label="printf('%s/%02d', s.period_year, s.period_month)")
+
+
+def upsert_multiples(conn, df: pd.DataFrame, logger=None) -> dict:
+    return _upsert_with_keys(conn, df, "multiple", MULTIPLE_KEYS, MULTIPLE_VALUES, logger,
+                             label="substr(s.date_of_price, 1, 10)")
+
+
+def upsert_indicators(conn, df: pd.DataFrame, logger=None) -> dict:
+    return upsert_df(conn, df, "indicator", INDICATOR_KEYS, INDICATOR_VALUES, logger,
+                     label="date(s.day * 86400, 'unixepoch')")
+
+
+def upsert_scores(conn, df: pd.DataFrame, logger=None) -> dict:
+    return upsert_df(conn, df, "score", SCORE_KEYS, SCORE_VALUES, logger, label="substr(s.date, 1, 10)")
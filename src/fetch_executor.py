@@ -0,0 +1,120 @@
+# Veri sağlayıcılarına (yfinance, isyatirimhisse) yapılan istekleri parçalara (shard) bölüp
+# sınırlı bir thread havuzunda paralel çalıştıran yardımcı modül.
+# Her sağlayıcının kendi istek hızı sınırı vardır, hata alan parçalar ve hata vermeden verisi dönmeyen
+# tickerlar (yf.download tek tek tickerlar için exception fırlatmaz) tekrar denenir ve sonuçta hangi
+# tickerların çekilemediği raporlanır.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class RateLimiter:
+    """İki istek arasında en az 1 / calls_per_second saniye geçmesini sağlar."""
+
+    def __init__(self, calls_per_second: float, clock=time.monotonic, sleep=time.sleep):
+        self.min_interval = 1.0 / calls_per_second if calls_per_second else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = self._clock()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.min_interval
+        if wait_time > 0:
+            self._sleep(wait_time)
+
+
+class FetchResult:
+    """Bir sağlayıcıdan gelen başarılı parçaları ve çekilemeyen tickerları tutar."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.frames = []   # başarılı parçaların DataFrame'leri
+        self.failed = []   # çekilemeyen tickerlar
+        self.errors = {}   # ticker -> son hata mesajı
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+class FetchExecutor:
+    """
+    Ticker listesini shard_size'lık parçalara böler ve bütün sağlayıcıların parçalarını
+    aynı ThreadPoolExecutor üzerinde çalıştırır.
+
+    rate_limits: {"yf": 2.0, "is": 1.0} gibi sağlayıcı başına saniyedeki en fazla istek sayısı.
+    clock / sleep: hız sınırı ve backoff beklemeleri için (testlerde sahte saat verilir).
+    """
+
+    def __init__(self, max_workers: int = 4, shard_size: int = 50, rate_limits: dict = None,
+                 retries: int = 2, backoff: float = 0.5, clock=time.monotonic, sleep=time.sleep):
+        self.max_workers = max_workers
+        self.shard_size = shard_size
+        self.retries = retries
+        self.backoff = backoff
+        self._sleep = sleep
+        self._limiters = {provider: RateLimiter(rate, clock, sleep) for provider, rate in (rate_limits or {}).items()}
+
+    def _shards(self, tickers: list) -> list:
+        return [tickers[i:i + self.shard_size] for i in range(0, len(tickers), self.shard_size)]
+
+    def _run_shard(self, provider: str, fetch_fn, shard: list, returned_fn=None) -> tuple:
+        # hata alınırsa ya da bazı tickerların verisi dönmezse backoff * 2^deneme saniye bekleyip sadece eksik
+        # tickerları tekrar ister. retryable = False olan hatalar (örn. önbellekte olmayan replay isteği) tekrar denenmez.
+        # Sonuç: (DataFrame listesi, {çekilemeyen ticker: son hata mesajı})
+        limiter = self._limiters.get(provider)
+        frames = []
+        pending = list(shard)
+        for attempt in range(self.retries + 1):
+            if limiter is not None:
+                limiter.wait()
+            try:
+                df = fetch_fn(pending)
+            except Exception as e:
+                if attempt == self.retries or not getattr(e, "retryable", True):
+                    return frames, {ticker: str(e) for ticker in pending}
+                self._sleep(self.backoff * (2 ** attempt))
+                continue
+
+            if df is not None and not df.empty:
+                frames.append(df)
+            if returned_fn is None:
+                return frames, {}
+            returned = set() if df is None or df.empty else set(returned_fn(df))
+            pending = [ticker for ticker in pending if ticker not in returned]
+            if not pending:
+                return frames, {}
+            if attempt < self.retries:
+                self._sleep(self.backoff * (2 ** attempt))
+        return frames, {ticker: "veri dönmedi" for ticker in pending}
+
+    def run(self, jobs: dict) -> dict:
+        """
+        jobs: {provider: (fetch_fn, tickers)} ya da {provider: (fetch_fn, tickers, returned_fn)} şeklinde.
+        fetch_fn bir ticker listesi alıp DataFrame döndürmeli, hata durumunda exception fırlatmalıdır.
+        returned_fn verilirse fetch_fn'in sonucundan verisi gelen tickerları döndürür, gelmeyenler tekrar istenir,
+        yine gelmezse çekilemedi olarak raporlanır.
+        Sonuç: {provider: FetchResult}
+        """
+        results = {provider: FetchResult(provider) for provider in jobs}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {}
+            for provider, (fetch_fn, tickers, *returned_fn) in jobs.items():
+                for shard in self._shards(list(tickers)):
+                    future = pool.submit(self._run_shard, provider, fetch_fn, shard, *returned_fn)
+                    futures[future] = provider
+
+            for future in as_completed(futures):
+                result = results[futures[future]]
+                frames, errors = future.result()
+                result.frames.extend(frames)
+                result.failed.extend(errors)
+                result.errors.update(errors)
+
+        return results
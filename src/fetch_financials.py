@@ -1,9 +1,63 @@
 import pandas as pd
 import numpy as np
-import sqlite3
 import os
 import json
 from isyatirimhisse import fetch_financials
+from src.db_writer import upsert_financials
+from src.app_logger import AppLogger
+from src.provider_cache import ProviderCache, is_closed_year_range
+from src.db import get_database
+from src.settings import get_settings
+from src.compact_keys import encode_period
+from src.stage_metrics import stage, track_run
+
+# kümülatif (_c) değerlerinden çeyreklik (_q) ve son 4 çeyrek (_ttm) değerleri hesaplanan kalemler
+KALEMLER = ["revenue","gross_profit","operating_profit","ebitda","net_income","taxation_on_continuing_operations","profit_before_tax_from_continuing_operations","eps","dividend"]
+
+
+def _derive_quarterly(df: pd.DataFrame, kalemler: list) -> pd.DataFrame:
+    """
+    Bütün kalemlerin _c -> _q -> _ttm hesaplarını tek bir 2 boyutlu dizi üzerinde yapar.
+    df company_id, period_year, period_month'a göre sıralı ve dönemler tekil olmalıdır.
+    Eksik çeyrekler açıkça ele alınır: önceki çeyreği olmayan satırın _q'su, ardışık 4 çeyreği
+    olmayan satırın _ttm'i NaN olur (yan yana olmayan satırlar toplanmaz).
+    """
+    n = len(df)
+    company = df["company_id"].to_numpy()
+    month = df["period_month"].to_numpy()
+    quarter = df["period_year"].to_numpy(dtype=np.int64) * 4 + month // 3 - 1  # ardışık çeyrek numarası
+    is_quarter = np.isin(month, (3, 6, 9, 12))
+
+    def follows(lag: int) -> np.ndarray:
+        # satırdan lag satır önceki satır aynı şirketin tam lag çeyrek önceki dönemi mi
+        ok = np.zeros(n, dtype=bool)
+        if n > lag:
+            ok[lag:] = (company[lag:] == company[:-lag]) & (quarter[lag:] - quarter[:-lag] == lag) & is_quarter[:-lag]
+        return ok & is_quarter
+
+    def shifted(values: np.ndarray, lag: int) -> np.ndarray:
+        out = np.full_like(values, np.nan)
+        out[lag:] = values[:n - lag]
+        return out
+
+    cumulative = df[[kalem + "_c" for kalem in kalemler]].to_numpy(dtype=float)
+
+    # ilk çeyrekte kümülatif değer çeyreğin kendisidir, diğerlerinde bir önceki çeyrekten farkı
+    quarterly = np.where((month == 3)[:, None], cumulative, cumulative - shifted(cumulative, 1))
+    quarterly[~(follows(1) | (month == 3))] = np.nan
+    quarterly[~is_quarter] = np.nan
+
+    # dönemler tekil ve sıralı olduğu için 3 satır önceki dönem 3 çeyrek önceyse aradaki satırlar da ardışıktır
+    ttm = quarterly + shifted(quarterly, 1) + shifted(quarterly, 2) + shifted(quarterly, 3)
+    ttm[~follows(3)] = np.nan
+
+    derived = pd.DataFrame(
+        np.hstack([quarterly, ttm]),
+        columns=[kalem + "_q" for kalem in kalemler] + [kalem + "_ttm" for kalem in kalemler],
+        index=df.index,
+    )
+    return pd.concat([df.drop(columns=derived.columns, errors="ignore"), derived], axis=1)
+
 
 def _get_ticker_dict() -> dict:
     """Proje kök dizinindeki config klasöründen ticker sözlüğünü okur."""
@@ -26,28 +80,34 @@ def _get_ticker_dict() -> dict:
         return {}
     
 
-def fetch_fin(conn,ticker_dict: dict,start_year,end_year):
+def _is_no_data(error: Exception) -> bool:
+    # isyatirimhisse hiçbir sembolde veri bulamazsa bu mesajla ValueError verir, diğer hatalar gerçek hatadır
+    return isinstance(error, ValueError) and str(error).startswith("No financial data was fetched")
 
-    ticker_dict  = {key.replace('.IS', ''): value for key, value in ticker_dict.items()}
 
-    tickers = list(ticker_dict.keys())
+# isyatirimhisse bir sembolün isteği hata verirse uyarı basıp o sembolü atlar
+def _returned_fin(df: pd.DataFrame) -> list:
+    return list(df["SYMBOL"].unique()) if "SYMBOL" in df.columns else []
 
-    try:
-        df = fetch_financials(
-            symbols=tickers,
-            start_year=start_year,
-            end_year=end_year,
-            exchange="TRY",
-            financial_group='1',
-            save_to_excel=False
-        )
-    except Exception as e: 
-        print(f"Hata: Veri çekilemedi. Bağlantı sorunu olabilir. Hata detayları: {e}")
-        return pd.DataFrame()
-
-    if df.empty:
-        return pd.DataFrame()
 
+def _download_fin(tickers: list, start_year, end_year, cache: ProviderCache = None):
+    if cache is not None:
+        return cache.fetch("is_fin", lambda: _download_fin(tickers, start_year, end_year), tickers, start_year, end_year,
+                           params={"exchange": "TRY", "financial_group": "1"}, closed=is_closed_year_range(end_year),
+                           returned_fn=_returned_fin)
+
+    return fetch_financials(
+        symbols=tickers,
+        start_year=start_year,
+        end_year=end_year,
+        exchange="TRY",
+        financial_group='1',
+        save_to_excel=False
+    )
+
+
+def _transform_fin(df: pd.DataFrame, ticker_dict: dict) -> pd.DataFrame:
+    """isyatirimhisse'in kalem x dönem tablosunu financial tablosunun kolonlarına çevirir, çeyreklik ve TTM kalemlerini hesaplar."""
     df.drop(['FINANCIAL_ITEM_NAME_TR',"FINANCIAL_ITEM_CODE"], axis=1, inplace=True)  
 
     df_melted = df.melt(
@@ -89,22 +149,7 @@ def fetch_fin(conn,ticker_dict: dict,start_year,end_year):
     df_pivoted = df_pivoted.drop_duplicates(subset=["period_year","period_month", "company_id"], keep="last")
 
     df_pivoted = df_pivoted.sort_values(by=['company_id', 'period_year', 'period_month']).reset_index(drop=True)
-    kalemler = ["revenue","gross_profit","operating_profit","ebitda","net_income","taxation_on_continuing_operations","profit_before_tax_from_continuing_operations","eps","dividend"]
-
-    for kalem in kalemler:
-        kalem_q = kalem + "_q"
-        kalem_c = kalem + "_c"
-        kalem_ttm = kalem + "_ttm"
-
-        df_pivoted[kalem_q] = np.where(
-            df_pivoted['period_month'] == 3,
-            df_pivoted[kalem_c],
-            df_pivoted.groupby(['company_id',"period_year"])[kalem_c].diff()
-        )
-
-        df_pivoted[kalem_ttm] = df_pivoted.groupby('company_id')[kalem_q].rolling(
-            window=4
-        ).sum().reset_index(level=0, drop=True)
+    df_pivoted = _derive_quarterly(df_pivoted, KALEMLER)
 
     df_pivoted["effective_tax_rate_ttm"] = df_pivoted["taxation_on_continuing_operations_ttm"] + df_pivoted["profit_before_tax_from_continuing_operations_ttm"]
 
@@ -112,59 +157,237 @@ def fetch_fin(conn,ticker_dict: dict,start_year,end_year):
 
     df_pivoted = df_pivoted[['company_id',"period_year","period_month","date_of_publish","revenue_ttm","gross_profit_ttm","operating_profit_ttm","ebitda_ttm","net_income_ttm","revenue_q","gross_profit_q","operating_profit_q","ebitda_q","net_income_q","revenue_c","gross_profit_c","operating_profit_c","ebitda_c","net_income_c","effective_tax_rate_ttm","cash_and_cash_equivalents","current_assets","fixed_assets","long_term_debt","short_term_debt","gross_debt","net_debt","equity","eps_c","eps_q","eps_ttm","dividend_ttm"]]
 
-    # -----------------------------------------------------------
-    # Bu koyacağımız veri database'de zaten var mı ona bakacağız.
-    # -----------------------------------------------------------
-    if conn is not None: # bu kısım testlerde conn'un None olduğu durumları engellemek için
+    return df_pivoted
+
+
+def fetch_fin(conn,ticker_dict: dict,start_year,end_year,logger: AppLogger = None, cache: ProviderCache = None):
+    """
+    Finansal tabloları çekip çeyreklik ve TTM kalemlerini hesaplar. conn verilirse veriyi financial
+    tablosuna upsert eder ve {"inserted", "updated", "unchanged"} sayılarını döndürür, conn None ise DataFrame döndürür.
+    logger verilmezse olaylar bu çağrının sonunda app_logs'a yazılır.
+    cache verilirse isyatirimhisse cevabı önce diskteki önbellekten okunur (bkz. src/provider_cache.py).
+    conn verildiğinde indirme ve yazma hataları loglanıp tekrar fırlatılır, conn None ise indirme hatasında boş DataFrame döner.
+    """
+    if logger is None:
+        with AppLogger(conn, "fetch_fin") as logger:
+            return fetch_fin(conn, ticker_dict, start_year, end_year, logger, cache)
+
+    ticker_dict  = {key.replace('.IS', ''): value for key, value in ticker_dict.items()}
+
+    tickers = list(ticker_dict.keys())
+
+    # her aşamanın süresi, satır sayısı ve belleği stage_metrics'e yazılır (src/stage_metrics.py)
+    with track_run(conn, "fetch_fin", rows_in=len(tickers)) as run:
         try:
-            # Sadece ilgili tarih aralığını DB’den çek
-            query = """
-            SELECT company_id,period_year,period_month
-            FROM financial 
-            WHERE period_year BETWEEN ? AND ?
-            """
-            existing_data = pd.read_sql_query(query, conn, params=[start_year, end_year])
-
-            existing_data['period_month'] = pd.to_numeric(existing_data['period_month'])
-            existing_data['period_year'] = pd.to_numeric(existing_data['period_year'])
-
-            merged_df = df_pivoted.merge(
-                existing_data,
-                on=['company_id','period_year',"period_month"],
-                how='left',
-                indicator=True
-            )
-
-            if merged_df.empty:
+            with stage("download", rows_in=len(tickers)) as s:
+                df = _download_fin(tickers, start_year, end_year, cache)
+                s.add_rows(rows_out=len(df))
+        except Exception as e: 
+            logger.error(f"Veri çekilemedi. Bağlantı sorunu olabilir. Hata detayları: {e}")
+            if conn is None:
                 return pd.DataFrame()
-            
-            dups = merged_df[merged_df['_merge'] == 'both']
-            if not dups.empty:
-                for row in dups.itertuples(index=False, name=None):
-                    company_id, p_year, p_month = row[ dups.columns.get_loc('company_id') ], row[ dups.columns.get_loc('period_year') ], row[ dups.columns.get_loc('period_month') ]
-                    print(f"Uyarı: company_id {company_id} için {p_year}/{p_month} verisi zaten bulunuyor.")
+            raise
 
-            new_data_df = merged_df[merged_df['_merge'] == 'left_only'].drop(columns=['_merge'])
-            new_data_df.columns = [col.replace('_x', '') if col.endswith('_x') else col for col in new_data_df.columns]
-            new_data_df = new_data_df[['company_id',"period_year","period_month","date_of_publish","revenue_ttm","gross_profit_ttm","operating_profit_ttm","ebitda_ttm","net_income_ttm","revenue_q","gross_profit_q","operating_profit_q","ebitda_q","net_income_q","revenue_c","gross_profit_c","operating_profit_c","ebitda_c","net_income_c","effective_tax_rate_ttm","cash_and_cash_equivalents","current_assets","fixed_assets","long_term_debt","short_term_debt","gross_debt","net_debt","equity","eps_c","eps_q","eps_ttm","dividend_ttm"]]
+        if df.empty:
+            return pd.DataFrame() if conn is None else {"inserted": 0, "updated": 0, "unchanged": 0}
 
+        with stage("transform", rows_in=len(df)) as s:
+            df_pivoted = _transform_fin(df, ticker_dict)
+            s.add_rows(rows_out=len(df_pivoted))
+
+        if conn is None: # bu kısım testlerde conn'un None olduğu durumları engellemek için
+            return df_pivoted
+
+        # -----------------------------------------------------------
+        # Yeni dönemler eklenir, değeri değişen dönemler güncellenir.
+        # Bu kısım tek bir staging + upsert sorgusuyla veritabanında yapılıyor.
+        # -----------------------------------------------------------
+        try:
+            with stage("write", rows_in=len(df_pivoted)) as s:
+                counts = upsert_financials(conn, df_pivoted, logger, return_keys=True)
+                s.add_rows(rows_out=counts["inserted"] + counts["updated"])
         except Exception as e:
-            print(f"Hata: Veritabanından mevcut veri çekilemedi. İşlem durduruldu: {e}")
-            return pd.DataFrame()
-    else:
-        return df_pivoted
+            # pipeline aşamayı hatalı saymalı, watermark ilerlemesin diye hata tekrar fırlatılır
+            logger.error(f"Veriler veritabanına yazılamadı. İşlem durduruldu: {e}")
+            raise
+        run.add_rows(rows_out=counts["inserted"] + counts["updated"])
 
-    return new_data_df.drop_duplicates(subset=["period_year","period_month", "company_id"], keep="last")
+    logger.info(f"{start_year} - {end_year}: {counts['inserted']} yeni, {counts['updated']} güncellenen, {counts['unchanged']} değişmeyen dönem.")
 
+    # counts["keys"]: eklenen/güncellenen (company_id, period_year, period_month) dönemleri, calc_ratios ve calc_multiples için
+
+    return counts
+
+
+def _latest_periods(conn, company_ids: list) -> dict:
+    """Şirketlerin financial'daki son dönemi (period_key). Hiç dönemi olmayan şirketler sözlükte yer almaz."""
+    # her şirket için UNIQUE (company_id, period_key) kısıtının index'i üzerinde tek bir index araması
+    rows = conn.execute(
+        "SELECT company_id, MAX(period_key) FROM financial WHERE company_id IN (SELECT value FROM json_each(?)) "
+        "GROUP BY company_id",
+        [json.dumps([int(company_id) for company_id in company_ids])]
+    ).fetchall()
+    return {company_id: period_key for company_id, period_key in rows if period_key is not None}
+
+
+def _next_period(period_key: int) -> tuple:
+    """period_key'den (yyyyqq) sonraki dönem: (yıl, ay)."""
+    year, quarter = divmod(int(period_key), 100)
+    return (year + 1, 3) if quarter == 4 else (year, (quarter + 1) * 3)
+
+
+def probe_new_reports(ticker_dict: dict, latest: dict, today=None, cache: ProviderCache = None,
+                      logger: AppLogger = None, batch_size: int = None) -> tuple:
+    """
+    Son kayıtlı dönemden (latest: {company_id: period_key}) sonraki dönemi açıklanmış şirketleri bulur.
+    - Sonraki dönemi henüz bitmemiş (ya da bitişinden report_lag_days geçmemiş) şirketler için istek atılmaz.
+    - Kalanlar için sadece sonraki dönemin yılı istenir (sembol başına tek istek) ve o dönemin kolonu dolu mu bakılır.
+      isyatirimhisse tek bir dönem istemeyi desteklemez, en küçük istek bir yılın dört çeyreğidir. Yani prob,
+      o yılın normal indirmesiyle aynı maliyettedir. Kazanç, sırası gelmemiş şirketlere hiç istek atılmamasından ve
+      yeni dönemi olanların prob satırlarının tam indirmede tekrar kullanılmasından gelir.
+    latest'te olmayan şirketler sorgulanmaz, çağıran bunları doğrudan tam indirmeye göndermelidir.
+    (new, probed) döndürür: new {ticker: company_id}, probed {ticker: o şirketin indirilen yıla ait ham satırları}.
+    fetch_new_fin bu satırları tekrar indirmez.
+    """
+    settings = get_settings("financials")
+    today = pd.Timestamp(today or pd.Timestamp.now().normalize())
+    batch_size = batch_size or settings["batch_size"]
+    lag = pd.Timedelta(days=settings["report_lag_days"])
+
+    due = {}  # yıl -> {ticker: ay}
+    for ticker, company_id in ticker_dict.items():
+        period_key = latest.get(int(company_id))
+        if period_key is None:
+            continue
+        year, month = _next_period(period_key)
+        if pd.Timestamp(year, month, 1) + pd.offsets.MonthEnd(0) + lag >= today:
+            continue
+        due.setdefault(year, {})[ticker] = month
+
+    new, probed = {}, {}
+    for year, group in sorted(due.items()):
+        tickers = list(group)
+        for i in range(0, len(tickers), batch_size):
+            batch = tickers[i:i + batch_size]
+            try:
+                df = _download_fin([ticker.replace(".IS", "") for ticker in batch], year, year, cache)
+            except Exception as e:
+                # hiçbir sembolde veri yoksa yeni dönem de yoktur
+                if logger is not None and not _is_no_data(e):
+                    logger.error(f"{year} için yeni dönem sorgulanamadı ({len(batch)} şirket): {e}")
+                continue
+            for ticker in batch:
+                column = f"{year}/{group[ticker]}"
+                rows = df[df["SYMBOL"] == ticker.replace(".IS", "")]
+                if column in df.columns and rows[column].notna().any():
+                    new[ticker] = ticker_dict[ticker]
+                    probed[ticker] = rows
+
+    if logger is not None:
+        n_due = sum(len(group) for group in due.values())
+        logger.info(f"{len(new)} şirketin yeni dönemi var ({n_due} şirket sorgulandı, "
+                    f"{len(latest) - n_due} şirketin sonraki dönemi henüz açıklanamaz).")
+    return new, probed
 
-if __name__ == "__main__":
-    conn = sqlite3.connect("C:/Users/KULLANICI/Desktop/portfolio-backtest-project/data/database.db")
 
+def _complete_probed(batch: dict, year: int, end_year: int, probed: dict, cache: ProviderCache = None) -> pd.DataFrame:
+    """
+    Prob'da year yılı indirilmiş şirketlerin eksik yıllarını (_q ve _ttm için year - 1, varsa year'dan sonrakiler)
+    indirir ve prob satırlarıyla birleştirip financial kolonlarına çevirir.
+    """
+    symbols = [ticker.replace(".IS", "") for ticker in batch]
+    frames = [probed[ticker] for ticker in batch]
+    for start, end in [(year - 1, year - 1), (year + 1, end_year)]:
+        if start > end:
+            continue
+        try:
+            frames.append(_download_fin(symbols, start, end, cache))
+        except ValueError as e:
+            if not _is_no_data(e):
+                raise
+    # yıllar ayrı satırlarda gelir, _transform_fin'deki pivot aynı kalemin dönemlerini birleştirir
+    df = pd.concat(frames, ignore_index=True)
+    return _transform_fin(df, {ticker.replace(".IS", ""): company_id for ticker, company_id in batch.items()})
+
+
+def fetch_new_fin(conn, ticker_dict: dict, start_year, logger: AppLogger = None, cache: ProviderCache = None,
+                  today=None, batch_size: int = None) -> dict:
+    """
+    Sadece yeni dönemi açıklanmış şirketlerin finansallarını çekip financial'a upsert eder (probe_new_reports).
+    Hiç dönemi olmayan şirketler start_year'dan itibaren çekilir. İndirme ve hesaplama batch_size şirketlik gruplarla yapılır.
+    fetch_fin gibi {"inserted", "updated", "unchanged", "keys"} döndürür. Çekilemeyen şirket olursa diğerleri
+    yazıldıktan sonra RuntimeError verilir (sağlayıcıda hiç verisi olmayan şirketler hata sayılmaz).
+    """
+    if logger is None:
+        with AppLogger(conn, "fetch_fin") as logger:
+            return fetch_new_fin(conn, ticker_dict, start_year, logger, cache, today, batch_size)
+
+    today = pd.Timestamp(today or pd.Timestamp.now().normalize())
+    batch_size = batch_size or get_settings("financials")["batch_size"]
+    latest = _latest_periods(conn, list(ticker_dict.values()))
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "keys": []}
+    failed = 0
+
+    with track_run(conn, "fetch_new_fin", rows_in=len(ticker_dict)) as run:
+        with stage("probe", rows_in=len(latest)) as s:
+            new, probed = probe_new_reports(ticker_dict, latest, today, cache, logger, batch_size)
+            s.add_rows(rows_out=len(new))
+
+        # yeni dönemi olanlar (yıl, True) grubunda: prob'da indirilen yılın önceki yılı eklenir, _q ve _ttm hesapları
+        # önceki 3 çeyreğe ihtiyaç duyar. Hiç dönemi olmayanlar (start_year, False) grubunda tamamen indirilir.
+        groups = {}
+        for ticker, company_id in new.items():
+            groups.setdefault((_next_period(latest[int(company_id)])[0], True), {})[ticker] = company_id
+        for ticker, company_id in ticker_dict.items():
+            if int(company_id) not in latest:
+                groups.setdefault((int(start_year), False), {})[ticker] = company_id
+
+        for (group_year, is_probed), group in sorted(groups.items()):
+            tickers = list(group)
+            for i in range(0, len(tickers), batch_size):
+                batch = {ticker: group[ticker] for ticker in tickers[i:i + batch_size]}
+                try:
+                    if is_probed:
+                        df = _complete_probed(batch, group_year, today.year, probed, cache)
+                    else:
+                        symbols = [ticker.replace(".IS", "") for ticker in batch]
+                        df = _transform_fin(_download_fin(symbols, group_year, today.year, cache),
+                                            {ticker.replace(".IS", ""): company_id for ticker, company_id in batch.items()})
+                except Exception as e:
+                    if not _is_no_data(e):
+                        logger.error(f"{len(batch)} şirketin finansalları {group_year} - {today.year} için çekilemedi: {e}")
+                        failed += len(batch)
+                    continue
+                if df.empty:
+                    continue
+
+                # sadece kayıtlı son dönemden sonraki dönemler yazılır. Önceki yılın satırları sadece hesap için
+                # çekildi, eksik geçmişle hesaplanan _ttm'leri kayıtlı değerlerin üzerine yazılmamalı.
+                floor = df["company_id"].map(lambda company_id: latest.get(int(company_id), 0))
+                df = df[encode_period(df["period_year"], df["period_month"]).to_numpy() > floor.to_numpy()]
+
+                with stage("write", rows_in=len(df)) as s:
+                    batch_counts = upsert_financials(conn, df, logger, return_keys=True)
+                    s.add_rows(rows_out=batch_counts["inserted"] + batch_counts["updated"])
+                for key in counts:
+                    counts[key] += batch_counts[key]
+        run.add_rows(rows_out=counts["inserted"] + counts["updated"])
+
+    if failed:
+        # çekilemeyen şirketler sessizce atlanırsa pipeline watermark'ı ilerletir ve bir sonraki yenilemeye kadar denemez
+        raise RuntimeError(f"{failed} şirketin finansalları çekilemedi, ayrıntılar app_logs'ta.")
+    logger.info(f"{len(new)} şirketin yeni dönemi, {sum(len(group) for group in groups.values()) - len(new)} yeni şirket: "
+                f"{counts['inserted']} yeni, {counts['updated']} güncellenen, {counts['unchanged']} değişmeyen dönem.")
+    return counts
+
+
+if __name__ == "__main__":
     ticker_dict = _get_ticker_dict()
 
     start_year = 2020
     end_year = 2021
 
-    df_pivoted = fetch_fin(conn,ticker_dict,start_year,end_year)
-    df_pivoted.to_sql('financial', conn, if_exists='append', index=False)
-    conn.close()
+    # veritabanı yolu ve PRAGMA'lar config/settings.json'daki "database" bölümünden
+    with ProviderCache.from_settings() as cache, get_database().write() as conn, AppLogger(conn, "fetch_fin") as logger:
+        counts = fetch_fin(conn,ticker_dict,start_year,end_year,logger,cache)
+        logger.info(f"Financial fetch completed: {counts}")
@@ -1,34 +1,107 @@
-import sqlite3
 import pandas as pd
+import numpy as np
 import yfinance as yf
 import json
 import os
 from isyatirimhisse import fetch_stock_data
-from datetime import datetime
+from datetime import datetime, timedelta
+from src.fetch_executor import FetchExecutor, FetchResult
+from src.db_writer import upsert_prices
+from src.adjustments import record_actions, refetch_pending
+from src.compact_keys import decode_day
+from src.app_logger import AppLogger
+from src.settings import get_settings
+from src.provider_cache import ProviderCache, is_closed_day_range
+from src.db import get_database, transaction
+from src.stage_metrics import stage, track_run
+
+# yfinance'in ham (düzeltilmemiş) fiyat ve aksiyon (Dividends / Stock Splits) kolonlarını isteyen parametreler.
+# Aksiyonlar geçmiş fiyatları yeniden yazmak yerine adjustment_factor'a yazılır (src/adjustments.py).
+YF_PARAMS = {"auto_adjust": False, "actions": True}
+
+# yfinance'e tek bir parça (shard) için istek atan fonksiyon, hata durumunda exception fırlatır
+def _download_yf(tickers: list, start_date: str, end_date: str, cache: ProviderCache = None):
+    if cache is not None:
+        return cache.fetch("yf", lambda: _download_yf(tickers, start_date, end_date), tickers, start_date, end_date,
+                           params=YF_PARAMS, closed=is_closed_day_range(end_date), returned_fn=_returned_yf)
+
+    data = yf.download(tickers, start=start_date, end=end_date, **YF_PARAMS)
+    return data[~data.index.duplicated(keep="last")] # parçalar birleştirilirken index tekil olmalı
+
+# isyatirimhisse'ye tek bir parça (shard) için market_cap isteği atan fonksiyon
+def _download_is(tickers: list, start_date: str, end_date: str, cache: ProviderCache = None):
+    if cache is not None:
+        return cache.fetch("is", lambda: _download_is(tickers, start_date, end_date), tickers, start_date, end_date,
+                           closed=is_closed_day_range(end_date), returned_fn=_returned_is)
 
-# yf verilerini çekip işleyen fonksiyon
-def _fetch_and_process_yf(ticker_dict: dict, start_date: str, end_date: str):
+    start_date_object = datetime.strptime(start_date, "%Y-%m-%d")
+    end_date_object = datetime.strptime(end_date, "%Y-%m-%d")
+
+    return fetch_stock_data(
+        symbols=[s[:-3] for s in tickers],
+        start_date=start_date_object.strftime("%d-%m-%Y"),
+        end_date=end_date_object.strftime("%d-%m-%Y"),
+        save_to_excel=False
+    )
+
+# yf.download çekemediği tickerlar için exception fırlatmaz, kolonlarını boş (NaN) döndürür
+def _returned_yf(data: pd.DataFrame) -> list:
+    return list(data.columns[data.notna().any().to_numpy()].get_level_values(-1).unique())
+
+def _returned_is(data: pd.DataFrame) -> list:
+    return list(data["HGDG_HS_KODU"].dropna().unique() + ".IS") if "HGDG_HS_KODU" in data.columns else []
+
+# iki sağlayıcının parçalarını aynı thread havuzunda paralel çalıştırır. Verisi dönmeyen tickerlar tekrar istenir,
+# yine dönmezse result.failed'de raporlanır
+def _fetch_raw(ticker_dict: dict, start_date: str, end_date: str, executor: FetchExecutor, logger: AppLogger,
+               cache: ProviderCache = None) -> dict:
 
     tickers = list(ticker_dict.keys())
 
-    try:
-        data = yf.download(tickers, start=start_date, end=end_date)
-    except Exception as e: 
-        print(f"Hata: Veri çekilemedi. Bağlantı sorunu olabilir. Hata detayları: {e}")
+    results = executor.run({
+        "yf": (lambda shard: _download_yf(shard, start_date, end_date, cache), tickers, _returned_yf),
+        "is": (lambda shard: _download_is(shard, start_date, end_date, cache), tickers, _returned_is),
+    })
+
+    for result in results.values():
+        if result.failed:
+            logger.warn(f"{result.provider} için {len(result.failed)} ticker çekilemedi: {', '.join(result.failed)}")
+
+    return results
+
+# yfinance'in (alan, ticker) MultiIndex kolonlu geniş tablosunu price tablosunun uzun formatına çevirir
+def _reshape_yf(data: pd.DataFrame) -> pd.DataFrame:
+
+    fields = data.columns.get_level_values(0).unique()
+    tickers = data.columns.get_level_values(1).unique()
+
+    # eksik (alan, ticker) çiftleri NaN ile tamamlanır ki kolonlar tam bir ızgara olsun
+    data = data.reindex(columns=pd.MultiIndex.from_product([fields, tickers]))
+
+    # (gün, alan * ticker) -> (gün, alan, ticker) -> (gün, ticker, alan) -> (gün * ticker, alan)
+    values = data.to_numpy(dtype="float64").reshape(len(data), len(fields), len(tickers))
+    values = values.transpose(0, 2, 1).reshape(-1, len(fields))
+
+    long_df = pd.DataFrame(values, columns=[str(field).lower() for field in fields])
+    long_df.insert(0, "date", np.repeat(data.index.values, len(tickers)))
+    long_df.insert(1, "ticker", np.tile(tickers.to_numpy(dtype=object), len(data)))
+
+    # o gün için hiç verisi olmayan tickerların satırları atılır
+    return long_df[~np.isnan(values).all(axis=1)].reset_index(drop=True)
+
+# yf verilerini işleyen fonksiyon
+def _fetch_and_process_yf(ticker_dict: dict, yf_result: FetchResult):
+
+    if not yf_result.frames:
         return pd.DataFrame()
-    
+
+    data = pd.concat(yf_result.frames, axis=1) if len(yf_result.frames) > 1 else yf_result.frames[0]
+
     if data.empty:
         return pd.DataFrame()
 
-    data.columns = ['_'.join(col).strip() for col in data.columns.values]
-    data = data.reset_index()
-    data = pd.melt(data, id_vars=['Date'], var_name='ticker_info', value_name='value')
-    data[['data_type', 'ticker']] = data['ticker_info'].str.split('_', expand=True)
-    data.drop('ticker_info', axis=1, inplace=True)
-
-    data = data.pivot_table(index=['Date', 'ticker'], columns='data_type', values='value').reset_index()
-    data.columns.name = None
-    data.columns = data.columns.str.lower()
+    data = data.loc[:, ~data.columns.duplicated(keep="last")] # aynı ticker birden fazla parçada gelmişse tek kalsın
+    data = _reshape_yf(data)
     data['company_id'] = data['ticker'].map(ticker_dict)
 
     data = data.drop_duplicates(subset=["date", "ticker"], keep="last") # eğer aynı veriden iki tane varsa en sonuncusu kalsın
@@ -36,19 +109,9 @@ def _fetch_and_process_yf(ticker_dict: dict, start_date: str, end_date: str):
     return data
 
 # isyatirimhisse'den gelen market_cap verisini ekleyen fonksiyon
-def _fetch_and_merge_is(yf_df: pd.DataFrame,ticker_dict: dict, start_date: str, end_date: str):
-
-    tickers = list(ticker_dict.keys())
-
-    start_date_object = datetime.strptime(start_date, "%Y-%m-%d")
-    end_date_object = datetime.strptime(end_date, "%Y-%m-%d")
+def _fetch_and_merge_is(yf_df: pd.DataFrame, is_result: FetchResult):
 
-    mc_df = fetch_stock_data(
-        symbols=[s[:-3] for s in tickers],
-        start_date=start_date_object.strftime("%d-%m-%Y"),
-        end_date=end_date_object.strftime("%d-%m-%Y"),
-        save_to_excel=False
-    )
+    mc_df = pd.concat(is_result.frames, ignore_index=True) if is_result.frames else pd.DataFrame()
 
     expected_cols = ["HGDG_HS_KODU","HGDG_TARIH","PD"]
     if not mc_df.empty and all(col in mc_df.columns for col in expected_cols):
@@ -96,124 +159,179 @@ def _get_ticker_dict() -> dict:
         return {}
     
 
-def fetch_prices(conn, ticker_dict: dict, start_date: str, end_date: str):
-    yfinance_df = _fetch_and_process_yf(ticker_dict, start_date, end_date)
-    if yfinance_df.empty:
-        print("yfinance'ten veri alınamadı. İşlem durduruldu.")
-        return pd.DataFrame()
-
-    final_df = _fetch_and_merge_is(yfinance_df, ticker_dict, start_date, end_date)
-
-    # -----------------------------------------------------------
-    # Bu koyacağımız veri database'de zaten var mı ona bakacağız.
-    # -----------------------------------------------------------
-    if conn is not None: # bu kısım testlerde conn'un None olduğu durumları engellemek için
+def fetch_prices(conn, ticker_dict: dict, start_date: str, end_date: str, executor: FetchExecutor = None, logger: AppLogger = None,
+                 cache: ProviderCache = None):
+    """
+    Fiyat ve market_cap verisini çeker. conn verilirse veriyi price tablosuna upsert eder ve
+    {"inserted", "updated", "unchanged"} sayılarını döndürür, conn None ise DataFrame döndürür.
+    logger verilmezse olaylar bu çağrının sonunda app_logs'a yazılır.
+    cache verilirse sağlayıcı cevapları önce diskteki önbellekten okunur (bkz. src/provider_cache.py).
+    Yazma hataları loglanıp tekrar fırlatılır.
+    """
+    if executor is None:
+        executor = FetchExecutor(**get_settings("fetch"))
+
+    if logger is None:
+        with AppLogger(conn, "fetch_prices") as logger:
+            return fetch_prices(conn, ticker_dict, start_date, end_date, executor, logger, cache)
+
+    # her aşamanın süresi, satır sayısı ve belleği stage_metrics'e yazılır (src/stage_metrics.py)
+    with track_run(conn, "fetch_prices", rows_in=len(ticker_dict)) as run:
+        with stage("download", rows_in=len(ticker_dict)) as s:
+            raw_results = _fetch_raw(ticker_dict, start_date, end_date, executor, logger, cache)
+            s.add_rows(rows_out=sum(len(frame) for result in raw_results.values() for frame in result.frames))
+
+        with stage("reshape") as s:
+            yfinance_df = _fetch_and_process_yf(ticker_dict, raw_results["yf"])
+            s.add_rows(rows_out=len(yfinance_df))
+        if yfinance_df.empty:
+            logger.error(f"yfinance'ten {start_date} - {end_date} için veri alınamadı. İşlem durduruldu.")
+            return pd.DataFrame() if conn is None else {"inserted": 0, "updated": 0, "unchanged": 0}
+
+        with stage("merge_is", rows_in=len(yfinance_df)) as s:
+            final_df = _fetch_and_merge_is(yfinance_df, raw_results["is"])
+            final_df = final_df.drop_duplicates(subset=["date", "company_id"], keep="last")
+            s.add_rows(rows_out=len(final_df))
+
+        if conn is None: # conn'un none olma durumu (testler için önemli)
+            return final_df
+
+        # -----------------------------------------------------------
+        # Yeni satırlar eklenir, değeri değişen satırlar güncellenir.
+        # Bu kısım tek bir staging + upsert sorgusuyla veritabanında yapılıyor.
+        # -----------------------------------------------------------
+        # fiyatlar ve aksiyonlar birlikte yazılır, çağıranın açık transaction'ı commit edilmez (src/db.transaction)
         try:
-            # Sadece ilgili tarih aralığını DB’den çek
-            query = """
-            SELECT *
-            FROM price 
-            WHERE date BETWEEN ? AND ?
-            """
-            existing_data = pd.read_sql_query(query, conn, params=[start_date, end_date])
-            existing_data['date'] = pd.to_datetime(existing_data['date'])
-
-            merged_df = final_df.merge(
-                existing_data,
-                on=['company_id', 'date'],
-                how='left',
-                indicator=True
-            )
-
-            if merged_df.empty:
-                return pd.DataFrame(), []
-
-            # indicator=True → yeni bir _merge kolonu ekleniyor:
-            # "left_only" → sadece final_df’de var, DB’de yok (yeni kayıt).
-            # "both" → hem final_df hem DB’de var (duplicate).
-
-            # Uyarı mesajı
-            dups = merged_df[merged_df['_merge'] == 'both']
-            if not dups.empty:
-                for row in dups.itertuples(index=False, name=None):
-                    company_id, dt = row[ dups.columns.get_loc('company_id') ], row[ dups.columns.get_loc('date') ]
-                    print(f"Uyarı: company_id {company_id} için {dt.strftime('%Y-%m-%d')} verisi zaten bulunuyor.")
-
-
-
-            # burada sadece yeni güne ait veriler var
-            new_data_df = merged_df[merged_df['_merge'] == 'left_only'].drop(columns=['_merge'])
-            new_data_df.columns = [col.replace('_x', '') if col.endswith('_x') else col for col in new_data_df.columns]
-            new_data_df = new_data_df[["date","close","high","low","open","volume","company_id","market_cap"]]
-
-            update_df = pd.DataFrame()
-            both_mask = merged_df['_merge'].eq('both')
-            if both_mask.any():
-
-                # bu kısımda ise daha önceden olan ancak değişmiş verileri değiştireceğiz
-                new_values = merged_df[['open_x', 'close_x', 'high_x', 'low_x', 'volume_x', 'market_cap_x']]
-                new_values.columns = [col.replace('_x', '') if col.endswith('_x') else col for col in new_values.columns]
-                old_values = merged_df[['open_y', 'close_y', 'high_y', 'low_y', 'volume_y', 'market_cap_y']]
-                old_values.columns = [col.replace('_y', '') if col.endswith('_y') else col for col in old_values.columns]
-                diffs = new_values.fillna(-1).ne(old_values.fillna(-1))   # element bazlı karşılaştırma (True/False)
-                row_has_diff = diffs.any(axis=1)
-                update_df = merged_df[row_has_diff & (merged_df['_merge'] == 'both')]
-
-                update_df.columns = [col.replace('_x', '') if col.endswith('_x') else col for col in update_df.columns]
-                update_df = update_df[["date","close","high","low","open","volume","company_id","market_cap"]]
-
-                update_list = [
-                    (
-                        float(row.open), float(row.close), float(row.high), float(row.low),
-                        int(row.volume) if pd.notna(row.volume) else None,
-                        float(row.market_cap) if pd.notna(row.market_cap) else None,
-                        int(row.company_id), 
-                        row.date.strftime('%Y-%m-%d %H:%M:%S')  # string'e çevir
-                    )
-                    for row in update_df.itertuples(index=False)
-                ]
+            with transaction(conn):
+                with stage("write", rows_in=len(final_df)) as s:
+                    counts = upsert_prices(conn, final_df, logger)
+                    s.add_rows(rows_out=counts["inserted"] + counts["updated"])
+                # temettü düzeltmesi önceki kapanışı price'tan okuduğu için yazmadan sonra
+                with stage("actions", rows_in=len(final_df)) as s:
+                    actions = record_actions(conn, final_df, logger)
+                    s.add_rows(rows_out=actions)
+        except Exception as e:
+            # pipeline aşamayı hatalı saymalı, watermark ilerlemesin diye hata tekrar fırlatılır
+            logger.error(f"Veriler veritabanına yazılamadı. İşlem durduruldu: {e}")
+            raise
+        run.add_rows(rows_out=counts["inserted"] + counts["updated"])
+
+    logger.info(f"{start_date} - {end_date}: {counts['inserted']} yeni, {counts['updated']} güncellenen, {counts['unchanged']} değişmeyen satır.")
+    if actions:
+        logger.info(f"{actions} yeni şirket aksiyonu adjustment_factor'a yazıldı.")
+
+    return counts
+
+
+def _get_watermarks(conn, ticker_dict: dict) -> dict:
+    """Her şirketin price tablosundaki son kayıtlı tarihini döndürür (hiç verisi yoksa None)."""
+
+    company_ids = [int(company_id) for company_id in ticker_dict.values()]
+
+    # Her company_id için MAX(day) alt sorgusu UNIQUE (company_id, day) kısıtının index'i üzerinden tek bir index araması yapar,
+    # böylece bütün price tablosu taranmaz. day kolonu olmayan (migrate edilmemiş) tablolarda metin tarih okunur.
+    has_day = any(row[1] == "day" for row in conn.execute("PRAGMA table_info(price)"))
+    last_date = "date(MAX(p.day) * 86400, 'unixepoch')" if has_day else "MAX(p.date)"
+    query = f"""
+    SELECT ids.value AS company_id,
+           (SELECT {last_date} FROM price p WHERE p.company_id = ids.value) AS last_date
+    FROM json_each(?) AS ids
+    """
+    rows = conn.execute(query, [json.dumps(company_ids)]).fetchall()
+
+    return {company_id: (pd.to_datetime(last_date) if last_date is not None else None) for company_id, last_date in rows}
+
+
+def refetch_history(conn, ticker_dict: dict, end_date: str, executor: FetchExecutor = None, logger: AppLogger = None,
+                    cache: ProviderCache = None) -> dict:
+    """
+    price_refetch'te işaretli (geçmişi sağlayıcının düzelttiği fiyatlarla yazılmış) şirketlerin fiyatlarını ilk
+    kayıtlı günlerinden itibaren ham fiyatlarla yeniden çeker ve aksiyonlarını yazar. Verisi gelen şirketlerin
+    işareti kaldırılır, gelmeyenler bir sonraki çalıştırmada tekrar denenir.
+    """
+    if logger is None:
+        with AppLogger(conn, "fetch_prices") as logger:
+            return refetch_history(conn, ticker_dict, end_date, executor, logger, cache)
+
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'price_refetch'").fetchone()
+    if not exists:
+        return totals
+
+    pending = refetch_pending(conn, list(ticker_dict.values()))
+    groups = {}
+    for ticker, company_id in ticker_dict.items():
+        if int(company_id) in pending:
+            start_date = decode_day([pending[int(company_id)]])[0].strftime("%Y-%m-%d")
+            groups.setdefault(start_date, {})[ticker] = company_id
+
+    for start_date, group_dict in sorted(groups.items()):
+        df = fetch_prices(None, group_dict, start_date, end_date, executor, logger, cache)
+        if df.empty:
+            continue
+        refetched = [int(company_id) for company_id in df["company_id"].unique()]
+        # işaret sadece ham fiyatlar ve aksiyonlar yazıldıysa kalkar
+        with transaction(conn):
+            counts = upsert_prices(conn, df, logger)
+            record_actions(conn, df, logger)
+            conn.execute("DELETE FROM price_refetch WHERE company_id IN (SELECT value FROM json_each(?))",
+                         [json.dumps(refetched)])
+        for key, value in counts.items():
+            totals[key] += value
+        logger.info(f"{len(refetched)} şirketin fiyat geçmişi {start_date} tarihinden itibaren ham fiyatlarla yeniden çekildi.")
+    return totals
+
+
+def fetch_prices_incremental(conn, ticker_dict: dict, end_date: str, default_start_date: str, executor: FetchExecutor = None, logger: AppLogger = None,
+                             cache: ProviderCache = None):
+    """
+    Her şirket için son kayıtlı tarihten (dahil) itibaren eksik günleri çeker. Son kayıtlı gün seans
+    sırasında yazılmış yarım bir bar olabileceği için tekrar istenir, değişmediyse upsert ona dokunmaz.
+    Aynı son tarihe sahip tickerlar tek bir istekte gruplanır. Hiç verisi olmayan
+    şirketler default_start_date'den itibaren çekilir. price_refetch'te işaretli şirketlerin geçmişi önce
+    ham fiyatlarla yeniden çekilir (refetch_history).
+    """
+    # içteki fetch_prices çağrıları bu çalıştırmanın "fetch_prices" aşamasına toplanır
+    with track_run(conn, "fetch_prices_incremental", rows_in=len(ticker_dict)) as run:
+        with stage("refetch", rows_in=len(ticker_dict)) as s:
+            totals = refetch_history(conn, ticker_dict, end_date, executor, logger, cache)
+            s.add_rows(rows_out=totals["inserted"] + totals["updated"])
+
+        with stage("watermarks", rows_in=len(ticker_dict)):
+            watermarks = _get_watermarks(conn, ticker_dict)
+
+        # başlangıç tarihi aynı olan tickerları grupla
+        groups = {}
+        for ticker, company_id in ticker_dict.items():
+            last_date = watermarks.get(int(company_id))
+            if last_date is None:
+                start_date = default_start_date
             else:
-                update_list = []
-
-
-            # Değişenler için uyarı mesajları
-            if not update_df.empty:
-                for row in update_df.itertuples(index=False, name=None):
-                    company_id, dt = row[ update_df.columns.get_loc('company_id') ], row[ update_df.columns.get_loc('date') ]
-                    print(f"Uyarı: company_id {company_id} için {dt.strftime('%Y-%m-%d')} verisi zaten bulunuyor.")
-
+                start_date = last_date.strftime("%Y-%m-%d")
 
-        except Exception as e:
-            print(f"Hata: Veritabanından mevcut veri çekilemedi. İşlem durduruldu: {e}")
-            return pd.DataFrame()
-        
-    else: 
-        # conn'un none olma durumu (testler için önemli)
-        return final_df.drop_duplicates(subset=["date", "company_id"], keep="last")
+            if start_date >= end_date: # bu şirketin verisi zaten güncel
+                continue
+            groups.setdefault(start_date, {})[ticker] = company_id
 
-    return new_data_df.drop_duplicates(subset=["date", "company_id"], keep="last"),update_list
+        for start_date, group_dict in sorted(groups.items()):
+            counts = fetch_prices(conn, group_dict, start_date, end_date, executor, logger, cache)
+            for key, value in counts.items():
+                totals[key] += value
+        run.add_rows(rows_out=totals["inserted"] + totals["updated"])
 
+    return totals
 
 
 if __name__ == "__main__":
-    db_path = "C:/Users/KULLANICI/Desktop/portfolio-backtest-project/data/database.db"
-
     ticker_dict = _get_ticker_dict()
-    start_date = '2025-08-20'
-    end_date = '2025-09-03'
-
-    with sqlite3.connect(db_path) as conn:
-        conn.execute("PRAGMA journal_mode=WAL;")
-
-        new_data_df,update_list = fetch_prices(conn,ticker_dict,start_date,end_date)
-        
-        new_data_df.to_sql('price', conn, if_exists='append', index=False)
-
-        if update_list:
-            conn.executemany(
-                "UPDATE price SET open=?, close=?, high=?, low=?, volume=?, market_cap=? "
-                "WHERE company_id=? AND date=?",
-                update_list
-            )
-
-    print("Price fetch completed.")
\ No newline at end of file
+    default_start_date = '2025-08-20' # hiç verisi olmayan şirketler için başlangıç tarihi
+    end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d") # yfinance'te end_date dahil değil
+
+    # veritabanı yolu ve PRAGMA'lar (WAL dahil) config/settings.json'daki "database" bölümünden
+    with get_database().write() as conn:
+        # parça boyutu, thread sayısı ve istek limitleri config/settings.json'daki "fetch" bölümünden
+        executor = FetchExecutor(**get_settings("fetch"))
+        # sağlayıcı önbelleği config/settings.json'daki "cache" bölümünden ("replay" modunda ağ kullanılmaz)
+        with ProviderCache.from_settings() as cache, AppLogger(conn, "fetch_prices") as logger:
+            counts = fetch_prices_incremental(conn,ticker_dict,end_date,default_start_date,executor,logger,cache)
+            logger.info(f"Price fetch completed: {counts}")
\ No newline at end of file
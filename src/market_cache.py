@@ -0,0 +1,228 @@
+# Aynı process içinde tekrar tekrar okunan gün x şirket matrislerini bellekte tutan önbellek.
+#
+# - price ve multiple kolonları yoğun (dense) NumPy dizileri olarak, ratio kolonları close matrisinin
+#   günlerine eşlenmiş (o gün bilinen son dönem, forward-fill) olarak saklanır.
+# - Her kaydın günleri ve şirketleri pd.Index olarak tutulur, date_pos / company_pos ile konumlara çevrilir.
+# - Her kayıt okunduğu andaki tablo versiyonunu taşır. Versiyonlar sql/triggers.sql'deki table_version
+#   tablosundan gelir: version her değişiklikte, mutations sadece update / delete'te artar.
+#     * version aynıysa kayıt doğrudan bellekten döner (veritabanına tek bir küçük sorgu atılır)
+#     * sadece yeni satır eklendiyse (mutations aynı) sadece rowid'si kayıttaki son rowid'den büyük
+#       satırlar okunup matrise işlenir
+#     * satır güncellendi veya silindiyse kayıt baştan okunur
+#   table_version tablosu olmayan veritabanlarında güncel olmayan veri dönmemesi için her çağrıda baştan okunur.
+#
+# - Şirket aksiyonlarına göre düzeltilmiş fiyatlar (adjusted=True) ham matrisin ayrı bir kaydı olarak tutulur.
+#   Ham matris ya da adjustment_factor değişince sadece çarpım (src/adjustments.py) tekrarlanır, fiyatlar tekrar okunmaz.
+#
+# Matrisler salt okunurdur (writeable=False), çağıranlar kopyalamadan değiştiremez.
+# cached_matrix, src/backtest.load_matrix ile aynı imzaya sahiptir ve onun yerine kullanılabilir.
+
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.adjustments import adjust_matrix, check_adjustable, check_raw_history, read_factors
+from src.backtest import DAILY_TABLES, load_matrix
+from src.compact_keys import decode_day
+
+# bellekteki veritabanları için en fazla bu kadar bağlantının önbelleği tutulur
+MAX_MEMORY_CACHES = 8
+
+
+class MatrixEntry:
+    """Bir tablo kolonunun gün x şirket matrisi ve okunduğu andaki versiyon bilgisi."""
+
+    def __init__(self, values: np.ndarray, dates: pd.DatetimeIndex, company_ids: pd.Index, state, max_rowid: int):
+        values.flags.writeable = False
+        self.values = values
+        self.dates = dates
+        self.company_ids = company_ids
+        self.state = state
+        self.max_rowid = max_rowid
+
+    def date_pos(self, dates) -> np.ndarray:
+        """Günlerin satır numaraları, olmayan günler -1."""
+        return self.dates.get_indexer(pd.DatetimeIndex(dates))
+
+    def company_pos(self, company_ids) -> np.ndarray:
+        """Şirketlerin kolon numaraları, olmayan şirketler -1."""
+        return self.company_ids.get_indexer(company_ids)
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values, index=self.dates, columns=self.company_ids, copy=False)
+
+
+class MarketCache:
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "patches": 0, "loads": 0}
+
+    # ---------------------------------------------------------------
+    # versiyonlar
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _table_state(conn, table: str):
+        # (version, mutations), table_version yoksa None (her çağrıda baştan okunur)
+        try:
+            row = conn.execute("SELECT version, mutations FROM table_version WHERE table_name = ?", [table]).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return tuple(row) if row is not None else None
+
+    @staticmethod
+    def _max_rowid(conn, table: str) -> int:
+        return conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+
+    # ---------------------------------------------------------------
+    # kayıtlar
+    # ---------------------------------------------------------------
+    def matrix(self, conn, table: str, column: str, adjusted: bool = False) -> MatrixEntry:
+        """table.column'un bütün günleri ve şirketleri için güncel matrisi döndürür."""
+        with self._lock:
+            if adjusted:
+                check_adjustable(table, column)
+                check_raw_history(conn)  # price_refetch primary key'i üzerinde tek okuma, genellikle boş
+                return self._adjusted_matrix(conn, column)
+            if table == "ratio":
+                return self._ratio_matrix(conn, column)
+
+            key = (table, column)
+            entry = self._entries.get(key)
+            state = self._table_state(conn, table)
+            if entry is not None and state is not None and entry.state == state:
+                self.stats["hits"] += 1
+                return entry
+            if entry is not None and state is not None and entry.state is not None and entry.state[1] == state[1]:
+                entry = self._patch(conn, table, column, entry, state)
+                self.stats["patches"] += 1
+            else:
+                entry = self._load(conn, table, column, state)
+                self.stats["loads"] += 1
+            self._entries[key] = entry
+            return entry
+
+    def _load(self, conn, table: str, column: str, state) -> MatrixEntry:
+        # max_rowid okumadan önce alınır, arada eklenen satırlar bir sonraki patch'te tekrar işlenir (aynı değer)
+        max_rowid = self._max_rowid(conn, table)
+        matrix = load_matrix(conn, table, column)
+        return MatrixEntry(matrix.to_numpy(dtype=float, copy=True), matrix.index,
+                           pd.Index(matrix.columns, name="company_id"), state, max_rowid)
+
+    def _patch(self, conn, table: str, column: str, entry: MatrixEntry, state) -> MatrixEntry:
+        """Sadece kayıttan sonra eklenen satırları okuyup mevcut matrisin bir kopyasına işler."""
+        day_col = DAILY_TABLES[table]
+        max_rowid = self._max_rowid(conn, table)
+        rows = pd.read_sql_query(
+            f"SELECT company_id, {day_col}, {column} FROM {table} WHERE rowid > ? AND rowid <= ?",
+            conn, params=[entry.max_rowid, max_rowid]
+        )
+        if rows.empty:
+            return MatrixEntry(entry.values, entry.dates, entry.company_ids, state, max_rowid)
+
+        row_dates = decode_day(rows[day_col])
+        dates = entry.dates.union(row_dates.unique()).rename("date")
+        companies = entry.company_ids.union(pd.Index(rows["company_id"].unique())).rename("company_id")
+
+        if len(dates) == len(entry.dates) and len(companies) == len(entry.company_ids):
+            values = entry.values.copy()
+        else:
+            # yeni gün veya şirket geldiyse eski matris yeni şekle yerleştirilir
+            values = np.full((len(dates), len(companies)), np.nan)
+            values[np.ix_(dates.get_indexer(entry.dates), companies.get_indexer(entry.company_ids))] = entry.values
+
+        values[dates.get_indexer(row_dates), companies.get_indexer(rows["company_id"])] = \
+            pd.to_numeric(rows[column], errors="coerce").to_numpy(dtype=float)
+        return MatrixEntry(values, dates, companies, state, max_rowid)
+
+    def _ratio_matrix(self, conn, column: str) -> MatrixEntry:
+        # ratio kayıtları close matrisinin günlerine ve şirketlerine göre tutulur,
+        # ratio tablosu ya da close matrisi değiştiyse baştan eşlenir
+        close = self.matrix(conn, "price", "close")
+        key = ("ratio", column)
+        entry = self._entries.get(key)
+        state = self._table_state(conn, "ratio")
+        if (entry is not None and state is not None and entry.state == (state, close.state)
+                and entry.dates is close.dates and entry.company_ids is close.company_ids):
+            self.stats["hits"] += 1
+            return entry
+
+        matrix = load_matrix(conn, "ratio", column, company_ids=list(close.company_ids), index=close.dates)
+        entry = MatrixEntry(matrix.to_numpy(dtype=float, copy=True), close.dates, close.company_ids,
+                            (state, close.state) if state is not None else None, 0)
+        self.stats["loads"] += 1
+        self._entries[key] = entry
+        return entry
+
+    def _adjusted_matrix(self, conn, column: str) -> MatrixEntry:
+        # ham matrisin günleri ve şirketleriyle tutulur, ham matris ya da adjustment_factor değiştiyse tekrar çarpılır
+        raw = self.matrix(conn, "price", column)
+        key = ("price", column, "adjusted")
+        entry = self._entries.get(key)
+        state = self._table_state(conn, "adjustment_factor")
+        if (entry is not None and state is not None and entry.state == (state, raw.state)
+                and entry.dates is raw.dates and entry.company_ids is raw.company_ids):
+            self.stats["hits"] += 1
+            return entry
+
+        # aksiyonu olmayan veritabanında ham matrisin dizisi kopyalanmadan kullanılır
+        values = adjust_matrix(raw.frame(), read_factors(conn, list(raw.company_ids))).to_numpy(dtype=float)
+        entry = MatrixEntry(values, raw.dates, raw.company_ids, (state, raw.state) if state is not None else None, 0)
+        self.stats["loads"] += 1
+        self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# process seviyesindeki önbellekler: dosya veritabanları path'e göre (aynı dosyaya açılan bütün bağlantılar
+# ortak kullanır), bellekteki veritabanları bağlantının kendisine göre tutulur
+_CACHES = {}
+_MEMORY_CACHES = OrderedDict()
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_market_cache(conn) -> MarketCache:
+    """conn'un veritabanına ait process seviyesindeki önbelleği döndürür."""
+    path = next((row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main"), "")
+    with _REGISTRY_LOCK:
+        if path:
+            return _CACHES.setdefault(path, MarketCache())
+        # bağlantı referansı tutulduğu sürece id'si başka bir bağlantıya verilemez
+        key = id(conn)
+        if key not in _MEMORY_CACHES:
+            _MEMORY_CACHES[key] = (conn, MarketCache())
+            while len(_MEMORY_CACHES) > MAX_MEMORY_CACHES:
+                _MEMORY_CACHES.popitem(last=False)
+        _MEMORY_CACHES.move_to_end(key)
+        return _MEMORY_CACHES[key][1]
+
+
+def cached_matrix(conn, table: str, column: str, company_ids: list = None, start=None, end=None,
+                  index: pd.DatetimeIndex = None, adjusted: bool = False) -> pd.DataFrame:
+    """
+    load_matrix ile aynı parametreler, matris önbellekten kesilir.
+    start / end verildiğinde o aralıkta hiç değeri olmayan şirketler kolonlardan çıkarılır.
+    """
+    if table == "ratio" and index is None:
+        raise ValueError("ratio matrisi için günleri belirten index verilmeli.")
+
+    entry = get_market_cache(conn).matrix(conn, table, column, adjusted=adjusted)
+    if table == "ratio" and not index.isin(entry.dates).all():
+        # fiyatı olmayan günler istenirse önbellekteki eşleme kullanılamaz
+        return load_matrix(conn, table, column, company_ids=company_ids, index=index)
+
+    matrix = entry.frame()
+    if start is not None or end is not None:
+        matrix = matrix.loc[pd.Timestamp(start) if start is not None else None:
+                            pd.Timestamp(end) if end is not None else None]
+        matrix = matrix.loc[:, matrix.notna().any(axis=0).to_numpy()]
+    if company_ids is not None:
+        matrix = matrix.reindex(columns=pd.Index(company_ids, name="company_id"))
+    return matrix if index is None else matrix.reindex(index)
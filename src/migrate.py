@@ -0,0 +1,216 @@
+# Mevcut bir veritabanını güncel şemaya taşıyan migration aracı.
+# Uygulanan son migration'ın numarası veritabanında PRAGMA user_version olarak tutulur,
+# migrate() sadece daha yüksek numaralı migration'ları sırayla uygular. Her migration tekrar
+# çalıştırılabilir şekilde yazılır (kolon / index zaten varsa atlanır).
+#
+# Kullanım: python -m src.migrate [--vacuum]
+
+import argparse
+import os
+import sqlite3
+
+from src.compact_keys import COMPACT_KEYS, UNIQUE_KEYS, day_sql, period_key_sql
+from src.db import connect
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql")
+
+# UNIQUE kısıtlarının index'leriyle aynı kolonlara sahip olan, gereksiz yer kaplayan eski index'ler
+REDUNDANT_INDEXES = ["idx_prices_company_date", "idx_financials_company_period", "idx_ratios_company_period",
+                     "idx_multiples_company_period"]
+
+
+def _read_sql(name: str) -> str:
+    with open(os.path.join(SQL_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def _execute_statements(conn, script: str):
+    # executescript açık transaction'ı commit ettiği için ifadeler tek tek çalıştırılır (trigger gövdeleri bölünmez)
+    statement = ""
+    for part in script.split(";"):
+        statement += part + ";"
+        if sqlite3.complete_statement(statement):
+            if statement.strip(" \n;"):
+                conn.execute(statement)
+            statement = ""
+
+
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _key_expr(source) -> str:
+    if isinstance(source, tuple):
+        return period_key_sql(*source)
+    return day_sql(source)
+
+
+def _apply_schema(conn):
+    # schema / index / trigger dosyalarındaki bütün ifadeler IF NOT EXISTS'tir: yeni tablolar ve index'ler oluşur,
+    # mevcut olanlara dokunulmaz
+    for name in ["schema.sql", "indexes.sql", "triggers.sql"]:
+        _execute_statements(conn, _read_sql(name))
+
+
+def _compact_keys(conn):
+    """
+    1: price / multiple için gün numarası (day), financial / ratio / multiple için yyyyqq dönem anahtarı (period_key).
+    Kolonlar eklenip mevcut satırlar doldurulur, metin anahtarlardaki gereksiz index'ler tam sayı index'lerle
+    değiştirilir, doldurma triggerları kurulur.
+    """
+    for table, keys in COMPACT_KEYS.items():
+        existing = _columns(conn, table)
+        for key_col in keys:
+            if key_col not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {key_col} INTEGER")
+
+    # eski version triggerları anahtar doldurmayı da değişiklik sayıyordu, triggers.sql'deki tanımlarla değiştirilir
+    for table in COMPACT_KEYS:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_version_update")
+
+    for table, keys in COMPACT_KEYS.items():
+        sets = ", ".join(f"{key_col} = {_key_expr(source)}" for key_col, source in keys.items())
+        first_key = next(iter(keys))
+        conn.execute(f"UPDATE {table} SET {sets} WHERE {first_key} IS NULL")
+
+    for index in REDUNDANT_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+    _apply_schema(conn)
+    conn.execute("ANALYZE")
+
+
+def _stage_metrics(conn):
+    """2: aşama ölçümleri için stage_metrics tablosu (src/stage_metrics.py)."""
+    _apply_schema(conn)
+
+
+def _pipeline_state(conn):
+    """3: pipeline aşamalarının girdi durumu için pipeline_state tablosu (src/pipeline.py)."""
+    _apply_schema(conn)
+
+
+def _change_log(conn):
+    """4: price / financial değişiklik akışı için change_log, change_cursor tabloları ve triggerları (src/change_feed.py)."""
+    _apply_schema(conn)
+
+
+def _adjustment_factor(conn):
+    """5: şirket aksiyonlarının fiyat düzeltme çarpanları için adjustment_factor tablosu (src/adjustments.py)."""
+    _apply_schema(conn)
+
+
+def _indicators(conn):
+    """6: teknik göstergeler ve kayan pencere durumları için indicator / indicator_state tabloları (src/calc_indicators.py)."""
+    _apply_schema(conn)
+
+
+def _price_refetch(conn):
+    """
+    7: price_refetch tablosu. Ham fiyat çekmeye geçilmeden (auto_adjust=False) önce yazılmış fiyatlar sağlayıcı
+    tarafından düzeltilmiştir, adjustment_factor'la tekrar düzeltilmesinler diye fiyatı olan bütün şirketler
+    yeniden çekilmek üzere işaretlenir. Zaten ham çekilmiş bir geçmişin yeniden çekilmesi upsert'te değişiklik yapmaz.
+    """
+    _apply_schema(conn)
+    conn.execute("""
+        INSERT OR IGNORE INTO price_refetch (company_id, first_day, flagged_at)
+        SELECT c.company_id, (SELECT MIN(p.day) FROM price p WHERE p.company_id = c.company_id), datetime('now')
+        FROM company c
+        WHERE EXISTS (SELECT 1 FROM price p WHERE p.company_id = c.company_id)
+    """)
+
+
+def _derived_changes(conn):
+    """8: ratio / multiple değişiklik triggerları. Tablonun bir change_cursor okuyucusu olana kadar yazmazlar (src/columnar_store.py)."""
+    _apply_schema(conn)
+
+
+def _integer_unique_keys(conn):
+    """
+    9: price, financial, ratio ve multiple'ın UNIQUE kısıtları metin anahtarlardan tam sayı anahtarlara taşınır
+    (UNIQUE_KEYS), tam sayı kısıtla aynı kolonlardaki index'ler ve metin kısıtların index'leri kalkar. Kısıt tablo
+    tanımının parçası olduğu için tablolar schema.sql'deki tanımla yeniden oluşturulur. Aynı güne / döneme düşen
+    satırlardan ('2024-06-03' ve '2024-06-03 00:00:00') en son yazılanı kalır. Kopyalama triggerlar kurulmadan
+    yapılır, change_log'a ve table_version'a yazılmaz.
+    """
+    old_tables = {}
+    for table, keys in COMPACT_KEYS.items():
+        sets = ", ".join(f"{key_col} = {_key_expr(source)}" for key_col, source in keys.items())
+        conn.execute(f"UPDATE {table} SET {sets} WHERE {' OR '.join(f'{key_col} IS NULL' for key_col in keys)}")
+
+        triggers = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", [table])]
+        for trigger in triggers:
+            conn.execute(f"DROP TRIGGER {trigger}")
+        conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        old_tables[table] = _columns(conn, f"{table}_old")
+
+    # sadece tablolar oluşur (diğerleri zaten var), index'ler ve triggerlar eski tablolar silindikten sonra kurulur
+    _execute_statements(conn, _read_sql("schema.sql"))
+    for table, old_columns in old_tables.items():
+        columns = ", ".join(col for col in _columns(conn, table) if col in old_columns)
+        unique_cols = ", ".join(UNIQUE_KEYS[table])
+        conn.execute(f"""
+            INSERT INTO {table} ({columns})
+            SELECT {columns} FROM {table}_old
+            WHERE rowid IN (SELECT MAX(rowid) FROM {table}_old GROUP BY {unique_cols})
+               OR {UNIQUE_KEYS[table][-1]} IS NULL
+        """)
+        conn.execute(f"DROP TABLE {table}_old")
+
+    # eski tabloların index'leri tablolarla birlikte silindi, indexes.sql'de tam sayı kısıtla aynı index'ler yok
+    _apply_schema(conn)
+    conn.execute("ANALYZE")
+
+
+# (numara, ad, fonksiyon), numaralar artan sırada
+MIGRATIONS = [
+    (1, "compact_keys", _compact_keys),
+    (2, "stage_metrics", _stage_metrics),
+    (3, "pipeline_state", _pipeline_state),
+    (4, "change_log", _change_log),
+    (5, "adjustment_factor", _adjustment_factor),
+    (6, "indicators", _indicators),
+    (7, "price_refetch", _price_refetch),
+    (8, "derived_changes", _derived_changes),
+    (9, "integer_unique_keys", _integer_unique_keys),
+]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, vacuum: bool = False) -> list:
+    """Bekleyen migration'ları uygular, uygulananların adlarını döndürür. Her migration kendi transaction'ında çalışır."""
+    applied = []
+    for number, name, fn in MIGRATIONS:
+        if number <= schema_version(conn):
+            continue
+        conn.commit()
+        conn.execute("BEGIN")
+        try:
+            fn(conn)
+            conn.execute(f"PRAGMA user_version = {int(number)}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(name)
+
+    if vacuum and applied:
+        # silinen index'lerin ve eski sayfaların yeri dosyadan geri alınır
+        conn.execute("VACUUM")
+    return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Veritabanını güncel şemaya taşır.")
+    parser.add_argument("--path", default=None, help="veritabanı dosyası (varsayılan: config/settings.json)")
+    parser.add_argument("--vacuum", action="store_true", help="migration'dan sonra VACUUM ile dosyayı küçült")
+    args = parser.parse_args()
+
+    conn = connect(args.path)
+    before = schema_version(conn)
+    applied = migrate(conn, vacuum=args.vacuum)
+    print(f"Şema versiyonu {before} -> {schema_version(conn)}: {', '.join(applied) or 'bekleyen migration yok'}")
+    conn.close()
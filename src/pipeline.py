@@ -0,0 +1,337 @@
+# Pipeline aşamalarını bağımlılık sırasıyla çalıştıran, girdileri değişmeyen aşamaları atlayan orkestratör.
+#
+#   fetch_prices ─────────────────────┬──> calc_indicators
+#                                     │
+#   fetch_fin ──> calc_ratios ────────┴──> calc_multiples
+#
+# - Her aşamanın girdileri bir watermark sözlüğüyle özetlenir:
+#     fetch_prices:   verisi oluşmuş son işlem günü + ticker listesinin özeti
+#     fetch_fin:      finansalların yenilenme dönemi (fin_refresh_days, yeni dönem sorgusu ucuz olduğu için her gün)
+#                     + ticker listesinin özeti
+#     calc_ratios:    financial tablosunun table_version sayaçları
+#     calc_multiples: price ve financial tablolarının table_version sayaçları
+#     calc_indicators: price ve adjustment_factor tablolarının table_version sayaçları
+#   Son başarılı çalıştırmanın watermark'ı pipeline_state'te tutulur. Watermark'ı aynı olan aşama atlanır.
+# - Birbirine bağlı olmayan kollar (fetch_prices ve fetch_fin -> calc_ratios) ayrı thread'lerde paralel çalışır.
+#   Her aşama kendi bağlantısını kullanır. Bağlantılar yazma kilidini transaction başında alır (BEGIN IMMEDIATE),
+#   böylece aynı anda yazan iki aşama birbirini bekler, okuma anlık görüntüsü eskidiği için hata almaz.
+# - calc_ratios, calc_multiples ve calc_indicators değişen dönemleri / günleri change_log'dan okur (src/change_feed.py), sadece
+#   etkilenen dönemler / günler hesaplanır. Elle yapılan düzeltmeler de change_log'a yazıldığı için aynı şekilde
+#   işlenir. Okuyucunun cursor'ı yoksa ya da aşama zorla çalıştırıldıysa tamamı hesaplanır.
+#   Çalıştırmanın sonunda bütün okuyucuların okuduğu change_log satırları silinir.
+#
+# Çalıştırmak için proje kök dizininden:
+#   python -m src.pipeline                      # girdisi değişen aşamalar
+#   python -m src.pipeline --dry-run            # sadece hangi aşamaların çalışacağını göster
+#   python -m src.pipeline --force calc_ratios  # watermark'a bakmadan çalıştır (--force all: hepsi)
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from src.app_logger import AppLogger, utc_now
+from src.change_feed import advance, changed_days, changed_periods, read_changes, trim
+from src.db import connect, get_database
+from src.settings import get_settings
+
+TICKER_DICT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "ticker_dict.json")
+
+
+class Stage:
+    """
+    name: pipeline_state.stage ve loglardaki ad
+    deps: bu aşamadan önce bitmesi gereken aşamalar
+    watermark: fn(conn, now) -> dict, aşamanın girdilerinin şu anki durumu
+    run: fn(conn, previous) -> dict, aşamayı çalıştırıp sayılarını döndürür
+         previous: son başarılı çalıştırmanın watermark'ı (hiç çalışmadıysa None)
+    """
+
+    def __init__(self, name: str, deps: list, watermark, run):
+        self.name = name
+        self.deps = list(deps)
+        self.watermark = watermark
+        self.run = run
+
+
+# -----------------------------------------------------------
+# Watermark'lar
+# -----------------------------------------------------------
+
+def table_versions(conn) -> dict:
+    """table_version'daki sayaçlar: {tablo: [version, mutations]}."""
+    return {name: [version, mutations]
+            for name, version, mutations in conn.execute("SELECT table_name, version, mutations FROM table_version")}
+
+
+def _tickers_digest() -> str:
+    # ticker listesi değişirse (yeni şirket) kaynak aşamalar yeniden çalışır
+    try:
+        with open(TICKER_DICT_PATH, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:12]
+    except FileNotFoundError:
+        return None
+
+
+def last_trading_day(now: datetime, ready_hour: int) -> str:
+    """Verisi oluşmuş son iş günü: hafta içi ready_hour'dan sonra bugün, değilse bir önceki iş günü."""
+    day = pd.Timestamp(now.date())
+    if day.dayofweek >= 5:  # cumartesi / pazar -> cuma
+        day = pd.offsets.BDay(1).rollback(day)
+    elif now.hour < ready_hour:  # bugünün kapanışı henüz yok
+        day = day - pd.offsets.BDay(1)
+    return day.strftime("%Y-%m-%d")
+
+
+def _prices_watermark(conn, now: datetime) -> dict:
+    return {"trading_day": last_trading_day(now, get_settings("pipeline")["price_ready_hour"]), "tickers": _tickers_digest()}
+
+
+def _fin_watermark(conn, now: datetime) -> dict:
+    refresh_days = get_settings("pipeline")["fin_refresh_days"]
+    refresh_from = date.fromordinal(now.date().toordinal() // refresh_days * refresh_days)
+    return {"refresh_from": refresh_from.strftime("%Y-%m-%d"), "tickers": _tickers_digest()}
+
+
+def _ratios_watermark(conn, now: datetime) -> dict:
+    return {"financial": table_versions(conn).get("financial")}
+
+
+def _multiples_watermark(conn, now: datetime) -> dict:
+    versions = table_versions(conn)
+    return {"price": versions.get("price"), "financial": versions.get("financial")}
+
+
+def _indicators_watermark(conn, now: datetime) -> dict:
+    versions = table_versions(conn)
+    return {"price": versions.get("price"), "adjustment_factor": versions.get("adjustment_factor")}
+
+
+# -----------------------------------------------------------
+# Aşamalar. Modüller sadece aşama çalışacaksa import edilir (yfinance / isyatirimhisse importu yavaş).
+# -----------------------------------------------------------
+
+def _run_fetch_prices(conn, previous: dict) -> dict:
+    from src.fetch_executor import FetchExecutor
+    from src.fetch_prices import _get_ticker_dict, fetch_prices_incremental
+    from src.provider_cache import ProviderCache
+
+    # seans sırasında yarım bar yazılmaması için verisi oluşmuş son iş gününe kadar (yfinance'te end_date dahil değil)
+    trading_day = last_trading_day(datetime.now(), get_settings("pipeline")["price_ready_hour"])
+    end_date = (pd.Timestamp(trading_day) + timedelta(days=1)).strftime("%Y-%m-%d")
+    with ProviderCache.from_settings() as cache:
+        return fetch_prices_incremental(conn, _get_ticker_dict(), end_date, get_settings("pipeline")["price_start_date"],
+                                        FetchExecutor(**get_settings("fetch")), cache=cache)
+
+
+def _run_fetch_fin(conn, previous: dict) -> dict:
+    from src.fetch_financials import _get_ticker_dict, fetch_new_fin
+    from src.provider_cache import ProviderCache
+
+    # sadece yeni dönemi açıklanmış şirketler çekilir, hiç finansalı olmayanlar start_year'dan itibaren
+    start_year = datetime.now().year - get_settings("pipeline")["fin_years_back"]
+    with ProviderCache.from_settings() as cache:
+        return fetch_new_fin(conn, _get_ticker_dict(), start_year, cache=cache)
+
+
+def _run_calc_ratios(conn, previous: dict) -> dict:
+    from src.calc_ratios import update_ratios
+
+    fin_changes, fin_seq = read_changes(conn, "calc_ratios", "financial")
+    if previous is None or fin_changes is None:
+        result = update_ratios(conn)  # bütün dönemler
+    else:
+        result = update_ratios(conn, changed_keys=changed_periods(fin_changes))
+    advance(conn, "calc_ratios", "financial", fin_seq)
+    return result
+
+
+def _run_calc_multiples(conn, previous: dict) -> dict:
+    from src.calc_multiples import update_multiples
+
+    fin_changes, fin_seq = read_changes(conn, "calc_multiples", "financial")
+    price_changes, price_seq = read_changes(conn, "calc_multiples", "price")
+    if previous is None or fin_changes is None or price_changes is None:
+        result = update_multiples(conn, full=True)
+    else:
+        # eklenen, güncellenen ve silinen fiyatlar şirketin değişen ilk gününden itibaren hesaplanır
+        result = update_multiples(conn, changed_fin_keys=changed_periods(fin_changes),
+                                  changed_price_days=changed_days(price_changes))
+    advance(conn, "calc_multiples", "financial", fin_seq)
+    advance(conn, "calc_multiples", "price", price_seq)
+    return result
+
+
+def _run_calc_indicators(conn, previous: dict) -> dict:
+    from src.calc_indicators import update_indicators
+
+    price_changes, price_seq = read_changes(conn, "calc_indicators", "price")
+    if previous is None or price_changes is None:
+        result = update_indicators(conn, rebuild=True)
+    else:
+        # yeni günler durumdan devam eder, son işlenen günden önce değişen şirketler baştan hesaplanır
+        result = update_indicators(conn, changed_price_days=changed_days(price_changes))
+    advance(conn, "calc_indicators", "price", price_seq)
+    return result
+
+
+PIPELINE = [
+    Stage("fetch_prices", [], _prices_watermark, _run_fetch_prices),
+    Stage("fetch_fin", [], _fin_watermark, _run_fetch_fin),
+    Stage("calc_ratios", ["fetch_fin"], _ratios_watermark, _run_calc_ratios),
+    Stage("calc_multiples", ["fetch_prices", "calc_ratios"], _multiples_watermark, _run_calc_multiples),
+    Stage("calc_indicators", ["fetch_prices"], _indicators_watermark, _run_calc_indicators),
+]
+
+
+# -----------------------------------------------------------
+# Orkestratör
+# -----------------------------------------------------------
+
+def _connect(path: str):
+    conn = connect(path)
+    # yazma kilidi transaction başında alınır, aynı anda yazan aşama busy_timeout kadar bekler
+    conn.isolation_level = "IMMEDIATE"
+    conn.execute(f"PRAGMA busy_timeout = {int(get_settings('pipeline')['busy_timeout_ms'])}")
+    return conn
+
+
+def read_state(conn) -> dict:
+    """pipeline_state: {aşama: {"input_watermark", "status", "last_run_at", "last_success_at", "seconds", "result"}}."""
+    rows = conn.execute("SELECT stage, input_watermark, status, last_run_at, last_success_at, seconds, result FROM pipeline_state")
+    return {stage: {"input_watermark": json.loads(watermark) if watermark else None, "status": status,
+                    "last_run_at": last_run_at, "last_success_at": last_success_at, "seconds": seconds, "result": result}
+            for stage, watermark, status, last_run_at, last_success_at, seconds, result in rows}
+
+
+def _save_state(conn, name: str, watermark, status: str, seconds: float, result: str):
+    # hata durumunda son başarılı çalıştırmanın watermark'ı korunur, aşama bir sonraki çalıştırmada tekrar denenir
+    with conn:
+        conn.execute("""
+            INSERT INTO pipeline_state (stage, input_watermark, status, last_run_at, last_success_at, seconds, result)
+            VALUES (:stage, CASE WHEN :status = 'ok' THEN :watermark END, :status, :now, CASE WHEN :status = 'ok' THEN :now END, :seconds, :result)
+            ON CONFLICT(stage) DO UPDATE SET
+                input_watermark = CASE WHEN excluded.status = 'ok' THEN excluded.input_watermark ELSE input_watermark END,
+                status = excluded.status, last_run_at = excluded.last_run_at,
+                last_success_at = COALESCE(excluded.last_success_at, last_success_at),
+                seconds = excluded.seconds, result = excluded.result
+        """, {"stage": name, "watermark": json.dumps(watermark), "status": status, "now": utc_now(), "seconds": seconds,
+              "result": result})
+
+
+def _execute(path: str, stage: Stage, previous: dict) -> dict:
+    """Aşamayı kendi bağlantısında çalıştırıp sonucunu döndürür."""
+    conn = _connect(path)
+    try:
+        # fetch_* yazma ve indirme hatalarını loglayıp tekrar fırlatır, aşama "failed" olur ve watermark'ı kaydedilmez
+        result = stage.run(conn, previous)
+        conn.commit()
+        return result
+    finally:
+        conn.close()
+
+
+def run_pipeline(path: str = None, stages: list = None, force=(), dry_run: bool = False, now: datetime = None,
+                 max_workers: int = None, logger: AppLogger = None) -> dict:
+    """
+    Girdileri son başarılı çalıştırmadan bu yana değişen aşamaları bağımlılık sırasıyla çalıştırır.
+    force: watermark'a bakılmadan çalıştırılacak aşamalar ("all" ise hepsi).
+    Her aşamanın durumunu döndürür: "ran", "skipped" (girdileri değişmedi), "failed", "blocked" (bağımlı olduğu
+    aşama hata verdi). dry_run ise hiçbir şey çalıştırılmaz: "dirty", "clean" ya da "pending" (önceki bir aşama
+    çalışırsa girdileri değişebilir).
+    stages'te olmayan bağımlılıklar bitmiş sayılır: sadece calc_ratios verilirse fetch_fin beklenmeden, mevcut
+    finansallarla çalışır.
+    """
+    stages = PIPELINE if stages is None else stages
+    now = now or datetime.now()
+    force = {stage.name for stage in stages} if force == "all" or "all" in force else set(force)
+
+    path = get_database(path).path  # bekleyen migration'lar ilk açılışta uygulanır
+    conn = _connect(path)
+    try:
+        if logger is not None:
+            return _run(conn, path, stages, force, dry_run, now, max_workers, logger)
+        with AppLogger(conn, "pipeline") as logger:
+            return _run(conn, path, stages, force, dry_run, now, max_workers, logger)
+    finally:
+        conn.close()
+
+
+def _run(conn, path: str, stages: list, force: set, dry_run: bool, now: datetime, max_workers: int,
+         logger: AppLogger) -> dict:
+    state = read_state(conn)
+    pending = {stage.name: stage for stage in stages}
+    # stages'te olmayan bağımlılık hiç bitmeyeceği için beklenmez
+    deps = {stage.name: [dep for dep in stage.deps if dep in pending] for stage in stages}
+    status = {}
+    running = {}  # future -> (aşama, watermark, başlangıç)
+
+    with ThreadPoolExecutor(max_workers=max_workers or get_settings("pipeline")["max_workers"]) as pool:
+        while pending or running:
+            # bağımlılıkları bitmiş aşamalar: girdileri artık değişmeyeceği için watermark'ları burada okunur
+            for name in [name for name in pending if all(dep in status for dep in deps[name])]:
+                stage = pending.pop(name)
+                previous = state.get(name, {}).get("input_watermark")
+                deps_status = {status[dep] for dep in deps[name]}
+                if deps_status & {"failed", "blocked"}:
+                    status[name] = "blocked"
+                    logger.warn(f"{name}: bağımlı olduğu aşama hata verdiği için çalıştırılmadı.")
+                    continue
+
+                watermark = stage.watermark(conn, now)
+                dirty = name in force or state.get(name, {}).get("status") != "ok" or watermark != previous
+                if dry_run:
+                    status[name] = "dirty" if dirty else ("pending" if deps_status & {"dirty", "pending"} else "clean")
+                    continue
+                if not dirty:
+                    status[name] = "skipped"
+                    continue
+
+                # zorla çalıştırılan aşama önceki durumu bilmiyormuş gibi çalışır (tamamını hesaplar)
+                future = pool.submit(_execute, path, stage, None if name in force else previous)
+                running[future] = (stage, watermark, time.perf_counter())
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, watermark, start = running.pop(future)
+                seconds = time.perf_counter() - start
+                try:
+                    result = future.result()
+                except Exception as e:
+                    status[stage.name] = "failed"
+                    logger.error(f"{stage.name}: hata verdi: {e}")
+                    _save_state(conn, stage.name, watermark, "error", seconds, str(e))
+                    continue
+
+                status[stage.name] = "ran"
+                counts = {key: value for key, value in result.items() if key != "keys"}
+                logger.info(f"{stage.name}: {seconds:.1f} s, {counts}")
+                _save_state(conn, stage.name, watermark, "ok", seconds, json.dumps(counts))
+
+    if not dry_run:
+        trim(conn)
+
+    skipped = [name for name, value in status.items() if value == "skipped"]
+    if skipped:
+        logger.info(f"Girdileri değişmediği için atlanan aşamalar: {', '.join(skipped)}")
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Girdileri değişen pipeline aşamalarını bağımlılık sırasıyla çalıştırır.")
+    parser.add_argument("--force", nargs="+", default=[], help="watermark'a bakmadan çalıştırılacak aşamalar ya da all")
+    parser.add_argument("--dry-run", action="store_true", help="hiçbir şey çalıştırmadan planı göster")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    status = run_pipeline(force=args.force, dry_run=args.dry_run)
+    for name, value in status.items():
+        print(f"{name:>15}: {value}")
+    print(f"{time.perf_counter() - start:.2f} s")
@@ -0,0 +1,223 @@
+# Veri sağlayıcılarından (yfinance, isyatirimhisse) gelen ham cevapları diskte saklayan önbellek.
+# Her istek (sağlayıcı, semboller, tarih/yıl aralığı, parametreler) ile anahtarlanır, anahtarın
+# sha256'sı dosya adı olur ve cevap gzip'li pickle olarak yazılır. index.json her kaydın boyutunu,
+# son kullanım zamanını ve varsa son geçerlilik zamanını tutar. Okumalarda değişen son kullanım zamanları
+# bellekte biriktirilir, index her flush_every okumada bir, her yazmada ve flush() / with bloğunun sonunda kaydedilir.
+#
+# - Kapanmış dönemler (geçmiş günler / yıllar) değişmediği için süresiz saklanır.
+# - İstenen sembollerden bazılarının verisi olmayan cevaplar kaydedilmez: sağlayıcılar çekemedikleri sembolleri
+#   hata vermeden atlar, böyle bir cevap kaydedilirse eksik semboller hiç tekrar istenmez.
+# - Açık dönemler (bugünü veya içinde bulunulan yılı kapsayan istekler) open_ttl_hours kadar geçerlidir.
+# - Toplam boyut max_size_mb'ı geçerse en uzun süredir kullanılmayan kayıtlar silinir (LRU).
+#
+# Modlar:
+#   "off"     önbellek kullanılmaz
+#   "use"     önbellekte geçerli kayıt varsa o kullanılır, yoksa sağlayıcıya gidilip kaydedilir
+#   "refresh" her zaman sağlayıcıya gidilir, sonuç kaydedilir
+#   "replay"  sadece önbellekten okunur, kayıt yoksa CacheMiss fırlatılır (ağ kullanılmaz)
+
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from datetime import date, datetime
+
+from src.settings import get_settings
+
+MODES = ("off", "use", "refresh", "replay")
+
+
+class CacheMiss(LookupError):
+    """Replay modunda önbellekte olmayan bir istek yapıldığında fırlatılır."""
+
+    # FetchExecutor bu hatayı tekrar denemez, önbellek tekrar denemede de değişmez
+    retryable = False
+
+
+def is_closed_day_range(end_date: str, today: date = None) -> bool:
+    """Bitiş günü bugünden önceyse aralıktaki bütün günler kapanmıştır."""
+    today = today or date.today()
+    return datetime.strptime(end_date, "%Y-%m-%d").date() < today
+
+
+def is_closed_year_range(end_year, today: date = None) -> bool:
+    """
+    Yıllık finansallar bir sonraki yılın ortasına kadar açıklanabildiği için sadece
+    içinde bulunulan yıldan en az iki önceki yıllar kapanmış sayılır.
+    """
+    today = today or date.today()
+    return int(end_year) < today.year - 1
+
+
+class ProviderCache:
+
+    def __init__(self, path: str, mode: str = "use", open_ttl_hours: float = 12, max_size_mb: float = 2048,
+                 flush_every: int = 100):
+        if mode not in MODES:
+            raise ValueError(f"Geçersiz önbellek modu: {mode}. Seçenekler: {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self.open_ttl = open_ttl_hours * 3600
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._unsaved_hits = 0
+        self._index = self._load_index()
+
+    @classmethod
+    def from_settings(cls, mode: str = None) -> "ProviderCache":
+        """config/settings.json'daki "cache" bölümünden oluşturur, göreli path proje köküne göredir."""
+        settings = get_settings("cache")
+        path = settings["path"]
+        if not os.path.isabs(path):
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            path = os.path.join(project_root, path)
+        return cls(path, mode or settings["mode"], settings["open_ttl_hours"], settings["max_size_mb"],
+                   settings["flush_every"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
+    def flush(self):
+        """Bellekte biriken son kullanım zamanlarını index.json'a yazar."""
+        with self._lock:
+            if self._unsaved_hits:
+                self._save_index()
+
+    # ---------------------------------------------------------------
+    # index
+    # ---------------------------------------------------------------
+    def _index_path(self) -> str:
+        return os.path.join(self.path, "index.json")
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self):
+        # önce geçici dosyaya yazılır, yarım kalan yazma index'i bozmasın
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path())
+        self._unsaved_hits = 0
+
+    def _file_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key + ".pkl.gz")
+
+    def _remove(self, key: str):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._file_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep: str):
+        # en uzun süredir kullanılmayan kayıtlardan başlayarak boyut sınırının altına inilir, yeni yazılan kayıt (keep) silinmez
+        total = sum(entry["size"] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._index[key]["size"]
+            self._remove(key)
+
+    # ---------------------------------------------------------------
+    # okuma / yazma
+    # ---------------------------------------------------------------
+    @staticmethod
+    def key(provider: str, symbols, start, end, params: dict = None) -> str:
+        request = {"provider": provider, "symbols": sorted(symbols), "start": str(start), "end": str(end),
+                   "params": params or {}}
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Geçerli bir kayıt varsa cevabı, yoksa None döndürür. Süresi geçmiş kayıt silinir."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            if entry["expires"] is not None and entry["expires"] < now:
+                self._remove(key)
+                self._save_index()
+                return None
+            try:
+                with gzip.open(self._file_path(key), "rb") as f:
+                    value = pickle.load(f)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                self._remove(key)
+                self._save_index()
+                return None
+            # son kullanım zamanı sadece LRU sırası içindir, her okumada diske yazılmaz
+            entry["last_access"] = now
+            self._unsaved_hits += 1
+            if self._unsaved_hits >= self.flush_every:
+                self._save_index()
+            return value
+
+    def put(self, key: str, provider: str, value, closed: bool):
+        """Cevabı yazar. Kapanmış dönemler süresiz, açık dönemler open_ttl kadar saklanır."""
+        with self._lock:
+            file_path = self._file_path(key)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with gzip.open(file_path, "wb", compresslevel=6) as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            now = time.time()
+            self._index[key] = {
+                "provider": provider,
+                "size": os.path.getsize(file_path),
+                "created": now,
+                "last_access": now,
+                "expires": None if closed else now + self.open_ttl,
+            }
+            self._evict(keep=key)
+            self._save_index()
+
+    def fetch(self, provider: str, fetch_fn, symbols, start, end, params: dict = None, closed: bool = False,
+              returned_fn=None):
+        """
+        fetch_fn() sağlayıcıya istek atan argümansız fonksiyondur. Moda göre önce önbelleğe bakılır,
+        sağlayıcıdan gelen boş olmayan cevaplar kaydedilir. returned_fn(cevap) verisi dönen sembolleri döndürür,
+        verilirse bütün symbols'ü içermeyen cevaplar kaydedilmez.
+        """
+        if self.mode == "off":
+            return fetch_fn()
+
+        key = self.key(provider, symbols, start, end, params)
+        if self.mode in ("use", "replay"):
+            value = self.get(key)
+            if value is not None:
+                return value
+            if self.mode == "replay":
+                raise CacheMiss(f"{provider} için önbellekte kayıt yok: {len(symbols)} sembol, {start} - {end}")
+
+        value = fetch_fn()
+        # boş cevaplar çoğu zaman geçici bir hatadır, kaydedilmez
+        if value is None or getattr(value, "empty", False):
+            return value
+        # eksik sembollü cevap kaydedilmez, eksikler bir sonraki çalıştırmada tekrar istenir
+        if returned_fn is not None and set(symbols) - set(returned_fn(value)):
+            return value
+        self.put(key, provider, value, closed)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "size_mb": sum(entry["size"] for entry in self._index.values()) / (1024 * 1024),
+            }
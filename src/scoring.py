@@ -0,0 +1,195 @@
+# ratio ve multiple tablolarındaki faktörlerden her gün için kesitsel skor hesaplayan modül.
+#
+# Bir skor tanımı faktör listesidir, örn. config/settings.json'da:
+#   "scoring": {"scores": {"value_quality_growth": [
+#       {"table": "multiple", "column": "pe", "direction": "low", "weight": 1.0}, ...]}}
+#
+# Her faktör gün x şirket matrisine çevrilir (src/backtest.load_matrix, ratio'lar o gün bilinen döneme eşlenir).
+# Matrisler src/market_cache üzerinden okunur, aynı process'teki tekrar hesaplamalar veritabanını baştan okumaz.
+# Her gün (satır) için ayrı ayrı ve döngüsüz olarak:
+#   1. winsorize: değerler o günün winsor / 1 - winsor yüzdelikleriyle sınırlanır
+#   2. z-skor: (değer - gün ortalaması) / gün standart sapması, "low" faktörlerde işaret ters çevrilir
+#   3. composite: z-skorların ağırlıklı ortalaması (eksik faktörler atlanır, en az min_factors faktör gerekir)
+#   4. percentile ve rank: composite'in o günkü yüzdelik sırası ve sırası
+# Sonuçlar score tablosuna yazılır, "D günü ilk N" sorgusu idx_scores_name_date_rank üzerinde bir aralık taramasıdır.
+# ratio ve multiple, price ve financial'dan hesaplanır: update_scores bu iki tablonun change_log'unu okuyup
+# (src/change_feed.py) sonradan eklenen ya da düzeltilen verinin etkilediği ilk günden itibaren yeniden hesaplar.
+
+import warnings
+import numpy as np
+import pandas as pd
+from src.market_cache import cached_matrix
+from src.db_writer import upsert_scores
+from src.app_logger import AppLogger
+from src.alignment import period_end
+from src.change_feed import advance, read_changes
+from src.compact_keys import decode_day
+from src.settings import get_settings
+from src.db import get_database, transaction
+
+
+def winsorize(values: np.ndarray, limit: float) -> np.ndarray:
+    """Her satırı kendi limit ve 1 - limit yüzdeliklerine sınırlar, NaN'lar NaN kalır."""
+    if limit <= 0 or values.shape[1] == 0:
+        return values
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # tamamı NaN olan günler
+        low, high = np.nanquantile(values, [limit, 1 - limit], axis=1, keepdims=True)
+    return np.clip(values, low, high)
+
+
+def zscore(values: np.ndarray) -> np.ndarray:
+    """Her satırın kesitsel z-skoru, standart sapması 0 olan satırlar 0 olur."""
+    with warnings.catch_warnings(), np.errstate(all="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)  # tamamı NaN olan günler
+        mean = np.nanmean(values, axis=1, keepdims=True)
+        std = np.nanstd(values, axis=1, keepdims=True)
+        z = (values - mean) / std
+    return np.where(std > 0, z, np.where(np.isnan(values), np.nan, 0.0))
+
+
+def composite_scores(factor_matrices: list, factors: list, winsor: float = 0.02, min_factors: int = 1) -> pd.DataFrame:
+    """factor_matrices: factors ile aynı sırada, aynı şekildeki gün x şirket matrisleri. Composite skor matrisini döndürür."""
+    template = factor_matrices[0]
+    total = np.zeros(template.shape)
+    weight_sum = np.zeros(template.shape)
+    n_factors = np.zeros(template.shape, dtype=np.int64)
+    for matrix, factor in zip(factor_matrices, factors):
+        z = zscore(winsorize(matrix.to_numpy(dtype=float), winsor))
+        if factor.get("direction", "high") == "low":
+            z = -z
+        weight = float(factor.get("weight", 1.0))
+        has_value = ~np.isnan(z)
+        total += np.where(has_value, z * weight, 0.0)
+        weight_sum += np.where(has_value, weight, 0.0)
+        n_factors += has_value
+
+    with np.errstate(all="ignore"):
+        composite = np.where((n_factors >= min_factors) & (weight_sum > 0), total / weight_sum, np.nan)
+    return pd.DataFrame(composite, index=template.index, columns=template.columns)
+
+
+def rank_scores(composite: pd.DataFrame) -> tuple:
+    """Her gün için composite'in yüzdelik sırası (1 = en iyi) ve sırası (1 = en iyi)."""
+    percentile = composite.rank(axis=1, pct=True)
+    rank = composite.rank(axis=1, ascending=False, method="first")
+    return percentile, rank
+
+
+def _to_rows(score_name: str, composite: pd.DataFrame, percentile: pd.DataFrame, rank: pd.DataFrame) -> pd.DataFrame:
+    # matrisleri (gün, şirket) satırlarına çevirir, skoru olmayan hücreler atlanır
+    values = composite.to_numpy()
+    date_idx, company_idx = np.nonzero(~np.isnan(values))
+    return pd.DataFrame({
+        "score_name": score_name,
+        "date": composite.index.values[date_idx],
+        "company_id": composite.columns.values[company_idx].astype(np.int64),
+        "composite": values[date_idx, company_idx],
+        "percentile": percentile.to_numpy()[date_idx, company_idx],
+        "rank": rank.to_numpy()[date_idx, company_idx].astype(np.int64),
+    })
+
+
+def compute_scores(conn, factors: list, start=None, end=None, winsor: float = None, min_factors: int = None) -> tuple:
+    """
+    start - end arasındaki her işlem günü için composite, percentile ve rank matrislerini hesaplar.
+    Evren o günlerde fiyatı olan şirketlerdir.
+    """
+    settings = get_settings("scoring")
+    winsor = settings["winsor"] if winsor is None else winsor
+    min_factors = settings["min_factors"] if min_factors is None else min_factors
+
+    close = cached_matrix(conn, "price", "close", start=start, end=end, adjusted=True)
+    if close.empty:
+        empty = pd.DataFrame()
+        return empty, empty, empty
+
+    matrices = [
+        cached_matrix(conn, factor["table"], factor["column"], company_ids=list(close.columns), index=close.index)
+        for factor in factors
+    ]
+    # o gün fiyatı olmayan şirketler o günün kesitine girmez
+    no_price = close.isna().to_numpy()
+    matrices = [matrix.mask(no_price) for matrix in matrices]
+
+    composite = composite_scores(matrices, factors, winsor, min_factors)
+    percentile, rank = rank_scores(composite)
+    return composite, percentile, rank
+
+
+def _changed_start(conn, score_name: str) -> tuple:
+    """
+    Skorun yeniden hesaplanması gereken ilk gün ve okunan change_log seq'leri: (start, {tablo: seq}).
+    start score tablosundaki son günün ertesi, değişen ilk fiyat günü ve değişen finansal dönemin sonu (dönem
+    açıklanmadan kullanılmaz, silinen dönemlerin açıklanma günü bilinmez) arasında en erken olanıdır.
+    Skor hiç yazılmadıysa ya da okuyucunun cursor'ı yoksa start None'dır (bütün günler).
+    """
+    consumer = f"update_scores:{score_name}"
+    price_changes, price_seq = read_changes(conn, consumer, "price")
+    fin_changes, fin_seq = read_changes(conn, consumer, "financial")
+    seqs = {"price": price_seq, "financial": fin_seq}
+
+    last_date = conn.execute("SELECT MAX(date) FROM score WHERE score_name = ?", [score_name]).fetchone()[0]
+    if last_date is None or price_changes is None or fin_changes is None:
+        return None, seqs
+
+    starts = [pd.Timestamp(last_date) + pd.Timedelta(days=1)]
+    if not price_changes.empty:
+        starts.append(decode_day([price_changes["row_key"].min()])[0])
+    if not fin_changes.empty:
+        keys = fin_changes["row_key"]
+        starts.append(period_end(keys // 100, keys % 100 * 3).min())
+    return min(starts), seqs
+
+
+def update_scores(conn, score_name: str = None, factors: list = None, start=None, logger: AppLogger = None) -> dict:
+    """
+    score_name skorunu hesaplayıp score tablosuna upsert eder. factors verilmezse config/settings.json'daki
+    tanım kullanılır. Skorlar kesitsel olduğu için bir şirketin bir günlük verisi değişince o günün bütün skorları
+    değişir: score tablosundaki son günden sonraki günlerle birlikte, son çalıştırmadan bu yana price ya da
+    financial'ı değişen ilk günden itibaren hesaplanır (_changed_start). start verilirse hesaplama en geç start'tan başlar.
+    ratio ve multiple bu değişikliklerle güncellendikten sonra (calc_ratios, calc_multiples) çalıştırılmalıdır.
+    """
+    if logger is None:
+        with AppLogger(conn, "update_scores") as logger:
+            return update_scores(conn, score_name, factors, start, logger)
+
+    settings = get_settings("scoring")
+    score_name = score_name or settings["default"]
+    factors = factors or settings["scores"][score_name]
+
+    changed_start, seqs = _changed_start(conn, score_name)
+    if start is None:
+        start = changed_start
+    elif changed_start is not None:
+        start = min(pd.Timestamp(start), changed_start)
+
+    composite, percentile, rank = compute_scores(conn, factors, start=start)
+    # skorlar ve cursor birlikte yazılır, yazma yarıda kalırsa aynı değişiklikler bir sonraki çalıştırmada tekrar okunur
+    with transaction(conn):
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if not composite.empty:
+            counts = upsert_scores(conn, _to_rows(score_name, composite, percentile, rank))
+        for table, seq in seqs.items():
+            advance(conn, f"update_scores:{score_name}", table, seq)
+    if composite.empty:
+        logger.info(f"{score_name}: hesaplanacak yeni gün yok.")
+        return counts
+
+    logger.info(f"{score_name}: {len(composite)} gün hesaplandı: {counts['inserted']} yeni, {counts['updated']} güncellenen, {counts['unchanged']} değişmeyen satır.")
+    return counts
+
+
+def top_n(conn, score_name: str, date, n: int) -> pd.DataFrame:
+    """date günü skora göre ilk n şirket, idx_scores_name_date_rank üzerinde tek bir aralık taraması."""
+    date = pd.Timestamp(date).strftime("%Y-%m-%d %H:%M:%S")
+    return pd.read_sql_query(
+        "SELECT company_id, composite, percentile, rank FROM score "
+        "WHERE score_name = ? AND date = ? AND rank <= ? ORDER BY rank",
+        conn, params=[score_name, date, int(n)]
+    )
+
+
+if __name__ == "__main__":
+    with get_database().write() as conn:
+        update_scores(conn)
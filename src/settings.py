@@ -0,0 +1,94 @@
+# Proje ayarlarını config/settings.json dosyasından okuyan modül.
+# Dosyada olmayan ayarlar için DEFAULTS içindeki değerler kullanılır.
+
+import copy
+import json
+import os
+from functools import lru_cache
+
+DEFAULTS = {
+    "database": {
+        "path": "data/database.db",
+        "cache_size_mb": 64,
+        "mmap_size_mb": 256,
+        "busy_timeout_ms": 5000,
+        "read_pool_size": 4,
+    },
+    "fetch": {
+        "max_workers": 4,
+        "shard_size": 50,
+        "rate_limits": {},
+        "retries": 2,
+        "backoff": 0.5,
+    },
+    "logging": {
+        "level": "INFO",
+        "batch_size": 500,
+        "echo": True,
+    },
+    "metrics": {
+        "enabled": True,
+        "trace_memory": False,
+    },
+    "financials": {
+        "batch_size": 25,
+        "report_lag_days": 0,
+    },
+    "pipeline": {
+        "max_workers": 2,
+        "busy_timeout_ms": 600000,
+        "price_start_date": "2025-08-20",
+        "price_ready_hour": 19,
+        "fin_refresh_days": 1,
+        "fin_years_back": 1,
+    },
+    "analytics": {
+        "chunk_companies": 50,
+    },
+    "cache": {
+        "mode": "use",
+        "path": "data/cache",
+        "open_ttl_hours": 12,
+        "max_size_mb": 2048,
+        "flush_every": 100,
+    },
+    "columnar": {
+        "path": "data/columnar",
+    },
+    "scoring": {
+        "winsor": 0.02,
+        "min_factors": 2,
+        "default": "value_quality_growth",
+        "scores": {
+            "value_quality_growth": [
+                {"table": "multiple", "column": "pe", "direction": "low", "weight": 1.0},
+                {"table": "ratio", "column": "roe_ttm", "direction": "high", "weight": 1.0},
+                {"table": "ratio", "column": "revenue_growth_ttm_yoy", "direction": "high", "weight": 1.0},
+            ],
+        },
+    },
+}
+
+
+def _settings_path() -> str:
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, "config", "settings.json")
+
+
+@lru_cache(maxsize=1)
+def _load_settings() -> dict:
+    settings = copy.deepcopy(DEFAULTS)
+    try:
+        with open(_settings_path(), "r", encoding="utf-8") as f:
+            user_settings = json.load(f)
+    except FileNotFoundError:
+        return settings
+
+    for section, values in user_settings.items():
+        settings.setdefault(section, {}).update(values)
+    return settings
+
+
+def get_settings(section: str) -> dict:
+    """İstenen bölümün ayarlarını döndürür, örn. get_settings("logging")["batch_size"]."""
+    return copy.deepcopy(_load_settings().get(section, {}))
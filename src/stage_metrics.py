@@ -0,0 +1,245 @@
+# Pipeline adımlarının süre, satır sayısı ve bellek ölçümü.
+#
+#   with track_run(conn, "fetch_prices"):           # bir çalıştırma, stage_metrics'e "total" satırı olarak yazılır
+#       with stage("download") as s:                # çalıştırmanın içindeki bir aşama
+#           raw = ...
+#           s.rows_out = len(raw)
+#       for chunk in metered("read", chunks):       # generator'ın her next()'i "read" aşamasına eklenir
+#           ...
+#
+# - Aktif bir çalıştırma yoksa stage() ve metered() hiçbir şey yapmaz, fonksiyonlar testlerde ve
+#   tek başına çağrıldıklarında eskisi gibi çalışır.
+# - Çalıştırma içindeyken track_run() yeni bir çalıştırma açmaz, aynı adla bir aşama açar
+#   (örn. fetch_prices_incremental içindeki her fetch_prices çağrısı).
+# - Aşamalar iç içe olabilir, adları yol olarak tutulur ("write/diff"). Aynı aşama birden fazla
+#   çalışırsa (chunk döngüleri) süreler ve satırlar toplanır, calls'ta sayısı tutulur.
+# - Bellek: tracemalloc ile aşamanın başındaki ayırmaya göre en yüksek ek ayırma (peak_mb). numpy dizileri dahildir,
+#   SQLite'ın kendi belleği dahil değildir. tracemalloc pandas ağırlıklı aşamaları birkaç kat yavaşlattığı için
+#   varsayılan olarak kapalıdır, config/settings.json'da "metrics": {"trace_memory": true} ile ya da
+#   track_run(..., trace_memory=True) ile açılır. Kapalıyken peak_mb boş kalır.
+#
+# Rapor: python -m src.stage_metrics [--runs 20] [--action fetch_prices]
+
+import argparse
+import contextvars
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+from src.app_logger import utc_now
+from src.db import transaction
+from src.settings import get_settings
+
+_MB = 2 ** 20
+
+_current_run = contextvars.ContextVar("stage_metrics_run", default=None)
+
+
+class StageRecord:
+    """Bir aşamanın toplam ölçümü. rows_in / rows_out aşamanın içinde atanır (ya da arttırılır)."""
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.started_at = utc_now()
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows_in = None
+        self.rows_out = None
+        self.peak_mb = None
+        self.status = "ok"
+
+    def add_rows(self, rows_in: int = None, rows_out: int = None):
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + int(rows_in)
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + int(rows_out)
+
+
+class _NullRecord(StageRecord):
+    # aktif çalıştırma yokken verilen kayıt, atanan değerler bir yere yazılmaz
+    def __init__(self):
+        super().__init__("", 0)
+
+
+class RunMetrics:
+    """Tek bir çalıştırmanın aşamaları. Çalıştırma bitince bütün aşamalar stage_metrics'e tek seferde yazılır."""
+
+    def __init__(self, conn, action: str, trace_memory: bool = None):
+        settings = get_settings("metrics")
+        self.conn = conn
+        self.action = action
+        self.run_id = uuid.uuid4().hex[:12]
+        self.trace_memory = settings["trace_memory"] if trace_memory is None else trace_memory
+        self.records = {}  # yol -> StageRecord, ilk çalışma sırasıyla
+        self._stack = []   # [(yol, başlangıçtaki ayırma, en yüksek ayırma)]
+        self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        # "total" yola eklenmez: total > read > parse aşaması "read/parse" olarak yazılır
+        path = f"{self._stack[-1][0]}/{name}" if len(self._stack) > 1 else name
+        record = self.records.get(path)
+        if record is None:
+            record = self.records[path] = StageRecord(path, len(self._stack))
+        record.add_rows(rows_in=rows_in)
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # üst aşamanın o ana kadarki en yüksek değeri reset_peak'ten önce saklanır
+                self._stack[-1][2] = max(self._stack[-1][2], peak)
+            tracemalloc.reset_peak()
+            frame = [path, current, current]
+        else:
+            frame = [path, 0, 0]
+        self._stack.append(frame)
+
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record.status = "error"
+            raise
+        finally:
+            record.seconds += time.perf_counter() - start
+            record.calls += 1
+            self._stack.pop()
+            if self.trace_memory:
+                frame[2] = max(frame[2], tracemalloc.get_traced_memory()[1])
+                record.peak_mb = max(record.peak_mb or 0.0, (frame[2] - frame[1]) / _MB)
+                if self._stack:
+                    self._stack[-1][2] = max(self._stack[-1][2], frame[2])
+                elif self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+
+    def rows(self) -> list:
+        return [(self.run_id, self.action, record.name, record.depth, record.started_at, record.calls, record.seconds,
+                 record.rows_in, record.rows_out, record.peak_mb, record.status) for record in self.records.values()]
+
+    def save(self):
+        """Aşamaları stage_metrics'e yazar. conn yoksa ya da tablo henüz oluşturulmamışsa yazılmaz."""
+        if self.conn is None or not self.records:
+            return
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stage_metrics'").fetchone()
+        if not exists:
+            return
+        with transaction(self.conn):
+            self.conn.executemany(
+                "INSERT INTO stage_metrics (run_id, action, stage, depth, started_at, calls, seconds, rows_in, rows_out, "
+                "peak_mb, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self.rows()
+            )
+
+
+@contextmanager
+def track_run(conn, action: str, rows_in: int = None, trace_memory: bool = None):
+    """
+    action için bir çalıştırma başlatır, bütün blok "total" aşaması olarak ölçülür. Zaten bir çalıştırmanın
+    içindeyse action adıyla bir aşama açar. "metrics": {"enabled": false} ise hiçbir şey ölçülmez.
+    trace_memory None ise ayarlardaki değer kullanılır.
+    """
+    run = _current_run.get()
+    if run is not None:
+        with run.stage(action, rows_in=rows_in) as record:
+            yield record
+        return
+
+    if not get_settings("metrics")["enabled"]:
+        yield _NullRecord()
+        return
+
+    run = RunMetrics(conn, action, trace_memory)
+    token = _current_run.set(run)
+    try:
+        with run.stage("total", rows_in=rows_in) as record:
+            yield record
+    finally:
+        _current_run.reset(token)
+        run.save()
+
+
+@contextmanager
+def stage(name: str, rows_in: int = None):
+    """Aktif çalıştırmanın içinde bir aşama. Aktif çalıştırma yoksa sadece boş bir kayıt verir."""
+    run = _current_run.get()
+    if run is None:
+        yield _NullRecord()
+        return
+    with run.stage(name, rows_in=rows_in) as record:
+        yield record
+
+
+def metered(name: str, iterable):
+    """iterable'ın her elemanını üretme süresini name aşamasına ekler, elemanların len()'i rows_out'a eklenir."""
+    iterator = iter(iterable)
+    while True:
+        with stage(name) as record:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            record.add_rows(rows_out=len(item) if hasattr(item, "__len__") else None)
+        yield item
+
+
+def slowest_stages(conn, runs: int = 20, action: str = None) -> pd.DataFrame:
+    """Her action'ın son runs çalıştırmasında aşama başına ortalama / en uzun süre, satır ve bellek, en yavaştan başlayarak."""
+    return pd.read_sql_query("""
+        WITH recent AS (
+            SELECT run_id, action
+            FROM (SELECT run_id, action, ROW_NUMBER() OVER (PARTITION BY action ORDER BY started_at DESC, metric_id DESC) AS n
+                  FROM stage_metrics WHERE stage = 'total' AND (:action IS NULL OR action = :action))
+            WHERE n <= :runs
+        )
+        SELECT m.action, m.stage, COUNT(*) AS runs, AVG(m.seconds) AS avg_seconds, MAX(m.seconds) AS max_seconds,
+               AVG(m.rows_in) AS avg_rows_in, AVG(m.rows_out) AS avg_rows_out, MAX(m.peak_mb) AS max_peak_mb,
+               SUM(m.status = 'error') AS errors
+        FROM stage_metrics m JOIN recent r ON r.run_id = m.run_id
+        WHERE m.stage != 'total'
+        GROUP BY m.action, m.stage
+        ORDER BY avg_seconds DESC
+    """, conn, params={"runs": runs, "action": action})
+
+
+def run_trend(conn, runs: int = 20, action: str = None) -> pd.DataFrame:
+    """
+    Her action'ın son runs çalıştırmasının toplam süresi, satırları ve belleği, eskiden yeniye.
+    vs_median: o çalıştırmanın süresinin, action'ın bu çalıştırmalardaki medyan süresine oranı.
+    """
+    df = pd.read_sql_query("""
+        SELECT action, run_id, started_at, seconds, rows_in, rows_out, peak_mb, status
+        FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY action ORDER BY started_at DESC, metric_id DESC) AS n
+              FROM stage_metrics WHERE stage = 'total' AND (:action IS NULL OR action = :action))
+        WHERE n <= :runs
+        ORDER BY action, started_at, metric_id
+    """, conn, params={"runs": runs, "action": action})
+    df["vs_median"] = df["seconds"] / df.groupby("action")["seconds"].transform("median")
+    return df
+
+
+if __name__ == "__main__":
+    from src.db import get_database
+
+    parser = argparse.ArgumentParser(description="stage_metrics raporu: son çalıştırmalar ve en yavaş aşamalar.")
+    parser.add_argument("--runs", type=int, default=20, help="action başına bakılacak son çalıştırma sayısı")
+    parser.add_argument("--action", default=None, help="sadece bu action (fetch_prices, calc_ratios, ...)")
+    parser.add_argument("--top", type=int, default=15, help="gösterilecek en yavaş aşama sayısı")
+    args = parser.parse_args()
+
+    with pd.option_context("display.width", 200, "display.max_columns", 20, "display.float_format", "{:,.3f}".format):
+        with get_database().read() as conn:
+            trend = run_trend(conn, args.runs, args.action)
+            slowest = slowest_stages(conn, args.runs, args.action).head(args.top)
+        print("Son çalıştırmalar (vs_median: action'ın medyan süresine oran):")
+        print(trend.drop(columns=["run_id"]).to_string(index=False) if not trend.empty else "kayıt yok")
+        print()
+        print("En yavaş aşamalar:")
+        print(slowest.to_string(index=False) if not slowest.empty else "kayıt yok")
@@ -0,0 +1,197 @@
+# Aynı piyasa verisi üzerinde yüzlerce backtest'i paralel çalıştıran parametre taraması (sweep).
+#
+# - Fiyat ve faktör matrisleri SQLite'tan bir kez okunur ve geçici bir klasöre .npy olarak yazılır.
+#   Worker process'ler bunları np.load(mmap_mode="r") ile açar. Sayfalar işletim sisteminin önbelleğinden
+#   paylaşılır, her process veriyi ne veritabanından okur ne de kopyalar.
+#   (multiprocessing.shared_memory yerine dosya kullanıldı: Windows'ta da aynı şekilde çalışır ve
+#   worker'ların resource_tracker ile uğraşması gerekmez.)
+# - Parametre kombinasyonları ProcessPoolExecutor'a dağıtılır, biten her çalıştırmanın özeti sweep_result
+#   tablosuna yazılır (commit_every sonuçta bir commit).
+# - Her kombinasyonun run_id'si parametrelerinin hash'idir. Kesilen bir sweep tekrar çalıştırıldığında
+#   tabloda başarıyla bitmiş olan run_id'ler atlanır (resume).
+
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from src.backtest import backtest, top_n_weights
+from src.market_cache import cached_matrix
+from src.app_logger import AppLogger
+from src.db import get_database
+
+METRICS = ["total_return", "cagr", "volatility", "sharpe", "max_drawdown", "avg_turnover", "total_cost"]
+
+
+def load_market(conn, factors: list, start=None, end=None) -> dict:
+    """
+    close matrisini ve factors'taki ({"table": ..., "column": ...}) her faktörün matrisini okur.
+    Sonuç: {"close": DataFrame, "<column>": DataFrame, ...}, hepsi aynı gün x şirket şeklinde.
+    Matrisler src/market_cache'ten gelir, aynı process'te tekrar çağrıldığında veritabanı baştan okunmaz.
+    """
+    close = cached_matrix(conn, "price", "close", start=start, end=end, adjusted=True)
+    market = {"close": close}
+    for factor in factors:
+        market[factor["column"]] = cached_matrix(conn, factor["table"], factor["column"],
+                                                 company_ids=list(close.columns), index=close.index)
+    return market
+
+
+def parameter_grid(grid: dict) -> list:
+    """{"n": [10, 20], "rebalance_every": [1, 21]} -> her kombinasyon için bir parametre sözlüğü."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def run_id(params: dict) -> str:
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def factor_top_n(market: dict, params: dict):
+    """
+    Örnek strateji: her rebalance_every günde bir params["factor"] matrisine göre ilk n hisseye eşit ağırlık.
+    ascending True ise en düşük değerler seçilir (örn. F/K), positive_only True ise 0 ve altı değerler atlanır.
+    """
+    signal = market[params["factor"]]
+    if params.get("positive_only", False):
+        signal = signal.where(signal > 0)
+    weights = top_n_weights(signal, int(params["n"]), ascending=params.get("ascending", False))
+    return backtest(market["close"], weights, rebalance_every=int(params.get("rebalance_every", 1)),
+                    cost_bps=float(params.get("cost_bps", 10.0)))
+
+
+class SharedMarket:
+    """Piyasa matrislerini geçici bir klasöre .npy olarak yazar, worker'lar attach_market ile bellek eşlemeli açar."""
+
+    def __init__(self, market: dict, directory: str = None):
+        self.directory = tempfile.mkdtemp(prefix="sweep_", dir=directory)
+        close = market["close"]
+        self.descriptor = {"directory": self.directory, "index": close.index, "columns": close.columns,
+                           "names": list(market)}
+        for name, matrix in market.items():
+            np.save(os.path.join(self.directory, f"{name}.npy"), matrix.to_numpy(dtype=np.float64))
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def attach_market(descriptor: dict) -> dict:
+    """SharedMarket dosyalarını kopyalamadan, salt okunur DataFrame'ler olarak açar."""
+    market = {}
+    for name in descriptor["names"]:
+        values = np.load(os.path.join(descriptor["directory"], f"{name}.npy"), mmap_mode="r")
+        market[name] = pd.DataFrame(values, index=descriptor["index"], columns=descriptor["columns"], copy=False)
+    return market
+
+
+# worker process'in açtığı piyasa verisi ve strateji, _init_worker ile bir kez kurulur
+_MARKET = None
+_STRATEGY = None
+
+
+def _init_worker(descriptor: dict, strategy):
+    global _MARKET, _STRATEGY
+    _MARKET = attach_market(descriptor)
+    _STRATEGY = strategy
+
+
+def _init_worker_local(market: dict, strategy):
+    # workers=1 iken aynı process'te, dosyaya yazmadan çalışılır
+    global _MARKET, _STRATEGY
+    _MARKET = market
+    _STRATEGY = strategy
+
+
+def _run_one(params: dict) -> tuple:
+    # hata veren kombinasyon bütün sweep'i durdurmaz, hata mesajı sonuç olarak döner
+    try:
+        return params, _STRATEGY(_MARKET, params).summary(), None
+    except Exception as e:
+        return params, None, f"{type(e).__name__}: {e}"
+
+
+def _finished_runs(conn, sweep_name: str) -> set:
+    rows = conn.execute("SELECT run_id FROM sweep_result WHERE sweep_name = ? AND error IS NULL", [sweep_name])
+    return {row[0] for row in rows}
+
+
+def _write_result(conn, sweep_name: str, params: dict, summary: dict, error: str):
+    summary = summary or {}
+    columns = ["sweep_name", "run_id", "params"] + METRICS + ["error"]
+    values = [sweep_name, run_id(params), json.dumps(params, sort_keys=True, default=str)]
+    values += [summary.get(metric) for metric in METRICS] + [error]
+    updates = ", ".join(f"{col} = excluded.{col}" for col in columns[2:])
+    conn.execute(
+        f"INSERT INTO sweep_result ({', '.join(columns)}, finished_at) VALUES ({', '.join('?' for _ in columns)}, datetime('now')) "
+        f"ON CONFLICT(sweep_name, run_id) DO UPDATE SET {updates}, finished_at = excluded.finished_at",
+        values
+    )
+
+
+def run_sweep(conn, sweep_name: str, market: dict, grid, strategy=factor_top_n, workers: int = None,
+              commit_every: int = 20, logger: AppLogger = None) -> dict:
+    """
+    grid: parameter_grid'e verilecek sözlük ya da hazır parametre sözlükleri listesi.
+    strategy: (market, params) alıp BacktestResult döndüren, modül seviyesinde tanımlı bir fonksiyon.
+    workers: process sayısı (varsayılan: CPU sayısı), 1 ise her şey bu process'te çalışır.
+    Sonuç: {"done": biten, "failed": hata veren, "skipped": daha önce bitmiş olduğu için atlanan}
+    """
+    if logger is None:
+        with AppLogger(conn, "run_sweep") as logger:
+            return run_sweep(conn, sweep_name, market, grid, strategy, workers, commit_every, logger)
+
+    combinations = parameter_grid(grid) if isinstance(grid, dict) else list(grid)
+    finished = _finished_runs(conn, sweep_name)
+    pending = [params for params in combinations if run_id(params) not in finished]
+    counts = {"done": 0, "failed": 0, "skipped": len(combinations) - len(pending)}
+    if not pending:
+        logger.info(f"{sweep_name}: bütün kombinasyonlar daha önce bitmiş ({counts['skipped']}).")
+        return counts
+
+    workers = workers or os.cpu_count() or 1
+
+    def _collect(params, summary, error):
+        _write_result(conn, sweep_name, params, summary, error)
+        counts["failed" if error else "done"] += 1
+        if error:
+            logger.warn(f"{sweep_name}: {json.dumps(params, default=str)} hata verdi: {error}")
+        if (counts["done"] + counts["failed"]) % commit_every == 0:
+            conn.commit()
+
+    try:
+        if workers == 1:
+            _init_worker_local(market, strategy)
+            for params in pending:
+                _collect(*_run_one(params))
+        else:
+            with SharedMarket(market) as shared, ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_worker, initargs=(shared.descriptor, strategy)) as pool:
+                futures = [pool.submit(_run_one, params) for params in pending]
+                for future in as_completed(futures):
+                    _collect(*future.result())
+    finally:
+        conn.commit()
+
+    logger.info(f"{sweep_name}: {counts['done']} çalıştırma bitti, {counts['failed']} hata, {counts['skipped']} atlandı.")
+    return counts
+
+
+if __name__ == "__main__":
+    with get_database().write() as conn:
+        market = load_market(conn, [{"table": "multiple", "column": "pe"}], start="2015-01-01")
+        run_sweep(conn, "pe_top_n", market, {
+            "factor": ["pe"], "ascending": [True], "positive_only": [True],
+            "n": [5, 10, 20, 30], "rebalance_every": [5, 21, 63], "cost_bps": [10, 25],
+        })
@@ -0,0 +1,133 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+import sqlite3
+from unittest.mock import MagicMock
+
+import src.fetch_prices
+from src.adjustments import record_action, record_actions
+from src.backtest import load_matrix
+from src.db_writer import PRICE_KEYS, PRICE_VALUES, upsert_prices
+from src.fetch_prices import refetch_history
+from src.market_cache import cached_matrix, get_market_cache
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DATES = pd.bdate_range("2024-06-03", "2024-06-14")
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    for name in ["schema.sql", "indexes.sql", "triggers.sql"]:
+        with open(os.path.join(ROOT, "sql", name), encoding="utf-8") as f:
+            conn.executescript(f.read())
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "BIMAS.IS", "BIM"), (2, "THYAO.IS", "THY")])
+    # 1: 2024-06-10'da 2:1 bölünme (ham fiyat 100 -> 50), 2: aksiyon yok
+    conn.executemany("INSERT INTO price (company_id, date, close) VALUES (?, ?, ?)",
+                     [(1, d.strftime("%Y-%m-%d"), 100.0 if d < pd.Timestamp("2024-06-10") else 50.0) for d in DATES] +
+                     [(2, d.strftime("%Y-%m-%d"), 20.0) for d in DATES])
+    yield conn
+    conn.close()
+
+
+def _factors(conn) -> list:
+    return conn.execute("SELECT ex_date, kind, factor, cumulative FROM adjustment_factor ORDER BY ex_day").fetchall()
+
+
+def test_split_and_dividend_are_applied_at_read_time(db_conn):
+    """Bölünme ve temettünün price'a dokunmadan okuma anında uygulandığını test eder."""
+    raw = load_matrix(db_conn, "price", "close")
+    assert record_action(db_conn, 1, "2024-06-10", "split", 2.0)
+    assert record_action(db_conn, 1, "2024-06-13", "dividend", 5.0)  # önceki kapanış 50 -> factor 0.9
+    assert _factors(db_conn) == [("2024-06-10", "split", 0.5, 0.5), ("2024-06-13", "dividend", 0.9, pytest.approx(0.45))]
+
+    adjusted = load_matrix(db_conn, "price", "close", adjusted=True)
+    expected = raw.copy()
+    expected.loc[:"2024-06-07", 1] = 100.0 * 0.5 * 0.9
+    expected.loc["2024-06-10":"2024-06-12", 1] = 50.0 * 0.9
+    pd.testing.assert_frame_equal(adjusted, expected)
+    pd.testing.assert_frame_equal(load_matrix(db_conn, "price", "close"), raw)  # ham fiyatlar değişmedi
+
+    # aynı aksiyon tekrar yazılmaz
+    assert not record_action(db_conn, 1, "2024-06-10", "split", 2.0)
+    with pytest.raises(ValueError):
+        load_matrix(db_conn, "price", "volume", adjusted=True)
+
+
+def test_new_action_is_a_single_insert(db_conn):
+    """Sona eklenen aksiyonun tek satır olduğunu, geriye dönük eklenen aksiyonun sonrakileri düzelttiğini test eder."""
+    record_action(db_conn, 1, "2024-06-10", "split", 2.0)
+    changes = db_conn.total_changes
+    record_action(db_conn, 1, "2024-06-12", "other", factor=0.8)
+    # adjustment_factor'a tek insert + table_version triggerı
+    assert db_conn.total_changes - changes == 2
+    assert _factors(db_conn)[-1] == ("2024-06-12", "other", 0.8, pytest.approx(0.4))
+
+    record_action(db_conn, 1, "2024-06-05", "dividend", 10.0)  # önceki kapanış 100 -> factor 0.9
+    assert [row[3] for row in _factors(db_conn)] == pytest.approx([0.9, 0.45, 0.36])
+
+
+def test_record_actions_from_yfinance_columns(db_conn):
+    """yfinance'in Dividends / Stock Splits kolonlarındaki aksiyonların yazıldığını, hesaplanamayanların atlandığını test eder."""
+    df = pd.DataFrame({"company_id": [1, 2, 2], "date": pd.to_datetime(["2024-06-10", "2024-06-03", "2024-06-05"]),
+                       "dividends": [0.0, 1.0, 2.0], "stock splits": [2.0, 0.0, 0.0]})
+    # 2'nin 2024-06-03'ten önce fiyatı yok, temettü düzeltmesi hesaplanamaz
+    assert record_actions(db_conn, df) == 2
+    assert [(kind, factor) for _, kind, factor, _ in _factors(db_conn)] == [("dividend", 0.9), ("split", 0.5)]
+    assert record_actions(db_conn, pd.DataFrame({"company_id": [1], "date": ["2024-06-10"]})) == 0
+
+
+def test_cached_adjusted_matrix_only_remultiplies(db_conn):
+    """Yeni aksiyonda ham matrisin önbellekten geldiğini, sadece düzeltilmiş matrisin yeniden hesaplandığını test eder."""
+    cache = get_market_cache(db_conn)
+    first = cached_matrix(db_conn, "price", "close", adjusted=True)
+    pd.testing.assert_frame_equal(first, load_matrix(db_conn, "price", "close"))  # aksiyon yokken ham ile aynı
+    assert cached_matrix(db_conn, "price", "close", adjusted=True) is not None
+    assert cache.stats == {"hits": 2, "patches": 0, "loads": 2}  # ham + düzeltilmiş, ikinci çağrıda ikisi de bellekten
+
+    record_action(db_conn, 1, "2024-06-10", "split", 2.0)
+    adjusted = cached_matrix(db_conn, "price", "close", adjusted=True, company_ids=[1])
+    assert cache.stats == {"hits": 3, "patches": 0, "loads": 3}  # ham matris tekrar okunmadı
+    np.testing.assert_allclose(adjusted[1].to_numpy(), 50.0)
+    pd.testing.assert_frame_equal(adjusted, load_matrix(db_conn, "price", "close", company_ids=[1], adjusted=True))
+
+
+def test_adjusted_read_waits_for_refetch(db_conn, monkeypatch):
+    """Geçmişi düzeltilmiş fiyatlarla yazılmış şirketlerin ham fiyatlarla yeniden çekilene kadar düzeltilmediğini test eder."""
+    def prices(before_split: float) -> pd.DataFrame:
+        close = np.where(DATES < pd.Timestamp("2024-06-10"), before_split, 50.0)
+        df = pd.DataFrame({"company_id": 1, "date": DATES, "close": close, "stock splits": 0.0})
+        return df.reindex(columns=PRICE_KEYS + PRICE_VALUES + ["stock splits"])
+
+    # eski fetch'in yazdığı, sağlayıcının bölünmeye göre düzelttiği geçmiş; migration 7 şirketi işaretler
+    db_conn.execute("DELETE FROM price WHERE company_id = 1")
+    upsert_prices(db_conn, prices(50.0))
+    db_conn.execute("INSERT INTO price_refetch (company_id, first_day, flagged_at) SELECT company_id, MIN(day), '' FROM price "
+                    "WHERE company_id = 1 GROUP BY company_id")
+    record_action(db_conn, 1, "2024-06-10", "split", 2.0)
+    with pytest.raises(ValueError):
+        load_matrix(db_conn, "price", "close", adjusted=True)
+    with pytest.raises(ValueError):
+        cached_matrix(db_conn, "price", "close", adjusted=True)
+    load_matrix(db_conn, "price", "close", company_ids=[2], adjusted=True)  # işaretsiz şirket okunabilir
+
+    requests = []
+    def fake_fetch(conn, ticker_dict, start_date, end_date, *args):
+        requests.append((sorted(ticker_dict), start_date))
+        return prices(100.0)  # ham fiyatlar
+    monkeypatch.setattr(src.fetch_prices, "fetch_prices", fake_fetch)
+
+    counts = refetch_history(db_conn, {"BIMAS.IS": 1, "THYAO.IS": 2}, "2024-06-15", logger=MagicMock())
+    assert requests == [(["BIMAS.IS"], "2024-06-03")]
+    assert counts == {"inserted": 0, "updated": 5, "unchanged": 5}  # bölünmeden önceki günler ham fiyatla yazıldı
+    assert db_conn.execute("SELECT COUNT(*) FROM price_refetch").fetchone()[0] == 0
+    np.testing.assert_allclose(load_matrix(db_conn, "price", "close", adjusted=True)[1].to_numpy(), 50.0)
@@ -0,0 +1,74 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+
+from src.alignment import align_fundamentals
+
+
+@pytest.fixture
+def fin_df():
+    # iki şirket için 2023/12 - 2024/12 arası çeyrekler, date_of_publish boş
+    periods = [(2023, 12), (2024, 3), (2024, 6), (2024, 9), (2024, 12)]
+    return pd.DataFrame({
+        "company_id": [1] * 5 + [2] * 5,
+        "period_year": [str(y) for y, _ in periods] * 2,
+        "period_month": [str(m) for _, m in periods] * 2,
+        "date_of_publish": pd.Series([None] * 10, dtype=object),
+    })
+
+
+def _legacy_periods(price_df):
+    # ADR 11'deki sabit 45 günlük kural
+    effective = (price_df["date"] - pd.Timedelta(days=45)) + pd.offsets.QuarterEnd(-1)
+    return effective.dt.year * 100 + effective.dt.month
+
+
+def test_fallback_matches_45_day_rule_on_unsorted_prices(fin_df):
+    """
+    date_of_publish boşken sonuçların eski 45 günlük kuralla aynı olduğunu ve
+    fiyatlar şirkete göre sıralı olmasa da doğru çalıştığını test eder.
+    """
+    dates = pd.date_range("2024-05-10", "2025-03-31", freq="D")
+    price_df = pd.DataFrame({
+        "company_id": np.repeat([2, 1], len(dates)),
+        "date": np.tile(dates, 2),
+    }).sample(frac=1, random_state=0).reset_index(drop=True)
+
+    fin_idx = align_fundamentals(price_df, fin_df)
+
+    assert (fin_idx >= 0).all()
+    matched = fin_df.iloc[fin_idx].reset_index(drop=True)
+    assert (matched["company_id"].to_numpy() == price_df["company_id"].to_numpy()).all()
+
+    matched_periods = matched["period_year"].astype(int) * 100 + matched["period_month"].astype(int)
+    assert (matched_periods.to_numpy() == _legacy_periods(price_df).to_numpy()).all()
+
+
+def test_publish_date_is_used_when_available(fin_df):
+    """date_of_publish varsa 45 gün beklenmeden ertesi günden itibaren kullanıldığını test eder."""
+    fin_df.loc[(fin_df["company_id"] == 1) & (fin_df["period_month"] == "3"), "date_of_publish"] = "2024-04-20"
+
+    price_df = pd.DataFrame({
+        "company_id": [1, 1, 2],
+        "date": pd.to_datetime(["2024-04-20", "2024-04-21", "2024-04-21"]),
+    })
+    matched = fin_df.iloc[align_fundamentals(price_df, fin_df)]
+
+    assert matched["period_month"].tolist() == ["12", "3", "12"]
+
+
+def test_no_match_before_first_report(fin_df):
+    """İlk rapor açıklanmadan önceki ve finansali olmayan şirketlerin fiyatları -1 almalı."""
+    price_df = pd.DataFrame({
+        "company_id": [1, 3],
+        "date": pd.to_datetime(["2024-01-05", "2024-09-01"]),
+    })
+
+    assert align_fundamentals(price_df, fin_df).tolist() == [-1, -1]
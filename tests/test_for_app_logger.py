@@ -0,0 +1,102 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import sqlite3
+
+from src.app_logger import AppLogger
+from src.db import transaction
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS app_logs (
+            log_id     INTEGER PRIMARY KEY,
+            ts         TEXT    DEFAULT (datetime('now')),
+            action     TEXT,
+            level      TEXT,
+            message    TEXT
+            )"""
+        )
+    yield conn
+    conn.close()
+
+
+def test_repeated_warnings_are_summarized(db_conn):
+    """Aynı şirket için tekrar eden uyarıların tek bir özet satırına dönüştüğünü test eder."""
+    with AppLogger(db_conn, "fetch_prices", echo=False) as logger:
+        for day in ["2020-01-03", "2020-01-02", "2021-03-04"]:
+            logger.repeated("WARN", "satır zaten bulunuyor", 5, day)
+        logger.repeated("WARN", "satır zaten bulunuyor", 5, "2020-06-01", "2020-06-30", count=309)
+        logger.repeated("WARN", "satır zaten bulunuyor", 6, "2020-01-02")
+
+    rows = db_conn.execute("SELECT action, level, message FROM app_logs ORDER BY message").fetchall()
+    assert rows == [
+        ("fetch_prices", "WARN", "company_id 5 için 312 satır zaten bulunuyor, 2020-01-02..2021-03-04"),
+        ("fetch_prices", "WARN", "company_id 6 için 1 satır zaten bulunuyor, 2020-01-02"),
+    ]
+
+
+def test_events_are_flushed_in_batches(db_conn):
+    """batch_size kadar olay birikmeden app_logs'a yazılmadığını test eder."""
+    logger = AppLogger(db_conn, "calc_ratios", batch_size=3, echo=False)
+
+    logger.info("1")
+    logger.info("2")
+    assert db_conn.execute("SELECT COUNT(*) FROM app_logs").fetchone()[0] == 0
+
+    logger.info("3")
+    assert db_conn.execute("SELECT COUNT(*) FROM app_logs").fetchone()[0] == 3
+
+
+def test_events_below_level_are_dropped(db_conn):
+    """Ayarlanan seviyenin altındaki olayların yazılmadığını test eder."""
+    with AppLogger(db_conn, "fetch_fin", level="WARN", echo=False) as logger:
+        logger.info("bilgi")
+        logger.repeated("INFO", "dönem zaten bulunuyor", 1, "2024/03")
+        logger.error("hata")
+
+    assert db_conn.execute("SELECT level, message FROM app_logs").fetchall() == [("ERROR", "hata")]
+
+
+def test_flush_does_not_commit_the_callers_transaction(db_conn):
+    """Açık bir transaction içindeki flush'ın çağıranın yazdıklarını commit etmediğini test eder."""
+    db_conn.execute("CREATE TABLE item (value INTEGER)")
+    logger = AppLogger(db_conn, "fetch_prices", batch_size=1, echo=False)
+    try:
+        with db_conn:
+            db_conn.execute("INSERT INTO item VALUES (1)")
+            logger.info("yarım kalan yazma")  # batch_size dolduğu için hemen yazılır
+            assert db_conn.in_transaction
+            raise ValueError("yazma yarıda kaldı")
+    except ValueError:
+        pass
+    assert db_conn.execute("SELECT COUNT(*) FROM item").fetchone()[0] == 0
+
+    # açık transaction yoksa kendi transaction'ında yazılıp commit edilir
+    logger.info("yeni")
+    assert not db_conn.in_transaction
+    assert db_conn.execute("SELECT message FROM app_logs").fetchall() == [("yeni",)]
+
+
+def test_nested_transactions_commit_once(db_conn):
+    """Yeni açılan transaction içindeki iç blokların commit etmediğini, dıştaki hata verince hepsinin geri alındığını test eder."""
+    db_conn.execute("CREATE TABLE item (value INTEGER)")
+    with pytest.raises(ValueError):
+        with transaction(db_conn):
+            with transaction(db_conn):  # dıştaki blok henüz yazmadı
+                db_conn.execute("INSERT INTO item VALUES (1)")
+            raise ValueError("yazma yarıda kaldı")
+    assert not db_conn.in_transaction
+    assert db_conn.execute("SELECT COUNT(*) FROM item").fetchone()[0] == 0
+
+    with transaction(db_conn):
+        with transaction(db_conn):
+            db_conn.execute("INSERT INTO item VALUES (1)")
+    assert db_conn.execute("SELECT COUNT(*) FROM item").fetchone()[0] == 1
@@ -0,0 +1,115 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import sqlite3
+
+from src.change_feed import advance, changed_days, changed_periods, consumer_lag, read_changes, trim
+from src.calc_multiples import update_multiples
+from src.compact_keys import encode_day
+from src.db_writer import PRICE_KEYS, PRICE_VALUES, upsert_prices
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    for name in ["schema.sql", "indexes.sql", "triggers.sql"]:
+        with open(os.path.join(ROOT, "sql", name), encoding="utf-8") as f:
+            conn.executescript(f.read())
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "BIMAS.IS", "BIM"), (2, "THYAO.IS", "THY")])
+    yield conn
+    conn.close()
+
+
+def _log(conn) -> list:
+    return conn.execute("SELECT table_name, company_id, row_key, op FROM change_log ORDER BY seq").fetchall()
+
+
+def _day(date: str) -> int:
+    return int(encode_day([date])[0])
+
+
+def test_triggers_log_each_change_once(db_conn):
+    """Insert / update / delete'lerin anahtarlarıyla bir kez yazıldığını, anahtar doldurmanın yazılmadığını test eder."""
+    db_conn.execute("INSERT INTO price (company_id, date, close) VALUES (1, '2024-05-14 00:00:00', 10.0)")
+    db_conn.execute("INSERT INTO financial (company_id, period_year, period_month) VALUES (2, '2024', '3')")
+    assert db_conn.execute("SELECT day FROM price").fetchone()[0] == _day("2024-05-14")  # trigger doldurdu
+    assert _log(db_conn) == [("price", 1, _day("2024-05-14"), "I"), ("financial", 2, 202401, "I")]
+
+    db_conn.execute("DELETE FROM change_log")
+    db_conn.execute("UPDATE price SET close = 11.0")
+    db_conn.execute("UPDATE price SET date = '2024-05-15 00:00:00'")  # eski anahtar silinmiş sayılır
+    db_conn.execute("UPDATE financial SET period_month = '6'")
+    db_conn.execute("DELETE FROM financial")
+    assert sorted(_log(db_conn)) == sorted([
+        ("price", 1, _day("2024-05-14"), "U"),
+        ("price", 1, _day("2024-05-15"), "U"), ("price", 1, _day("2024-05-14"), "D"),
+        ("financial", 2, 202402, "U"), ("financial", 2, 202401, "D"),
+        ("financial", 2, 202402, "D"),
+    ])
+
+
+def test_consumer_reads_after_its_cursor(db_conn):
+    """Cursor'ı olmayan okuyucuya None, sonrasında sadece cursor'dan sonraki son değişikliklerin döndüğünü test eder."""
+    db_conn.execute("INSERT INTO financial (company_id, period_year, period_month) VALUES (1, '2023', '12')")
+    changes, seq = read_changes(db_conn, "calc_ratios", "financial")
+    assert changes is None  # ilk okuma: tamamı hesaplanmalı
+    advance(db_conn, "calc_ratios", "financial", seq)
+
+    db_conn.execute("INSERT INTO financial (company_id, period_year, period_month) VALUES (1, '2024', '3')")
+    db_conn.execute("UPDATE financial SET revenue_ttm = 1.0 WHERE period_year = '2024'")
+    db_conn.execute("INSERT INTO price (company_id, date, close) VALUES (1, '2024-05-14', 10.0)")
+    changes, seq = read_changes(db_conn, "calc_ratios", "financial")
+    assert changes.values.tolist() == [[1, 202401, "U"]]  # aynı anahtarın son değişikliği
+    assert changed_periods(changes) == [(1, "2024", "3")]
+
+    # advance edilmeden tekrar okunursa aynı değişiklikler döner
+    assert read_changes(db_conn, "calc_ratios", "financial")[0].values.tolist() == [[1, 202401, "U"]]
+    advance(db_conn, "calc_ratios", "financial", seq)
+    changes, _ = read_changes(db_conn, "calc_ratios", "financial")
+    assert changes.empty
+
+
+def test_trim_keeps_unread_rows(db_conn):
+    """trim'in sadece bütün okuyucuların okuduğu satırları sildiğini, geride kalan okuyucuyu max_lag ile düşürdüğünü test eder."""
+    for consumer in ["calc_multiples", "export"]:
+        advance(db_conn, consumer, "price", read_changes(db_conn, consumer, "price")[1])
+    db_conn.executemany("INSERT INTO price (company_id, date, close) VALUES (?, ?, ?)",
+                        [(1, f"2024-05-{d:02d}", 10.0) for d in range(13, 18)])
+    advance(db_conn, "calc_multiples", "price", read_changes(db_conn, "calc_multiples", "price")[1])
+
+    assert trim(db_conn) == 0  # export henüz okumadı
+    lag = consumer_lag(db_conn).set_index("consumer")
+    assert lag.loc["export", "pending"] == 5 and lag.loc["calc_multiples", "pending"] == 0
+
+    assert trim(db_conn, max_lag=3) == 5
+    assert read_changes(db_conn, "export", "price")[0] is None  # cursor'ı düşürülen okuyucu tamamını hesaplar
+    assert db_conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0
+
+
+def test_updated_prices_recompute_from_first_changed_day(db_conn):
+    """Güncellenen bir fiyatın, multiple tablosunun tamamı yerine sadece o günden itibaren hesaplandığını test eder."""
+    dates = pd.bdate_range("2024-05-13", periods=5)
+    df = pd.DataFrame({"company_id": [c for c in (1, 2) for _ in dates], "date": list(dates) * 2,
+                       "close": 10.0, "market_cap": 1e10})
+    upsert_prices(db_conn, df.reindex(columns=PRICE_KEYS + PRICE_VALUES))
+    db_conn.executemany("INSERT INTO financial (company_id, period_year, period_month, date_of_publish, net_income_ttm, "
+                        "equity) VALUES (?, '2023', '12', '2024-03-01', 1e9, 1e9)", [(1,), (2,)])
+    update_multiples(db_conn)
+    advance(db_conn, "calc_multiples", "price", read_changes(db_conn, "calc_multiples", "price")[1])
+
+    db_conn.execute("UPDATE price SET market_cap = 2e10 WHERE company_id = 2 AND day >= ?", [_day("2024-05-16")])
+    changes, _ = read_changes(db_conn, "calc_multiples", "price")
+    assert changed_days(changes) == {2: _day("2024-05-16")}
+
+    counts = update_multiples(db_conn, changed_price_days=changed_days(changes))
+    # 2'nin 16 ve 17'si değişir, 1'in sadece (her zaman tekrar hesaplanan) son günü okunur
+    assert counts == {"inserted": 0, "updated": 2, "unchanged": 1}
@@ -0,0 +1,119 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+import sqlite3
+
+pytest.importorskip("pyarrow")
+
+from src.columnar_store import sync_columnar, sync_table, load_columnar
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    with open(os.path.join(ROOT, "sql", "schema.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())
+    with open(os.path.join(ROOT, "sql", "triggers.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())  # doğrudan eklenen satırların gün / dönem anahtarları triggerlarla dolar
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "BIMAS.IS", "BIM"), (2, "THYAO.IS", "THY")])
+
+    dates = pd.bdate_range("2023-11-01", "2024-02-29")
+    pd.DataFrame({
+        "company_id": np.repeat([1, 2], len(dates)),
+        "date": np.tile(dates, 2),
+        "open": 10.0, "close": np.linspace(10, 20, 2 * len(dates)), "high": 21.0, "low": 9.0,
+        "volume": 1000, "market_cap": 1e9,
+    }).to_sql("price", conn, if_exists="append", index=False)
+
+    pd.DataFrame({
+        "company_id": [1, 1, 2], "date_of_price": ["2023-12-29 00:00:00", "2024-01-02 00:00:00", "2024-01-02 00:00:00"],
+        "period_year": ["2023", "2023", "2023"], "period_month": ["9", "9", "9"], "pe": [10.5, 11.25, 7.0],
+    }).to_sql("multiple", conn, if_exists="append", index=False)
+
+    conn.execute("CREATE TABLE IF NOT EXISTS app_logs (log_id INTEGER PRIMARY KEY, ts TEXT, action TEXT, level TEXT, message TEXT)")
+    yield conn
+    conn.close()
+
+
+def test_sync_and_load_round_trip(db_conn, tmp_path):
+    """Partition'ların yıl ve şirket bazında yazıldığını ve okunan verinin kaynakla aynı olduğunu test eder."""
+    results = sync_columnar(db_conn, tables=["price", "multiple"], path=str(tmp_path))
+
+    assert results["price"] == {"written": 4, "deleted": 0, "unchanged": 0}
+    assert os.path.exists(tmp_path / "price" / "year=2024" / "company_id=2" / "part-0.parquet")
+
+    price = load_columnar("price", columns=["company_id", "date", "close"], path=str(tmp_path))
+    expected = pd.read_sql_query("SELECT company_id, date, close FROM price", db_conn)
+    price = price.sort_values(["company_id", "date"]).reset_index(drop=True)
+    assert len(price) == len(expected)
+    assert np.allclose(price["close"], expected["close"])
+    assert isinstance(price["company_id"].dtype, pd.CategoricalDtype)  # dictionary kodlu
+
+    multiple = load_columnar("multiple", path=str(tmp_path))
+    assert multiple["pe"].dtype == np.float32
+    assert sorted(multiple["pe"].tolist()) == [7.0, 10.5, 11.25]
+
+
+def test_only_changed_partitions_are_rewritten(db_conn, tmp_path):
+    """Sadece satırı değişen partition'ın yeniden yazıldığını, kaynakta kalmayan partition'ın silindiğini test eder."""
+    sync_table(db_conn, "price", path=str(tmp_path))
+
+    db_conn.execute("UPDATE price SET close = 99 WHERE company_id = 1 AND date = '2024-01-02 00:00:00'")
+    db_conn.execute("DELETE FROM price WHERE company_id = 2 AND date < '2024-01-01'")
+
+    assert sync_table(db_conn, "price", path=str(tmp_path)) == {"written": 1, "deleted": 1, "unchanged": 2}
+    assert not os.path.exists(tmp_path / "price" / "year=2023" / "company_id=2")
+
+    price = load_columnar("price", columns=["company_id", "date", "close"], company_ids=[1],
+                          start="2024-01-02", end="2024-01-02", path=str(tmp_path))
+    assert price["close"].tolist() == [99.0]
+
+
+def test_filters_prune_partitions(db_conn, tmp_path):
+    """Şirket ve tarih filtrelerinin uygulandığını test eder."""
+    sync_table(db_conn, "price", path=str(tmp_path))
+
+    price = load_columnar("price", columns=["company_id", "date"], company_ids=[2], start="2024-02-01", path=str(tmp_path))
+
+    assert set(price["company_id"].astype(int)) == {2}
+    assert pd.to_datetime(price["date"]).min() == pd.Timestamp("2024-02-01")
+    assert len(price) == len(pd.bdate_range("2024-02-01", "2024-02-29"))
+
+
+def test_change_with_same_totals_is_rewritten(db_conn, tmp_path):
+    """Toplamları değiştirmeyen bir düzeltmenin (aynı partition'da iki kapanışın yer değiştirmesi) de yazıldığını test eder."""
+    sync_table(db_conn, "price", path=str(tmp_path))
+
+    db_conn.execute("UPDATE price SET close = 1 WHERE company_id = 1 AND date = '2024-01-02 00:00:00'")
+    db_conn.execute("UPDATE price SET close = 2 WHERE company_id = 1 AND date = '2024-01-03 00:00:00'")
+    assert sync_table(db_conn, "price", path=str(tmp_path)) == {"written": 1, "deleted": 0, "unchanged": 3}
+
+    db_conn.execute("UPDATE price SET close = 3 - close WHERE company_id = 1 AND date IN ('2024-01-02 00:00:00', '2024-01-03 00:00:00')")
+    assert sync_table(db_conn, "price", path=str(tmp_path)) == {"written": 1, "deleted": 0, "unchanged": 3}
+
+    price = load_columnar("price", columns=["date", "close"], company_ids=[1], start="2024-01-02", end="2024-01-03",
+                          path=str(tmp_path)).sort_values("date")
+    assert price["close"].tolist() == [2.0, 1.0]
+    assert sync_table(db_conn, "price", path=str(tmp_path)) == {"written": 0, "deleted": 0, "unchanged": 4}
+
+
+def test_derived_tables_are_synced_from_the_change_feed(db_conn, tmp_path):
+    """multiple'ın değişikliklerinin sadece kopyanın cursor'ı oluştuktan sonra change_log'a yazıldığını test eder."""
+    db_conn.execute("UPDATE multiple SET pe = 1 WHERE company_id = 2")
+    assert db_conn.execute("SELECT COUNT(*) FROM change_log WHERE table_name = 'multiple'").fetchone()[0] == 0
+
+    assert sync_table(db_conn, "multiple", path=str(tmp_path)) == {"written": 3, "deleted": 0, "unchanged": 0}
+
+    db_conn.execute("DELETE FROM multiple WHERE company_id = 1 AND date_of_price LIKE '2023-%'")
+    assert sync_table(db_conn, "multiple", path=str(tmp_path)) == {"written": 0, "deleted": 1, "unchanged": 2}
+    assert sorted(load_columnar("multiple", path=str(tmp_path))["pe"].tolist()) == [1.0, 11.25]
@@ -0,0 +1,105 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import sqlite3
+import threading
+
+from src.db import Database, connect, db_path
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def database(tmp_path):
+    db = Database(str(tmp_path / "test.db"), read_pool_size=2)
+    with db.write() as conn:
+        with open(os.path.join(ROOT, "sql", "schema.sql"), encoding="utf-8") as f:
+            conn.executescript(f.read())
+        conn.execute("INSERT INTO company (company_id, ticker, company_name) VALUES (1, 'T1.IS', 'T1')")
+    yield db
+    db.close()
+
+
+def test_relative_path_is_resolved_from_project_root():
+    """Ayarlardaki göreli yolun proje köküne göre çözüldüğünü test eder."""
+    assert db_path("data/x.db") == os.path.join(ROOT, "data", "x.db")
+    assert db_path(":memory:") == ":memory:"
+
+
+def test_pragmas_are_applied(database):
+    """Yazma ve okuma bağlantılarına PRAGMA'ların uygulandığını, okuma bağlantısının yazamadığını test eder."""
+    with database.write() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] < 0
+
+    with database.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM company").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM company")
+
+
+def test_write_commits_or_rolls_back(database):
+    """Hatasız biten yazma bloğunun commit, hata veren bloğun rollback edildiğini test eder."""
+    with pytest.raises(RuntimeError):
+        with database.write() as conn:
+            conn.execute("INSERT INTO company (company_id, ticker, company_name) VALUES (2, 'T2.IS', 'T2')")
+            raise RuntimeError("hata")
+
+    with database.write() as conn:
+        conn.execute("INSERT INTO company (company_id, ticker, company_name) VALUES (3, 'T3.IS', 'T3')")
+
+    with database.read() as conn:
+        assert [row[0] for row in conn.execute("SELECT company_id FROM company ORDER BY company_id")] == [1, 3]
+
+
+def test_read_pool_is_bounded_and_reused(database):
+    """Okuma havuzunun read_pool_size'dan fazla bağlantı açmadığını ve bağlantıları tekrar kullandığını test eder."""
+    seen = set()
+    barrier = threading.Barrier(4)
+
+    def _reader():
+        barrier.wait()
+        for _ in range(5):
+            with database.read() as conn:
+                seen.add(id(conn))
+                conn.execute("SELECT COUNT(*) FROM company").fetchone()
+
+    threads = [threading.Thread(target=_reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(seen) <= 2
+
+
+def test_queries_are_timed(database):
+    """conn.execute ve pandas okumalarının sorgu istatistiklerine yazıldığını test eder."""
+    with database.read() as conn:
+        for _ in range(3):
+            conn.execute("SELECT  COUNT(*)\n FROM company").fetchone()
+        pd.read_sql_query("SELECT ticker FROM company WHERE company_id = ?", conn, params=[1])
+
+    stats = database.query_stats().set_index("sql")
+    assert stats.loc["SELECT COUNT(*) FROM company", "count"] == 3
+    assert stats.loc["SELECT ticker FROM company WHERE company_id = ?", "count"] == 1
+    assert (stats["total_seconds"] >= 0).all()
+
+
+def test_connect_to_memory():
+    """Testlerde kullanılan bellekteki veritabanının da aynı bağlantı sınıfıyla açılabildiğini test eder."""
+    conn = connect(":memory:")
+    conn.execute("CREATE TABLE t (a)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(1,), (2,)])
+    assert conn.execute("SELECT SUM(a) FROM t").fetchone()[0] == 3
+    assert conn.query_stats.to_frame()["sql"].str.startswith("INSERT").any()
+    conn.close()
@@ -0,0 +1,45 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import sqlite3
+
+from src.db_reader import iter_company_chunks
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    conn.execute("CREATE TABLE price (company_id INTEGER, date TEXT, close REAL, volume REAL)")
+    pd.DataFrame({
+        "company_id": [1, 1, 2, 3, 3, 3],
+        "date": ["2024-01-01", "2024-01-02", "2024-01-01", "2024-01-01", "2024-01-02", "2024-01-03"],
+        "close": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        "volume": 100.0,
+    }).to_sql("price", conn, if_exists="append", index=False)
+    yield conn
+    conn.close()
+
+
+def test_chunks_keep_companies_together(db_conn):
+    """Her grubun sadece istenen kolonları içerdiğini ve bir şirketin tek grupta geldiğini test eder."""
+    chunks = list(iter_company_chunks(db_conn, "price", ["company_id", "close"], chunk_size=2))
+
+    assert len(chunks) == 2
+    assert all(list(chunk.columns) == ["company_id", "close"] for chunk in chunks)
+    assert sorted(chunks[0]["company_id"].unique()) == [1, 2]
+    assert list(chunks[1]["close"]) == [4.0, 5.0, 6.0]
+
+
+def test_lower_bounds_limit_rows(db_conn):
+    """lower_bounds verildiğinde sadece o şirketlerin sınırdan sonraki satırlarının okunduğunu test eder."""
+    chunks = list(iter_company_chunks(db_conn, "price", ["company_id", "date"], chunk_size=10,
+                                      lower_bounds={1: "2024-01-02", 3: "2024-01-03"}, bound_expr="t.date"))
+
+    assert len(chunks) == 1
+    assert chunks[0].values.tolist() == [[1, "2024-01-02"], [3, "2024-01-03"]]
@@ -0,0 +1,104 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import pandas as pd
+
+from src.fetch_executor import FetchExecutor, RateLimiter
+
+
+def test_partial_success_reports_failed_tickers():
+    """
+    Bir parça hata verdiğinde diğer parçaların sonuçlarının kaybolmadığını ve
+    hata veren parçadaki tickerların raporlandığını test eder.
+    """
+    def fetch_fn(shard):
+        if "THYAO.IS" in shard:
+            raise ConnectionError("İnternet bağlantısı yok!")
+        return pd.DataFrame({"ticker": shard})
+
+    executor = FetchExecutor(max_workers=2, shard_size=1, retries=1, backoff=0)
+    results = executor.run({"yf": (fetch_fn, ["BIMAS.IS", "THYAO.IS", "HTTBT.IS"])})
+
+    result = results["yf"]
+    assert not result.ok
+    assert result.failed == ["THYAO.IS"]
+    assert "THYAO.IS" in result.errors
+    assert sorted(pd.concat(result.frames)["ticker"]) == ["BIMAS.IS", "HTTBT.IS"]
+
+
+def test_retry_recovers_from_transient_error():
+    """İlk denemede hata veren bir parçanın tekrar denemede başarılı olduğunu test eder."""
+    calls = []
+
+    def fetch_fn(shard):
+        calls.append(shard)
+        if len(calls) == 1:
+            raise TimeoutError("Zaman aşımı")
+        return pd.DataFrame({"ticker": shard})
+
+    executor = FetchExecutor(max_workers=1, shard_size=10, retries=2, backoff=0)
+    results = executor.run({"is": (fetch_fn, ["BIMAS.IS"])})
+
+    assert results["is"].ok
+    assert len(calls) == 2
+
+
+def test_shards_run_in_parallel():
+    """Parçaların max_workers kadar thread'de aynı anda çalıştığını test eder."""
+    # dört parça da aynı anda çalışmıyorsa bariyer zaman aşımına uğrar ve parçalar hata verir
+    barrier = threading.Barrier(4)
+
+    def fetch_fn(shard):
+        barrier.wait(timeout=5)
+        return pd.DataFrame({"ticker": shard})
+
+    tickers = [f"TICK{i}.IS" for i in range(40)]
+    executor = FetchExecutor(max_workers=4, shard_size=10, backoff=0, retries=0)
+    results = executor.run({"yf": (fetch_fn, tickers)})
+
+    assert results["yf"].ok
+    assert len(pd.concat(results["yf"].frames)) == 40
+
+
+def test_missing_tickers_are_retried_and_reported():
+    """Hata vermeden verisi dönmeyen tickerların tekrar istendiğini, yine dönmezse raporlandığını test eder."""
+    calls = []
+    sleeps = []
+
+    def fetch_fn(shard):
+        calls.append(shard)
+        # THYAO hiç dönmez, HTTBT ilk denemede döner
+        return pd.DataFrame({"ticker": [t for t in shard if t != "THYAO.IS" and (t != "HTTBT.IS" or len(calls) > 1)]})
+
+    executor = FetchExecutor(max_workers=1, shard_size=10, retries=2, backoff=0.5, sleep=sleeps.append)
+    results = executor.run({"yf": (fetch_fn, ["BIMAS.IS", "THYAO.IS", "HTTBT.IS"], lambda df: df["ticker"])})
+
+    result = results["yf"]
+    assert calls == [["BIMAS.IS", "THYAO.IS", "HTTBT.IS"], ["THYAO.IS", "HTTBT.IS"], ["THYAO.IS"]]
+    assert sleeps == [0.5, 1.0]
+    assert result.failed == ["THYAO.IS"] and result.errors["THYAO.IS"] == "veri dönmedi"
+    assert sorted(pd.concat(result.frames)["ticker"]) == ["BIMAS.IS", "HTTBT.IS"]
+
+
+def test_rate_limiter_spaces_calls():
+    """Hız sınırının istekler arasında 1 / calls_per_second bekleme eklediğini sahte saatle test eder."""
+    now = [100.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(2.0, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        limiter.wait()
+    assert sleeps == [0.5, 0.5]
+
+    now[0] += 10  # uzun bir aradan sonra beklemeden çalışır
+    limiter.wait()
+    assert sleeps == [0.5, 0.5]
@@ -12,7 +12,10 @@ import sqlite3
 from datetime import datetime
 from unittest.mock import patch, MagicMock
 
-from src.fetch_financials import fetch_fin
+from src.fetch_financials import fetch_fin, fetch_new_fin, probe_new_reports
+from benchmarks.synthetic import is_fin_frame
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
 @pytest.fixture
 def db_conn():
@@ -57,6 +60,15 @@ def db_conn():
             UNIQUE (company_id, period_year,period_month)           
         )"""
         )
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS app_logs (
+            log_id     INTEGER PRIMARY KEY,
+            ts         TEXT    DEFAULT (datetime('now')),
+            action     TEXT,
+            level      TEXT,
+            message    TEXT
+            )"""
+        )
     yield conn
     conn.close()
 
@@ -200,22 +212,156 @@ def test_fetch_prices_handles_existing_data(mock_fetch_financials,mock_is_data,
     # Hem 2023 hem de 2024 THYAO ve BIMAS verilerini içeren bir df
 
     mock_fetch_financials.return_value = mock_is_data_to_f
-    yeni_eklenecekler_df = fetch_fin(conn=db_conn,ticker_dict={"BIMAS.IS": 1, "THYAO.IS": 2},start_year=2023,end_year=2024)
+    counts = fetch_fin(conn=db_conn,ticker_dict={"BIMAS.IS": 1, "THYAO.IS": 2},start_year=2023,end_year=2024)
 
-    yeni_eklenecekler_df.to_sql('financial', db_conn, if_exists='append', index=False)
+    # 2023 dönemleri yeni eklenmeli, 2024 dönemleri zaten bulunuyor
+    assert counts["inserted"] == 8
+    assert counts["updated"] + counts["unchanged"] == 8
+
+    final_df = pd.read_sql_query("SELECT * FROM financial ORDER BY period_year,period_month", db_conn)
+    assert final_df.shape[0] == 16
+    assert sorted(final_df['period_year'].astype(int).unique()) == [2023, 2024]
 
-    assert not yeni_eklenecekler_df.empty
 
-    assert list(yeni_eklenecekler_df['period_year'].unique()) == [2023]
+def test_quarterly_derivation_handles_gaps():
+    """
+    Çeyreklik ve TTM hesaplarını test eder: ardışık dönemlerde _q kümülatif farkı, _ttm son 4 çeyreğin
+    toplamıdır. Eksik çeyrekten sonra yan yana olmayan satırlar toplanmaz, NaN döner.
+    """
+    from src.fetch_financials import _derive_quarterly
 
-    assert yeni_eklenecekler_df.shape[0] == 8
+    periods = [(2023, 3), (2023, 6), (2023, 9), (2023, 12), (2024, 3), (2024, 9), (2024, 12), (2025, 3)]
+    df = pd.DataFrame({
+        "company_id": [1] * len(periods) + [2, 2],
+        "period_year": [y for y, _ in periods] + [2024, 2024],
+        "period_month": [m for _, m in periods] + [3, 6],
+        "revenue_c": [10.0, 30.0, 60.0, 100.0, 20.0, 90.0, 130.0, 50.0, 5.0, 12.0],
+    })
 
-    final_df = pd.read_sql_query("SELECT * FROM financial ORDER BY period_year,period_month", db_conn)
-    assert final_df.shape[0] == 16
+    result = _derive_quarterly(df, ["revenue"])
+
+    expected_q = [10, 20, 30, 40, 20, np.nan, 40, 50, 5, 7]  # 2024/6 eksik, 2024/9 hesaplanamaz
+    expected_ttm = [np.nan, np.nan, np.nan, 100, 110, np.nan, np.nan, np.nan, np.nan, np.nan]
+    assert np.allclose(result["revenue_q"], expected_q, equal_nan=True)
+    assert np.allclose(result["revenue_ttm"], expected_ttm, equal_nan=True)
+
+
+@pytest.fixture
+def schema_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    for name in ["schema.sql", "triggers.sql"]:
+        with open(os.path.join(ROOT, "sql", name), encoding="utf-8") as f:
+            conn.executescript(f.read())
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "AAA.IS", "A"), (2, "BBB.IS", "B"), (3, "CCC.IS", "C"), (4, "DDD.IS", "D")])
+    # 1 ve 2'nin son dönemi 2026/3, 3'ün 2026/6, 4'ün hiç dönemi yok
+    conn.executemany("INSERT INTO financial (company_id, period_year, period_month, revenue_ttm) VALUES (?, ?, ?, ?)",
+                     [(1, "2026", "3", -1.0), (2, "2026", "3", -1.0), (3, "2026", "6", -1.0)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _provider(last_period: dict, calls: list):
+    """
+    isyatirimhisse.fetch_financials gibi davranan sahte sağlayıcı: her sembolün last_period'a ('2026/6') kadar
+    verisi vardır. Hiçbir sembolün verisi olmayan kolonlar atılır, hiç veri yoksa ValueError verilir.
+    """
+    def fetch(symbols, start_year, end_year, **kwargs):
+        calls.append((sorted(symbols), start_year, end_year))
+        df = is_fin_frame(symbols, start_year, end_year)
+        periods = [col for col in df.columns if "/" in col]
+        for symbol in symbols:
+            last_year, last_month = map(int, last_period[symbol].split("/"))
+            late = [col for col in periods if tuple(map(int, col.split("/"))) > (last_year, last_month)]
+            df.loc[df["SYMBOL"] == symbol, late] = np.nan
+        df = df.drop(columns=[col for col in periods if df[col].isna().all()])
+        if not any("/" in col for col in df.columns):
+            raise ValueError("No financial data was fetched for any symbol.")
+        return df
+    return fetch
+
+
+TICKERS = {"AAA.IS": 1, "BBB.IS": 2, "CCC.IS": 3, "DDD.IS": 4}
+LAST_PERIOD = {"AAA": "2026/6", "BBB": "2026/3", "CCC": "2026/6", "DDD": "2026/6"}
+
+
+@patch('src.fetch_financials.fetch_financials')
+def test_probe_only_asks_companies_whose_next_period_ended(mock_fetch_financials, schema_conn):
+    """
+    Sonraki dönemi bitmemiş şirketlerin sorgulanmadığını, diğerleri için sadece o yılın istendiğini ve
+    sadece yeni dönemi gelen şirketin döndüğünü test eder.
+    """
+    calls = []
+    mock_fetch_financials.side_effect = _provider(LAST_PERIOD, calls)
+
+    latest = {1: 202601, 2: 202601, 3: 202602}
+    new, probed = probe_new_reports(TICKERS, latest, today="2026-08-20")
+
+    assert new == {"AAA.IS": 1}
+    assert list(probed) == ["AAA.IS"] and set(probed["AAA.IS"]["SYMBOL"]) == {"AAA"}
+    assert calls == [(["AAA", "BBB"], 2026, 2026)]  # CCC'nin 2026/9'u henüz bitmedi, DDD'nin verisi yok
 
+    # hiçbir şirketin sonraki dönemi bitmediyse istek atılmaz
+    calls.clear()
+    assert probe_new_reports(TICKERS, latest, today="2026-06-15") == ({}, {})
+    assert calls == []
 
 
+@patch('src.fetch_financials.fetch_financials')
+def test_fetch_new_fin_writes_only_new_periods(mock_fetch_financials, schema_conn):
+    """
+    Sadece yeni dönemi olan ve hiç dönemi olmayan şirketlerin çekildiğini, kayıtlı dönemlerin üzerine
+    yazılmadığını ve yeni dönemin TTM'inin önceki yıl kullanılarak hesaplandığını test eder.
+    """
+    calls = []
+    mock_fetch_financials.side_effect = _provider(LAST_PERIOD, calls)
+
+    counts = fetch_new_fin(schema_conn, TICKERS, start_year=2025, today="2026-08-20", batch_size=10)
+
+    # prob + AAA'nın sadece 2025'i (2026 prob'dan) + DDD'nin start_year'dan itibaren indirilmesi
+    assert calls == [(["AAA", "BBB"], 2026, 2026), (["DDD"], 2025, 2026), (["AAA"], 2025, 2025)]
+    assert counts["inserted"] == 1 + 6  # AAA 2026/6, DDD 2025/3 - 2026/6
+    assert sorted(counts["keys"]) == [(1, "2026", "6")] + [(4, y, m) for y, m in
+        [("2025", "12"), ("2025", "3"), ("2025", "6"), ("2025", "9"), ("2026", "3"), ("2026", "6")]]
 
+    rows = dict(((c, y, m), v) for c, y, m, v in schema_conn.execute(
+        "SELECT company_id, period_year, period_month, revenue_ttm FROM financial"))
+    assert rows[(1, "2026", "3")] == -1.0  # kayıtlı dönem değişmedi
+    assert rows[(2, "2026", "3")] == -1.0 and (2, "2026", "6") not in rows
+    assert not np.isnan(rows[(1, "2026", "6")])  # TTM için 2025 çeyrekleri kullanıldı
+    assert schema_conn.execute("SELECT COUNT(*) FROM financial WHERE company_id = 3").fetchone()[0] == 1
 
 
 
+@patch('src.fetch_financials.fetch_financials')
+def test_probe_logs_errors_other_than_no_data(mock_fetch_financials, schema_conn):
+    """Prob'da sadece kütüphanenin "veri yok" hatasının sessizce geçildiğini, diğer ValueError'ların loglandığını test eder."""
+    latest = {1: 202601, 2: 202601}
+    logger = MagicMock()
+    mock_fetch_financials.side_effect = ValueError("No financial data was fetched for any symbol. Please check your parameters.")
+    assert probe_new_reports(TICKERS, latest, today="2026-08-20", logger=logger) == ({}, {})
+    logger.error.assert_not_called()
+
+    mock_fetch_financials.side_effect = ValueError("could not convert string to float: '-'")
+    assert probe_new_reports(TICKERS, latest, today="2026-08-20", logger=logger) == ({}, {})
+    assert "could not convert" in logger.error.call_args[0][0]
+
+
+@patch('src.fetch_financials.fetch_financials')
+def test_fetch_new_fin_raises_after_writing_when_a_batch_fails(mock_fetch_financials, schema_conn):
+    """Çekilemeyen şirket olduğunda diğerlerinin yazıldığını ve sonra hata verildiğini test eder (pipeline tekrar denemeli)."""
+    calls = []
+    provider = _provider(LAST_PERIOD, calls)
+
+    def fetch(symbols, start_year, end_year, **kwargs):
+        if "DDD" in symbols:
+            raise ConnectionError("sağlayıcıya ulaşılamadı")
+        return provider(symbols, start_year, end_year, **kwargs)
+    mock_fetch_financials.side_effect = fetch
+    logger = MagicMock()
+
+    with pytest.raises(RuntimeError, match="1 şirketin"):
+        fetch_new_fin(schema_conn, TICKERS, start_year=2025, logger=logger, today="2026-08-20", batch_size=10)
+    assert "ulaşılamadı" in logger.error.call_args[0][0]
+    assert schema_conn.execute("SELECT COUNT(*) FROM financial WHERE company_id = 1").fetchone()[0] == 2
@@ -0,0 +1,155 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+import sqlite3
+
+import src.calc_indicators
+from src.adjustments import record_action
+from src.calc_indicators import update_indicators, verify_indicators
+from src.db_writer import INDICATOR_VALUES
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DATES = pd.bdate_range("2024-01-01", periods=90)
+SPLIT_DATE = DATES[70]
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    for name in ["schema.sql", "indexes.sql", "triggers.sql"]:
+        with open(os.path.join(ROOT, "sql", name), encoding="utf-8") as f:
+            conn.executescript(f.read())
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "BIMAS.IS", "BIM"), (2, "THYAO.IS", "THY")])
+    yield conn
+    conn.close()
+
+
+def _prices(dates) -> list:
+    # 1: SPLIT_DATE'te 2:1 bölünme (ham fiyat yarıya iner), 2: bir günün hacmi boş
+    rng = np.random.default_rng(7)
+    rows = []
+    for company_id, start in [(1, 100.0), (2, 20.0)]:
+        closes = start * np.cumprod(1 + rng.normal(0, 0.02, len(DATES)))
+        volumes = rng.integers(1_000, 5_000, len(DATES)).astype(float)
+        for d, close, volume in zip(DATES, closes, volumes):
+            if d not in dates:
+                continue
+            if company_id == 1 and d >= SPLIT_DATE:
+                close /= 2
+            if company_id == 2 and d == DATES[30]:
+                volume = None
+            rows.append((company_id, d.strftime("%Y-%m-%d"), float(close), volume))
+    return rows
+
+
+def _insert(conn, dates):
+    with conn:
+        conn.executemany("INSERT INTO price (company_id, date, close, volume) VALUES (?, ?, ?, ?)", _prices(dates))
+
+
+def _indicators(conn) -> pd.DataFrame:
+    return pd.read_sql_query(f"SELECT company_id, day, {', '.join(INDICATOR_VALUES)} FROM indicator ORDER BY company_id, day", conn)
+
+
+def test_incremental_matches_rebuild(db_conn):
+    """Günlük artımlı hesabın (bölünme günü dahil) bütün geçmişin vektörel hesabıyla aynı olduğunu test eder."""
+    _insert(db_conn, DATES[:40])
+    assert update_indicators(db_conn)["inserted"] == 80
+    for start in range(40, len(DATES), 10):
+        _insert(db_conn, DATES[start:start + 10])
+        if DATES[start] <= SPLIT_DATE < DATES[min(start + 10, len(DATES)) - 1]:
+            with db_conn:
+                record_action(db_conn, 1, SPLIT_DATE, "split", 2.0)
+        update_indicators(db_conn)
+
+    assert db_conn.execute("SELECT COUNT(*) FROM indicator").fetchone()[0] == 2 * len(DATES)
+    assert verify_indicators(db_conn).empty
+    incremental = _indicators(db_conn)
+
+    update_indicators(db_conn, rebuild=True)
+    rebuilt = _indicators(db_conn)
+    pd.testing.assert_frame_equal(incremental, rebuilt, rtol=1e-9)
+
+    # bölünme günü getiri düzeltilmiş fiyattan, sma_20 o günün ham fiyat bazında
+    split = rebuilt[(rebuilt["company_id"] == 1)].set_index("day").iloc[70]
+    assert abs(split["ret_1d"]) < 0.1
+    closes = db_conn.execute("SELECT close FROM price WHERE company_id = 1 ORDER BY day").fetchall()
+    raw = np.array([c for c, in closes])
+    assert split["sma_20"] == pytest.approx(np.mean(np.r_[raw[51:70] / 2, raw[70]]))
+    assert np.isnan(rebuilt.groupby("company_id")["sma_50"].head(49)).all()
+
+
+def test_new_day_reads_only_new_rows(db_conn, monkeypatch):
+    """Durumu olan şirketlerde yeni bir günün fiyat geçmişi okunmadan işlendiğini test eder."""
+    _insert(db_conn, DATES[:-1])
+    update_indicators(db_conn)
+    _insert(db_conn, DATES[-1:])
+
+    read = []
+    read_companies = src.calc_indicators.read_companies
+    def spy(*args, **kwargs):
+        df = read_companies(*args, **kwargs)
+        read.append(len(df))
+        return df
+    monkeypatch.setattr(src.calc_indicators, "read_companies", spy)
+
+    counts = update_indicators(db_conn)
+    assert read == [2]
+    assert counts == {"inserted": 2, "updated": 0, "unchanged": 0}
+    assert verify_indicators(db_conn).empty
+
+
+def test_past_changes_rebuild_the_company(db_conn):
+    """Geçmişe dönük fiyat düzeltmesinin ve aksiyonun şirketi baştan hesaplattığını test eder."""
+    _insert(db_conn, DATES)
+    update_indicators(db_conn)
+
+    day = db_conn.execute("SELECT day FROM price WHERE company_id = 2 AND date = ?",
+                          [DATES[10].strftime("%Y-%m-%d")]).fetchone()[0]
+    with db_conn:
+        db_conn.execute("UPDATE price SET close = close * 1.1 WHERE company_id = 2 AND day = ?", [day])
+    assert not verify_indicators(db_conn).empty
+    update_indicators(db_conn, changed_price_days={2: day})
+    assert verify_indicators(db_conn).empty
+
+    # son işlenen günden önceki bir aksiyon durumdaki cumulative'i değiştirir
+    with db_conn:
+        record_action(db_conn, 2, DATES[20], "other", factor=0.8)
+    assert not verify_indicators(db_conn).empty
+    update_indicators(db_conn)
+    assert verify_indicators(db_conn).empty
+
+    # silinen fiyat günlerinin göstergeleri de silinir
+    with db_conn:
+        db_conn.execute("DELETE FROM price WHERE company_id = 1 AND day > ?", [day])
+    update_indicators(db_conn, changed_price_days={1: day + 1})
+    assert verify_indicators(db_conn).empty
+    assert db_conn.execute("SELECT COUNT(*) FROM indicator WHERE company_id = 1 AND day > ?", [day]).fetchone()[0] == 0
+
+
+def test_rows_and_state_are_written_together(db_conn, monkeypatch):
+    """Durum yazılamazsa aynı gruptaki gösterge satırlarının da geri alındığını test eder."""
+    _insert(db_conn, DATES[:40])
+    update_indicators(db_conn)
+    _insert(db_conn, DATES[40:])
+    before = _indicators(db_conn)
+
+    def fail(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(src.calc_indicators, "_save_states", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        update_indicators(db_conn)
+    pd.testing.assert_frame_equal(_indicators(db_conn), before)
+
+    monkeypatch.undo()
+    update_indicators(db_conn)
+    assert verify_indicators(db_conn).empty
@@ -0,0 +1,127 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+import sqlite3
+
+from src.backtest import load_matrix
+from src.db_writer import PRICE_KEYS, PRICE_VALUES, upsert_prices
+from src.market_cache import get_market_cache, cached_matrix
+from src.compact_keys import encode_day
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _connect(triggers: bool):
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    for name in ["schema.sql", "indexes.sql"] + (["triggers.sql"] if triggers else []):
+        with open(os.path.join(ROOT, "sql", name), encoding="utf-8") as f:
+            conn.executescript(f.read())
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(c, f"T{c}.IS", f"T{c}") for c in [1, 2, 3]])
+
+    dates = pd.bdate_range("2024-06-03", "2024-06-14")
+    pd.DataFrame({
+        "company_id": np.repeat([1, 2], len(dates)),
+        "date": np.tile(dates.strftime("%Y-%m-%d %H:%M:%S"), 2),
+        "day": np.tile(encode_day(dates), 2),  # triggers olmadan da gün numarası dolu olsun
+        "close": np.arange(2 * len(dates), dtype=float),
+    }).to_sql("price", conn, if_exists="append", index=False)
+    pd.DataFrame({
+        "company_id": [1, 1, 2], "period_year": ["2023", "2024", "2024"], "period_month": ["12", "3", "3"],
+        "date_of_publish": ["2024-03-01 00:00:00", "2024-06-10 00:00:00", "2024-05-01 00:00:00"],
+        "roe_ttm": [0.10, 0.20, 0.30],
+    }).to_sql("ratio", conn, if_exists="append", index=False)
+    return conn
+
+
+@pytest.fixture
+def db_conn():
+    conn = _connect(triggers=True)
+    yield conn
+    conn.close()
+
+
+def test_repeated_calls_are_served_from_memory(db_conn):
+    """İkinci okumanın veritabanına gitmeden aynı matrisi döndürdüğünü test eder."""
+    cache = get_market_cache(db_conn)
+    first = cached_matrix(db_conn, "price", "close")
+    second = cached_matrix(db_conn, "price", "close")
+
+    pd.testing.assert_frame_equal(first, load_matrix(db_conn, "price", "close"))
+    pd.testing.assert_frame_equal(first, second)
+    assert cache.stats == {"hits": 1, "patches": 0, "loads": 1}
+    assert not cache.matrix(db_conn, "price", "close").values.flags.writeable
+
+
+def test_inserts_are_patched_and_updates_reload(db_conn):
+    """Yeni satırların matrise işlendiğini, güncellenen satırlarda matrisin baştan okunduğunu test eder."""
+    cache = get_market_cache(db_conn)
+    cached_matrix(db_conn, "price", "close")
+
+    db_conn.executemany("INSERT INTO price (company_id, date, close) VALUES (?, '2024-06-17 00:00:00', ?)", [(1, 100.0), (3, 300.0)])
+    patched = cached_matrix(db_conn, "price", "close")
+    assert cache.stats["patches"] == 1
+    pd.testing.assert_frame_equal(patched, load_matrix(db_conn, "price", "close"), check_freq=False)
+
+    entry = cache.matrix(db_conn, "price", "close")
+    assert entry.values[entry.date_pos(["2024-06-17"])[0], entry.company_pos([3])[0]] == 300.0
+
+    db_conn.execute("UPDATE price SET close = 1.5 WHERE company_id = 2 AND date = '2024-06-03 00:00:00'")
+    reloaded = cached_matrix(db_conn, "price", "close")
+    assert cache.stats["loads"] == 2
+    assert reloaded.loc["2024-06-03", 2] == 1.5
+
+
+def test_upsert_counts_ignore_trigger_writes(db_conn):
+    """table_version triggerlarının yazdığı satırların upsert sayılarına karışmadığını test eder."""
+    df = pd.DataFrame({"company_id": [1, 1, 3], "date": pd.to_datetime(["2024-06-03", "2024-06-17", "2024-06-17"]),
+                       "close": [0.0, 5.0, 6.0]}).reindex(columns=PRICE_KEYS + PRICE_VALUES)
+    assert upsert_prices(db_conn, df) == {"inserted": 2, "updated": 0, "unchanged": 1}
+    df["close"] = [1.0, 5.0, 6.0]
+    assert upsert_prices(db_conn, df) == {"inserted": 0, "updated": 1, "unchanged": 2}
+
+
+def test_upsert_does_not_commit_the_callers_transaction(db_conn):
+    """Açık bir transaction içindeki upsert'in onu commit etmediğini, geri alınınca yazdıklarının da gittiğini test eder."""
+    db_conn.commit()
+    before = db_conn.execute("SELECT COUNT(*) FROM price").fetchone()[0]
+    db_conn.execute("INSERT INTO price (company_id, date, close) VALUES (1, '2024-06-18 00:00:00', 1.0)")
+    df = pd.DataFrame({"company_id": [1], "date": pd.to_datetime(["2024-06-19"]), "close": [2.0]})
+    assert upsert_prices(db_conn, df.reindex(columns=PRICE_KEYS + PRICE_VALUES))["inserted"] == 1
+    assert db_conn.in_transaction
+
+    db_conn.rollback()
+    assert db_conn.execute("SELECT COUNT(*) FROM price").fetchone()[0] == before
+
+
+def test_ratio_is_forward_filled_on_price_days(db_conn):
+    """ratio matrisinin load_matrix ile aynı olduğunu ve fiyat günleri değişince yeniden eşlendiğini test eder."""
+    close = cached_matrix(db_conn, "price", "close")
+    roe = cached_matrix(db_conn, "ratio", "roe_ttm", company_ids=list(close.columns), index=close.index)
+    expected = load_matrix(db_conn, "ratio", "roe_ttm", company_ids=list(close.columns), index=close.index)
+    pd.testing.assert_frame_equal(roe, expected)
+    # açıklanan dönem ertesi günden itibaren kullanılır
+    assert roe.loc["2024-06-10", 1] == 0.10 and roe.loc["2024-06-11", 1] == 0.20
+
+    db_conn.execute("INSERT INTO price (company_id, date, close) VALUES (1, '2024-06-17 00:00:00', 1.0)")
+    close = cached_matrix(db_conn, "price", "close")
+    roe = cached_matrix(db_conn, "ratio", "roe_ttm", index=close.index)
+    assert roe.loc["2024-06-17", 2] == 0.30
+
+
+def test_without_version_table_every_call_reloads():
+    """table_version olmayan veritabanında güncel olmayan matris dönmediğini test eder."""
+    conn = _connect(triggers=False)
+    cached_matrix(conn, "price", "close")
+    conn.execute("UPDATE price SET close = 999 WHERE company_id = 1")
+
+    assert (cached_matrix(conn, "price", "close")[1] == 999).all()
+    assert get_market_cache(conn).stats["hits"] == 0
+    conn.close()
@@ -0,0 +1,149 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import re
+import pytest
+import pandas as pd
+import sqlite3
+
+from src.migrate import migrate, schema_version
+from src.backtest import load_matrix
+from src.compact_keys import UNIQUE_KEYS, decode_day, encode_day, encode_period
+from src.db_writer import upsert_prices
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _read_sql(name: str) -> str:
+    with open(os.path.join(ROOT, "sql", name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def legacy_conn():
+    """Tam sayı anahtar kolonları olmayan, eski index'leri olan bir veritabanı."""
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    schema = re.sub(r"\n\s*(day|period_key)\s+INTEGER,[^\n]*", "", _read_sql("schema.sql"))
+    schema = re.sub(r",[ \t]*\n\s*UNIQUE \(company_id, (day|period_key)\)[^\n]*", "", schema)
+    conn.executescript(schema)
+    conn.executescript("""
+        CREATE UNIQUE INDEX legacy_price_key ON price (company_id, date);
+        CREATE UNIQUE INDEX legacy_financial_key ON financial (company_id, period_year, period_month);
+        CREATE UNIQUE INDEX legacy_ratio_key ON ratio (company_id, period_year, period_month);
+        CREATE UNIQUE INDEX legacy_multiple_key ON multiple (company_id, date_of_price);
+        CREATE INDEX idx_prices_company_date ON price (company_id, date);
+        CREATE INDEX idx_financials_company_period ON financial (company_id, period_year, period_month);
+        DROP TABLE stage_metrics;
+        DROP TABLE pipeline_state;
+        DROP TABLE change_log;
+        DROP TABLE change_cursor;
+        DROP TABLE adjustment_factor;
+        DROP TABLE indicator;
+        DROP TABLE indicator_state;
+        DROP TABLE price_refetch;
+    """)
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "BIMAS.IS", "BIM"), (2, "THYAO.IS", "THY")])
+    conn.executemany("INSERT INTO price (company_id, date, close) VALUES (?, ?, ?)",
+                     [(1, "2024-05-14 00:00:00", 10.0), (1, "2024-05-16", 11.0), (2, "2024-05-16 00:00:00", 20.0)])
+    conn.executemany("INSERT INTO financial (company_id, period_year, period_month) VALUES (?, ?, ?)",
+                     [(1, "2023", "12"), (1, "2024", "3")])
+    conn.executemany("INSERT INTO multiple (company_id, date_of_price, period_year, period_month, pe) VALUES (?, ?, ?, ?, ?)",
+                     [(1, "2024-05-16 00:00:00", "2024", "3", 8.0)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_migration_backfills_keys_and_replaces_indexes(legacy_conn):
+    """Eski veritabanının kolonlarının eklenip doldurulduğunu ve index'lerin değiştirildiğini test eder."""
+    assert schema_version(legacy_conn) == 0
+    assert migrate(legacy_conn) == ["compact_keys", "stage_metrics", "pipeline_state", "change_log",
+                                   "adjustment_factor", "indicators", "price_refetch", "derived_changes",
+                                   "integer_unique_keys"]
+    assert schema_version(legacy_conn) == 9
+
+    days = [row[0] for row in legacy_conn.execute("SELECT day FROM price ORDER BY rowid")]
+    assert days == encode_day(["2024-05-14", "2024-05-16", "2024-05-16"]).tolist()
+    period_keys = [row[0] for row in legacy_conn.execute("SELECT period_key FROM financial ORDER BY rowid")]
+    assert period_keys == [202304, 202401]
+    assert legacy_conn.execute("SELECT day, period_key FROM multiple").fetchone() == (encode_day(["2024-05-16"])[0], 202401)
+
+    indexes = {row[0] for row in legacy_conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_prices_company_date" not in indexes
+    assert "idx_financials_company_period" not in indexes
+    assert "idx_prices_company_day_close" in indexes
+    assert not any(name.startswith("legacy_") or name.endswith("_period_key") for name in indexes)
+    # UNIQUE kısıtları tam sayı anahtarlardadır, metin anahtarlarda index kalmaz
+    for table, keys in UNIQUE_KEYS.items():
+        unique = [[row[2] for row in legacy_conn.execute(f"PRAGMA index_info({name})")]
+                  for _, name, is_unique, *_ in legacy_conn.execute(f"PRAGMA index_list({table})") if is_unique]
+        assert unique == [keys]
+    assert legacy_conn.execute("SELECT COUNT(*) FROM stage_metrics").fetchone()[0] == 0
+    assert legacy_conn.execute("SELECT COUNT(*) FROM pipeline_state").fetchone()[0] == 0
+    assert legacy_conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0  # doldurma değişiklik sayılmaz
+    assert legacy_conn.execute("SELECT COUNT(*) FROM adjustment_factor").fetchone()[0] == 0
+    assert legacy_conn.execute("SELECT COUNT(*) FROM indicator").fetchone()[0] == 0
+    assert legacy_conn.execute("SELECT COUNT(*) FROM indicator_state").fetchone()[0] == 0
+    # eski fiyatlar sağlayıcının düzelttiği fiyatlardır, şirketler yeniden çekilmek üzere işaretlenir
+    assert legacy_conn.execute("SELECT company_id, first_day FROM price_refetch ORDER BY company_id").fetchall() == \
+        [(1, encode_day(["2024-05-14"])[0]), (2, encode_day(["2024-05-16"])[0])]
+
+    # tekrar çalıştırıldığında bekleyen migration yok
+    assert migrate(legacy_conn) == []
+
+
+def test_rows_of_the_same_day_are_merged(legacy_conn):
+    """Aynı güne düşen metin tarihlerden en son yazılanın kaldığını ve upsert'in gün üzerinden eşleştiğini test eder."""
+    legacy_conn.execute("INSERT INTO price (company_id, date, close) VALUES (1, '2024-05-16 00:00:00', 12.0)")
+    legacy_conn.commit()
+    migrate(legacy_conn)
+
+    assert legacy_conn.execute("SELECT date, close FROM price WHERE company_id = 1 ORDER BY day").fetchall() == \
+        [("2024-05-14 00:00:00", 10.0), ("2024-05-16 00:00:00", 12.0)]
+
+    row = {"company_id": 1, "date": "2024-05-16", "open": None, "close": 13.0, "high": None, "low": None,
+           "volume": None, "market_cap": None}
+    counts = upsert_prices(legacy_conn, pd.DataFrame([row]))
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 0}
+    assert legacy_conn.execute("SELECT COUNT(*), MAX(close) FROM price WHERE company_id = 1").fetchone() == (2, 13.0)
+
+
+def test_loaders_read_migrated_database(legacy_conn):
+    """Migration sonrası matrisin metin tarihlerden beklenen matrisle aynı olduğunu test eder."""
+    migrate(legacy_conn)
+    close = load_matrix(legacy_conn, "price", "close")
+
+    expected = pd.DataFrame({1: [10.0, 11.0], 2: [float("nan"), 20.0]},
+                            index=pd.DatetimeIndex(["2024-05-14", "2024-05-16"], name="date"))
+    expected.columns.name = "company_id"
+    pd.testing.assert_frame_equal(close, expected)
+    assert load_matrix(legacy_conn, "price", "close", start="2024-05-15").index.tolist() == [pd.Timestamp("2024-05-16")]
+
+
+def test_raw_inserts_get_keys_without_counting_as_mutation(legacy_conn):
+    """Doğrudan SQL ile eklenen satırların anahtarlarının triggerla dolduğunu ve bunun değişiklik sayılmadığını test eder."""
+    migrate(legacy_conn)
+    version, mutations = legacy_conn.execute("SELECT version, mutations FROM table_version WHERE table_name = 'price'").fetchone()
+
+    legacy_conn.execute("INSERT INTO price (company_id, date, close) VALUES (2, '2024-05-17 00:00:00', 21.0)")
+    legacy_conn.execute("INSERT INTO financial (company_id, period_year, period_month) VALUES (1, '2024', '6')")
+
+    day = legacy_conn.execute("SELECT day FROM price WHERE company_id = 2 AND date = '2024-05-17 00:00:00'").fetchone()[0]
+    assert decode_day([day])[0] == pd.Timestamp("2024-05-17")
+    assert legacy_conn.execute("SELECT MAX(period_key) FROM financial").fetchone()[0] == 202402
+    assert legacy_conn.execute("SELECT version, mutations FROM table_version WHERE table_name = 'price'").fetchone() \
+        == (version + 1, mutations)
+
+    # tarihi değişen satırın gün numarası da güncellenir
+    legacy_conn.execute("UPDATE price SET date = '2024-05-20 00:00:00' WHERE company_id = 2 AND date = '2024-05-17 00:00:00'")
+    assert legacy_conn.execute("SELECT MAX(day) FROM price").fetchone()[0] == encode_day(["2024-05-20"])[0]
+
+
+def test_encode_period_maps_months_to_quarters():
+    """Ay sonlarının çeyreklere sıralı şekilde eşlendiğini test eder."""
+    assert encode_period(["2023", "2024", "2024", "2024"], ["12", "3", "6", "12"]).tolist() == [202304, 202401, 202402, 202404]
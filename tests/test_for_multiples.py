@@ -0,0 +1,144 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+import sqlite3
+
+from src.calc_multiples import calc_multiples, update_multiples
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    with open(os.path.join(ROOT, "sql", "schema.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())
+    with open(os.path.join(ROOT, "sql", "indexes.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())
+    with open(os.path.join(ROOT, "sql", "triggers.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())  # doğrudan eklenen satırların gün / dönem anahtarları triggerlarla dolar
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "BIMAS.IS", "BIM"), (2, "THYAO.IS", "THY")])
+
+    dates = pd.bdate_range("2024-05-01", "2024-12-31")
+    pd.DataFrame({
+        "company_id": np.repeat([1, 2], len(dates)),
+        "date": np.tile(dates, 2),
+        "close": 10.0,
+        "market_cap": np.linspace(1e9, 2e9, 2 * len(dates)),
+    }).to_sql("price", conn, if_exists="append", index=False)
+
+    periods = [(2023, 3), (2023, 6), (2023, 9), (2023, 12), (2024, 3), (2024, 6), (2024, 9)]
+    pd.DataFrame({
+        "company_id": np.repeat([1, 2], len(periods)),
+        "period_year": [y for y, _ in periods] * 2,
+        "period_month": [m for _, m in periods] * 2,
+        "net_income_ttm": np.arange(1, 2 * len(periods) + 1) * 1e7,
+        "equity": 5e8, "revenue_ttm": 3e9, "gross_debt": 1e8,
+        "cash_and_cash_equivalents": 5e7, "ebitda_ttm": 2e8, "dividend_ttm": 1e7,
+    }).to_sql("financial", conn, if_exists="append", index=False)
+
+    conn.execute("CREATE TABLE IF NOT EXISTS app_logs (log_id INTEGER PRIMARY KEY, ts TEXT, action TEXT, level TEXT, message TEXT)")
+    yield conn
+    conn.close()
+
+
+def _multiple_table(conn):
+    df = pd.read_sql_query("SELECT company_id, date_of_price, period_year, period_month, pe, pb, peg FROM multiple", conn)
+    df["date_of_price"] = pd.to_datetime(df["date_of_price"])
+    return df.sort_values(["company_id", "date_of_price"]).reset_index(drop=True)
+
+
+def test_incremental_matches_full_calculation(db_conn):
+    """İlk çalıştırmada bütün günlerin yazıldığını ve sonucun tam hesaplamayla aynı olduğunu test eder."""
+    counts = update_multiples(db_conn)
+
+    n_prices = db_conn.execute("SELECT COUNT(*) FROM price").fetchone()[0]
+    assert counts["inserted"] == n_prices
+
+    expected = calc_multiples(db_conn).sort_values(["company_id", "date_of_price"]).reset_index(drop=True)
+    result = _multiple_table(db_conn)
+    assert np.allclose(result["pe"], expected["pe"], equal_nan=True)
+    assert np.allclose(result["peg"], expected["peg"], equal_nan=True)
+    assert (result["period_month"].astype(float).fillna(-1) == expected["period_month"].astype(float).fillna(-1)).all()
+
+
+def test_only_new_price_days_are_computed(db_conn):
+    """Yeni bir fiyat günü geldiğinde sadece o günün (ve son günün) işlendiğini test eder."""
+    update_multiples(db_conn)
+
+    pd.DataFrame({
+        "company_id": [1, 2], "date": pd.to_datetime(["2025-01-02", "2025-01-02"]),
+        "close": [10.0, 10.0], "market_cap": [3e9, 3e9],
+    }).to_sql("price", db_conn, if_exists="append", index=False)
+
+    counts = update_multiples(db_conn)
+
+    # her şirket için yeni gün eklenir, son kayıtlı gün tekrar hesaplanır ama değişmez
+    assert counts == {"inserted": 2, "updated": 0, "unchanged": 2}
+
+
+def test_backfilled_price_day_is_computed(db_conn):
+    """Son çarpan gününden önceye sonradan eklenen bir fiyat gününün changed_price_days'le verildiğinde hesaplandığını test eder."""
+    db_conn.execute("DELETE FROM price WHERE company_id = 1 AND date = '2024-06-04 00:00:00'")
+    update_multiples(db_conn)
+
+    db_conn.execute("INSERT INTO price (company_id, date, close, market_cap) VALUES (1, '2024-06-04 00:00:00', 10.0, 1.2e9)")
+    day = db_conn.execute("SELECT day FROM price WHERE company_id = 1 AND date = '2024-06-04 00:00:00'").fetchone()[0]
+    assert update_multiples(db_conn)["inserted"] == 0  # sadece son günden sonrası hesaplanır
+    counts = update_multiples(db_conn, changed_price_days={1: day})
+
+    assert counts["inserted"] == 1
+    assert db_conn.execute("SELECT COUNT(*) FROM multiple WHERE company_id = 1 AND day = "
+                           "(SELECT day FROM price WHERE company_id = 1 AND date = '2024-06-04 00:00:00')").fetchone()[0] == 1
+    expected = calc_multiples(db_conn).sort_values(["company_id", "date_of_price"]).reset_index(drop=True)
+    assert np.allclose(_multiple_table(db_conn)["pe"], expected["pe"], equal_nan=True)
+
+
+def test_changed_financial_updates_affected_days(db_conn):
+    """Değişen finansal dönemin sadece açıklandığı günden sonraki çarpanları güncellediğini test eder."""
+    update_multiples(db_conn)
+
+    db_conn.execute("UPDATE financial SET net_income_ttm = 1e9 WHERE company_id = 1 AND period_year = '2024' AND period_month = '6'")
+    counts = update_multiples(db_conn, changed_fin_keys=[(1, 2024, 6)])
+
+    # 2024/6 dönemi 2024-08-15'ten sonra, 2024/9 dönemi 2024-11-14'ten sonra kullanılır
+    changed_days = len(pd.bdate_range("2024-08-15", "2024-11-14"))
+    assert counts["updated"] == changed_days
+    assert counts["inserted"] == 0
+
+    expected = calc_multiples(db_conn).sort_values(["company_id", "date_of_price"]).reset_index(drop=True)
+    assert np.allclose(_multiple_table(db_conn)["pe"], expected["pe"], equal_nan=True)
+
+
+def test_chunked_run_matches_single_chunk(db_conn):
+    """Şirket grupları halinde (her grupta 1 şirket) hesaplamanın tek seferlik hesaplamayla aynı olduğunu test eder."""
+    counts = update_multiples(db_conn, chunk_size=1)
+    assert counts["inserted"] == db_conn.execute("SELECT COUNT(*) FROM price").fetchone()[0]
+
+    expected = calc_multiples(db_conn, chunk_size=100).sort_values(["company_id", "date_of_price"]).reset_index(drop=True)
+    result = _multiple_table(db_conn)
+    assert np.allclose(result["pb"], expected["pb"], equal_nan=True)
+    assert np.allclose(result["peg"], expected["peg"], equal_nan=True)
+
+
+def test_deleted_financial_period_recomputes_the_company(db_conn):
+    """Silinen finansal dönemin kullanıldığı günlerin, dönemin açıklanma günü bilinmese de yeniden hesaplandığını test eder."""
+    update_multiples(db_conn)
+
+    db_conn.execute("DELETE FROM financial WHERE company_id = 1 AND period_year = '2024' AND period_month = '9'")
+    counts = update_multiples(db_conn, changed_fin_keys=[(1, 2024, 9)])
+
+    assert counts["updated"] > 0
+    expected = calc_multiples(db_conn).sort_values(["company_id", "date_of_price"]).reset_index(drop=True)
+    result = _multiple_table(db_conn)
+    assert np.allclose(result["pe"], expected["pe"], equal_nan=True)
+    assert not ((result["company_id"] == 1) & (result["period_month"].astype(float) == 9)
+                & (result["period_year"].astype(float) == 2024)).any()
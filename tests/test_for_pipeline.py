@@ -0,0 +1,241 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import pytest
+import pandas as pd
+from datetime import datetime
+
+import src.calc_multiples
+import src.calc_ratios
+from src.db import connect
+from src.db_writer import FINANCIAL_KEYS, FINANCIAL_VALUES, PRICE_KEYS, PRICE_VALUES, upsert_financials, upsert_prices
+from src.migrate import migrate
+from src.pipeline import PIPELINE, Stage, last_trading_day, read_state, run_pipeline
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MONDAY = datetime(2026, 10, 12, 20, 0)
+TUESDAY = datetime(2026, 10, 13, 20, 0)
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = str(tmp_path / "pipeline.db")
+    conn = connect(path)
+    for name in ["schema.sql", "indexes.sql", "triggers.sql"]:
+        with open(os.path.join(ROOT, "sql", name), encoding="utf-8") as f:
+            conn.executescript(f.read())
+    migrate(conn)
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "BIMAS.IS", "BIM"), (2, "THYAO.IS", "THY")])
+    conn.commit()
+    conn.close()
+    return path
+
+
+class FakeSources:
+    """Ağa gitmeden fiyat ve finansal yazan fetch aşamaları. now, fiyatı yazılacak günü belirler."""
+
+    def __init__(self, now: datetime, delay: float = 0.0):
+        self.now = now
+        self.delay = delay
+        self.fin_value = 1e9
+        self.fail_fin = False
+        self.calls = []
+
+    def fetch_prices(self, conn, previous):
+        self.calls.append("fetch_prices")
+        time.sleep(self.delay)
+        df = pd.DataFrame({"company_id": [1, 2], "date": pd.Timestamp(last_trading_day(self.now, 19)),
+                           "close": [10.0, 20.0], "market_cap": [1e10, 2e10]})
+        return upsert_prices(conn, df.reindex(columns=PRICE_KEYS + PRICE_VALUES))
+
+    def fetch_fin(self, conn, previous):
+        self.calls.append("fetch_fin")
+        time.sleep(self.delay)
+        if self.fail_fin:
+            raise ConnectionError("sağlayıcıya ulaşılamadı")
+        periods = [(2025, 9), (2025, 12), (2026, 3), (2026, 6)]
+        df = pd.DataFrame({"company_id": [c for c in (1, 2) for _ in periods],
+                           "period_year": [y for _ in (1, 2) for y, _ in periods],
+                           "period_month": [m for _ in (1, 2) for _, m in periods]})
+        df["revenue_ttm"] = df["net_income_ttm"] = df["equity"] = self.fin_value
+        df["eps_ttm"] = 1.0
+        return upsert_financials(conn, df.reindex(columns=FINANCIAL_KEYS + FINANCIAL_VALUES), return_keys=True)
+
+    def stages(self) -> list:
+        fakes = {"fetch_prices": self.fetch_prices, "fetch_fin": self.fetch_fin}
+        return [Stage(stage.name, stage.deps, stage.watermark, fakes.get(stage.name, stage.run))
+                for stage in PIPELINE]
+
+
+def test_second_run_skips_every_stage(db_file):
+    """İlk çalıştırmada bütün aşamaların çalıştığını, girdiler değişmeden tekrar çalıştırıldığında hepsinin atlandığını test eder."""
+    sources = FakeSources(MONDAY)
+    assert run_pipeline(db_file, sources.stages(), now=MONDAY) == \
+        {"fetch_prices": "ran", "fetch_fin": "ran", "calc_ratios": "ran", "calc_multiples": "ran",
+         "calc_indicators": "ran"}
+
+    start = time.perf_counter()
+    status = run_pipeline(db_file, sources.stages(), now=MONDAY)
+    assert time.perf_counter() - start < 1.0
+    assert set(status.values()) == {"skipped"}
+    assert sorted(sources.calls) == ["fetch_fin", "fetch_prices"]
+
+    conn = connect(db_file)
+    state = read_state(conn)
+    assert conn.execute("SELECT COUNT(*) FROM multiple").fetchone()[0] == 2
+    conn.close()
+    assert {value["status"] for value in state.values()} == {"ok"}
+    assert state["fetch_prices"]["input_watermark"]["trading_day"] == "2026-10-12"
+
+
+def test_new_prices_do_not_touch_calc_ratios(db_file, monkeypatch):
+    """Sadece yeni fiyat geldiğinde calc_ratios'un atlandığını, calc_multiples'ın çalıştığını test eder."""
+    sources = FakeSources(MONDAY)
+    run_pipeline(db_file, sources.stages(), now=MONDAY)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("calc_ratios çalıştırılmamalı")
+    monkeypatch.setattr(src.calc_ratios, "update_ratios", fail)
+
+    sources.now = TUESDAY  # fetch_fin de çalışır ama financial'da değişen satır olmaz
+    status = run_pipeline(db_file, sources.stages(), now=TUESDAY)
+    assert status == {"fetch_prices": "ran", "fetch_fin": "ran", "calc_ratios": "skipped", "calc_multiples": "ran",
+                      "calc_indicators": "ran"}
+
+    conn = connect(db_file)
+    assert conn.execute("SELECT COUNT(*) FROM multiple").fetchone()[0] == 4
+    conn.close()
+
+
+def test_changed_financials_are_passed_as_keys(db_file, monkeypatch):
+    """fetch_fin'in değiştirdiği dönemlerin calc_ratios'a anahtar olarak verildiğini test eder."""
+    sources = FakeSources(MONDAY)
+    run_pipeline(db_file, sources.stages(), now=MONDAY)
+
+    calls = []
+    update_ratios = src.calc_ratios.update_ratios
+    def spy(conn, changed_keys=None, *args):
+        calls.append(changed_keys)  # logger verilmediğinde update_ratios kendini bir kez daha çağırır
+        return update_ratios(conn, changed_keys, *args)
+    monkeypatch.setattr(src.calc_ratios, "update_ratios", spy)
+
+    sources.fin_value = 2e9
+    status = run_pipeline(db_file, sources.stages(), force=["fetch_fin"], now=MONDAY)
+    assert status == {"fetch_prices": "skipped", "fetch_fin": "ran", "calc_ratios": "ran", "calc_multiples": "ran",
+                      "calc_indicators": "skipped"}
+    keys = sorted((company_id, int(year), int(month)) for company_id, year, month in calls[-1])
+    assert keys == [(c, y, m) for c in (1, 2) for y, m in [(2025, 9), (2025, 12), (2026, 3), (2026, 6)]]
+
+    # elle yapılan düzeltmeler de change_log'a yazılır, sadece düzeltilen dönemler hesaplanır
+    conn = connect(db_file)
+    with conn:
+        conn.execute("UPDATE financial SET equity = 5e9 WHERE company_id = 1")
+    conn.close()
+    assert run_pipeline(db_file, sources.stages(), now=MONDAY)["calc_ratios"] == "ran"
+    keys = sorted((company_id, int(year), int(month)) for company_id, year, month in calls[-1])
+    assert keys == [(1, y, m) for y, m in [(2025, 9), (2025, 12), (2026, 3), (2026, 6)]]
+
+    # bütün okuyucuların okuduğu değişiklikler çalıştırmanın sonunda silinir
+    conn = connect(db_file)
+    assert conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0
+    conn.close()
+
+
+def test_backfilled_price_day_gets_a_multiple(db_file, monkeypatch):
+    """Son çarpan gününden önceye eklenen fiyat gününün calc_multiples'a değişen gün olarak verildiğini test eder."""
+    sources = FakeSources(TUESDAY)
+    run_pipeline(db_file, sources.stages(), now=TUESDAY)
+
+    calls = []
+    update_multiples = src.calc_multiples.update_multiples
+    def spy(conn, *args, **kwargs):
+        calls.append(kwargs.get("changed_price_days"))
+        return update_multiples(conn, *args, **kwargs)
+    monkeypatch.setattr(src.calc_multiples, "update_multiples", spy)
+
+    conn = connect(db_file)
+    with conn:
+        upsert_prices(conn, pd.DataFrame({"company_id": [1], "date": pd.Timestamp("2026-10-09"), "close": [9.0],
+                                          "market_cap": [9e9]}).reindex(columns=PRICE_KEYS + PRICE_VALUES))
+    conn.close()
+    assert run_pipeline(db_file, sources.stages(), now=TUESDAY)["calc_multiples"] == "ran"
+
+    conn = connect(db_file)
+    day = conn.execute("SELECT day FROM price WHERE company_id = 1 AND date LIKE '2026-10-09%'").fetchone()[0]
+    assert calls[0] == {1: day}
+    assert conn.execute("SELECT COUNT(*) FROM multiple WHERE company_id = 1 AND day = ?", [day]).fetchone()[0] == 1
+    conn.close()
+
+
+def test_failed_stage_blocks_dependents_and_is_retried(db_file):
+    """Hata veren aşamaya bağlı aşamaların çalışmadığını ve bir sonraki çalıştırmada tekrar denendiğini test eder."""
+    sources = FakeSources(MONDAY)
+    sources.fail_fin = True
+    status = run_pipeline(db_file, sources.stages(), now=MONDAY)
+    assert status == {"fetch_prices": "ran", "fetch_fin": "failed", "calc_ratios": "blocked", "calc_multiples": "blocked",
+                      "calc_indicators": "ran"}
+
+    conn = connect(db_file)
+    state = read_state(conn)
+    conn.close()
+    assert state["fetch_fin"]["status"] == "error" and "ulaşılamadı" in state["fetch_fin"]["result"]
+    assert state["fetch_fin"]["input_watermark"] is None
+
+    sources.fail_fin = False
+    status = run_pipeline(db_file, sources.stages(), now=MONDAY)
+    assert status == {"fetch_prices": "skipped", "fetch_fin": "ran", "calc_ratios": "ran", "calc_multiples": "ran",
+                      "calc_indicators": "skipped"}
+
+
+def test_independent_branches_run_in_parallel(db_file):
+    """fetch_prices ve fetch_fin'in aynı anda çalıştığını ve ikisinin de yazabildiğini test eder."""
+    sources = FakeSources(MONDAY, delay=0.5)
+    start = time.perf_counter()
+    status = run_pipeline(db_file, sources.stages(), now=MONDAY, max_workers=2)
+    assert time.perf_counter() - start < 0.95  # sırayla çalışsalar en az 1 s
+    assert set(status.values()) == {"ran"}
+
+
+def test_stages_without_their_dependencies_run(db_file):
+    """stages'te bağımlılığı olmayan aşamaların beklemeden mevcut verilerle çalıştığını test eder."""
+    sources = FakeSources(MONDAY)
+    run_pipeline(db_file, sources.stages(), now=MONDAY)
+
+    sources.fin_value = 2e9
+    fetch_fin = [stage for stage in sources.stages() if stage.name == "fetch_fin"]
+    assert run_pipeline(db_file, fetch_fin, now=MONDAY, force=["fetch_fin"]) == {"fetch_fin": "ran"}
+
+    calc_stages = [stage for stage in sources.stages() if stage.name in ("calc_ratios", "calc_multiples")]
+    start = time.perf_counter()
+    status = run_pipeline(db_file, calc_stages, now=MONDAY)
+    assert time.perf_counter() - start < 1.0
+    assert status == {"calc_ratios": "ran", "calc_multiples": "ran"}
+
+
+def test_dry_run_does_not_execute(db_file):
+    """dry_run'da hiçbir aşamanın çalışmadığını ve planın döndürüldüğünü test eder."""
+    sources = FakeSources(MONDAY)
+    assert run_pipeline(db_file, sources.stages(), dry_run=True, now=MONDAY) == \
+        {"fetch_prices": "dirty", "fetch_fin": "dirty", "calc_ratios": "dirty", "calc_multiples": "dirty",
+         "calc_indicators": "dirty"}
+    assert sources.calls == []
+
+    run_pipeline(db_file, sources.stages(), now=MONDAY)
+    assert run_pipeline(db_file, sources.stages(), dry_run=True, now=TUESDAY) == \
+        {"fetch_prices": "dirty", "fetch_fin": "dirty", "calc_ratios": "pending", "calc_multiples": "pending",
+         "calc_indicators": "pending"}
+
+
+def test_last_trading_day():
+    """Verisi oluşmuş son iş gününün hafta sonu ve kapanış saatine göre seçildiğini test eder."""
+    assert last_trading_day(datetime(2026, 10, 13, 20, 0), 19) == "2026-10-13"
+    assert last_trading_day(datetime(2026, 10, 13, 10, 0), 19) == "2026-10-12"
+    assert last_trading_day(datetime(2026, 10, 12, 10, 0), 19) == "2026-10-09"  # pazartesi sabahı -> cuma
+    assert last_trading_day(datetime(2026, 10, 18, 10, 0), 19) == "2026-10-16"  # pazar -> cuma
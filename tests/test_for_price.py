@@ -10,10 +10,19 @@ import pandas as pd
 import numpy as np
 import sqlite3
 from datetime import datetime
+from functools import partial
 from unittest.mock import patch, MagicMock
 
 # Test edilecek fonksiyonu import et
-from src.fetch_prices import fetch_prices
+import src.fetch_prices
+from src.fetch_executor import FetchExecutor
+from src.fetch_prices import fetch_prices, fetch_prices_incremental
+
+
+@pytest.fixture(autouse=True)
+def no_wait(monkeypatch):
+    # verisi dönmeyen tickerların tekrar denemeleri hız sınırı ve backoff için beklemesin
+    monkeypatch.setattr(src.fetch_prices, "FetchExecutor", partial(FetchExecutor, sleep=lambda seconds: None))
 
 # Bu test için geçici bir veritabanı dosyası oluşturun
 @pytest.fixture
@@ -35,6 +44,15 @@ def db_conn():
             UNIQUE (company_id, date)
             )"""
         )
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS app_logs (
+            log_id     INTEGER PRIMARY KEY,
+            ts         TEXT    DEFAULT (datetime('now')),
+            action     TEXT,
+            level      TEXT,
+            message    TEXT
+            )"""
+        )
     yield conn
     conn.close()
 
@@ -123,6 +141,8 @@ def test_fetch_prices_happy_path(mock_yf_download, mock_fetch_stock_data,mock_yf
     assert 'close' in result_df.columns # Sütun adlarının küçültüldüğünü kontrol et
     assert result_df['company_id'].iloc[0] == 1 # ticker_dict map'inin çalıştığını kontrol et
     assert result_df['market_cap'].iloc[0] == 3.177000e+11
+    # fiyatlar ham istenir, aksiyonlar adjustment_factor'a yazılır (src/adjustments.py)
+    assert mock_yf_download.call_args.kwargs["auto_adjust"] is False
 
     # --- YENİ VERİ TİPİ KONTROLLERİ ---
     expected_dtypes = {
@@ -228,6 +248,28 @@ def test_partial_ticker_success_from_yfinance(mock_fetch_stock_data, mock_yf_dow
     assert result_df['company_id'].unique().tolist() == [1] 
 
 
+@patch('src.fetch_prices.yf.download')
+@patch('src.fetch_prices.fetch_stock_data')
+def test_failed_yfinance_tickers_are_retried_and_reported(mock_fetch_stock_data, mock_yf_download, default_params):
+    """
+    yf.download'un hata vermeden boş kolon döndürdüğü tickerların tekrar istendiğini ve
+    yine gelmezse çekilemedi olarak loglandığını test eder.
+    """
+    columns = pd.MultiIndex.from_product([['Close', 'Open'], ['BIMAS.IS', 'THYAO.IS']])
+    mock_yf_download.return_value = pd.DataFrame([[529.5, np.nan, 530.0, np.nan]], columns=columns,
+                                                 index=pd.to_datetime(['2025-09-01']))
+    mock_fetch_stock_data.return_value = pd.DataFrame()
+    logger = MagicMock()
+
+    result_df = fetch_prices(**default_params, logger=logger)
+
+    assert result_df['company_id'].unique().tolist() == [1]
+    requested = [sorted(call.args[0]) for call in mock_yf_download.call_args_list]
+    assert requested == [["BIMAS.IS", "THYAO.IS"], ["THYAO.IS"], ["THYAO.IS"]]  # retries = 2
+    warnings = [call.args[0] for call in logger.warn.call_args_list]
+    assert any(message.startswith("yf için 1 ticker çekilemedi: THYAO.IS") for message in warnings)
+
+
 @patch('src.fetch_prices.yf.download')
 @patch('src.fetch_prices.fetch_stock_data')
 def test_handles_duplicate_input_data(mock_fetch_stock_data, mock_yf_download,default_params):
@@ -343,39 +385,47 @@ def test_fetch_prices_handles_existing_data(mock_yf_download, mock_fetch_stock_d
     ticker_dict = {"BIMAS.IS": 1, "THYAO.IS": 2}
 
     # ACT:
-    yeni_eklenecekler_df,update_list = fetch_prices(conn=db_conn, ticker_dict=ticker_dict, start_date='2025-09-01', end_date='2025-09-02')
-
-    # 1. Yeni verileri veritabanına ekle
-    yeni_eklenecekler_df.to_sql('price', db_conn, if_exists='append', index=False)
-    
-    # 2. Güncelleme listesi varsa, veritabanını güncelle
-    if update_list:
-        db_conn.executemany(
-            "UPDATE price SET open=?, close=?, high=?, low=?, volume=?, market_cap=? WHERE company_id=? AND date=?",
-            update_list
-        )
+    counts = fetch_prices(conn=db_conn, ticker_dict=ticker_dict, start_date='2025-09-01', end_date='2025-09-02')
 
     # ASSERT:
-    # 1. Fonksiyonun bir hata fırlatmadan çalıştığını ve bir DataFrame döndürdüğünü doğrula
-    assert not yeni_eklenecekler_df.empty
-    
-    # 2. Döndürülen DataFrame'in yalnızca yeni tarihi (02-09-2025) içerdiğini doğrula
-    expected_dates = [pd.to_datetime('2025-09-02')]
-    assert list(yeni_eklenecekler_df['date'].unique()) == expected_dates
-    
-    # 3. Yalnızca yeni veriyi içerdiğinden emin olmak için satır sayısını kontrol et
-    assert yeni_eklenecekler_df.shape[0] == 2  # BIMAS ve THYAO için 1'er satır = toplam 2 satır
+    # 1. 02-09-2025 için BIMAS ve THYAO yeni eklenmeli
+    assert counts["inserted"] == 2
 
-    # 4. Update_list içinde ilk günün BIMAS verileri olmalı
-    assert len(update_list) == 1
+    # 2. İlk günün BIMAS verisi değiştiği için güncellenmeli, THYAO verisi aynı kalmalı
+    assert counts["updated"] == 1
+    assert counts["unchanged"] == 1
 
-    # 5. Update list içeriği doğru mu?
-    assert update_list[0] == (490.0,505.0,510.0,490.0,1000,1.0,1,"2025-09-01 00:00:00")
+    # 3. Güncellenen satırın içeriği doğru mu?
+    bimas_row = db_conn.execute(
+        "SELECT open, close, high, low, volume, market_cap FROM price WHERE company_id = 1 AND date = '2025-09-01 00:00:00'"
+    ).fetchone()
+    assert bimas_row == (490.0, 505.0, 510.0, 490.0, 1000, 1.0)
 
-    # 6. En son database'de yeterince veri var mı?
+    # 4. En son database'de yeterince veri var mı?
     final_db_df = pd.read_sql_query("SELECT * FROM price ORDER BY date", db_conn)
     assert final_db_df.shape[0] == 4
 
+    # 5. Aynı veri tekrar yazıldığında hiçbir satır değişmemeli
+    counts = fetch_prices(conn=db_conn, ticker_dict=ticker_dict, start_date='2025-09-01', end_date='2025-09-02')
+    assert counts == {"inserted": 0, "updated": 0, "unchanged": 4}
+
+
+@patch('src.fetch_prices.fetch_stock_data')
+@patch('src.fetch_prices.yf.download')
+def test_write_error_is_raised(mock_yf_download, mock_fetch_stock_data, mock_yfinance_data, db_conn, monkeypatch):
+    """Yazma hatasının loglanıp tekrar fırlatıldığını test eder (pipeline aşamayı hatalı saymalı)."""
+    mock_yf_download.return_value = mock_yfinance_data
+    mock_fetch_stock_data.return_value = pd.DataFrame()
+
+    def fail(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(src.fetch_prices, "upsert_prices", fail)
+    logger = MagicMock()
+
+    with pytest.raises(sqlite3.OperationalError):
+        fetch_prices(db_conn, {"BIMAS.IS": 1, "THYAO.IS": 2}, '2025-09-01', '2025-09-02', logger=logger)
+    assert "yazılamadı" in logger.error.call_args[0][0]
+
 
 def test_data_validation(db_conn):
     ticker_dict = {
@@ -385,7 +435,8 @@ def test_data_validation(db_conn):
         "AKFYE.IS":4,
         "CEMTS.IS":5,
     }
-    db_df,update_list = fetch_prices(db_conn,ticker_dict,"2022-09-01","2025-09-01")
+    fetch_prices(db_conn,ticker_dict,"2022-09-01","2025-09-01")
+    db_df = pd.read_sql_query("SELECT * FROM price", db_conn)
 
     ground_truth_df = pd.DataFrame(
         {
@@ -438,3 +489,63 @@ def test_data_validation(db_conn):
     # Testin başarısız olması durumunda, sapma miktarını görmek için bir döngü ekleyebilirsin
     for idx, pct_diff in enumerate(market_cap_diff_percentage):
         assert pct_diff < 0.05, f"{ground_truth_df.iloc[idx]['date'].strftime('%Y-%m-%d')} tarihli ve {ground_truth_df.iloc[idx]['company_id']} company_id'sine sahip market cap verisi doğrulaması başarısız. Sapma: {pct_diff:.2%} (Beklenen: <5%)"
+
+
+@patch('src.fetch_prices.fetch_stock_data')
+@patch('src.fetch_prices.yf.download')
+def test_fetch_prices_incremental_groups_by_watermark(mock_yf_download, mock_fetch_stock_data, db_conn):
+    """
+    Her şirket için son kayıtlı tarihten (dahil) itibaren günlerin istendiğini,
+    aynı son tarihe sahip tickerların tek istekte gruplandığını ve son tarihi
+    end_date'ten önce olmayan şirketlerin atlandığını test eder.
+    """
+    pd.DataFrame({
+        'date': pd.to_datetime(['2025-09-01', '2025-09-01', '2025-08-29', '2025-09-03']),
+        'open': [1.0, 1.0, 1.0, 1.0], 'close': [1.0, 1.0, 1.0, 1.0],
+        'high': [1.0, 1.0, 1.0, 1.0], 'low': [1.0, 1.0, 1.0, 1.0],
+        'volume': [1, 1, 1, 1], 'market_cap': [1.0, 1.0, 1.0, 1.0],
+        'company_id': [1, 2, 3, 4]
+    }).to_sql('price', db_conn, if_exists='append', index=False)
+
+    mock_yf_download.return_value = pd.DataFrame()
+    mock_fetch_stock_data.return_value = pd.DataFrame()
+
+    ticker_dict = {"BIMAS.IS": 1, "THYAO.IS": 2, "HTTBT.IS": 3, "AKFYE.IS": 4, "CEMTS.IS": 5}
+    counts = fetch_prices_incremental(db_conn, ticker_dict, end_date='2025-09-03', default_start_date='2025-01-01')
+
+    assert counts == {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    requests = {call.kwargs['start']: sorted(call.args[0]) for call in mock_yf_download.call_args_list}
+    assert requests == {
+        '2025-01-01': ["CEMTS.IS"],               # hiç verisi yok
+        '2025-08-29': ["HTTBT.IS"],               # son gün yarım bar olabilir, tekrar istenir
+        '2025-09-01': ["BIMAS.IS", "THYAO.IS"],   # aynı son tarih -> tek istek
+    }                                             # AKFYE.IS zaten güncel
+
+
+@patch('src.fetch_prices.fetch_stock_data')
+@patch('src.fetch_prices.yf.download')
+def test_ticker_with_underscore(mock_yf_download, mock_fetch_stock_data):
+    """
+    İçinde '_' geçen tickerların kolon isimleri birleştirilip tekrar bölünmediği için
+    doğru şekilde işlendiğini test eder.
+    """
+    columns_yf = [
+        ('Close', 'ABC_D.IS'), ('High', 'ABC_D.IS'), ('Low', 'ABC_D.IS'), ('Open', 'ABC_D.IS'), ('Volume', 'ABC_D.IS'),
+    ]
+    mock_df_yf = pd.DataFrame(
+        np.array([[10.0, 11.0, 9.0, 9.5, 1000]]),
+        columns=pd.MultiIndex.from_tuples(columns_yf),
+        index=pd.to_datetime(['2025-09-01'])
+    )
+    mock_df_yf.index.name = 'Date'
+
+    mock_yf_download.return_value = mock_df_yf
+    mock_fetch_stock_data.return_value = pd.DataFrame()
+
+    result_df = fetch_prices(conn=None, ticker_dict={"ABC_D.IS": 7}, start_date="2025-09-01", end_date="2025-09-02")
+
+    assert result_df.shape[0] == 1
+    assert result_df['company_id'].iloc[0] == 7
+    assert result_df['close'].iloc[0] == 10.0
+    assert result_df['open'].iloc[0] == 9.5
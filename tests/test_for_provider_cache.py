@@ -0,0 +1,144 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import pytest
+import pandas as pd
+from datetime import date
+
+from src.fetch_executor import FetchExecutor
+from src.provider_cache import ProviderCache, CacheMiss, is_closed_day_range, is_closed_year_range
+
+
+def _response(n: int = 10) -> pd.DataFrame:
+    return pd.DataFrame({"ticker": ["BIMAS.IS"] * n, "close": range(n)})
+
+
+def test_cached_response_is_reused(tmp_path):
+    """Aynı istek ikinci kez yapıldığında sağlayıcıya gidilmediğini, sembol sırasının anahtarı değiştirmediğini test eder."""
+    calls = []
+
+    def fetch_fn():
+        calls.append(1)
+        return _response()
+
+    cache = ProviderCache(str(tmp_path))
+    first = cache.fetch("yf", fetch_fn, ["BIMAS.IS", "THYAO.IS"], "2024-01-01", "2024-02-01", closed=True)
+    second = cache.fetch("yf", fetch_fn, ["THYAO.IS", "BIMAS.IS"], "2024-01-01", "2024-02-01", closed=True)
+
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+    # index diskte tutulduğu için yeni bir nesne de aynı kaydı kullanır
+    ProviderCache(str(tmp_path)).fetch("yf", fetch_fn, ["BIMAS.IS", "THYAO.IS"], "2024-01-01", "2024-02-01", closed=True)
+    assert len(calls) == 1
+
+
+def test_open_period_expires(tmp_path):
+    """Açık dönem kayıtlarının TTL sonunda yeniden çekildiğini, kapanmış dönemlerin süresiz kaldığını test eder."""
+    calls = []
+
+    def fetch_fn():
+        calls.append(1)
+        return _response()
+
+    cache = ProviderCache(str(tmp_path), open_ttl_hours=0.5 / 3600)
+    cache.fetch("yf", fetch_fn, ["BIMAS.IS"], "2024-01-01", "2099-01-01", closed=False)
+    cache.fetch("yf", fetch_fn, ["BIMAS.IS"], "2024-01-01", "2024-02-01", closed=True)
+    time.sleep(0.6)
+    cache.fetch("yf", fetch_fn, ["BIMAS.IS"], "2024-01-01", "2099-01-01", closed=False)
+    cache.fetch("yf", fetch_fn, ["BIMAS.IS"], "2024-01-01", "2024-02-01", closed=True)
+
+    assert len(calls) == 3
+
+
+def test_lru_eviction_keeps_size_bounded(tmp_path):
+    """Boyut sınırı aşıldığında en uzun süredir kullanılmayan kaydın silindiğini test eder."""
+    cache = ProviderCache(str(tmp_path), max_size_mb=0.0001)  # ~100 byte, sadece en son yazılan kayıt kalır
+    cache.fetch("yf", lambda: _response(), ["A.IS"], "2024-01-01", "2024-02-01", closed=True)
+    cache.fetch("yf", lambda: _response(), ["B.IS"], "2024-01-01", "2024-02-01", closed=True)
+
+    assert cache.get(ProviderCache.key("yf", ["A.IS"], "2024-01-01", "2024-02-01")) is None
+    assert cache.get(ProviderCache.key("yf", ["B.IS"], "2024-01-01", "2024-02-01")) is not None
+    assert cache.stats()["entries"] == 1
+
+
+def test_replay_serves_only_from_cache(tmp_path):
+    """Replay modunda kayıtlı isteklerin önbellekten geldiğini, olmayanların tekrar denenmeden hata verdiğini test eder."""
+    ProviderCache(str(tmp_path)).fetch("yf", lambda: _response(), ["BIMAS.IS"], "2024-01-01", "2024-02-01", closed=True)
+    replay = ProviderCache(str(tmp_path), mode="replay")
+
+    def network():
+        raise AssertionError("replay modunda ağa gidilmemeli")
+
+    assert len(replay.fetch("yf", network, ["BIMAS.IS"], "2024-01-01", "2024-02-01")) == 10
+
+    calls = []
+
+    def fetch_fn(shard):
+        calls.append(shard)
+        return replay.fetch("yf", network, shard, "2024-01-01", "2024-03-01")
+
+    results = FetchExecutor(shard_size=1, retries=3, backoff=0).run({"yf": (fetch_fn, ["BIMAS.IS"])})
+    assert results["yf"].failed == ["BIMAS.IS"]
+    assert len(calls) == 1
+    with pytest.raises(CacheMiss):
+        replay.fetch("yf", network, ["THYAO.IS"], "2024-01-01", "2024-02-01")
+
+
+def test_response_missing_symbols_is_not_cached(tmp_path):
+    """Bazı sembollerin verisi dönmeyen cevabın kaydedilmediğini, tam cevabın kaydedildiğini test eder."""
+    calls = []
+
+    def fetch_fn():
+        calls.append(1)
+        return _response()
+
+    def returned(df):
+        return df["ticker"].unique()
+
+    cache = ProviderCache(str(tmp_path))
+    for _ in range(2):
+        cache.fetch("yf", fetch_fn, ["BIMAS.IS", "THYAO.IS"], "2024-01-01", "2024-02-01", closed=True, returned_fn=returned)
+    assert len(calls) == 2
+    with pytest.raises(CacheMiss):
+        ProviderCache(str(tmp_path), mode="replay").fetch("yf", fetch_fn, ["BIMAS.IS", "THYAO.IS"], "2024-01-01", "2024-02-01")
+
+    for _ in range(2):
+        cache.fetch("yf", fetch_fn, ["BIMAS.IS"], "2024-01-01", "2024-02-01", closed=True, returned_fn=returned)
+    assert len(calls) == 3
+
+
+def test_hits_are_saved_in_batches(tmp_path):
+    """Okumalarda index'in her seferinde değil flush_every okumada bir ve flush'ta kaydedildiğini test eder."""
+    key = ProviderCache.key("yf", ["BIMAS.IS"], "2024-01-01", "2024-02-01")
+    ProviderCache(str(tmp_path)).fetch("yf", lambda: _response(), ["BIMAS.IS"], "2024-01-01", "2024-02-01", closed=True)
+    index_path = tmp_path / "index.json"
+
+    def saved_access():
+        return ProviderCache(str(tmp_path))._index[key]["last_access"]
+
+    written = saved_access()
+    with ProviderCache(str(tmp_path), flush_every=3) as cache:
+        cache.get(key)
+        cache.get(key)
+        assert saved_access() == written
+        cache.get(key)
+        assert saved_access() > written
+        written = saved_access()
+        mtime = os.path.getmtime(index_path)
+        cache.get(key)
+        assert os.path.getmtime(index_path) == mtime
+    assert saved_access() > written
+
+
+def test_closed_ranges():
+    today = date(2025, 3, 10)
+    assert is_closed_day_range("2025-03-09", today)
+    assert not is_closed_day_range("2025-03-11", today)
+    assert is_closed_year_range(2023, today)
+    assert not is_closed_year_range(2024, today)
@@ -0,0 +1,97 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+import sqlite3
+
+from src.calc_ratios import calc_ratios, update_ratios
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    with open(os.path.join(ROOT, "sql", "schema.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())
+    with open(os.path.join(ROOT, "sql", "triggers.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())  # doğrudan eklenen satırların gün / dönem anahtarları triggerlarla dolar
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "BIMAS.IS", "BIM"), (2, "THYAO.IS", "THY")])
+
+    periods = [(y, m) for y in (2021, 2022, 2023, 2024) for m in (3, 6, 9, 12)]
+    rng = np.random.default_rng(0)
+    n = 2 * len(periods)
+    fin_df = pd.DataFrame({
+        "company_id": np.repeat([1, 2], len(periods)),
+        "period_year": [y for y, _ in periods] * 2,
+        "period_month": [m for _, m in periods] * 2,
+    })
+    for col in ["revenue_ttm", "revenue_q", "revenue_c", "net_income_ttm", "net_income_q", "net_income_c",
+                "gross_profit_ttm", "gross_profit_q", "gross_profit_c", "operating_profit_ttm", "operating_profit_q",
+                "operating_profit_c", "ebitda_ttm", "eps_ttm", "eps_q", "current_assets", "fixed_assets",
+                "short_term_debt", "gross_debt", "equity"]:
+        fin_df[col] = rng.random(n) * 1e9 + 1e8
+    fin_df["effective_tax_rate_ttm"] = 0.2
+    fin_df.to_sql("financial", conn, if_exists="append", index=False)
+
+    conn.execute("CREATE TABLE IF NOT EXISTS app_logs (log_id INTEGER PRIMARY KEY, ts TEXT, action TEXT, level TEXT, message TEXT)")
+    yield conn
+    conn.close()
+
+
+def _ratio_table(conn):
+    df = pd.read_sql_query("SELECT * FROM ratio", conn).drop(columns=["ratio_id"])
+    df["period_year"] = pd.to_numeric(df["period_year"])
+    df["period_month"] = pd.to_numeric(df["period_month"])
+    return df.sort_values(["company_id", "period_year", "period_month"]).reset_index(drop=True)
+
+
+def test_changed_period_only_recomputes_its_window(db_conn):
+    """
+    Tek bir dönem değiştiğinde sadece o dönemin ve ona shift ile bakan sonraki
+    4 dönemin güncellendiğini, sonucun tam hesaplamayla aynı olduğunu test eder.
+    """
+    counts = update_ratios(db_conn)
+    assert counts["inserted"] == 32
+
+    db_conn.execute("UPDATE financial SET revenue_q = 1, revenue_ttm = 1 WHERE company_id = 1 AND period_year = '2022' AND period_month = '6'")
+    counts = update_ratios(db_conn, changed_keys=[(1, 2022, 6)])
+
+    # 2022/6 (marjlar), 2022/9 (qoq) ve 2023/6 (yoy) değişir, 2022/12 - 2023/3 aynı kalır
+    assert counts == {"inserted": 0, "updated": 3, "unchanged": 2}
+
+    expected = calc_ratios(db_conn).sort_values(["company_id", "period_year", "period_month"]).reset_index(drop=True)
+    result = _ratio_table(db_conn)
+    for col in ["revenue_growth_q_qoq", "revenue_growth_ttm_yoy", "net_income_margin_ttm"]:
+        assert np.allclose(result[col], expected[col], equal_nan=True)
+
+
+def test_new_quarter_costs_a_few_rows(db_conn):
+    """Yeni bir çeyrek eklendiğinde sadece o çeyreğin yazıldığını test eder."""
+    update_ratios(db_conn)
+
+    db_conn.execute("INSERT INTO financial (company_id, period_year, period_month, revenue_q, revenue_ttm, equity) VALUES (2, '2025', '3', 5e8, 2e9, 1e9)")
+    counts = update_ratios(db_conn, changed_keys=[(2, 2025, 3)])
+
+    assert counts == {"inserted": 1, "updated": 0, "unchanged": 0}
+    new_row = _ratio_table(db_conn).iloc[-1]
+    assert new_row["company_id"] == 2 and new_row["period_year"] == 2025
+    assert not np.isnan(new_row["revenue_growth_q_qoq"])
+
+
+def test_chunked_run_matches_single_chunk(db_conn):
+    """Şirket grupları halinde (her grupta 1 şirket) hesaplamanın tek seferlik hesaplamayla aynı olduğunu test eder."""
+    counts = update_ratios(db_conn, chunk_size=1)
+    assert counts["inserted"] == 32
+
+    expected = calc_ratios(db_conn, chunk_size=100).sort_values(["company_id", "period_year", "period_month"]).reset_index(drop=True)
+    result = _ratio_table(db_conn)
+    for col in ["revenue_growth_q_yoy", "eps_growth_q_qoq", "roic_ttm"]:
+        assert np.allclose(result[col], expected[col], equal_nan=True)
@@ -0,0 +1,124 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+import sqlite3
+
+from src.scoring import winsorize, zscore, composite_scores, update_scores, top_n
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+FACTORS = [
+    {"table": "multiple", "column": "pe", "direction": "low", "weight": 1.0},
+    {"table": "ratio", "column": "roe_ttm", "direction": "high", "weight": 1.0},
+]
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    with open(os.path.join(ROOT, "sql", "schema.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())
+    with open(os.path.join(ROOT, "sql", "indexes.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())
+    with open(os.path.join(ROOT, "sql", "triggers.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())  # doğrudan eklenen satırların gün / dönem anahtarları triggerlarla dolar
+    companies = [1, 2, 3, 4]
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(c, f"T{c}.IS", f"T{c}") for c in companies])
+
+    dates = pd.bdate_range("2024-06-03", "2024-06-14")
+    pd.DataFrame({
+        "company_id": np.repeat(companies, len(dates)),
+        "date": np.tile(dates, len(companies)),
+        "close": 10.0,
+    }).to_sql("price", conn, if_exists="append", index=False)
+    pd.DataFrame({
+        "company_id": np.repeat(companies, len(dates)),
+        "date_of_price": np.tile(dates.strftime("%Y-%m-%d %H:%M:%S"), len(companies)),
+        "pe": np.repeat([5.0, 10.0, 20.0, 40.0], len(dates)),
+    }).to_sql("multiple", conn, if_exists="append", index=False)
+    pd.DataFrame({
+        "company_id": companies, "period_year": "2024", "period_month": "3",
+        "roe_ttm": [0.30, 0.10, 0.20, 0.05],
+    }).to_sql("ratio", conn, if_exists="append", index=False)
+
+    yield conn
+    conn.close()
+
+
+def test_winsorize_and_zscore_per_row():
+    """Her günün (satırın) kendi yüzdelikleriyle sınırlandığını ve kendi içinde standartlaştırıldığını test eder."""
+    values = np.array([[1.0, 2.0, 3.0, 100.0], [np.nan, np.nan, np.nan, np.nan], [4.0, 4.0, np.nan, 4.0]])
+
+    clipped = winsorize(values, 0.25)
+    assert clipped[0, 3] < 100 and clipped[0, 0] > 1
+    assert np.isnan(clipped[1]).all()
+
+    z = zscore(values)
+    assert np.isclose(np.nanmean(z[0]), 0) and np.isclose(np.nanstd(z[0]), 1)
+    assert z[2].tolist()[:2] == [0.0, 0.0] and np.isnan(z[2, 2])
+
+
+def test_composite_requires_min_factors():
+    """Yeterli faktörü olmayan şirketlerin skorunun NaN kaldığını ve low yönlü faktörün ters çevrildiğini test eder."""
+    index = pd.RangeIndex(1)
+    pe = pd.DataFrame([[5.0, 10.0, 20.0]], index=index)
+    roe = pd.DataFrame([[0.3, np.nan, 0.1]], index=index)
+
+    composite = composite_scores([pe, roe], FACTORS, winsor=0, min_factors=2)
+
+    assert np.isnan(composite.iloc[0, 1])
+    assert composite.iloc[0, 0] > composite.iloc[0, 2]
+
+
+def test_scores_are_stored_and_top_n_is_index_lookup(db_conn):
+    """Skorların sadece finansalı bilinen günler için yazıldığını, ilk N'in index'ten okunduğunu test eder."""
+    counts = update_scores(db_conn, "test", FACTORS, start="2024-06-03")
+
+    # 2024/3 dönemi 2024-05-15'ten sonra bilinir, 10 gün x 4 şirket
+    assert counts["inserted"] == 40
+
+    best = top_n(db_conn, "test", "2024-06-14", 2)
+    assert best["company_id"].tolist() == [1, 3]
+    assert best["rank"].tolist() == [1, 2]
+
+    plan = " ".join(row[-1] for row in db_conn.execute(
+        "EXPLAIN QUERY PLAN SELECT company_id FROM score WHERE score_name = 'test' AND date = '2024-06-14 00:00:00' AND rank <= 2"))
+    assert "idx_scores_name_date_rank" in plan
+
+
+def test_incremental_run_only_adds_new_days(db_conn):
+    """İkinci çalıştırmada sadece score tablosundaki son günden sonraki günlerin hesaplandığını test eder."""
+    update_scores(db_conn, "test", FACTORS)
+
+    db_conn.executemany("INSERT INTO price (company_id, date, close) VALUES (?, '2024-06-17 00:00:00', 10.0)", [(1,), (2,), (3,), (4,)])
+    db_conn.executemany("INSERT INTO multiple (company_id, date_of_price, pe) VALUES (?, '2024-06-17 00:00:00', ?)",
+                        [(1, 50.0), (2, 10.0), (3, 20.0), (4, 40.0)])
+
+    assert update_scores(db_conn, "test", FACTORS) == {"inserted": 4, "updated": 0, "unchanged": 0}
+    assert top_n(db_conn, "test", "2024-06-17", 1)["company_id"].tolist() == [3]
+
+
+def test_restated_financials_rescore_past_days(db_conn):
+    """Düzeltilen bir finansal dönemin etkilediği geçmiş günlerin skorlarının yeniden hesaplandığını test eder."""
+    db_conn.execute("INSERT INTO financial (company_id, period_year, period_month) VALUES (4, '2024', '3')")
+    update_scores(db_conn, "test", FACTORS)
+    assert top_n(db_conn, "test", "2024-06-03", 4)["company_id"].tolist()[-1] == 4
+
+    # calc_ratios'un düzeltilen dönemden hesapladığı ratio
+    db_conn.execute("UPDATE financial SET equity = 1e9 WHERE company_id = 4")
+    db_conn.execute("UPDATE ratio SET roe_ttm = 0.90 WHERE company_id = 4")
+    counts = update_scores(db_conn, "test", FACTORS)
+
+    assert counts["inserted"] == 0 and counts["updated"] > 0
+    assert top_n(db_conn, "test", "2024-06-03", 4)["company_id"].tolist()[-1] != 4
+
+    # değişiklik yoksa sadece son günden sonrası hesaplanır
+    assert update_scores(db_conn, "test", FACTORS) == {"inserted": 0, "updated": 0, "unchanged": 0}
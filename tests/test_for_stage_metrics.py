@@ -0,0 +1,164 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+import sqlite3
+import tracemalloc
+
+from src.calc_ratios import update_ratios
+from src.stage_metrics import metered, run_trend, slowest_stages, stage, track_run
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    for name in ["schema.sql", "triggers.sql"]:
+        with open(os.path.join(ROOT, "sql", name), encoding="utf-8") as f:
+            conn.executescript(f.read())
+    conn.executemany("INSERT INTO company (company_id, ticker, company_name) VALUES (?, ?, ?)",
+                     [(1, "BIMAS.IS", "BIM"), (2, "THYAO.IS", "THY")])
+    conn.execute("CREATE TABLE IF NOT EXISTS app_logs (log_id INTEGER PRIMARY KEY, ts TEXT, action TEXT, level TEXT, message TEXT)")
+    yield conn
+    conn.close()
+
+
+def _metrics(conn) -> pd.DataFrame:
+    return pd.read_sql_query("SELECT * FROM stage_metrics ORDER BY metric_id", conn)
+
+
+def test_nested_and_repeated_stages_are_aggregated(db_conn):
+    """İç içe aşamaların yol adıyla, tekrar eden aşamaların toplanarak tek satır yazıldığını test eder."""
+    with track_run(db_conn, "test_action", rows_in=3, trace_memory=True) as run:
+        for n in [10, 20, 30]:
+            with stage("read", rows_in=n) as s:
+                s.add_rows(rows_out=n * 2)
+                with stage("parse"):
+                    blob = np.ones(200_000)  # ~1.5 MB
+                    del blob
+        run.add_rows(rows_out=1)
+
+    df = _metrics(db_conn).set_index("stage")
+    assert df.index.tolist() == ["total", "read", "read/parse"]
+    assert df["depth"].tolist() == [0, 1, 2]
+    assert df["run_id"].nunique() == 1 and (df["action"] == "test_action").all()
+    assert df.loc["read", "calls"] == 3
+    assert (df.loc["read", "rows_in"], df.loc["read", "rows_out"]) == (60, 120)
+    assert (df.loc["total", "rows_in"], df.loc["total", "rows_out"]) == (3, 1)
+    assert df.loc["total", "seconds"] >= df.loc["read", "seconds"] >= df.loc["read/parse", "seconds"]
+    # iç aşamanın belleği üst aşamalara da yansır
+    assert df.loc["read/parse", "peak_mb"] > 1.0
+    assert df.loc["total", "peak_mb"] >= df.loc["read/parse", "peak_mb"]
+    assert (df["status"] == "ok").all()
+
+
+def test_memory_is_not_traced_by_default(db_conn):
+    """trace_memory ayarı kapalıyken tracemalloc'un başlatılmadığını ve peak_mb'nin boş kaldığını test eder."""
+    with track_run(db_conn, "test_action"):
+        with stage("read"):
+            assert not tracemalloc.is_tracing()
+    assert _metrics(db_conn)["peak_mb"].isna().all()
+
+
+def test_stage_outside_run_is_noop(db_conn):
+    """Aktif çalıştırma yokken stage() ve metered()'in hiçbir şey yazmadığını test eder."""
+    with stage("alone", rows_in=5) as s:
+        s.add_rows(rows_out=5)
+    assert list(metered("chunks", [[1, 2], [3]])) == [[1, 2], [3]]
+    assert _metrics(db_conn).empty
+
+
+def test_nested_run_becomes_stage(db_conn):
+    """Çalıştırma içindeki track_run'ın yeni bir çalıştırma değil, bir aşama açtığını test eder."""
+    with track_run(db_conn, "outer"):
+        for _ in range(2):
+            with track_run(db_conn, "inner"):
+                pass
+        for chunk in metered("chunks", [[1, 2], [3]]):
+            pass
+
+    df = _metrics(db_conn).set_index("stage")
+    assert df.index.tolist() == ["total", "inner", "chunks"]
+    assert df.loc["inner", "calls"] == 2
+    assert (df.loc["chunks", "calls"], df.loc["chunks", "rows_out"]) == (3, 3)  # son çağrı StopIteration
+
+
+def test_failed_stage_is_recorded_as_error(db_conn):
+    """Hata veren aşamanın ve çalıştırmanın status'unun error olarak yazıldığını test eder."""
+    with pytest.raises(ValueError):
+        with track_run(db_conn, "failing"):
+            with stage("ok_stage"):
+                pass
+            with stage("bad_stage"):
+                raise ValueError("hata")
+
+    status = dict(db_conn.execute("SELECT stage, status FROM stage_metrics").fetchall())
+    assert status == {"total": "error", "ok_stage": "ok", "bad_stage": "error"}
+
+
+def test_missing_table_or_connection_is_ignored(db_conn):
+    """stage_metrics tablosu yoksa ya da conn None ise çalıştırmanın hata vermediğini test eder."""
+    db_conn.execute("DROP TABLE stage_metrics")
+    with track_run(db_conn, "no_table"):
+        with stage("a"):
+            pass
+    with track_run(None, "no_conn"):
+        with stage("a"):
+            pass
+
+
+def test_report_queries(db_conn):
+    """slowest_stages ve run_trend'in son çalıştırmaları action bazında özetlediğini test eder."""
+    rows = []
+    for i, seconds in enumerate([1.0, 2.0, 3.0, 10.0]):
+        run_id = f"run{i}"
+        started_at = f"2026-10-0{i + 1} 10:00:00"
+        rows += [(run_id, "calc_ratios", "total", 0, started_at, 1, seconds, None, 100, 5.0, "ok"),
+                 (run_id, "calc_ratios", "read", 1, started_at, 2, seconds * 0.7, None, 100, 3.0, "ok"),
+                 (run_id, "calc_ratios", "write", 1, started_at, 2, seconds * 0.2, 100, 100, 1.0, "ok")]
+    rows.append(("other", "fetch_prices", "total", 0, "2026-10-05 10:00:00", 1, 4.0, 5, 5, None, "ok"))
+    rows.append(("other", "fetch_prices", "download", 1, "2026-10-05 10:00:00", 1, 3.0, 5, 5, None, "error"))
+    db_conn.executemany("INSERT INTO stage_metrics (run_id, action, stage, depth, started_at, calls, seconds, rows_in, "
+                        "rows_out, peak_mb, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    slowest = slowest_stages(db_conn, runs=3, action="calc_ratios")
+    assert slowest["stage"].tolist() == ["read", "write"]
+    assert slowest.loc[0, "runs"] == 3  # en eski çalıştırma dahil değil
+    assert slowest.loc[0, "avg_seconds"] == pytest.approx(0.7 * 5.0)
+    assert slowest.loc[0, "max_seconds"] == pytest.approx(7.0)
+
+    assert slowest_stages(db_conn)["errors"].tolist() == [1, 0, 0]
+
+    trend = run_trend(db_conn, runs=3, action="calc_ratios")
+    assert trend["run_id"].tolist() == ["run1", "run2", "run3"]
+    assert trend["vs_median"].tolist() == pytest.approx([2 / 3, 1.0, 10 / 3])
+
+
+def test_update_ratios_records_stages(db_conn):
+    """update_ratios çalıştırmasının okuma, hesap ve yazma aşamalarının kaydedildiğini test eder."""
+    periods = [(y, m) for y in (2023, 2024) for m in (3, 6, 9, 12)]
+    fin_df = pd.DataFrame({
+        "company_id": np.repeat([1, 2], len(periods)),
+        "period_year": [y for y, _ in periods] * 2,
+        "period_month": [m for _, m in periods] * 2,
+    })
+    for col in ["revenue_ttm", "revenue_q", "net_income_ttm", "net_income_q", "gross_profit_ttm", "equity"]:
+        fin_df[col] = 1e9
+    fin_df.to_sql("financial", db_conn, if_exists="append", index=False)
+
+    counts = update_ratios(db_conn, chunk_size=1)
+
+    df = _metrics(db_conn).set_index("stage")
+    assert df.index.tolist() == ["total", "read", "compute", "write", "write/staging", "write/diff", "write/upsert"]
+    assert (df["action"] == "calc_ratios").all()
+    assert df.loc["compute", "calls"] == 2  # şirket başına bir chunk
+    assert df.loc["read", "rows_out"] == 16
+    assert df.loc["write", "rows_out"] == df.loc["total", "rows_out"] == counts["inserted"] == 16
+    assert df.loc["write/upsert", "rows_out"] == 16
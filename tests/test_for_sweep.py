@@ -0,0 +1,80 @@
+import sys
+import os
+
+# Projenin kök dizinini Python'ın arama yoluna ekle
+# Bu, 'tests' klasörünün bir üst dizinidir
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import pandas as pd
+import numpy as np
+import sqlite3
+
+from src.sweep import run_sweep, parameter_grid, run_id, factor_top_n, SharedMarket, attach_market
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+GRID = {"factor": ["momentum"], "n": [1, 2, 3], "rebalance_every": [1, 5]}
+
+
+@pytest.fixture
+def db_conn():
+    conn = sqlite3.connect(':memory:')  # Bellekte geçici bir veritabanı oluştur
+    with open(os.path.join(ROOT, "sql", "schema.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())
+    with open(os.path.join(ROOT, "sql", "triggers.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())  # doğrudan eklenen satırların gün / dönem anahtarları triggerlarla dolar
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def market():
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2024-01-01", periods=100)
+    close = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0, 0.02, (100, 5)), axis=0), index=dates, columns=[1, 2, 3, 4, 5])
+    return {"close": close, "momentum": close.pct_change(20)}
+
+
+def _failing_strategy(market, params):
+    if params["n"] == 2:
+        raise ValueError("test hatası")
+    return factor_top_n(market, params)
+
+
+def test_parameter_grid_and_run_id():
+    combinations = parameter_grid(GRID)
+    assert len(combinations) == 6
+    assert run_id({"a": 1, "b": 2}) == run_id({"b": 2, "a": 1})
+
+
+def test_shared_market_is_memory_mapped(market):
+    """Worker'ların açtığı matrislerin kopyalanmadan dosyadan okunduğunu ve aynı değerleri verdiğini test eder."""
+    with SharedMarket(market) as shared:
+        attached = attach_market(shared.descriptor)
+        # kopya olsaydı yazılabilir olurdu, salt okunur mmap'in üzerinde duruyor
+        assert not attached["close"].to_numpy().flags.writeable
+        pd.testing.assert_frame_equal(attached["momentum"], market["momentum"], check_freq=False)
+    assert not os.path.exists(shared.directory)
+
+
+def test_process_pool_matches_single_process(db_conn, market):
+    """İki process'li sweep'in tek process'le aynı sonuçları yazdığını test eder."""
+    run_sweep(db_conn, "single", market, GRID, workers=1)
+    counts = run_sweep(db_conn, "pool", market, GRID, workers=2)
+
+    assert counts == {"done": 6, "failed": 0, "skipped": 0}
+    single = pd.read_sql_query("SELECT run_id, sharpe, total_return FROM sweep_result WHERE sweep_name = 'single' ORDER BY run_id", db_conn)
+    pool = pd.read_sql_query("SELECT run_id, sharpe, total_return FROM sweep_result WHERE sweep_name = 'pool' ORDER BY run_id", db_conn)
+    pd.testing.assert_frame_equal(single, pool)
+
+
+def test_resume_skips_finished_runs(db_conn, market):
+    """Hata veren kombinasyonun kaydedildiğini ve tekrar çalıştırmada sadece onun denendiğini test eder."""
+    counts = run_sweep(db_conn, "resume", market, GRID, strategy=_failing_strategy, workers=1)
+    assert counts == {"done": 4, "failed": 2, "skipped": 0}
+    assert db_conn.execute("SELECT COUNT(*) FROM sweep_result WHERE error LIKE 'ValueError%'").fetchone()[0] == 2
+
+    counts = run_sweep(db_conn, "resume", market, GRID, workers=1)
+    assert counts == {"done": 2, "failed": 0, "skipped": 4}
+    assert db_conn.execute("SELECT COUNT(*) FROM sweep_result WHERE error IS NULL").fetchone()[0] == 6